@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, JSON, DateTime, Text
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, JSON, DateTime, Text, Index, SmallInteger, BigInteger
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -51,19 +51,82 @@ class ConfigApiKey(Base):
     max_latency = Column(Integer, default=0)
     method = Column(String(20), default="ANY")
     error_codes = Column(JSON, default=list)
+    # Optional chaos schedule: {"start_at": ISO-8601 UTC, "repeat": bool, "phases": [{"duration": s, ...overrides}]}
+    schedule = Column(JSON, nullable=True)
+    # Optional response corruption: {"rate": %, "modes": [...], "truncate_at": %, "flip_bytes": n}
+    corruption = Column(JSON, nullable=True)
+    # Optional connection-level faults: {"rate": %, "modes": [...], "delay_ms": n, "hang_ms": n}
+    transport_faults = Column(JSON, nullable=True)
+    # Reproducible chaos: decisions derived from seed + request number ("sequence") or request hash ("request")
+    seed = Column(BigInteger, nullable=True)
+    seed_mode = Column(String(16), nullable=True)
+    # Optional token-bucket rate limit: {"rate": requests per second, "burst": n}; over it, 429
+    rate_limit = Column(JSON, nullable=True)
+    # Optional concurrency limit: {"max_in_flight": n, "queue": n, "queue_timeout_ms": n, "latency_per_queued_ms": n}
+    concurrency_limit = Column(JSON, nullable=True)
+    # Optional correlated failures: {"p_enter": p, "p_exit": p, "bad_fail_rate": 0-100}, a good/bad state per key
+    failure_bursts = Column(JSON, nullable=True)
+    # Optional per-message chaos on proxied WebSockets: {"rate": 0-100, "modes": [...], "min_delay_ms": n,
+    # "max_delay_ms": n, "close_code": n, "direction": "both" | "client" | "target"}
+    websocket_chaos = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'))
     owner = relationship("User", back_populates="config_api_keys")
 
+    # Keyset pagination of a user's keys: WHERE owner_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index("ix_config_api_keys_owner_id_id", "owner_id", "id"),)
+
 
 class UsageLog(Base):
     __tablename__ = "usage_log"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     config_api_key_id = Column(Integer, ForeignKey("config_api_keys.id", ondelete="CASCADE"), index=True)
     requested_at = Column(DateTime, nullable=False, index=True)
+    status_code = Column(SmallInteger, nullable=True)  # status returned to the client (NULL for rows from older proxies)
+    latency_us = Column(Integer, nullable=True)  # end-to-end time seen by the proxy, injected delay included
+    upstream_us = Column(Integer, nullable=True)  # time waiting for the target (NULL when not forwarded)
+
+
+class LatencyRollup(Base):
+    """One minute of traffic for a config key as seen by one proxy process: counts per status and
+    latency histograms (sketch bins, see sketch.py). Rows for the same key are merged at read time."""
+    __tablename__ = "latency_rollups"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    config_api_key_id = Column(Integer, ForeignKey("config_api_keys.id", ondelete="CASCADE"), nullable=False)
+    minute = Column(DateTime, nullable=False)  # UTC start of the minute
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    status_counts = Column(JSON)  # {"200": 950, "503": 50}
+    latency_bins = Column(JSON)  # {bin index: count} of end-to-end latency (us)
+    upstream_bins = Column(JSON)  # same for time waiting for the target (forwarded requests only)
+
+    __table_args__ = (Index("ix_latency_rollups_key_minute", "config_api_key_id", "minute"),)
+
+
+class StripeWebhookEvent(Base):
+    """Inbox of verified Stripe webhook events. event_id is unique so retries are stored once;
+    the webhook worker applies pending rows in id order (status: pending | done | failed). A row that
+    hit an operational error stays pending with its attempt count and the time of its next retry."""
+    __tablename__ = "stripe_webhook_events"
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    event_id = Column(String(255), unique=True, nullable=False)
+    event_type = Column(String(255), nullable=False)
+    customer_id = Column(String(255), nullable=True, index=True)
+    payload = Column(Text, nullable=False)
+    status = Column(String(16), default="pending", nullable=False, index=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
 
 
-Base.metadata.create_all(bind=engine)
+class SchemaVersion(Base):
+    """One row per migration applied to this database (see migrations.py)."""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(255), nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 def get_db():
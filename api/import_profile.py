@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the API: runs `python -X importtime -c "import main"` in a fresh interpreter
+and reports the total and the slowest top-level imports (cumulative, so a package includes its own
+imports). With --budget-ms, exits 1 when the total is over budget.
+
+Usage: python import_profile.py [--module main] [--top 15] [--budget-ms 1500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def profile(module: str):
+    """[(module, self_us, cumulative_us, depth)] in import order."""
+    env = dict(os.environ)
+    # Importing must not need a database: fall back to a throwaway SQLite URL
+    env.setdefault("DATABASE_URL", "sqlite://")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the API")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    # The module's own row comes after everything it imported; interpreter startup imports come before
+    end = max(i for i, r in enumerate(rows) if r[0] == args.module and r[3] == 0)
+    start = max((i for i, r in enumerate(rows[:end]) if r[3] == 0), default=-1) + 1
+    total_ms = rows[end][2] / 1000
+    # Direct imports of the profiled module (depth 1), which is what its import statements control
+    top = sorted((r for r in rows[start:end] if r[3] == 1), key=lambda r: r[2], reverse=True)[:args.top]
+    print(f"import {args.module}: {total_ms:.0f} ms")
+    for name, _, cumulative, _ in top:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if args.budget_ms is not None:
+        status = "within" if total_ms <= args.budget_ms else "OVER"
+        print(f"budget {args.budget_ms:.0f} ms: {status}")
+        if total_ms > args.budget_ms:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
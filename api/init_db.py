@@ -1,10 +1,7 @@
-from database import SessionLocal, User, Base, engine, ConfigApiKey, UsageLog
-from passlib.context import CryptContext
-from sqlalchemy import text
+from database import SessionLocal, User, engine, ConfigApiKey
+import migrations
 import os
-import secrets
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import sys
 
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@example.com")
@@ -12,61 +9,23 @@ ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
 ADMIN_FULL_NAME = os.getenv("ADMIN_FULL_NAME", "Administrator")
 DEFAULT_API_KEY = os.getenv("DEFAULT_API_KEY", "lp_default_admin_key_change_in_production")
 
-def run_migrations(db):
-    """Add config_api_keys columns if missing; ensure usage_log exists; add users billing columns."""
-    for col, spec in [
-        ("target_url", "TEXT"),
-        ("fail_rate", "INT DEFAULT 0"),
-        ("min_latency", "INT DEFAULT 0"),
-        ("max_latency", "INT DEFAULT 0"),
-        ("method", "VARCHAR(20) DEFAULT 'ANY'"),
-        ("error_codes", "JSON"),
-    ]:
-        try:
-            db.execute(text(f"ALTER TABLE config_api_keys ADD COLUMN {col} {spec}"))
-            db.commit()
-            print(f"Added column {col} to config_api_keys")
-        except Exception:
-            db.rollback()
-    for col, spec in [
-        ("plan", "VARCHAR(32) NOT NULL DEFAULT 'free'"),
-        ("trial_ends_at", "DATETIME NULL"),
-        ("stripe_customer_id", "VARCHAR(255) NULL"),
-        ("stripe_subscription_id", "VARCHAR(255) NULL"),
-    ]:
-        try:
-            db.execute(text(f"ALTER TABLE users ADD COLUMN {col} {spec}"))
-            db.commit()
-            print(f"Added column {col} to users")
-        except Exception:
-            db.rollback()
-    # Ensure usage_log exists (proxy writes here for dashboard timeline)
-    try:
-        db.execute(text("""
-            CREATE TABLE IF NOT EXISTS usage_log (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                config_api_key_id INT NOT NULL,
-                requested_at DATETIME NOT NULL,
-                INDEX (config_api_key_id),
-                INDEX (requested_at),
-                FOREIGN KEY (config_api_key_id) REFERENCES config_api_keys(id) ON DELETE CASCADE
-            )
-        """))
-        db.commit()
-        print("Ensured usage_log table exists")
-    except Exception as e:
-        db.rollback()
-        print("Note: usage_log creation:", e)
-    Base.metadata.create_all(bind=engine)
-    print("Migrations completed")
+def ensure_schema(force: bool = False) -> bool:
+    """Apply pending migrations (see migrations.py). Returns True when any ran; when none are pending
+    this is one SELECT, so it is cheap on every boot."""
+    if not force and not migrations.pending(engine):
+        return False
+    return bool(migrations.run(engine, force=force))
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def init_db(force: bool = False):
+    if not ensure_schema(force):
+        print("Schema is up to date, migrations skipped (--force to run them)")
     db = SessionLocal()
-    run_migrations(db)
     try:
         admin_user = db.query(User).filter(User.username == ADMIN_USERNAME).first()
         if not admin_user:
+            # Only needed here: keeps bcrypt out of boots where the admin exists
+            from passlib.context import CryptContext
+            pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
             admin_user = User(
                 username=ADMIN_USERNAME,
                 email=ADMIN_EMAIL,
@@ -102,4 +61,4 @@ def init_db():
         db.close()
 
 if __name__ == "__main__":
-    init_db()
+    init_db(force="--force" in sys.argv[1:])
@@ -1,19 +1,20 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from pydantic import BaseModel, Field, field_validator, model_validator
+from sqlalchemy.orm import Session, load_only
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator, model_validator
 from typing import Optional, List
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from jose.exceptions import ExpiredSignatureError
-from passlib.context import CryptContext
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import json
 import os
 import re
 import secrets
 
-import stripe
-from database import get_db, User as DBUser, ConfigApiKey as DBConfigApiKey, UsageLog as DBUsageLog
+from database import get_db, SessionLocal, User as DBUser, ConfigApiKey as DBConfigApiKey, UsageLog as DBUsageLog, LatencyRollup as DBLatencyRollup
 from billing import (
     PLAN_LIMITS,
     get_effective_plan,
@@ -21,6 +22,12 @@ from billing import (
     get_keys_limit,
     get_requests_limit,
 )
+from plan_catalog import PlanCatalog
+from stripe_inbox import StripeInbox, enqueue_event
+from usage_stream import UsageAggregator, stream_events
+from rollups import RollupCompactor
+from sketch import LatencySketch, bin_sql
+from init_db import ensure_schema
 
 # Security
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -29,7 +36,17 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 if os.getenv("ENVIRONMENT") == "production" and SECRET_KEY == "your-secret-key-here":
     raise RuntimeError("Set SECRET_KEY in production")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# stripe, jose and passlib (with its bcrypt backend) are imported on first use: they are a large share
+# of the import time and most processes only need them once a request arrives
+def _stripe():
+    import stripe
+    return stripe
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 # Allowed HTTP methods for config
@@ -53,6 +70,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["Authorization", "Content-Type", "Accept"],
+    expose_headers=["X-Next-Cursor", "Link"],
 )
 
 # Models
@@ -113,6 +131,180 @@ def _validate_http_https(url: Optional[str]) -> Optional[str]:
         raise ValueError("target_url too long")
     return u
 
+# Chaos schedule: time-bounded phases that override the key's static chaos settings.
+# The proxy compiles the phases into a timeline once per cached key and looks up the active phase
+# by binary search; after the last phase the static settings apply again (unless repeat is set).
+MAX_SCHEDULE_PHASES = 1000
+
+class ChaosPhase(BaseModel):
+    duration: float = Field(..., gt=0, le=7 * 24 * 3600, description="Phase length in seconds")
+    fail_rate: Optional[int] = Field(None, ge=0, le=100)
+    min_latency: Optional[int] = Field(None, ge=0, le=60000)
+    max_latency: Optional[int] = Field(None, ge=0, le=60000)
+    error_codes: Optional[List[int]] = None
+
+    @field_validator("error_codes")
+    @classmethod
+    def error_codes_range(cls, v: Optional[List[int]]) -> Optional[List[int]]:
+        if not v:
+            return None
+        for c in v:
+            if c < 100 or c > 599:
+                raise ValueError("error_codes must be HTTP status codes 100-599")
+        return sorted(set(v))
+
+    @model_validator(mode="after")
+    def latency_order(self):
+        if self.min_latency is not None and self.max_latency is not None and self.min_latency > self.max_latency:
+            raise ValueError("min_latency cannot be greater than max_latency")
+        return self
+
+class ChaosSchedule(BaseModel):
+    start_at: Optional[datetime] = Field(None, description="UTC start of the first phase (default: when saved)")
+    repeat: bool = False
+    phases: List[ChaosPhase] = Field(default_factory=list, max_length=MAX_SCHEDULE_PHASES)
+
+    @field_validator("start_at")
+    @classmethod
+    def start_at_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        if v is None:
+            return None
+        if v.tzinfo is None:
+            return v.replace(tzinfo=timezone.utc)
+        return v.astimezone(timezone.utc)
+
+def _schedule_to_db(schedule: Optional[ChaosSchedule]) -> Optional[dict]:
+    """JSON stored in config_api_keys.schedule; an empty phase list clears the schedule."""
+    if schedule is None or not schedule.phases:
+        return None
+    if schedule.start_at is None:
+        schedule = schedule.model_copy(update={"start_at": datetime.now(timezone.utc).replace(microsecond=0)})
+    return schedule.model_dump(mode="json", exclude_none=True)
+
+# Response corruption: a share of forwarded responses get their body damaged while relayed
+CORRUPTION_MODES = ("truncate", "flip", "drop", "malformed_json")
+
+class CorruptionConfig(BaseModel):
+    rate: int = Field(0, ge=0, le=100, description="Percentage of forwarded responses corrupted")
+    modes: List[str] = Field(default_factory=lambda: ["truncate"], min_length=1)
+    truncate_at: Optional[int] = Field(None, ge=0, le=100, description="Percentage of the body kept (default: random offset)")
+    flip_bytes: int = Field(8, ge=1, le=65536)
+
+    @field_validator("modes")
+    @classmethod
+    def modes_known(cls, v: List[str]) -> List[str]:
+        for m in v:
+            if m not in CORRUPTION_MODES:
+                raise ValueError("modes must be among: " + ", ".join(CORRUPTION_MODES))
+        return sorted(set(v), key=CORRUPTION_MODES.index)
+
+def _corruption_to_db(corruption: Optional[CorruptionConfig]) -> Optional[dict]:
+    """JSON stored in config_api_keys.corruption; rate 0 clears it."""
+    if corruption is None or corruption.rate == 0:
+        return None
+    return corruption.model_dump(exclude_none=True)
+
+# Transport faults: resets, hung connections and slow responses below the HTTP status level
+TRANSPORT_FAULT_MODES = ("reset", "hang", "slow_first_byte", "slow_body")
+
+class TransportFaultsConfig(BaseModel):
+    rate: int = Field(0, ge=0, le=100, description="Percentage of requests with a transport fault")
+    modes: List[str] = Field(default_factory=lambda: ["reset"], min_length=1)
+    delay_ms: int = Field(5000, ge=0, le=600000, description="slow_first_byte / slow_body delay")
+    hang_ms: int = Field(60000, ge=0, le=600000, description="How long a hung connection is held open")
+
+    @field_validator("modes")
+    @classmethod
+    def modes_known(cls, v: List[str]) -> List[str]:
+        for m in v:
+            if m not in TRANSPORT_FAULT_MODES:
+                raise ValueError("modes must be among: " + ", ".join(TRANSPORT_FAULT_MODES))
+        return sorted(set(v), key=TRANSPORT_FAULT_MODES.index)
+
+def _transport_faults_to_db(faults: Optional[TransportFaultsConfig]) -> Optional[dict]:
+    """JSON stored in config_api_keys.transport_faults; rate 0 clears it."""
+    if faults is None or faults.rate == 0:
+        return None
+    return faults.model_dump()
+
+# Rate limit: a token bucket of `burst` requests refilled at `rate` per second; requests over it get a
+# 429 with Retry-After and X-RateLimit-* headers instead of being forwarded
+class RateLimitConfig(BaseModel):
+    rate: float = Field(0, ge=0, le=1000000, description="Requests per second (bucket refill rate)")
+    burst: Optional[int] = Field(None, ge=1, le=1000000, description="Bucket size (default: rate rounded up)")
+
+def _rate_limit_to_db(limit: Optional[RateLimitConfig]) -> Optional[dict]:
+    """JSON stored in config_api_keys.rate_limit; rate 0 clears it."""
+    if limit is None or limit.rate == 0:
+        return None
+    return limit.model_dump(exclude_none=True)
+
+# Concurrency limit: a saturated target with max_in_flight slots; up to `queue` more requests wait
+# (queue_timeout_ms at most), the others get a 503
+class ConcurrencyLimitConfig(BaseModel):
+    max_in_flight: int = Field(0, ge=0, le=100000, description="Requests forwarded at once")
+    queue: int = Field(0, ge=0, le=100000, description="Requests waiting for a slot (0: reject at once)")
+    queue_timeout_ms: int = Field(1000, ge=0, le=600000, description="Longest wait for a slot before a 503")
+    latency_per_queued_ms: int = Field(0, ge=0, le=60000, description="Extra latency per queue position of a waiting request")
+
+def _concurrency_limit_to_db(limit: Optional[ConcurrencyLimitConfig]) -> Optional[dict]:
+    """JSON stored in config_api_keys.concurrency_limit; max_in_flight 0 clears it."""
+    if limit is None or limit.max_in_flight == 0:
+        return None
+    return limit.model_dump()
+
+# Failure bursts (Gilbert-Elliott): each request moves the key from good to bad with probability p_enter,
+# or back with p_exit; a bad key fails at bad_fail_rate instead of fail_rate, so failures come in bursts
+class FailureBurstsConfig(BaseModel):
+    p_enter: float = Field(0, ge=0, le=1, description="Probability a request starts a burst")
+    p_exit: float = Field(0.1, ge=0, le=1, description="Probability a request ends a burst (mean length 1 / p_exit)")
+    bad_fail_rate: int = Field(100, ge=0, le=100, description="Failure percentage during a burst")
+
+def _failure_bursts_to_db(bursts: Optional[FailureBurstsConfig]) -> Optional[dict]:
+    """JSON stored in config_api_keys.failure_bursts; p_enter 0 clears it."""
+    if bursts is None or bursts.p_enter == 0:
+        return None
+    return bursts.model_dump()
+
+# WebSocket chaos, per message relayed on a proxied WebSocket: a delay in [min_delay_ms, max_delay_ms),
+# then `rate`% of the messages are dropped, duplicated, reordered or end the connection with close_code
+WEBSOCKET_MODES = ("drop", "duplicate", "reorder", "close")
+WEBSOCKET_DIRECTIONS = ("both", "client", "target")
+
+class WebSocketChaosConfig(BaseModel):
+    rate: int = Field(0, ge=0, le=100, description="Percentage of messages with a fault")
+    modes: List[str] = Field(default_factory=lambda: ["drop"], min_length=1)
+    min_delay_ms: int = Field(0, ge=0, le=60000, description="Minimum delay per message")
+    max_delay_ms: int = Field(0, ge=0, le=60000, description="Maximum delay per message")
+    close_code: int = Field(1011, ge=1000, le=4999, description="Status code of close faults")
+    direction: str = Field("both", description="Messages sent by the client, the target, or both")
+
+    @field_validator("modes")
+    @classmethod
+    def modes_known(cls, v: List[str]) -> List[str]:
+        for m in v:
+            if m not in WEBSOCKET_MODES:
+                raise ValueError("modes must be among: " + ", ".join(WEBSOCKET_MODES))
+        return sorted(set(v), key=WEBSOCKET_MODES.index)
+
+    @field_validator("direction")
+    @classmethod
+    def direction_known(cls, v: str) -> str:
+        if v not in WEBSOCKET_DIRECTIONS:
+            raise ValueError("direction must be one of: " + ", ".join(WEBSOCKET_DIRECTIONS))
+        return v
+
+def _websocket_chaos_to_db(ws: Optional[WebSocketChaosConfig]) -> Optional[dict]:
+    """JSON stored in config_api_keys.websocket_chaos; no rate and no delay clears it."""
+    if ws is None or (ws.rate == 0 and ws.max_delay_ms == 0 and ws.min_delay_ms == 0):
+        return None
+    return ws.model_dump()
+
+# Seeded chaos: the decisions for request N are a function of (seed, N); N is the key's request
+# counter ("sequence") or a hash of method, path, query and X-Request-Id ("request")
+SEED_MODES = ("sequence", "request")
+SEED_RANGE = {"ge": -(2 ** 63), "le": 2 ** 63 - 1}
+
 class ConfigApiKeyBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     target_url: Optional[str] = None
@@ -121,12 +313,30 @@ class ConfigApiKeyBase(BaseModel):
     max_latency: int = Field(0, ge=0, le=60000)
     method: str = "ANY"
     error_codes: List[int] = []
+    schedule: Optional[ChaosSchedule] = None
+    corruption: Optional[CorruptionConfig] = None
+    transport_faults: Optional[TransportFaultsConfig] = None
+    seed: Optional[int] = Field(None, **SEED_RANGE)
+    seed_mode: Optional[str] = "sequence"
+    rate_limit: Optional[RateLimitConfig] = None
+    concurrency_limit: Optional[ConcurrencyLimitConfig] = None
+    failure_bursts: Optional[FailureBurstsConfig] = None
+    websocket_chaos: Optional[WebSocketChaosConfig] = None
 
     @field_validator("target_url")
     @classmethod
     def target_url_http_https(cls, v: Optional[str]) -> Optional[str]:
         return _validate_http_https(v)
 
+    @field_validator("seed_mode")
+    @classmethod
+    def seed_mode_known(cls, v: Optional[str]) -> str:
+        if v is None:
+            return "sequence"
+        if v not in SEED_MODES:
+            raise ValueError("seed_mode must be sequence or request")
+        return v
+
     @field_validator("method")
     @classmethod
     def method_allowed(cls, v: str) -> str:
@@ -163,6 +373,28 @@ class ConfigApiKeyUpdate(BaseModel):
     max_latency: Optional[int] = Field(None, ge=0, le=60000)
     method: Optional[str] = None
     error_codes: Optional[List[int]] = None
+    # Send {"phases": []} to remove the schedule
+    schedule: Optional[ChaosSchedule] = None
+    # Send {"rate": 0} to turn corruption / transport faults / the rate limit off
+    corruption: Optional[CorruptionConfig] = None
+    transport_faults: Optional[TransportFaultsConfig] = None
+    rate_limit: Optional[RateLimitConfig] = None
+    # Send {"max_in_flight": 0} to turn the concurrency limit off
+    concurrency_limit: Optional[ConcurrencyLimitConfig] = None
+    # Send {"p_enter": 0} to turn failure bursts off
+    failure_bursts: Optional[FailureBurstsConfig] = None
+    # Send {"rate": 0} (and no delay) to turn WebSocket chaos off
+    websocket_chaos: Optional[WebSocketChaosConfig] = None
+    # Send "seed": null to turn seeded chaos off
+    seed: Optional[int] = Field(None, **SEED_RANGE)
+    seed_mode: Optional[str] = None
+
+    @field_validator("seed_mode")
+    @classmethod
+    def seed_mode_known(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and v not in SEED_MODES:
+            raise ValueError("seed_mode must be sequence or request")
+        return v
 
     @field_validator("target_url")
     @classmethod
@@ -191,6 +423,24 @@ class ConfigApiKeyUpdate(BaseModel):
                 raise ValueError("error_codes must be 100-599")
         return sorted(set(v))
 
+class ConfigApiKeyBatchUpdate(ConfigApiKeyUpdate):
+    id: int
+
+# Bulk provisioning: the whole batch is validated in one pass (errors carry the item index)
+# and applied in one transaction.
+MAX_BATCH_SIZE = 1000
+
+class ConfigApiKeyBatch(BaseModel):
+    create: List[ConfigApiKeyCreate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    update: List[ConfigApiKeyBatchUpdate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    delete: List[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
+class ConfigApiKeyImport(ConfigApiKeyBase):
+    is_active: bool = True
+
+# Fields written by export and accepted by import (no id/key: imports get fresh keys)
+CONFIG_KEY_EXPORT_FIELDS = ("name", "is_active", "target_url", "fail_rate", "min_latency", "max_latency", "method", "error_codes", "schedule", "corruption", "transport_faults", "seed", "seed_mode", "rate_limit", "concurrency_limit", "failure_bursts", "websocket_chaos")
+
 class ConfigApiKeyResponse(ConfigApiKeyBase):
     id: int
     key: str
@@ -201,7 +451,7 @@ class ConfigApiKeyResponse(ConfigApiKeyBase):
         orm_mode = True
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_user(db: Session, username: str):
     return db.query(DBUser).filter(DBUser.username == username).first()
@@ -216,14 +466,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
+    from jose import jwt
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return user_from_token(token, db)
+
+
+def user_from_token(token: str, db: Session):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    from jose import JWTError, jwt
+    from jose.exceptions import ExpiredSignatureError
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -270,7 +527,7 @@ async def register_user(body: UserCreate, db: Session = Depends(get_db)):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
         db_user = DBUser(
             username=username, email=body.email, full_name=body.full_name or None,
-            hashed_password=pwd_context.hash(body.password), disabled=False
+            hashed_password=pwd_context().hash(body.password), disabled=False
         )
         db.add(db_user)
         db.commit()
@@ -315,29 +572,211 @@ async def health(db: Session = Depends(get_db)):
 def generate_config_api_key():
     return f"lp_{secrets.token_urlsafe(32)}"
 
-@app.post("/api/config-keys/", response_model=ConfigApiKeyResponse)
-async def create_config_key(data: ConfigApiKeyCreate, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    plan = get_effective_plan(current_user)
-    key_count = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id).count()
-    if key_count >= get_keys_limit(plan):
+def _new_config_key(data: ConfigApiKeyBase, owner_id: int, is_active: bool = True) -> DBConfigApiKey:
+    return DBConfigApiKey(
+        name=data.name, key=generate_config_api_key(), is_active=is_active,
+        target_url=(data.target_url or "").strip() or None,
+        fail_rate=min(100, max(0, data.fail_rate)), min_latency=data.min_latency or 0, max_latency=data.max_latency or 0,
+        method=(data.method or "ANY").upper(), error_codes=data.error_codes or [],
+        schedule=_schedule_to_db(data.schedule), corruption=_corruption_to_db(data.corruption),
+        transport_faults=_transport_faults_to_db(data.transport_faults),
+        seed=data.seed, seed_mode=data.seed_mode, rate_limit=_rate_limit_to_db(data.rate_limit),
+        concurrency_limit=_concurrency_limit_to_db(data.concurrency_limit),
+        failure_bursts=_failure_bursts_to_db(data.failure_bursts),
+        websocket_chaos=_websocket_chaos_to_db(data.websocket_chaos), owner_id=owner_id
+    )
+
+def _apply_config_key_update(k: DBConfigApiKey, data: ConfigApiKeyUpdate) -> Optional[str]:
+    """Apply a partial update in place. Returns an error message if the result is invalid."""
+    if data.name is not None:
+        k.name = data.name
+    if data.is_active is not None:
+        k.is_active = data.is_active
+    if data.target_url is not None:
+        k.target_url = data.target_url.strip() or None
+    if data.fail_rate is not None:
+        k.fail_rate = min(100, max(0, data.fail_rate))
+    if data.min_latency is not None:
+        k.min_latency = data.min_latency
+    if data.max_latency is not None:
+        k.max_latency = data.max_latency
+    if data.method is not None:
+        k.method = data.method.upper()
+    if data.error_codes is not None:
+        k.error_codes = data.error_codes
+    if data.schedule is not None:
+        k.schedule = _schedule_to_db(data.schedule)
+    if data.corruption is not None:
+        k.corruption = _corruption_to_db(data.corruption)
+    if data.transport_faults is not None:
+        k.transport_faults = _transport_faults_to_db(data.transport_faults)
+    if data.rate_limit is not None:
+        k.rate_limit = _rate_limit_to_db(data.rate_limit)
+    if data.concurrency_limit is not None:
+        k.concurrency_limit = _concurrency_limit_to_db(data.concurrency_limit)
+    if data.failure_bursts is not None:
+        k.failure_bursts = _failure_bursts_to_db(data.failure_bursts)
+    if data.websocket_chaos is not None:
+        k.websocket_chaos = _websocket_chaos_to_db(data.websocket_chaos)
+    if "seed" in data.model_fields_set:
+        k.seed = data.seed
+    if data.seed_mode is not None:
+        k.seed_mode = data.seed_mode
+    if k.min_latency > k.max_latency:
+        return "min_latency cannot be greater than max_latency"
+    return None
+
+def _check_keys_limit(db: Session, user: DBUser, adding: int, removing: int = 0) -> None:
+    """One plan-limit check for a whole request (single key or batch)."""
+    if adding <= 0:
+        return
+    plan = get_effective_plan(user)
+    key_count = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == user.id).count()
+    if key_count - removing + adding > get_keys_limit(plan):
         raise HTTPException(
             status_code=403,
             detail=f"Plan limit reached: {get_keys_limit(plan)} config keys. Upgrade to add more.",
         )
-    db_key = DBConfigApiKey(
-        name=data.name, key=generate_config_api_key(), is_active=True,
-        target_url=(data.target_url or "").strip() or None,
-        fail_rate=min(100, max(0, data.fail_rate)), min_latency=data.min_latency or 0, max_latency=data.max_latency or 0,
-        method=(data.method or "ANY").upper(), error_codes=data.error_codes or [], owner_id=current_user.id
-    )
+
+@app.post("/api/config-keys/", response_model=ConfigApiKeyResponse)
+async def create_config_key(data: ConfigApiKeyCreate, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+    _check_keys_limit(db, current_user, 1)
+    db_key = _new_config_key(data, current_user.id)
     db.add(db_key)
     db.commit()
     db.refresh(db_key)
     return db_key
 
+@app.post("/api/config-keys/batch/")
+async def batch_config_keys(data: ConfigApiKeyBatch, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+    """Create, update and delete many keys in one transaction. All-or-nothing."""
+    update_ids = [u.id for u in data.update]
+    delete_ids = sorted(set(data.delete))
+    if len(set(update_ids)) != len(update_ids):
+        raise HTTPException(status_code=400, detail="Duplicate ids in update")
+    if set(update_ids) & set(delete_ids):
+        raise HTTPException(status_code=400, detail="A key cannot be updated and deleted in the same batch")
+    ids = update_ids + delete_ids
+    existing = {}
+    if ids:
+        existing = {
+            k.id: k for k in db.query(DBConfigApiKey).filter(
+                DBConfigApiKey.owner_id == current_user.id, DBConfigApiKey.id.in_(ids)
+            )
+        }
+    missing = [i for i in ids if i not in existing]
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Config keys not found", "ids": missing})
+    _check_keys_limit(db, current_user, len(data.create), len(delete_ids))
+    errors = []
+    for index, u in enumerate(data.update):
+        err = _apply_config_key_update(existing[u.id], u)
+        if err:
+            errors.append({"index": index, "id": u.id, "error": err})
+    if errors:
+        db.rollback()
+        raise HTTPException(status_code=400, detail={"message": "Invalid update", "errors": errors})
+    for key_id in delete_ids:
+        db.delete(existing[key_id])
+    created = [_new_config_key(c, current_user.id) for c in data.create]
+    db.add_all(created)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Batch could not be applied")
+    return {
+        "created": [ConfigApiKeyResponse.model_validate(k, from_attributes=True) for k in created],
+        "updated": [ConfigApiKeyResponse.model_validate(existing[i], from_attributes=True) for i in update_ids],
+        "deleted": delete_ids,
+    }
+
+@app.get("/api/config-keys/export/")
+async def export_config_keys(format: str = "json", db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    keys = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id).order_by(DBConfigApiKey.id).all()
+    items = [{f: getattr(k, f) for f in CONFIG_KEY_EXPORT_FIELDS} for k in keys]
+    if format == "ndjson":
+        body = "".join(json.dumps(item) + "\n" for item in items)
+        return Response(content=body, media_type="application/x-ndjson")
+    return JSONResponse(content=items)
+
+@app.post("/api/config-keys/import/")
+async def import_config_keys(request: Request, format: Optional[str] = None, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+    """Create keys from an export (JSON array, or NDJSON with ?format=ndjson / Content-Type application/x-ndjson)."""
+    raw = await request.body()
+    if format is None:
+        format = "ndjson" if "ndjson" in request.headers.get("content-type", "") else "json"
+    try:
+        if format == "ndjson":
+            items = [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+        elif format == "json":
+            items = json.loads(raw or b"[]")
+        else:
+            raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {format} body")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a list of config keys")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} keys per import")
+    try:
+        keys = TypeAdapter(List[ConfigApiKeyImport]).validate_python(items)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    _check_keys_limit(db, current_user, len(keys))
+    created = [_new_config_key(k, current_user.id, is_active=k.is_active) for k in keys]
+    db.add_all(created)
+    db.commit()
+    return {"created": [ConfigApiKeyResponse.model_validate(k, from_attributes=True) for k in created]}
+
+# Keyset pagination on id: pass the X-Next-Cursor header of a page as ?after= to get the next one.
+CONFIG_KEY_PAGE_DEFAULT = 100
+CONFIG_KEY_PAGE_MAX = 500
+
 @app.get("/api/config-keys/", response_model=List[ConfigApiKeyResponse])
-async def list_config_keys(db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    return db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id).all()
+async def list_config_keys(
+    request: Request,
+    response: Response,
+    limit: int = Query(CONFIG_KEY_PAGE_DEFAULT, ge=1, le=CONFIG_KEY_PAGE_MAX),
+    after: Optional[int] = Query(None, ge=0, description="Return keys with id greater than this cursor"),
+    is_active: Optional[bool] = None,
+    method: Optional[str] = None,
+    target_prefix: Optional[str] = Query(None, max_length=2048, description="Only keys whose target_url starts with this"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
+    db: Session = Depends(get_db),
+    current_user: DBUser = Depends(get_current_user),
+):
+    selected = None
+    if fields:
+        selected = ["id"] + [f for f in dict.fromkeys(x.strip() for x in fields.split(",")) if f and f != "id"]
+        unknown = [f for f in selected if f not in ConfigApiKeyResponse.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    q = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id)
+    if after is not None:
+        q = q.filter(DBConfigApiKey.id > after)
+    if is_active is not None:
+        q = q.filter(DBConfigApiKey.is_active == is_active)
+    if method:
+        q = q.filter(DBConfigApiKey.method == method.upper())
+    if target_prefix:
+        q = q.filter(DBConfigApiKey.target_url.startswith(target_prefix, autoescape=True))
+    if selected:
+        q = q.options(load_only(*(getattr(DBConfigApiKey, f) for f in selected)))
+    rows = q.order_by(DBConfigApiKey.id).limit(limit + 1).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = str(rows[-1].id)
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{request.url.include_query_params(after=cursor)}>; rel="next"'
+    if selected:
+        items = [{f: getattr(k, f) for f in selected} for k in rows]
+        return JSONResponse(content=jsonable_encoder(items), headers=headers)
+    response.headers.update(headers)
+    return rows
 
 @app.get("/api/config-keys/{key_id}/", response_model=ConfigApiKeyResponse)
 async def get_config_key(key_id: int, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
@@ -351,24 +790,9 @@ async def update_config_key(key_id: int, data: ConfigApiKeyUpdate, db: Session =
     k = db.query(DBConfigApiKey).filter(DBConfigApiKey.id == key_id, DBConfigApiKey.owner_id == current_user.id).first()
     if k is None:
         raise HTTPException(status_code=404, detail="Config key not found")
-    if data.name is not None:
-        k.name = data.name
-    if data.is_active is not None:
-        k.is_active = data.is_active
-    if data.target_url is not None:
-        k.target_url = data.target_url.strip() or None
-    if data.fail_rate is not None:
-        k.fail_rate = min(100, max(0, data.fail_rate))
-    if data.min_latency is not None:
-        k.min_latency = data.min_latency
-    if data.max_latency is not None:
-        k.max_latency = data.max_latency
-    if data.method is not None:
-        k.method = data.method.upper()
-    if data.error_codes is not None:
-        k.error_codes = data.error_codes
-    if k.min_latency > k.max_latency:
-        raise HTTPException(status_code=400, detail="min_latency cannot be greater than max_latency")
+    err = _apply_config_key_update(k, data)
+    if err:
+        raise HTTPException(status_code=400, detail=err)
     db.commit()
     db.refresh(k)
     return k
@@ -383,9 +807,49 @@ async def delete_config_key(key_id: int, db: Session = Depends(get_db), current_
     return {"message": "Config key deleted"}
 
 
+def _to_ms(values: dict) -> dict:
+    """Sketch quantiles (us) in ms."""
+    return {p: (round(v / 1000, 3) if v is not None else None) for p, v in values.items()}
+
+
 # Usage summary (raw counts for debugging empty chart)
+def _rollup_stats(db: Session, owner_id: int, since: datetime, percentiles=(50, 90, 99)) -> dict:
+    """Merge the rollups (all proxies and workers) of the owner's keys since `since`: per minute for the
+    last ROLLUP_COMPACT_AFTER seconds, one row per hour before (see rollups.py).
+    Returns key id -> requests, errors, counts per status and latency percentiles (ms)."""
+    merged = {}
+    rows = (
+        db.query(DBLatencyRollup)
+        .join(DBConfigApiKey, DBConfigApiKey.id == DBLatencyRollup.config_api_key_id)
+        .filter(DBConfigApiKey.owner_id == owner_id, DBLatencyRollup.minute >= since)
+        .yield_per(1000)
+    )
+    for r in rows:
+        m = merged.get(r.config_api_key_id)
+        if m is None:
+            m = merged[r.config_api_key_id] = {"requests": 0, "errors": 0, "status": {}, "latency": LatencySketch(), "upstream": LatencySketch()}
+        m["requests"] += r.requests or 0
+        m["errors"] += r.errors or 0
+        for code, n in (r.status_counts or {}).items():
+            m["status"][code] = m["status"].get(code, 0) + n
+        m["latency"].merge(LatencySketch.from_json(r.latency_bins))
+        m["upstream"].merge(LatencySketch.from_json(r.upstream_bins))
+
+    return {
+        kid: {
+            "requests": m["requests"],
+            "errors": m["errors"],
+            "status": dict(sorted(m["status"].items())),
+            "latency_ms": _to_ms(m["latency"].quantiles(percentiles)),
+            "upstream_ms": _to_ms(m["upstream"].quantiles(percentiles)),
+        }
+        for kid, m in merged.items()
+    }
+
+
 @app.get("/api/usage/summary")
 async def usage_summary(
+    latency_hours: int = Query(24, ge=1, le=24 * 30),
     db: Session = Depends(get_db),
     current_user: DBUser = Depends(get_current_user),
 ):
@@ -414,50 +878,46 @@ async def usage_summary(
         except Exception:
             cnt = 0
         by_key.append({"key_id": k.id, "key_name": k.name or f"Key {k.id}", "count": cnt})
-    return {"total_requests": total, "by_key": by_key}
-
-
-def _format_stripe_price(price_obj) -> str:
-    """Format Stripe Price for display (e.g. '12.00 €/month')."""
-    unit_amount = getattr(price_obj, "unit_amount", None) or 0
-    amount = unit_amount / 100
-    currency = (getattr(price_obj, "currency", None) or "eur").upper()
-    symbol = "€" if currency == "EUR" else " " + currency
-    interval = "month"
-    recurring = getattr(price_obj, "recurring", None)
-    if recurring:
-        interval = getattr(recurring, "interval", None) or interval
-    return f"{amount:.2f}{symbol}/{interval}"
+    # Latency percentiles and status counts over the last latency_hours, from the per-minute sketches
+    try:
+        rollups = _rollup_stats(db, current_user.id, datetime.utcnow() - timedelta(hours=latency_hours))
+    except Exception as e:
+        print("Latency rollups unavailable:", e)
+        db.rollback()
+        rollups = {}
+    for entry in by_key:
+        entry["recent"] = rollups.get(entry["key_id"])
+    return {"total_requests": total, "by_key": by_key, "latency_hours": latency_hours}
+
+
+usage_aggregator = UsageAggregator(SessionLocal)
+# Merges closed hours of latency_rollups into one row per key and hour, so summaries read few rows
+rollup_compactor = RollupCompactor(SessionLocal)
+
+
+# Live per-key request/error deltas (server-sent events). EventSource cannot send headers, so the
+# access token is passed as ?token=. The DB session is only held for authentication.
+@app.get("/api/usage/stream")
+async def usage_stream(request: Request, token: str = Query(..., min_length=1)):
+    db = SessionLocal()
+    try:
+        user = user_from_token(token, db)
+        owner_id = user.id
+    finally:
+        db.close()
+    return StreamingResponse(
+        stream_events(usage_aggregator, owner_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-# Public plans (prices fetched from Stripe by price_id)
+# Public plans (prices fetched from Stripe by price_id, cached in plan_catalog)
 @app.get("/api/billing/plans")
 async def billing_plans():
     if STRIPE_SECRET_KEY == "localhost" or not STRIPE_SECRET_KEY:
         return {"plans": []}
-    plan_defs = [
-        ("starter", "Starter", 10, 50000, STRIPE_STARTER_PRICE_ID),
-        ("pro", "Pro", 50, 500000, STRIPE_PRO_PRICE_ID),
-    ]
-    plans = []
-    client = stripe.StripeClient(STRIPE_SECRET_KEY)
-    for plan_id, name, keys, requests_per_month, price_id in plan_defs:
-        if not price_id or not price_id.startswith("price_"):
-            continue
-        try:
-            price_obj = client.prices.retrieve(price_id)
-            price_display = _format_stripe_price(price_obj)
-            plans.append({
-                "id": plan_id,
-                "name": name,
-                "keys": keys,
-                "requests_per_month": requests_per_month,
-                "price_display": price_display,
-                "price_id": price_id,
-            })
-        except Exception:
-            continue
-    return {"plans": plans}
+    return {"plans": await plan_catalog.get_plans()}
 
 
 # Sync plan from Stripe (call after checkout success; updates DB from Stripe subscriptions)
@@ -468,7 +928,7 @@ async def billing_sync(db: Session = Depends(get_db), current_user: DBUser = Dep
     cid = getattr(current_user, "stripe_customer_id", None)
     if not cid:
         return {"plan": "free", "synced": True}
-    client = stripe.StripeClient(STRIPE_SECRET_KEY)
+    client = _stripe().StripeClient(STRIPE_SECRET_KEY)
     try:
         for status in ("active", "trialing"):
             subs = client.subscriptions.list(params={"customer": cid, "status": status, "limit": 1})
@@ -490,7 +950,7 @@ async def billing_sync(db: Session = Depends(get_db), current_user: DBUser = Dep
         current_user.plan = "free"
         db.commit()
         db.refresh(current_user)
-    except stripe.StripeError:
+    except _stripe().StripeError:
         return {"plan": get_effective_plan(current_user), "synced": False}
     except Exception:
         return {"plan": get_effective_plan(current_user), "synced": False}
@@ -516,15 +976,8 @@ async def billing_usage(db: Session = Depends(get_db), current_user: DBUser = De
     }
 
 
-# Usage timeline (aggregated by hour/day/month)
-@app.get("/api/usage/timeline")
-async def usage_timeline(
-    group_by: str = "day",
-    period: str = "30d",
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user),
-):
-    from sqlalchemy import text
+def _usage_window(group_by: str, period: str):
+    """Validate group_by/period; returns (date_from, MySQL DATE_FORMAT pattern of a bucket)."""
     if group_by not in ("hour", "day", "month"):
         raise HTTPException(status_code=400, detail="group_by must be hour, day, or month")
     if period not in ("7d", "30d"):
@@ -533,15 +986,13 @@ async def usage_timeline(
     if group_by == "hour" and period == "30d":
         raise HTTPException(status_code=400, detail="hour grouping only allowed with period=7d")
     date_from = datetime.utcnow() - timedelta(days=days)
-
     # MySQL date format for grouping
     fmt = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "month": "%Y-%m"}[group_by]
-    bucket_col = f"DATE_FORMAT(u.requested_at, '{fmt}')"
+    return date_from, fmt
 
-    keys = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id).order_by(DBConfigApiKey.id).all()
-    key_ids = [k.id for k in keys]
 
-    # Build ordered list of bucket labels for the range
+def _usage_bucket_labels(group_by: str, date_from: datetime) -> List[str]:
+    """Ordered bucket labels for the range (same strings as DATE_FORMAT returns)."""
     labels = []
     if group_by == "hour":
         cur = date_from
@@ -564,6 +1015,25 @@ async def usage_timeline(
             else:
                 cur = cur.replace(month=cur.month + 1)
 
+    return labels
+
+
+# Usage timeline (aggregated by hour/day/month)
+@app.get("/api/usage/timeline")
+async def usage_timeline(
+    group_by: str = "day",
+    period: str = "30d",
+    db: Session = Depends(get_db),
+    current_user: DBUser = Depends(get_current_user),
+):
+    from sqlalchemy import text
+    date_from, fmt = _usage_window(group_by, period)
+    bucket_col = f"DATE_FORMAT(u.requested_at, '{fmt}')"
+
+    keys = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id).order_by(DBConfigApiKey.id).all()
+    key_ids = [k.id for k in keys]
+    labels = _usage_bucket_labels(group_by, date_from)
+
     # Raw query: count per (config_api_key_id, bucket) for user's keys
     # MySQL: GROUP BY bucket, config_api_key_id
     series = []
@@ -589,6 +1059,73 @@ async def usage_timeline(
     return {"group_by": group_by, "period": period, "labels": labels, "series": series}
 
 
+# Latency percentiles per key and bucket (end-to-end and upstream), from mergeable histograms:
+# MySQL groups requests into log-linear bins, buckets are merged for the whole-period percentiles.
+@app.get("/api/usage/latency")
+async def usage_latency(
+    group_by: str = "day",
+    period: str = "7d",
+    key_id: Optional[int] = None,
+    percentiles: str = "50,90,99",
+    db: Session = Depends(get_db),
+    current_user: DBUser = Depends(get_current_user),
+):
+    from sqlalchemy import text
+    date_from, fmt = _usage_window(group_by, period)
+    try:
+        qs = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        qs = []
+    if not qs or len(qs) > 10 or any(q <= 0 or q > 100 for q in qs):
+        raise HTTPException(status_code=400, detail="percentiles must be 1-10 comma-separated numbers in (0, 100]")
+    query = db.query(DBConfigApiKey).filter(DBConfigApiKey.owner_id == current_user.id)
+    if key_id is not None:
+        query = query.filter(DBConfigApiKey.id == key_id)
+    keys = query.order_by(DBConfigApiKey.id).all()
+    if key_id is not None and not keys:
+        raise HTTPException(status_code=404, detail="Config key not found")
+    labels = _usage_bucket_labels(group_by, date_from)
+
+    # (key_id, metric) -> bucket -> sketch; one grouped query per metric for all keys
+    sketches = {}
+    params = {"owner_id": current_user.id, "date_from": date_from}
+    key_filter = ""
+    if key_id is not None:
+        key_filter = "AND u.config_api_key_id = :key_id"
+        params["key_id"] = key_id
+    for metric, column in (("latency", "u.latency_us"), ("upstream", "u.upstream_us")):
+        rows = db.execute(text(f"""
+            SELECT DATE_FORMAT(u.requested_at, '{fmt}') AS bucket, u.config_api_key_id, {bin_sql(column)} AS bin, COUNT(*) AS cnt
+            FROM usage_log u
+            INNER JOIN config_api_keys c ON c.id = u.config_api_key_id AND c.owner_id = :owner_id
+            WHERE u.requested_at >= :date_from AND {column} IS NOT NULL {key_filter}
+            GROUP BY bucket, u.config_api_key_id, bin
+        """), params).fetchall()
+        for bucket, kid, b, cnt in rows:
+            bucket = str(bucket).strip() if bucket is not None else None
+            by_bucket = sketches.setdefault((kid, metric), {})
+            by_bucket.setdefault(bucket, LatencySketch()).add_bin(int(b), int(cnt))
+
+    series = []
+    for k in keys:
+        entry = {"key_id": k.id, "key_name": k.name or f"Key {k.id}"}
+        overall = {}
+        for metric in ("latency", "upstream"):
+            by_bucket = sketches.get((k.id, metric), {})
+            per_bucket = [_to_ms(by_bucket[lb].quantiles(qs)) if lb in by_bucket else None for lb in labels]
+            entry[metric] = {f"p{q:g}": [b[f"p{q:g}"] if b else None for b in per_bucket] for q in qs}
+            merged = LatencySketch()
+            for sketch in by_bucket.values():
+                merged.merge(sketch)
+            overall[metric] = _to_ms(merged.quantiles(qs))
+            if metric == "latency":
+                entry["counts"] = [by_bucket[lb].count if lb in by_bucket else 0 for lb in labels]
+                overall["count"] = merged.count
+        entry["overall"] = overall
+        series.append(entry)
+    return {"group_by": group_by, "period": period, "unit": "ms", "labels": labels, "series": series}
+
+
 # Stripe billing: trial (1 day), checkout, portal, webhook
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "localhost")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
@@ -596,6 +1133,47 @@ STRIPE_STARTER_PRICE_ID = os.getenv("STRIPE_STARTER_PRICE_ID", "")
 STRIPE_PRO_PRICE_ID = os.getenv("STRIPE_PRO_PRICE_ID", "")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000").rstrip("/")
 
+plan_catalog = PlanCatalog(
+    lambda: _stripe().StripeClient(STRIPE_SECRET_KEY),
+    [
+        ("starter", "Starter", PLAN_LIMITS["starter"]["config_keys"], PLAN_LIMITS["starter"]["requests_per_month"], STRIPE_STARTER_PRICE_ID),
+        ("pro", "Pro", PLAN_LIMITS["pro"]["config_keys"], PLAN_LIMITS["pro"]["requests_per_month"], STRIPE_PRO_PRICE_ID),
+    ],
+)
+
+
+stripe_inbox = StripeInbox(SessionLocal, STRIPE_PRO_PRICE_ID)
+
+
+@app.on_event("startup")
+def check_schema():
+    # One SELECT when init_db.py already migrated this schema version
+    if ensure_schema():
+        print("Schema migrated on startup")
+
+
+@app.on_event("startup")
+async def start_billing_workers():
+    if STRIPE_SECRET_KEY != "localhost" and STRIPE_SECRET_KEY:
+        plan_catalog.start()
+    stripe_inbox.start()
+
+
+@app.on_event("shutdown")
+async def stop_billing_workers():
+    await plan_catalog.stop()
+    await stripe_inbox.stop()
+
+
+@app.on_event("startup")
+async def start_rollup_compactor():
+    rollup_compactor.start()
+
+
+@app.on_event("shutdown")
+async def stop_rollup_compactor():
+    await rollup_compactor.stop()
+
 
 @app.post("/api/billing/trial")
 async def start_trial(db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
@@ -644,7 +1222,7 @@ async def create_checkout(
             status_code=400,
             detail="Invalid or unsupported plan. Use one of the subscription options shown.",
         )
-    client = stripe.StripeClient(STRIPE_SECRET_KEY)
+    client = _stripe().StripeClient(STRIPE_SECRET_KEY)
     if getattr(current_user, "stripe_customer_id", None):
         customer_id = current_user.stripe_customer_id
     else:
@@ -697,7 +1275,7 @@ async def upgrade_subscription(
         return {"plan": "pro", "message": "Already on Pro"}
     if plan != "starter":
         raise HTTPException(status_code=400, detail="Upgrade only from Starter to Pro")
-    client = stripe.StripeClient(STRIPE_SECRET_KEY)
+    client = _stripe().StripeClient(STRIPE_SECRET_KEY)
     try:
         items_resp = client.subscription_items.list(params={"subscription": sub_id})
         if not items_resp.data:
@@ -714,7 +1292,7 @@ async def upgrade_subscription(
         current_user.plan = "pro"
         db.commit()
         db.refresh(current_user)
-    except stripe.StripeError as e:
+    except _stripe().StripeError as e:
         raise HTTPException(status_code=400, detail=str(e))
     return {"plan": "pro"}
 
@@ -726,7 +1304,7 @@ async def create_portal(db: Session = Depends(get_db), current_user: DBUser = De
     cid = getattr(current_user, "stripe_customer_id", None)
     if not cid:
         raise HTTPException(status_code=400, detail="No subscription; subscribe first")
-    client = stripe.StripeClient(STRIPE_SECRET_KEY)
+    client = _stripe().StripeClient(STRIPE_SECRET_KEY)
     session = client.billing_portal.sessions.create(
         params={"customer": cid, "return_url": f"{FRONTEND_URL}/billing"}
     )
@@ -735,38 +1313,17 @@ async def create_portal(db: Session = Depends(get_db), current_user: DBUser = De
 
 @app.post("/api/billing/webhook")
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+    """Verify and store the event, then acknowledge; stripe_inbox applies it in the background."""
     payload = await request.body()
     sig = request.headers.get("stripe-signature", "")
     if not STRIPE_WEBHOOK_SECRET:
         raise HTTPException(status_code=503, detail="Webhook secret not set")
-    client = stripe.StripeClient(STRIPE_SECRET_KEY)
+    client = _stripe().StripeClient(STRIPE_SECRET_KEY)
     try:
         event = client.construct_event(payload, sig, STRIPE_WEBHOOK_SECRET)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid webhook signature")
-    if event["type"] == "customer.subscription.created" or event["type"] == "customer.subscription.updated":
-        sub = event["data"]["object"]
-        sub_id = sub["id"]
-        customer_id = sub.get("customer")
-        status = sub.get("status", "")
-        if status in ("active", "trialing"):
-            items = sub.get("items") or {}
-            data = items.get("data") or []
-            price_id = ""
-            if data:
-                price_obj = data[0].get("price")
-                price_id = (price_obj.get("id") if isinstance(price_obj, dict) else price_obj) or ""
-            plan = "pro" if price_id == STRIPE_PRO_PRICE_ID else "starter"
-            user = db.query(DBUser).filter(DBUser.stripe_customer_id == customer_id).first()
-            if user:
-                user.stripe_subscription_id = sub_id
-                user.plan = plan
-                db.commit()
-    elif event["type"] == "customer.subscription.deleted":
-        sub = event["data"]["object"]
-        user = db.query(DBUser).filter(DBUser.stripe_subscription_id == sub["id"]).first()
-        if user:
-            user.stripe_subscription_id = None
-            user.plan = "free"
-            db.commit()
+    if not enqueue_event(db, event["id"], event["type"], payload.decode("utf-8")):
+        return {"received": True, "duplicate": True}
+    stripe_inbox.notify()
     return {"received": True}
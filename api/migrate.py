@@ -1,35 +1,31 @@
 #!/usr/bin/env python3
 """
-Run database migrations to add new columns to proxy_tunnels table.
-Execute this script once to update your database schema.
+Apply pending schema migrations (see migrations.py), or list them.
+
+Usage: python migrate.py            apply pending migrations
+       python migrate.py status     list migrations, applied or pending
+       python migrate.py --force    re-check every migration (steps skip what already exists)
 """
+import sys
 
 from database import engine
-from sqlalchemy import text
+import migrations
+
+
+def status():
+    applied = migrations.applied_versions(engine) or set()
+    for m in migrations.MIGRATIONS:
+        print(f"{m.version:4d}  {'applied' if m.version in applied else 'pending'}  {m.name}")
 
-def migrate():
+
+def migrate(force: bool = False):
     print("Running migrations...")
-    
-    with engine.connect() as conn:
-        # Add columns one by one (MySQL doesn't support IF NOT EXISTS for columns)
-        columns_to_add = [
-            ("default_min_latency", "INT DEFAULT 0"),
-            ("default_max_latency", "INT DEFAULT 0"),
-            ("default_fail_rate", "INT DEFAULT 0"),
-        ]
-        
-        for col_name, col_type in columns_to_add:
-            try:
-                conn.execute(text(f"ALTER TABLE proxy_tunnels ADD COLUMN {col_name} {col_type}"))
-                conn.commit()
-                print(f"✓ Added column: {col_name}")
-            except Exception as e:
-                if "Duplicate column name" in str(e):
-                    print(f"  Column {col_name} already exists, skipping")
-                else:
-                    print(f"  Error adding {col_name}: {e}")
-    
-    print("\nMigration complete!")
+    done = migrations.run(engine, force=force)
+    print(f"\nMigration complete! ({len(done)} applied)" if done else "Nothing to migrate.")
+
 
 if __name__ == "__main__":
-    migrate()
+    if "status" in sys.argv[1:]:
+        status()
+    else:
+        migrate(force="--force" in sys.argv[1:])
@@ -0,0 +1,231 @@
+"""
+Versioned schema migrations.
+
+MIGRATIONS is an ordered list; the versions applied to a database are rows of schema_version, so a
+boot with nothing pending costs one SELECT. Steps look at the live schema before running DDL: a column
+or index that already exists (a database created by create_all, or migrated before this runner) is
+skipped without an ALTER attempt.
+
+On MySQL the DDL is online: columns are added with ALGORITHM=INSTANT (INPLACE, LOCK=NONE when the
+server cannot), indexes with INPLACE, LOCK=NONE, so reads and writes continue during the change. DDL
+waits at most MIGRATION_LOCK_WAIT_TIMEOUT seconds for the table's metadata lock instead of queueing
+every later query behind it; the migration then fails and is retried on the next boot. Backfills
+update one primary-key range per transaction.
+
+Processes booting together (API workers, replicas, init_db.py) take turns on a MySQL named lock and
+re-read schema_version once they hold it, so each migration is applied by one of them; the others find
+nothing left to do.
+"""
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Set
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+
+from database import Base, SchemaVersion
+
+MIGRATION_LOCK_WAIT_TIMEOUT = int(os.getenv("MIGRATION_LOCK_WAIT_TIMEOUT", "10"))
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "5000"))
+# How long a process waits for another one's migrations before giving up (its boot then fails)
+MIGRATION_RUNNER_WAIT = int(os.getenv("MIGRATION_RUNNER_WAIT", "600"))
+RUNNER_LOCK_NAME = "latencypoison_migrations"
+
+# MySQL errors for an ALGORITHM/LOCK clause the server cannot honour for this change
+_UNSUPPORTED_ALGORITHM = (1845, 1846)
+
+
+def _is_mysql(conn: Connection) -> bool:
+    return conn.dialect.name == "mysql"
+
+
+def _ddl(conn: Connection, statement: str, *online_clauses: str) -> None:
+    """Run an ALTER TABLE with the first online clause MySQL accepts (plain statement elsewhere)."""
+    if not _is_mysql(conn):
+        conn.execute(text(statement))
+        return
+    conn.execute(text(f"SET SESSION lock_wait_timeout = {MIGRATION_LOCK_WAIT_TIMEOUT}"))
+    for i, clause in enumerate(online_clauses):
+        try:
+            conn.execute(text(f"{statement}, {clause}"))
+            return
+        except OperationalError as e:
+            code = e.orig.args[0] if e.orig is not None and e.orig.args else None
+            if code not in _UNSUPPORTED_ALGORITHM or i == len(online_clauses) - 1:
+                raise
+
+
+@dataclass(frozen=True)
+class AddColumn:
+    table: str
+    column: str
+    spec: str
+
+    def apply(self, conn: Connection, log: Callable[[str], None]) -> None:
+        if self.column in {c["name"] for c in inspect(conn).get_columns(self.table)}:
+            return
+        _ddl(conn, f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.spec}",
+             "ALGORITHM=INSTANT", "ALGORITHM=INPLACE, LOCK=NONE")
+        log(f"Added column {self.table}.{self.column}")
+
+
+@dataclass(frozen=True)
+class AddIndex:
+    table: str
+    name: str
+    columns: Sequence[str]
+
+    def apply(self, conn: Connection, log: Callable[[str], None]) -> None:
+        if self.name in {i["name"] for i in inspect(conn).get_indexes(self.table)}:
+            return
+        columns = ", ".join(self.columns)
+        if _is_mysql(conn):
+            _ddl(conn, f"ALTER TABLE {self.table} ADD INDEX {self.name} ({columns})", "ALGORITHM=INPLACE, LOCK=NONE")
+        else:
+            conn.execute(text(f"CREATE INDEX {self.name} ON {self.table} ({columns})"))
+        log(f"Added index {self.name}")
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """UPDATE table SET assignment WHERE condition, one id range of batch_size rows per transaction."""
+    table: str
+    assignment: str
+    condition: str
+    batch_size: int = BACKFILL_BATCH_SIZE
+
+    def apply(self, conn: Connection, log: Callable[[str], None]) -> None:
+        lo, hi = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {self.table} WHERE {self.condition}")).one()
+        if lo is None:
+            return
+        updated = 0
+        for start in range(lo, hi + 1, self.batch_size):
+            result = conn.execute(
+                text(f"UPDATE {self.table} SET {self.assignment} WHERE id >= :lo AND id < :hi AND ({self.condition})"),
+                {"lo": start, "hi": start + self.batch_size},
+            )
+            conn.commit()
+            updated += result.rowcount
+        log(f"Backfilled {updated} rows of {self.table} ({self.assignment})")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    steps: Sequence
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "config key target and chaos columns", [
+        AddColumn("config_api_keys", "target_url", "TEXT"),
+        AddColumn("config_api_keys", "fail_rate", "INT DEFAULT 0"),
+        AddColumn("config_api_keys", "min_latency", "INT DEFAULT 0"),
+        AddColumn("config_api_keys", "max_latency", "INT DEFAULT 0"),
+        AddColumn("config_api_keys", "method", "VARCHAR(20) DEFAULT 'ANY'"),
+        AddColumn("config_api_keys", "error_codes", "JSON"),
+    ]),
+    Migration(2, "billing columns on users", [
+        AddColumn("users", "plan", "VARCHAR(32) NOT NULL DEFAULT 'free'"),
+        AddColumn("users", "trial_ends_at", "DATETIME NULL"),
+        AddColumn("users", "stripe_customer_id", "VARCHAR(255) NULL"),
+        AddColumn("users", "stripe_subscription_id", "VARCHAR(255) NULL"),
+    ]),
+    Migration(3, "keyset pagination index for config keys", [
+        AddIndex("config_api_keys", "ix_config_api_keys_owner_id_id", ("owner_id", "id")),
+    ]),
+    Migration(4, "usage_log status and timings", [
+        AddColumn("usage_log", "status_code", "SMALLINT NULL"),
+        AddColumn("usage_log", "latency_us", "INT NULL"),
+        AddColumn("usage_log", "upstream_us", "INT NULL"),
+    ]),
+    Migration(5, "chaos schedule, corruption and transport faults", [
+        AddColumn("config_api_keys", "schedule", "JSON NULL"),
+        AddColumn("config_api_keys", "corruption", "JSON NULL"),
+        AddColumn("config_api_keys", "transport_faults", "JSON NULL"),
+    ]),
+    Migration(6, "seeded chaos", [
+        AddColumn("config_api_keys", "seed", "BIGINT NULL"),
+        AddColumn("config_api_keys", "seed_mode", "VARCHAR(16) NULL"),
+        Backfill("config_api_keys", "seed_mode = 'sequence'", "seed_mode IS NULL"),
+    ]),
+    Migration(7, "rate limit", [
+        AddColumn("config_api_keys", "rate_limit", "JSON NULL"),
+    ]),
+    Migration(8, "concurrency limit", [
+        AddColumn("config_api_keys", "concurrency_limit", "JSON NULL"),
+    ]),
+    Migration(9, "failure bursts", [
+        AddColumn("config_api_keys", "failure_bursts", "JSON NULL"),
+    ]),
+    Migration(10, "websocket chaos", [
+        AddColumn("config_api_keys", "websocket_chaos", "JSON NULL"),
+    ]),
+    Migration(11, "stripe inbox retries", [
+        AddColumn("stripe_webhook_events", "attempts", "INT NOT NULL DEFAULT 0"),
+        AddColumn("stripe_webhook_events", "next_attempt_at", "DATETIME NULL"),
+    ]),
+]
+
+
+def applied_versions(engine: Engine) -> Optional[Set[int]]:
+    """Versions recorded in schema_version, None when the table does not exist yet."""
+    try:
+        with engine.connect() as conn:
+            return {row.version for row in conn.execute(SchemaVersion.__table__.select())}
+    except SQLAlchemyError:
+        return None
+
+
+def pending(engine: Engine) -> List[Migration]:
+    applied = applied_versions(engine) or set()
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+@contextmanager
+def runner_lock(engine: Engine):
+    """Held while migrating (MySQL GET_LOCK on its own connection; nothing elsewhere)."""
+    if engine.dialect.name != "mysql":
+        yield
+        return
+    with engine.connect() as conn:
+        got = conn.execute(text("SELECT GET_LOCK(:n, :t)"), {"n": RUNNER_LOCK_NAME, "t": MIGRATION_RUNNER_WAIT}).scalar()
+        if got != 1:
+            raise RuntimeError(f"Another process has been migrating the schema for {MIGRATION_RUNNER_WAIT}s")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": RUNNER_LOCK_NAME})
+
+
+def run(engine: Engine, force: bool = False, log: Callable[[str], None] = print) -> List[int]:
+    """Create missing tables, then apply pending migrations in order (all of them with force; steps
+    skip what is already there). Returns the versions applied."""
+    with runner_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        # Read under the lock: the process that held it before may have applied everything
+        applied = applied_versions(engine) or set()
+        done = []
+        for migration in MIGRATIONS:
+            if migration.version in applied and not force:
+                continue
+            with engine.connect() as conn:
+                for step in migration.steps:
+                    step.apply(conn, log)
+                conn.commit()
+                if migration.version not in applied:
+                    try:
+                        conn.execute(SchemaVersion.__table__.insert().values(
+                            version=migration.version, name=migration.name, applied_at=datetime.utcnow(),
+                        ))
+                        conn.commit()
+                    except IntegrityError:
+                        # Recorded meanwhile by a process that ran without the lock (not on MySQL): its
+                        # steps were the same and skip what is there
+                        conn.rollback()
+            log(f"Migration {migration.version} applied: {migration.name}")
+            done.append(migration.version)
+        return done
@@ -0,0 +1,173 @@
+# Cached Stripe plan catalog for /api/billing/plans.
+# Plans are served from memory, refreshed in the background every PLAN_CATALOG_TTL seconds and
+# shared across uvicorn workers through a small JSON snapshot on local disk. When Stripe is slow or
+# down the last known catalog keeps being served (stale-while-revalidate).
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+PLAN_CATALOG_TTL = int(os.getenv("PLAN_CATALOG_TTL", "300"))
+PLAN_CATALOG_TIMEOUT = float(os.getenv("PLAN_CATALOG_TIMEOUT", "3"))
+PLAN_CATALOG_CACHE_PATH = os.getenv(
+    "PLAN_CATALOG_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "latencypoison_plan_catalog.json"),
+)
+
+# (plan_id, display name, config keys, requests per month, Stripe price id)
+PlanDef = Tuple[str, str, int, int, str]
+
+
+def format_stripe_price(price_obj) -> str:
+    """Format Stripe Price for display (e.g. '12.00 €/month')."""
+    unit_amount = getattr(price_obj, "unit_amount", None) or 0
+    amount = unit_amount / 100
+    currency = (getattr(price_obj, "currency", None) or "eur").upper()
+    symbol = "€" if currency == "EUR" else " " + currency
+    interval = "month"
+    recurring = getattr(price_obj, "recurring", None)
+    if recurring:
+        interval = getattr(recurring, "interval", None) or interval
+    return f"{amount:.2f}{symbol}/{interval}"
+
+
+class PlanCatalog:
+    """In-memory plan list with TTL refresh. `client_factory` returns an object exposing
+    `prices.retrieve(price_id)` (a `stripe.StripeClient` or a local stub)."""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        plan_defs: Sequence[PlanDef],
+        ttl: float = PLAN_CATALOG_TTL,
+        timeout: float = PLAN_CATALOG_TIMEOUT,
+        cache_path: Optional[str] = PLAN_CATALOG_CACHE_PATH,
+    ):
+        self.client_factory = client_factory
+        self.plan_defs = [d for d in plan_defs if d[4] and d[4].startswith("price_")]
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self._plans: Optional[List[Dict[str, Any]]] = None
+        self._fetched_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def is_stale(self) -> bool:
+        return self._plans is None or time.time() - self._fetched_at >= self.ttl
+
+    async def get_plans(self) -> List[Dict[str, Any]]:
+        """Return the catalog without blocking on Stripe unless nothing was ever fetched."""
+        if not self.plan_defs:
+            return []
+        if self.is_stale():
+            self._load_shared()
+        if self._plans is None:
+            # Cold start: wait for the first fetch, bounded by the timeout.
+            await self._wait_refresh()
+            return list(self._plans or [])
+        if self.is_stale():
+            self._schedule_refresh()
+        return list(self._plans)
+
+    async def refresh(self) -> None:
+        """Fetch prices now (off the event loop), unless another worker refreshed recently."""
+        self._load_shared()
+        if not self.is_stale():
+            return
+        previous = {p["price_id"]: p for p in (self._plans or [])}
+        plans = await asyncio.to_thread(self._fetch, previous)
+        if not plans:
+            # Nothing fetched and nothing to keep: stay stale so the next request tries again.
+            return
+        self._plans = plans
+        self._fetched_at = time.time()
+        self._store_shared()
+
+    def _fetch(self, previous: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        client = self.client_factory()
+        plans = []
+        for plan_id, name, keys, requests_per_month, price_id in self.plan_defs:
+            try:
+                price_display = format_stripe_price(client.prices.retrieve(price_id))
+            except Exception:
+                # Keep the last known price for this plan rather than dropping it.
+                if price_id in previous:
+                    plans.append(previous[price_id])
+                continue
+            plans.append({
+                "id": plan_id,
+                "name": name,
+                "keys": keys,
+                "requests_per_month": requests_per_month,
+                "price_display": price_display,
+                "price_id": price_id,
+            })
+        return plans
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+            self._refresh_task.add_done_callback(_consume_exception)
+        return self._refresh_task
+
+    async def _wait_refresh(self) -> None:
+        task = self._schedule_refresh()
+        try:
+            # shield: a slow Stripe call keeps running for the next request after we time out.
+            await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except Exception:
+            pass
+
+    def _load_shared(self) -> None:
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        fetched_at = float(snapshot.get("fetched_at") or 0)
+        price_ids = {d[4] for d in self.plan_defs}
+        plans = [p for p in snapshot.get("plans") or [] if p.get("price_id") in price_ids]
+        if fetched_at > self._fetched_at and plans:
+            self._plans = plans
+            self._fetched_at = fetched_at
+
+    def _store_shared(self) -> None:
+        if not self.cache_path or not self._plans:
+            return
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": self._fetched_at, "plans": self._plans}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Same task as request-triggered refreshes, so the two never run side by side.
+                await asyncio.shield(self._schedule_refresh())
+            except Exception:
+                pass
+            await asyncio.sleep(self.ttl)
+
+    def start(self) -> None:
+        """Start the background refresh loop (call from the app startup event)."""
+        if self.plan_defs and self._loop_task is None:
+            self._loop_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._loop_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._loop_task = None
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
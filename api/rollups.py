@@ -0,0 +1,122 @@
+# Hourly compaction of latency_rollups. Every proxy process writes one row per key and minute, so a
+# 30-day summary would merge (processes x keys x 43200) rows. Once an hour is ROLLUP_COMPACT_AFTER
+# seconds old, its rows for a key are merged into a single row stamped with the start of the hour
+# (counts and sketch bins add up, so nothing is lost) and the minute rows are deleted in the same
+# transaction. An hour that already has one row is left alone; a late row (a proxy flushing minutes
+# kept during a database outage) makes it two again and it is merged on the next run.
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from database import LatencyRollup
+from sketch import LatencySketch
+
+ROLLUP_COMPACT_INTERVAL = float(os.getenv("ROLLUP_COMPACT_INTERVAL", "600"))
+ROLLUP_COMPACT_AFTER = float(os.getenv("ROLLUP_COMPACT_AFTER", "7200"))
+# After the first full pass, each run only looks this far back (late rows older than that stay as they are)
+ROLLUP_COMPACT_LOOKBACK = float(os.getenv("ROLLUP_COMPACT_LOOKBACK", "86400"))
+COMPACT_LOCK_NAME = "latencypoison_rollup_compact"
+
+
+def merge_rows(rows: List[LatencyRollup], hour: datetime) -> Dict:
+    """Values of the single row replacing `rows` (same key and hour)."""
+    statuses: Dict[str, int] = {}
+    latency, upstream = LatencySketch(), LatencySketch()
+    for r in rows:
+        for code, n in (r.status_counts or {}).items():
+            statuses[code] = statuses.get(code, 0) + n
+        latency.merge(LatencySketch.from_json(r.latency_bins))
+        upstream.merge(LatencySketch.from_json(r.upstream_bins))
+    return {
+        "config_api_key_id": rows[0].config_api_key_id,
+        "minute": hour,
+        "requests": sum(r.requests or 0 for r in rows),
+        "errors": sum(r.errors or 0 for r in rows),
+        "status_counts": dict(sorted(statuses.items(), key=lambda item: int(item[0]))),
+        "latency_bins": latency.to_json(),
+        "upstream_bins": upstream.to_json(),
+    }
+
+
+class RollupCompactor:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval: float = ROLLUP_COMPACT_INTERVAL,
+        after: float = ROLLUP_COMPACT_AFTER,
+        lookback: float = ROLLUP_COMPACT_LOOKBACK,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.after = after
+        self.lookback = lookback
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """Merge the rows of each (key, hour) older than `after` into one. Returns how many rows were
+        removed (0 if another process holds the compaction lock). Blocking; run it off the event loop."""
+        now = now or datetime.utcnow()
+        before = (now - timedelta(seconds=self.after)).replace(minute=0, second=0, microsecond=0)
+        db = self.session_factory()
+        lock_conn = None
+        try:
+            if db.get_bind().dialect.name == "mysql":
+                lock_conn = db.get_bind().connect()
+                got = lock_conn.execute(text("SELECT GET_LOCK(:n, 0)"), {"n": COMPACT_LOCK_NAME}).scalar()
+                if got != 1:
+                    return 0
+            start = self._since
+            if start is None:
+                start = db.query(func.min(LatencyRollup.minute)).scalar()
+            removed = 0
+            # One day per pass: only (id, key, minute) of the day is loaded, then the rows of each hour
+            # that has more than one, so memory stays bounded on a first pass over 30 days
+            while start is not None and start < before:
+                end = min(start + timedelta(days=1), before)
+                groups: Dict[Tuple[int, datetime], List[int]] = {}
+                for row_id, key_id, minute in (
+                    db.query(LatencyRollup.id, LatencyRollup.config_api_key_id, LatencyRollup.minute)
+                    .filter(LatencyRollup.minute >= start, LatencyRollup.minute < end)
+                ):
+                    groups.setdefault((key_id, minute.replace(minute=0, second=0, microsecond=0)), []).append(row_id)
+                for (key_id, hour), ids in groups.items():
+                    if len(ids) > 1:
+                        removed += self._replace(db, ids, hour)
+                        db.commit()
+                start = end
+            self._since = before - timedelta(seconds=self.lookback)
+            return removed
+        finally:
+            db.close()
+            if lock_conn is not None:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": COMPACT_LOCK_NAME})
+                lock_conn.close()
+
+    def _replace(self, db: Session, ids: List[int], hour: datetime) -> int:
+        # Rows are deleted by id, so a row inserted meanwhile for the same hour is kept for the next run
+        rows = db.query(LatencyRollup).filter(LatencyRollup.id.in_(ids)).all()
+        db.execute(LatencyRollup.__table__.delete().where(LatencyRollup.id.in_(ids)))
+        db.execute(LatencyRollup.__table__.insert(), [merge_rows(rows, hour)])
+        return len(rows) - 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.compact)
+            except Exception as e:
+                print("Rollup compaction failed:", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,88 @@
+# Mergeable latency histogram (HDR-style log-linear bins) for per-key percentiles.
+# Values (microseconds) below 16 get exact bins; above, each power of two is split into 16 bins, so a
+# percentile is off by at most 1/16 (6.25%) of its value. The bin index is cheap enough to compute in
+# SQL (BIN_SQL), so MySQL returns (bucket, key, bin, count) rows instead of raw timings, and sketches
+# of hours/days merge by adding counts: a 30-day query never sorts individual requests.
+# The Python gateway loads this same file (app/core/sketch.py); the Go proxy has the same bins
+# (internal/rollup).
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+
+def bin_index(value: int) -> int:
+    if value < SUB_COUNT:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BITS - 1
+    return shift * SUB_COUNT + (value >> shift)
+
+
+def bin_bounds(index: int) -> Tuple[int, int]:
+    """[low, high) of the values mapped to a bin."""
+    if index < 2 * SUB_COUNT:
+        return index, index + 1
+    shift = index // SUB_COUNT - 1
+    mantissa = index - shift * SUB_COUNT
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+def bin_sql(column: str) -> str:
+    """SQL (MySQL) expression equivalent to bin_index(column); BIN() gives the exact bit length."""
+    shift = f"(LENGTH(BIN({column})) - {SUB_BITS + 1})"
+    return f"CASE WHEN {column} < {SUB_COUNT} THEN GREATEST({column}, 0) ELSE {shift} * {SUB_COUNT} + ({column} >> {shift}) END"
+
+
+class LatencySketch:
+    __slots__ = ("bins", "count")
+
+    def __init__(self, bins: Optional[Dict[int, int]] = None):
+        self.bins: Dict[int, int] = dict(bins or {})
+        self.count = sum(self.bins.values())
+
+    def add(self, value: int, n: int = 1) -> None:
+        self.add_bin(bin_index(int(value)), n)
+
+    def add_bin(self, index: int, n: int) -> None:
+        self.bins[index] = self.bins.get(index, 0) + n
+        self.count += n
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        for index, n in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.count += other.count
+        return self
+
+    def quantiles(self, qs: Sequence[float]) -> Dict[str, Optional[float]]:
+        """Nearest-rank quantiles (qs in 0-100); each value is the midpoint of its bin."""
+        if not self.count:
+            return {f"p{q:g}": None for q in qs}
+        ranks = sorted((max(1, -(-q * self.count // 100)), q) for q in qs)
+        out: Dict[str, Optional[float]] = {}
+        seen = 0
+        i = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            while i < len(ranks) and ranks[i][0] <= seen:
+                low, high = bin_bounds(index)
+                out[f"p{ranks[i][1]:g}"] = (low + high - 1) / 2
+                i += 1
+            if i == len(ranks):
+                break
+        return {f"p{q:g}": out.get(f"p{q:g}") for q in qs}
+
+    def to_json(self) -> Dict[str, int]:
+        """Bins as stored in latency_rollups ({"<index>": count})."""
+        return {str(index): n for index, n in sorted(self.bins.items())}
+
+    @classmethod
+    def from_json(cls, bins: Optional[Dict[str, int]]) -> "LatencySketch":
+        """Sketch from stored bins ({"<index>": count}, latency_rollups columns)."""
+        return cls({int(index): int(n) for index, n in (bins or {}).items()})
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, int]]) -> "LatencySketch":
+        sketch = cls()
+        for index, n in rows:
+            sketch.add_bin(int(index), int(n))
+        return sketch
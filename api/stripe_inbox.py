@@ -0,0 +1,196 @@
+# Stripe webhook inbox: the webhook endpoint only verifies and stores the event (deduplicated on the
+# Stripe event id) and acknowledges; a background worker applies stored events to users in arrival
+# order. One process at a time drains the inbox (MySQL named lock), so events of a customer are
+# never applied concurrently or out of order when the API runs with several workers.
+# Stripe no longer retries once the event is acknowledged, so the worker does: an event that fails
+# on a database or other operational error stays pending and is retried with exponential backoff
+# (later events of the same customer wait behind it). Only a malformed payload marks it failed.
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import StripeWebhookEvent, User
+
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_RETRY_BASE = float(os.getenv("WEBHOOK_RETRY_BASE", "5"))
+WEBHOOK_RETRY_MAX = float(os.getenv("WEBHOOK_RETRY_MAX", "3600"))
+INBOX_LOCK_NAME = "latencypoison_stripe_inbox"
+
+# Errors that retrying cannot fix: the stored payload is not a usable subscription object.
+PAYLOAD_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+SUBSCRIPTION_EVENTS = frozenset({
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+})
+
+
+def enqueue_event(db: Session, event_id: str, event_type: str, payload: str) -> bool:
+    """Store a verified event. Returns False when the event id was already received (Stripe retry)."""
+    try:
+        obj = (json.loads(payload).get("data") or {}).get("object") or {}
+    except ValueError:
+        obj = {}
+    customer_id = obj.get("customer") if isinstance(obj, dict) else None
+    db.add(StripeWebhookEvent(
+        event_id=event_id,
+        event_type=event_type,
+        customer_id=customer_id if isinstance(customer_id, str) else None,
+        payload=payload,
+        status="pending" if event_type in SUBSCRIPTION_EVENTS else "done",
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def apply_event(db: Session, event_type: str, sub: Dict[str, Any], pro_price_id: str) -> None:
+    """Apply a subscription event to the matching user (no commit)."""
+    if event_type in ("customer.subscription.created", "customer.subscription.updated"):
+        if sub.get("status", "") not in ("active", "trialing"):
+            return
+        items = sub.get("items") or {}
+        data = items.get("data") or []
+        price_id = ""
+        if data:
+            price_obj = data[0].get("price")
+            price_id = (price_obj.get("id") if isinstance(price_obj, dict) else price_obj) or ""
+        plan = "pro" if price_id == pro_price_id else "starter"
+        user = db.query(User).filter(User.stripe_customer_id == sub.get("customer")).first()
+        if user:
+            user.stripe_subscription_id = sub["id"]
+            user.plan = plan
+    elif event_type == "customer.subscription.deleted":
+        user = db.query(User).filter(User.stripe_subscription_id == sub["id"]).first()
+        if user:
+            user.stripe_subscription_id = None
+            user.plan = "free"
+
+
+class StripeInbox:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        pro_price_id: str,
+        poll_interval: float = WEBHOOK_POLL_INTERVAL,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        retry_base: float = WEBHOOK_RETRY_BASE,
+        retry_max: float = WEBHOOK_RETRY_MAX,
+    ):
+        self.session_factory = session_factory
+        self.pro_price_id = pro_price_id
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake the worker after an insert so events are applied without waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def drain(self) -> int:
+        """Apply pending events in id order. Returns how many rows were attempted (0 if another
+        process holds the inbox lock). An event waiting for its retry holds back the later events
+        of its customer. Blocking; run it off the event loop."""
+        db = self.session_factory()
+        lock_conn = None
+        try:
+            if db.get_bind().dialect.name == "mysql":
+                lock_conn = db.get_bind().connect()
+                got = lock_conn.execute(text("SELECT GET_LOCK(:n, 0)"), {"n": INBOX_LOCK_NAME}).scalar()
+                if got != 1:
+                    return 0
+            handled = 0
+            last_id = 0
+            blocked: Set[str] = set()
+            while True:
+                rows = (
+                    db.query(StripeWebhookEvent)
+                    .filter(StripeWebhookEvent.status == "pending", StripeWebhookEvent.id > last_id)
+                    .order_by(StripeWebhookEvent.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    return handled
+                now = datetime.utcnow()
+                for row in rows:
+                    last_id = row.id
+                    customer_id = row.customer_id
+                    if customer_id in blocked or (row.next_attempt_at is not None and row.next_attempt_at > now):
+                        if customer_id is not None:
+                            blocked.add(customer_id)
+                        continue
+                    if not self._apply_row(db, row) and customer_id is not None:
+                        blocked.add(customer_id)
+                    handled += 1
+        finally:
+            db.close()
+            if lock_conn is not None:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": INBOX_LOCK_NAME})
+                lock_conn.close()
+
+    def _apply_row(self, db: Session, row: StripeWebhookEvent) -> bool:
+        """Apply one event. Returns False when it stays pending for a retry."""
+        # The user update and the inbox status change commit together, so an event is applied once.
+        try:
+            sub = json.loads(row.payload)["data"]["object"]
+            apply_event(db, row.event_type, sub, self.pro_price_id)
+            row.status = "done"
+            row.processed_at = datetime.utcnow()
+            db.commit()
+            return True
+        except PAYLOAD_ERRORS as e:
+            db.rollback()
+            row.status = "failed"
+            row.error = str(e)[:2000]
+            row.processed_at = datetime.utcnow()
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            row.attempts = (row.attempts or 0) + 1
+            row.error = str(e)[:2000]
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.retry_delay(row.attempts))
+            db.commit()
+            return False
+
+    def retry_delay(self, attempts: int) -> float:
+        """Seconds before retry number `attempts` (1-based): doubling from retry_base, capped at retry_max."""
+        return min(self.retry_base * 2 ** min(attempts - 1, 32), self.retry_max)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.drain)
+            except Exception as e:
+                print("Stripe inbox worker error:", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
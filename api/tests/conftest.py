@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+# The api service uses flat imports (`import database`, `from plan_catalog import ...`).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Api:
+    """TestClient on the API against an in-memory SQLite database (no startup hooks: they need MySQL)."""
+
+    def __init__(self, client, session_factory, main):
+        self.client = client
+        self.session_factory = session_factory
+        self.main = main
+
+    def user(self, username: str, plan: str = "pro") -> dict:
+        """Create a user; returns the Authorization header of a token for it."""
+        from database import User
+        db = self.session_factory()
+        db.add(User(username=username, email=f"{username}@example.com", hashed_password="x", plan=plan))
+        db.commit()
+        db.close()
+        return {"Authorization": f"Bearer {self.main.create_access_token({'sub': username})}"}
+
+
+@pytest.fixture
+def api():
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import main
+    from database import Base, get_db
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    yield Api(TestClient(main.app), factory, main)
+    main.app.dependency_overrides.clear()
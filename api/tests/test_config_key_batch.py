@@ -0,0 +1,125 @@
+import json
+
+KEY = {"name": "a", "target_url": "https://example.com", "fail_rate": 10, "min_latency": 5, "max_latency": 50}
+
+
+def keys(api, headers):
+    return api.client.get("/api/config-keys/", headers=headers).json()
+
+
+def create(api, headers, n, **fields):
+    return [api.client.post("/api/config-keys/", json={**KEY, "name": f"k{i}", **fields}, headers=headers).json()
+            for i in range(n)]
+
+
+def test_batch_applies_everything(api):
+    alice = api.user("alice")
+    first, second = create(api, alice, 2)
+    response = api.client.post("/api/config-keys/batch/", headers=alice, json={
+        "create": [{**KEY, "name": "new"}],
+        "update": [{"id": first["id"], "fail_rate": 99, "is_active": False}],
+        "delete": [second["id"]],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert [k["name"] for k in body["created"]] == ["new"]
+    assert body["updated"][0]["fail_rate"] == 99 and body["updated"][0]["is_active"] is False
+    assert body["deleted"] == [second["id"]]
+    assert sorted(k["name"] for k in keys(api, alice)) == ["k0", "new"]
+
+
+def test_batch_with_an_invalid_update_changes_nothing(api):
+    alice = api.user("alice")
+    first, second = create(api, alice, 2)
+    response = api.client.post("/api/config-keys/batch/", headers=alice, json={
+        "create": [{**KEY, "name": "new"}],
+        "update": [{"id": first["id"], "fail_rate": 99}, {"id": second["id"], "min_latency": 500}],
+        "delete": [],
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"] == [
+        {"index": 1, "id": second["id"], "error": "min_latency cannot be greater than max_latency"},
+    ]
+    after = keys(api, alice)
+    assert [k["fail_rate"] for k in after] == [10, 10] and len(after) == 2
+
+
+def test_batch_validation_errors_carry_the_item_index(api):
+    alice = api.user("alice")
+    response = api.client.post("/api/config-keys/batch/", headers=alice, json={
+        "create": [KEY, {**KEY, "method": "TRACE"}],
+    })
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:3] == ["body", "create", 1]
+    assert keys(api, alice) == []
+
+
+def test_batch_rejects_foreign_duplicate_and_conflicting_ids(api):
+    alice, bob = api.user("alice"), api.user("bob")
+    (mine,), (theirs,) = create(api, alice, 1), create(api, bob, 1)
+    response = api.client.post("/api/config-keys/batch/", headers=alice, json={"delete": [mine["id"], theirs["id"]]})
+    assert response.status_code == 404
+    assert response.json()["detail"]["ids"] == [theirs["id"]]
+    response = api.client.post("/api/config-keys/batch/", headers=alice,
+                               json={"update": [{"id": mine["id"]}, {"id": mine["id"]}]})
+    assert response.status_code == 400
+    response = api.client.post("/api/config-keys/batch/", headers=alice,
+                               json={"update": [{"id": mine["id"]}], "delete": [mine["id"]]})
+    assert response.status_code == 400
+    assert len(keys(api, alice)) == 1 and len(keys(api, bob)) == 1
+
+
+def test_batch_plan_limit_counts_deletes(api):
+    alice = api.user("alice", plan="free")  # 2 keys
+    first, _ = create(api, alice, 2)
+    response = api.client.post("/api/config-keys/batch/", headers=alice, json={"create": [KEY]})
+    assert response.status_code == 403
+    response = api.client.post("/api/config-keys/batch/", headers=alice, json={"create": [KEY], "delete": [first["id"]]})
+    assert response.status_code == 200
+    assert len(keys(api, alice)) == 2
+
+
+def test_import_enforces_the_plan_limit(api):
+    alice = api.user("alice", plan="free")
+    create(api, alice, 1)
+    response = api.client.post("/api/config-keys/import/", headers=alice, content=json.dumps([KEY, KEY]))
+    assert response.status_code == 403
+    assert "2 config keys" in response.json()["detail"]
+    assert len(keys(api, alice)) == 1
+    response = api.client.post("/api/config-keys/import/", headers=alice, content=json.dumps([KEY]))
+    assert response.status_code == 200
+    assert len(keys(api, alice)) == 2
+
+
+def test_import_rejects_bad_bodies(api):
+    alice = api.user("alice")
+    assert api.client.post("/api/config-keys/import/", headers=alice, content=b"{").status_code == 400
+    assert api.client.post("/api/config-keys/import/", headers=alice, content=b'{"name": "a"}').status_code == 400
+    response = api.client.post("/api/config-keys/import/", headers=alice, content=json.dumps([KEY, {"name": ""}]))
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", 1]
+    assert keys(api, alice) == []
+
+
+def test_export_import_round_trip(api):
+    alice, bob = api.user("alice"), api.user("bob")
+    api.client.post("/api/config-keys/", headers=alice, json={
+        **KEY, "name": "full", "method": "post", "error_codes": [503, 500, 503], "seed": 42, "seed_mode": "request",
+        "rate_limit": {"rate": 5, "burst": 10},
+    })
+    api.client.post("/api/config-keys/", headers=alice, json={**KEY, "name": "plain"})
+    api.client.put(f"/api/config-keys/{keys(api, alice)[1]['id']}/", headers=alice, json={"is_active": False})
+    exported = api.client.get("/api/config-keys/export/", headers=alice).json()
+    assert [k["name"] for k in exported] == ["full", "plain"]
+    assert "id" not in exported[0] and "key" not in exported[0]
+
+    ndjson = api.client.get("/api/config-keys/export/?format=ndjson", headers=alice)
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in ndjson.text.splitlines()] == exported
+
+    response = api.client.post("/api/config-keys/import/", headers={**bob, "Content-Type": "application/x-ndjson"},
+                               content=ndjson.content)
+    assert response.status_code == 200
+    assert api.client.get("/api/config-keys/export/", headers=bob).json() == exported
+    # Imported keys get fresh key strings
+    assert {k["key"] for k in keys(api, bob)}.isdisjoint(k["key"] for k in keys(api, alice))
@@ -0,0 +1,93 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from database import ConfigApiKey
+
+
+@pytest.fixture
+def alice(api):
+    headers = api.user("alice")
+    bob = api.user("bob")
+    db = api.session_factory()
+    owners = {u.username: u.id for u in db.query(api.main.DBUser)}
+    # 23 keys for alice, mixed with bob's so ids have gaps; every third inactive, two target hosts
+    for i in range(30):
+        owner = "bob" if i % 4 == 3 else "alice"
+        db.add(ConfigApiKey(name=f"{owner}{i}", key=f"lp_{i}", owner_id=owners[owner], is_active=i % 3 != 0,
+                            method="GET" if i % 2 else "POST",
+                            target_url=f"https://{'a' if i % 5 else 'b'}.example.com/{i}"))
+    db.commit()
+    db.close()
+    return headers
+
+
+def walk(api, headers, **params):
+    """All pages of the listing: (names, number of pages)."""
+    names, pages, after = [], 0, None
+    while True:
+        query = {**params, **({"after": after} if after is not None else {})}
+        response = api.client.get("/api/config-keys/", params=query, headers=headers)
+        assert response.status_code == 200
+        pages += 1
+        names += [k["name"] for k in response.json()]
+        after = response.headers.get("x-next-cursor")
+        if after is None:
+            assert "link" not in response.headers
+            return names, pages
+        link = response.headers["link"]
+        assert link.endswith('>; rel="next"')
+        assert parse_qs(urlsplit(link[1:link.index(">")]).query)["after"] == [after]
+
+
+def expected(api, **filters):
+    db = api.session_factory()
+    q = db.query(ConfigApiKey).filter(ConfigApiKey.name.startswith("alice")).filter_by(**filters)
+    names = [k.name for k in q.order_by(ConfigApiKey.id)]
+    db.close()
+    return names
+
+
+def test_pages_cover_every_key_once(api, alice):
+    names, pages = walk(api, alice, limit=5)
+    assert names == expected(api)
+    assert len(names) == 23 and pages == 5
+
+
+def test_exact_multiple_of_the_page_size(api, alice):
+    # 23 keys in pages of 23: one page, no cursor (the extra row fetched decides it)
+    names, pages = walk(api, alice, limit=23)
+    assert len(names) == 23 and pages == 1
+
+
+@pytest.mark.parametrize("params,filters", [
+    ({"is_active": "true"}, {"is_active": True}),
+    ({"is_active": "false", "method": "post"}, {"is_active": False, "method": "POST"}),
+])
+def test_filtered_pages(api, alice, params, filters):
+    names, _ = walk(api, alice, limit=3, **params)
+    assert names == expected(api, **filters) and names
+
+
+def test_target_prefix_filter(api, alice):
+    names, _ = walk(api, alice, limit=2, target_prefix="https://b.")
+    db = api.session_factory()
+    b = [k.name for k in db.query(ConfigApiKey).order_by(ConfigApiKey.id)
+         if k.name.startswith("alice") and k.target_url.startswith("https://b.")]
+    db.close()
+    assert names == b and names
+    # LIKE wildcards in the prefix are literal
+    assert walk(api, alice, target_prefix="https://_.")[0] == []
+
+
+def test_fields(api, alice):
+    response = api.client.get("/api/config-keys/", params={"limit": 2, "fields": "name,method"}, headers=alice)
+    assert [set(k) for k in response.json()] == [{"id", "name", "method"}] * 2
+    assert response.headers["x-next-cursor"] == str(response.json()[-1]["id"])
+    response = api.client.get("/api/config-keys/", params={"fields": "name,owner_id"}, headers=alice)
+    assert response.status_code == 400
+
+
+def test_limit_bounds(api, alice):
+    assert api.client.get("/api/config-keys/", params={"limit": 0}, headers=alice).status_code == 422
+    assert api.client.get("/api/config-keys/", params={"limit": 501}, headers=alice).status_code == 422
@@ -0,0 +1,10 @@
+import import_profile
+
+LAZY = ("stripe", "passlib", "jose", "bcrypt")
+
+
+def test_main_imports_without_the_lazy_libraries():
+    # Fresh interpreter (this one may have imported them already): what `import main` loads on its own
+    imported = {name.split(".")[0] for name, _, _, _ in import_profile.profile("main")}
+    assert "main" in imported and "fastapi" in imported
+    assert [name for name in LAZY if name in imported] == []
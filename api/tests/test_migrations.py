@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+import migrations
+from database import SchemaVersion
+
+LATEST = [m.version for m in migrations.MIGRATIONS]
+
+
+@pytest.fixture
+def engine():
+    return create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+
+def versions(engine):
+    with engine.connect() as conn:
+        return sorted(row.version for row in conn.execute(SchemaVersion.__table__.select()))
+
+
+def columns(engine, table):
+    return {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_fresh_database(engine):
+    assert migrations.applied_versions(engine) is None
+    assert [m.version for m in migrations.pending(engine)] == LATEST
+    assert migrations.run(engine, log=lambda line: None) == LATEST
+    assert versions(engine) == LATEST
+    assert migrations.pending(engine) == []
+    assert {"websocket_chaos", "seed_mode"} <= columns(engine, "config_api_keys")
+
+
+def test_partially_migrated_database(engine):
+    migrations.run(engine, log=lambda line: None)
+    # A database from before migration 9: its columns and version rows are missing
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE config_api_keys DROP COLUMN failure_bursts"))
+        conn.execute(text("ALTER TABLE config_api_keys DROP COLUMN websocket_chaos"))
+        conn.execute(text("DELETE FROM schema_version WHERE version >= 9"))
+    assert [m.version for m in migrations.pending(engine)] == [9, 10, 11]
+    log = []
+    assert migrations.run(engine, log=log.append) == [9, 10, 11]
+    assert "Added column config_api_keys.failure_bursts" in log
+    assert "Added column config_api_keys.websocket_chaos" in log
+    # Migration 11's columns were there (create_all): skipped without an ALTER
+    assert not any("stripe_webhook_events" in line for line in log)
+    assert versions(engine) == LATEST
+
+
+def test_backfill_runs_on_existing_rows(engine):
+    migrations.run(engine, log=lambda line: None)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO config_api_keys (name, key, owner_id, seed_mode) VALUES ('a', 'lp_a', 1, NULL)"))
+        conn.execute(text("DELETE FROM schema_version WHERE version = 6"))
+    log = []
+    assert migrations.run(engine, log=log.append) == [6]
+    assert "Backfilled 1 rows of config_api_keys (seed_mode = 'sequence')" in log
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT seed_mode FROM config_api_keys")).scalar() == "sequence"
+
+
+def test_force_rerun_changes_nothing(engine):
+    migrations.run(engine, log=lambda line: None)
+    log = []
+    assert migrations.run(engine, force=True, log=log.append) == LATEST
+    assert [line for line in log if not line.startswith("Migration ")] == []
+    assert versions(engine) == LATEST
+
+
+def test_version_recorded_meanwhile_is_tolerated(engine, monkeypatch):
+    migrations.run(engine, log=lambda line: None)
+    # Another process applied the migrations between this one's check and its inserts
+    monkeypatch.setattr(migrations, "applied_versions", lambda engine: set())
+    assert migrations.run(engine, log=lambda line: None) == LATEST
+    assert versions(engine) == LATEST
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from plan_catalog import PlanCatalog, format_stripe_price
+
+PLAN_DEFS = [
+    ("starter", "Starter", 3, 100_000, "price_starter"),
+    ("pro", "Pro", 10, 1_000_000, "price_pro"),
+    ("legacy", "Legacy", 1, 1_000, ""),
+]
+
+
+class StubPrices:
+    """Local stand-in for `stripe.StripeClient().prices`."""
+
+    def __init__(self, amounts, delay=0.0, fail=()):
+        self.amounts = amounts
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def retrieve(self, price_id):
+        with self.lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if price_id in self.fail:
+            raise RuntimeError("stripe unavailable")
+        return SimpleNamespace(
+            unit_amount=self.amounts[price_id],
+            currency="eur",
+            recurring=SimpleNamespace(interval="month"),
+        )
+
+
+def make_catalog(prices, **kwargs):
+    kwargs.setdefault("cache_path", None)
+    return PlanCatalog(lambda: SimpleNamespace(prices=prices), PLAN_DEFS, **kwargs)
+
+
+def test_format_stripe_price():
+    assert format_stripe_price(SimpleNamespace(unit_amount=1200, currency="eur", recurring=None)) == "12.00€/month"
+    price = SimpleNamespace(unit_amount=9900, currency="usd", recurring=SimpleNamespace(interval="year"))
+    assert format_stripe_price(price) == "99.00 USD/year"
+
+
+def test_cold_start_fetches_then_serves_from_memory():
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900})
+    catalog = make_catalog(prices, ttl=60)
+
+    async def run():
+        first = await catalog.get_plans()
+        second = await catalog.get_plans()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [p["id"] for p in first] == ["starter", "pro"]
+    assert first[1]["price_display"] == "49.00€/month"
+    assert second == first
+    assert prices.calls == 2
+
+
+def test_stale_catalog_is_served_while_revalidating():
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900})
+    catalog = make_catalog(prices, ttl=60)
+
+    async def run():
+        await catalog.get_plans()
+        catalog._fetched_at -= 120
+        prices.amounts["price_pro"] = 5900
+        prices.delay = 0.05
+        started = time.monotonic()
+        stale = await catalog.get_plans()
+        elapsed = time.monotonic() - started
+        await catalog._refresh_task
+        return stale, elapsed, await catalog.get_plans()
+
+    stale, elapsed, fresh = asyncio.run(run())
+    assert stale[1]["price_display"] == "49.00€/month"
+    assert elapsed < 0.05
+    assert fresh[1]["price_display"] == "59.00€/month"
+
+
+def test_failed_price_keeps_last_known_entry():
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900})
+    catalog = make_catalog(prices, ttl=60)
+
+    async def run():
+        await catalog.get_plans()
+        catalog._fetched_at -= 120
+        prices.fail = {"price_pro"}
+        await catalog.refresh()
+        return await catalog.get_plans()
+
+    plans = asyncio.run(run())
+    assert [p["id"] for p in plans] == ["starter", "pro"]
+    assert plans[1]["price_display"] == "49.00€/month"
+
+
+def test_empty_fetch_is_not_cached():
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900}, fail={"price_starter", "price_pro"})
+    catalog = make_catalog(prices, ttl=60)
+
+    async def run():
+        empty = await catalog.get_plans()
+        stale = catalog.is_stale()
+        prices.fail = set()
+        return empty, stale, await catalog.get_plans()
+
+    empty, stale, recovered = asyncio.run(run())
+    assert empty == []
+    assert stale
+    assert [p["id"] for p in recovered] == ["starter", "pro"]
+
+
+def test_slow_cold_start_times_out_without_blocking():
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900}, delay=0.2)
+    catalog = make_catalog(prices, ttl=60, timeout=0.02)
+
+    async def run():
+        started = time.monotonic()
+        plans = await catalog.get_plans()
+        elapsed = time.monotonic() - started
+        await catalog._refresh_task
+        return plans, elapsed, await catalog.get_plans()
+
+    plans, elapsed, later = asyncio.run(run())
+    assert plans == []
+    assert elapsed < 0.2
+    assert len(later) == 2
+
+
+def test_background_loop_shares_the_request_refresh():
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900}, delay=0.05)
+    catalog = make_catalog(prices, ttl=60)
+
+    async def run():
+        task = catalog._schedule_refresh()
+        catalog.start()
+        await asyncio.sleep(0)
+        await task
+        await catalog.stop()
+
+    asyncio.run(run())
+    assert prices.calls == 2
+
+
+def test_snapshot_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "plans.json")
+    prices = StubPrices({"price_starter": 1200, "price_pro": 4900})
+    other = StubPrices({"price_starter": 1, "price_pro": 1})
+
+    async def run():
+        await make_catalog(prices, ttl=60, cache_path=path).get_plans()
+        return await make_catalog(other, ttl=60, cache_path=path).get_plans()
+
+    plans = asyncio.run(run())
+    assert plans[0]["price_display"] == "12.00€/month"
+    assert other.calls == 0
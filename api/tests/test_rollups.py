@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, LatencyRollup
+from rollups import RollupCompactor
+from sketch import LatencySketch
+
+NOW = datetime(2026, 10, 19, 12, 30)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def add_minute(factory, key_id, minute, latencies, statuses):
+    sketch = LatencySketch()
+    for v in latencies:
+        sketch.add(v)
+    db = factory()
+    db.add(LatencyRollup(
+        config_api_key_id=key_id, minute=minute, requests=len(latencies),
+        errors=sum(n for code, n in statuses.items() if int(code) >= 400),
+        status_counts=statuses, latency_bins=sketch.to_json(), upstream_bins={},
+    ))
+    db.commit()
+    db.close()
+
+
+def all_rows(factory):
+    db = factory()
+    try:
+        return [(r.config_api_key_id, r.minute, r.requests, r.errors, r.status_counts, r.latency_bins)
+                for r in db.query(LatencyRollup).order_by(LatencyRollup.config_api_key_id, LatencyRollup.minute)]
+    finally:
+        db.close()
+
+
+def test_old_hours_merge_into_one_row(session_factory):
+    old = datetime(2026, 10, 19, 8, 0)
+    for i in range(3):
+        add_minute(session_factory, 1, old + timedelta(minutes=i), [1000, 2000], {"200": 1, "503": 1})
+    add_minute(session_factory, 2, old + timedelta(minutes=5), [500], {"200": 1})
+    recent = datetime(2026, 10, 19, 11, 0)
+    add_minute(session_factory, 1, recent, [100], {"200": 1})
+    add_minute(session_factory, 1, recent + timedelta(minutes=1), [100], {"200": 1})
+
+    compactor = RollupCompactor(session_factory, after=7200)
+    assert compactor.compact(NOW) == 2
+    rows = all_rows(session_factory)
+    merged = LatencySketch()
+    for v in [1000, 2000] * 3:
+        merged.add(v)
+    assert rows[0] == (1, old, 6, 3, {"200": 3, "503": 3}, merged.to_json())
+    # Younger than ROLLUP_COMPACT_AFTER: still one row per minute
+    assert [r[1] for r in rows[1:3]] == [recent, recent + timedelta(minutes=1)]
+    assert rows[3][:3] == (2, old + timedelta(minutes=5), 1)
+
+    assert compactor.compact(NOW) == 0
+
+
+def test_late_row_is_merged_on_the_next_run(session_factory):
+    hour = datetime(2026, 10, 19, 6, 0)
+    add_minute(session_factory, 1, hour, [1000], {"200": 1})
+    add_minute(session_factory, 1, hour + timedelta(minutes=59), [1000], {"200": 1})
+    compactor = RollupCompactor(session_factory, after=7200)
+    compactor.compact(NOW)
+    add_minute(session_factory, 1, hour + timedelta(minutes=30), [3000], {"500": 1})
+    assert compactor.compact(NOW) == 1
+    assert all_rows(session_factory)[0][:5] == (1, hour, 3, 1, {"200": 2, "500": 1})
@@ -0,0 +1,48 @@
+import random
+
+from sketch import SUB_COUNT, LatencySketch, bin_bounds, bin_index
+
+
+def test_bins_are_exact_below_32():
+    assert [bin_index(v) for v in range(2 * SUB_COUNT)] == list(range(2 * SUB_COUNT))
+    assert bin_index(-5) == 0
+
+
+def test_bin_bounds_contain_their_values():
+    for value in list(range(5000)) + [10 ** 6, 2 ** 31 - 1, 123_456_789]:
+        low, high = bin_bounds(bin_index(value))
+        assert low <= value < high
+        # 16 bins per power of two: a bin is at most 1/16 of its lower bound wide
+        assert high - low <= max(1, low // SUB_COUNT)
+
+
+def test_bins_are_monotonic():
+    indexes = [bin_index(v) for v in range(100_000)]
+    assert indexes == sorted(indexes)
+
+
+def test_quantiles_within_bin_resolution():
+    rng = random.Random(3)
+    values = [int(rng.lognormvariate(10, 1)) for _ in range(20000)]
+    sketch = LatencySketch()
+    for v in values:
+        sketch.add(v)
+    values.sort()
+    for q, estimate in zip((50, 90, 99), sketch.quantiles((50, 90, 99)).values()):
+        exact = values[-(-q * len(values) // 100) - 1]
+        assert abs(estimate - exact) <= exact / SUB_COUNT
+
+
+def test_merge_and_json_round_trip():
+    a, b = LatencySketch(), LatencySketch()
+    for v in range(0, 1000, 3):
+        a.add(v)
+    b.add(250, n=10)
+    merged = LatencySketch.from_json(a.to_json()).merge(LatencySketch.from_json(b.to_json()))
+    assert merged.count == a.count + 10
+    assert merged.bins[bin_index(250)] == a.bins[bin_index(250)] + 10
+    assert LatencySketch.from_rows([(bin_index(250), 10)]).bins == b.bins
+
+
+def test_empty_quantiles():
+    assert LatencySketch().quantiles((50, 99.9)) == {"p50": None, "p99.9": None}
@@ -0,0 +1,132 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import stripe_inbox
+from database import Base, StripeWebhookEvent, User
+from stripe_inbox import StripeInbox, enqueue_event
+
+PRO = "price_pro"
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add(User(username="alice", email="alice@example.com", hashed_password="x", stripe_customer_id="cus_a"))
+    db.add(User(username="bob", email="bob@example.com", hashed_password="x", stripe_customer_id="cus_b"))
+    db.commit()
+    db.close()
+    return factory
+
+
+def event(event_id, customer, sub_id, price, event_type="customer.subscription.updated", status="active"):
+    return event_id, event_type, json.dumps({
+        "id": event_id,
+        "type": event_type,
+        "data": {"object": {
+            "id": sub_id,
+            "customer": customer,
+            "status": status,
+            "items": {"data": [{"price": {"id": price}}]},
+        }},
+    })
+
+
+def enqueue(factory, *events):
+    db = factory()
+    try:
+        return [enqueue_event(db, *e) for e in events]
+    finally:
+        db.close()
+
+
+def rows(factory):
+    db = factory()
+    try:
+        return {r.event_id: (r.status, r.attempts) for r in db.query(StripeWebhookEvent)}
+    finally:
+        db.close()
+
+
+def plan(factory, username):
+    db = factory()
+    try:
+        return db.query(User).filter(User.username == username).one().plan
+    finally:
+        db.close()
+
+
+def test_duplicate_event_ids_are_stored_once(session_factory):
+    evt = event("evt_1", "cus_a", "sub_a", PRO)
+    assert enqueue(session_factory, evt, evt) == [True, False]
+    assert StripeInbox(session_factory, PRO).drain() == 1
+    assert plan(session_factory, "alice") == "pro"
+
+
+def test_events_apply_in_order(session_factory):
+    enqueue(
+        session_factory,
+        event("evt_1", "cus_a", "sub_a", "price_starter"),
+        event("evt_2", "cus_a", "sub_a", PRO),
+        event("evt_3", "cus_a", "sub_a", PRO, event_type="customer.subscription.deleted"),
+    )
+    StripeInbox(session_factory, PRO).drain()
+    assert plan(session_factory, "alice") == "free"
+    assert set(rows(session_factory).values()) == {("done", 0)}
+
+
+def test_malformed_payload_fails_permanently(session_factory):
+    enqueue(session_factory, ("evt_bad", "customer.subscription.updated", json.dumps({"data": {}})))
+    StripeInbox(session_factory, PRO).drain()
+    assert rows(session_factory)["evt_bad"] == ("failed", 0)
+
+
+def test_operational_error_is_retried_with_backoff(session_factory, monkeypatch):
+    enqueue(
+        session_factory,
+        event("evt_1", "cus_a", "sub_a", PRO),
+        event("evt_2", "cus_a", "sub_a", PRO, event_type="customer.subscription.deleted"),
+        event("evt_3", "cus_b", "sub_b", PRO),
+    )
+    real_apply = stripe_inbox.apply_event
+    failing = {"sub_a"}
+
+    def flaky_apply(db, event_type, sub, pro_price_id):
+        if sub["id"] in failing:
+            raise OperationalError("UPDATE users", {}, Exception("lost connection"))
+        real_apply(db, event_type, sub, pro_price_id)
+
+    monkeypatch.setattr(stripe_inbox, "apply_event", flaky_apply)
+    inbox = StripeInbox(session_factory, PRO, retry_base=60)
+
+    inbox.drain()
+    # alice's first event waits for its retry and holds back her second one; bob is not affected.
+    assert rows(session_factory) == {"evt_1": ("pending", 1), "evt_2": ("pending", 0), "evt_3": ("done", 0)}
+    assert plan(session_factory, "bob") == "pro"
+
+    assert inbox.drain() == 0
+
+    failing.clear()
+    db = session_factory()
+    db.query(StripeWebhookEvent).filter(StripeWebhookEvent.event_id == "evt_1").update(
+        {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    db.close()
+    assert inbox.drain() == 2
+    assert rows(session_factory) == {"evt_1": ("done", 1), "evt_2": ("done", 0), "evt_3": ("done", 0)}
+    assert plan(session_factory, "alice") == "free"
+
+
+def test_retry_delay_doubles_up_to_the_cap(session_factory):
+    inbox = StripeInbox(session_factory, PRO, retry_base=5, retry_max=60)
+    assert [inbox.retry_delay(n) for n in range(1, 6)] == [5, 10, 20, 40, 60]
+    assert inbox.retry_delay(1000) == 60
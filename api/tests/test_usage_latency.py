@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import ConfigApiKey, UsageLog
+from sketch import LatencySketch
+
+
+def mysql_functions(engine):
+    """The MySQL functions the endpoint's SQL uses, on the SQLite test database."""
+    conn = engine.raw_connection().driver_connection
+    conn.create_function("DATE_FORMAT", 2, lambda value, fmt: datetime.fromisoformat(value).strftime(fmt))
+    conn.create_function("BIN", 1, lambda value: format(value, "b"))
+    conn.create_function("GREATEST", 2, max)
+
+
+@pytest.fixture
+def usage(api):
+    mysql_functions(api.session_factory.kw["bind"])
+    headers = {"alice": api.user("alice"), "bob": api.user("bob")}
+    db = api.session_factory()
+    owners = {u.username: u.id for u in db.query(api.main.DBUser)}
+    keys = {}
+    for name, owner in (("a1", "alice"), ("a2", "alice"), ("b1", "bob")):
+        key = ConfigApiKey(name=name, key=f"lp_{name}", owner_id=owners[owner])
+        db.add(key)
+        db.flush()
+        keys[name] = key.id
+    now = datetime.utcnow()
+    # a1: 1..100 ms today, 1000 ms two days ago; a2: 5 ms; b1: 9 s (must not leak into alice's results)
+    for ms in range(1, 101):
+        db.add(UsageLog(config_api_key_id=keys["a1"], requested_at=now - timedelta(minutes=1),
+                        latency_us=ms * 1000, upstream_us=ms * 500))
+    db.add(UsageLog(config_api_key_id=keys["a1"], requested_at=now - timedelta(days=2), latency_us=1_000_000))
+    db.add(UsageLog(config_api_key_id=keys["a2"], requested_at=now - timedelta(minutes=1), latency_us=5000))
+    db.add(UsageLog(config_api_key_id=keys["b1"], requested_at=now - timedelta(minutes=1), latency_us=9_000_000))
+    # Outside the 7-day window
+    db.add(UsageLog(config_api_key_id=keys["a2"], requested_at=now - timedelta(days=9), latency_us=7_000_000))
+    db.commit()
+    db.close()
+    return api, headers, keys
+
+
+def get(api, headers, **params):
+    return api.client.get("/api/usage/latency", params=params, headers=headers)
+
+
+def test_series_are_the_owners_keys_only(usage):
+    api, headers, keys = usage
+    body = get(api, headers["alice"]).json()
+    assert [s["key_name"] for s in body["series"]] == ["a1", "a2"]
+    a1, a2 = body["series"]
+    assert a1["overall"]["count"] == 101 and sum(a1["counts"]) == 101
+    assert a2["overall"]["count"] == 1
+    # Bob's 9 s and the row older than the window are nowhere
+    assert max(v for s in body["series"] for v in s["overall"]["latency"].values()) < 7000
+    bob = get(api, headers["bob"]).json()
+    assert [s["key_name"] for s in bob["series"]] == ["b1"]
+
+
+def test_percentiles_per_bucket_and_overall(usage):
+    api, headers, keys = usage
+    body = get(api, headers["alice"], key_id=keys["a1"], percentiles="50,99.9").json()
+    assert body["unit"] == "ms" and len(body["labels"]) == 8
+    (a1,) = body["series"]
+    today = body["labels"].index(datetime.utcnow().strftime("%Y-%m-%d"))
+    assert a1["counts"][today] == 100
+    # Quantiles are bin representatives: close to the value, not exact
+    assert a1["latency"]["p50"][today] == pytest.approx(50, rel=1 / 32)
+    assert a1["upstream"]["p50"][today] == pytest.approx(25, rel=1 / 32)
+    assert a1["overall"]["latency"]["p99.9"] == pytest.approx(1000, rel=1 / 32)
+    # Buckets without requests are null
+    assert a1["latency"]["p50"][0] is None and a1["counts"][0] == 0
+
+
+def test_foreign_key_id_is_404(usage):
+    api, headers, keys = usage
+    assert get(api, headers["alice"], key_id=keys["b1"]).status_code == 404
+
+
+@pytest.mark.parametrize("params", [
+    {"percentiles": "abc"},
+    {"percentiles": ""},
+    {"percentiles": "0"},
+    {"percentiles": "101"},
+    {"percentiles": ",".join(["50"] * 11)},
+    {"group_by": "week"},
+    {"period": "90d"},
+    {"group_by": "hour", "period": "30d"},
+])
+def test_invalid_parameters(usage, params):
+    api, headers, _ = usage
+    assert get(api, headers["alice"], **params).status_code == 400
+
+
+def test_hour_and_month_buckets(usage):
+    api, headers, keys = usage
+    hourly = get(api, headers["alice"], group_by="hour", key_id=keys["a2"]).json()
+    assert len(hourly["labels"]) >= 7 * 24 and sum(hourly["series"][0]["counts"]) == 1
+    monthly = get(api, headers["alice"], group_by="month", period="30d", key_id=keys["a1"]).json()
+    assert sum(monthly["series"][0]["counts"]) == 101
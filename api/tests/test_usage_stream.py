@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, ConfigApiKey, UsageLog, User
+from usage_stream import UsageAggregator, is_error
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add(User(id=1, username="alice", email="alice@example.com", hashed_password="x"))
+    db.add(User(id=2, username="bob", email="bob@example.com", hashed_password="x"))
+    db.add(ConfigApiKey(id=10, name="a", key="lp_a", owner_id=1))
+    db.add(ConfigApiKey(id=20, name="b", key="lp_b", owner_id=2))
+    db.commit()
+    db.close()
+    return factory
+
+
+def insert(factory, *rows):
+    db = factory()
+    for row_id, key_id, status_code in rows:
+        db.add(UsageLog(id=row_id, config_api_key_id=key_id, status_code=status_code, requested_at=datetime.utcnow()))
+    db.commit()
+    db.close()
+
+
+def test_is_error():
+    assert [is_error(c) for c in (None, 200, 302, 404, 503, 0)] == [False, False, False, True, True, True]
+
+
+def test_deltas_grouped_by_owner(session_factory):
+    insert(session_factory, (1, 10, 200))
+    aggregator = UsageAggregator(session_factory)
+    assert aggregator.poll() == {}
+    insert(session_factory, (2, 10, 200), (3, 10, 503), (4, 20, None))
+    assert aggregator.poll() == {1: {10: [2, 1]}, 2: {20: [1, 0]}}
+    assert aggregator.poll() == {}
+
+
+def test_late_commit_below_the_cursor_is_counted_once(session_factory):
+    aggregator = UsageAggregator(session_factory)
+    aggregator.poll()
+    # Ids 1 and 2 were allocated first but are committed after id 3
+    insert(session_factory, (3, 10, 200))
+    assert aggregator.poll() == {1: {10: [1, 0]}}
+    insert(session_factory, (2, 20, 500))
+    assert aggregator.poll() == {2: {20: [1, 1]}}
+    assert aggregator.poll() == {}
+    insert(session_factory, (1, 10, 404), (4, 10, 200))
+    assert aggregator.poll() == {1: {10: [2, 1]}}
+    assert aggregator.poll() == {}
+
+
+def test_gaps_expire_after_the_lag(session_factory):
+    aggregator = UsageAggregator(session_factory, lag=0)
+    aggregator.poll()
+    insert(session_factory, (2, 10, 200))
+    assert aggregator.poll() == {1: {10: [1, 0]}}
+    aggregator._gaps = {g: passed - 1 for g, passed in aggregator._gaps.items()}
+    insert(session_factory, (1, 10, 200))
+    assert aggregator.poll() == {}
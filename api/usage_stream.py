@@ -0,0 +1,190 @@
+# Live usage for dashboards: one background task tails usage_log by id (a single indexed range query
+# per tick, however many dashboards are open) and fans per-key request/error deltas out to the
+# subscribers owning those keys. Served as server-sent events by GET /api/usage/stream; dashboards
+# load totals once from /api/usage/summary and /api/usage/timeline, then apply the deltas.
+# The task only runs while at least one dashboard is connected.
+# Ids are allocated before commit and two writers insert into usage_log (the Go proxy and the Python
+# batch recorder), so a lower id can become visible after the cursor has passed it. Ids skipped by the
+# cursor are remembered for USAGE_STREAM_LAG seconds and re-read each tick until their row shows up.
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+USAGE_STREAM_INTERVAL = float(os.getenv("USAGE_STREAM_INTERVAL", "1"))
+USAGE_STREAM_BATCH = int(os.getenv("USAGE_STREAM_BATCH", "10000"))
+USAGE_STREAM_LAG = float(os.getenv("USAGE_STREAM_LAG", "30"))
+# Skipped ids re-read per tick, at most (oldest dropped first)
+USAGE_STREAM_MAX_GAPS = 1000
+USAGE_STREAM_KEEPALIVE = 15.0
+# Deltas buffered per subscriber before it is told to resync (slow or stalled client)
+USAGE_STREAM_QUEUE_SIZE = 64
+
+# Key id -> [requests, errors]
+Deltas = Dict[int, List[int]]
+
+
+def is_error(status_code: Optional[int]) -> bool:
+    """4xx/5xx returned to the client, injected or from the target, or 0 when no response was sent
+    (connection reset or hung by a transport fault). NULL (older proxies) counts as success."""
+    return status_code is not None and (status_code >= 400 or status_code == 0)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class UsageAggregator:
+    def __init__(
+        self,
+        session_factory: Callable,
+        interval: float = USAGE_STREAM_INTERVAL,
+        batch_size: int = USAGE_STREAM_BATCH,
+        lag: float = USAGE_STREAM_LAG,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lag = lag
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._key_owner: Dict[int, Optional[int]] = {}
+        self._cursor: Optional[int] = None
+        # Ids below the cursor not seen yet -> monotonic time the cursor passed them
+        self._gaps: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, owner_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=USAGE_STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(owner_id, set()).add(queue)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, owner_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(owner_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[owner_id]
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            # Next subscriber starts from the current end of the log, not from a backlog
+            self._cursor = None
+            self._gaps.clear()
+
+    def poll(self) -> Dict[int, Deltas]:
+        """Read new usage rows (blocking). Returns deltas grouped by key owner."""
+        db = self.session_factory()
+        try:
+            if self._cursor is None:
+                self._cursor = int(db.execute(text("SELECT COALESCE(MAX(id), 0) FROM usage_log")).scalar() or 0)
+                return {}
+            now = time.monotonic()
+            rows = self._read_gaps(db, now)
+            new_rows = db.execute(
+                text("""
+                    SELECT id, config_api_key_id, status_code FROM usage_log
+                    WHERE id > :cursor ORDER BY id LIMIT :limit
+                """),
+                {"cursor": self._cursor, "limit": self.batch_size},
+            ).fetchall()
+            self._advance(new_rows, now)
+            rows.extend(new_rows)
+            if not rows:
+                return {}
+            per_key: Deltas = {}
+            for _, key_id, status_code in rows:
+                d = per_key.setdefault(key_id, [0, 0])
+                d[0] += 1
+                if is_error(status_code):
+                    d[1] += 1
+            unknown = [k for k in per_key if k not in self._key_owner]
+            if unknown:
+                params = {f"k{i}": k for i, k in enumerate(unknown)}
+                placeholders = ", ".join(f":{p}" for p in params)
+                found = dict(db.execute(
+                    text(f"SELECT id, owner_id FROM config_api_keys WHERE id IN ({placeholders})"), params
+                ).fetchall())
+                for k in unknown:
+                    self._key_owner[k] = found.get(k)
+        finally:
+            db.close()
+        by_owner: Dict[int, Deltas] = {}
+        for key_id, d in per_key.items():
+            owner = self._key_owner.get(key_id)
+            if owner is not None:
+                by_owner.setdefault(owner, {})[key_id] = d
+        return by_owner
+
+    def _read_gaps(self, db, now: float) -> list:
+        """Rows committed since the last tick under ids the cursor already passed."""
+        for gap_id in [g for g, passed in self._gaps.items() if now - passed > self.lag]:
+            del self._gaps[gap_id]
+        if not self._gaps:
+            return []
+        params = {f"g{i}": g for i, g in enumerate(self._gaps)}
+        placeholders = ", ".join(f":{p}" for p in params)
+        rows = db.execute(
+            text(f"SELECT id, config_api_key_id, status_code FROM usage_log WHERE id IN ({placeholders})"), params
+        ).fetchall()
+        for row in rows:
+            del self._gaps[row[0]]
+        return rows
+
+    def _advance(self, rows: list, now: float) -> None:
+        """Move the cursor past `rows` (in id order), remembering the ids skipped on the way."""
+        prev = self._cursor
+        for row in rows:
+            for gap_id in range(max(prev + 1, row[0] - USAGE_STREAM_MAX_GAPS), row[0]):
+                self._gaps[gap_id] = now
+            prev = row[0]
+        self._cursor = prev
+        while len(self._gaps) > USAGE_STREAM_MAX_GAPS:
+            del self._gaps[next(iter(self._gaps))]
+
+    def _publish(self, by_owner: Dict[int, Deltas]) -> None:
+        ts = time.time()
+        for owner, deltas in by_owner.items():
+            message = ("usage", {"ts": ts, "keys": {str(k): {"requests": r, "errors": e} for k, (r, e) in deltas.items()}})
+            for queue in self._subscribers.get(owner, ()):
+                if queue.full():
+                    # Client is not keeping up: drop what it missed and ask it to reload totals
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(("resync", {"ts": ts}))
+                else:
+                    queue.put_nowait(message)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                by_owner = await asyncio.to_thread(self.poll)
+                if by_owner:
+                    self._publish(by_owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Usage stream poll failed:", e)
+            await asyncio.sleep(self.interval)
+
+
+async def stream_events(aggregator: UsageAggregator, owner_id: int, is_disconnected: Callable):
+    """SSE body for one dashboard: deltas as they arrive, keep-alive comments in between."""
+    queue = aggregator.subscribe(owner_id)
+    try:
+        yield f"retry: 3000\n{sse_event('hello', {'ts': time.time(), 'interval': aggregator.interval})}"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=USAGE_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, data)
+    finally:
+        aggregator.unsubscribe(owner_id, queue)
@@ -0,0 +1,35 @@
+"""Good/bad states of keys with correlated failures (config_api_keys.failure_bursts, see chaos.FailureBursts).
+
+One bit per key, moved by one transition per request: O(1), in memory. One worker keeps the keys that are
+in a bad state in a set (a good key is simply absent). In multi-worker mode (APP_STATE_DB set) the states
+live in a memory-mapped file next to the state DB unless FAILURE_BURSTS_SHARED=0, so all workers see the
+same bursts (see slots.py); with per-worker states, each worker has bursts of its own.
+"""
+import os
+
+from . import store
+from .chaos import FailureBursts, LocalStates
+from .slots import SlotTable
+
+FAILURE_BURSTS_SHARED = os.getenv("FAILURE_BURSTS_SHARED", "1").lower() not in ("0", "false", "no")
+_SLOTS = 65536
+
+
+class SharedStates:
+    def __init__(self, path: str, slots: int = _SLOTS):
+        self.table = SlotTable(path, slots)
+
+    def step(self, key_id: int, bursts: FailureBursts, rng) -> bool:
+        """Move the key's state one request forward; True when it is (now) in a burst."""
+        def transition(state):
+            bad = bursts.step(bool(state), rng)
+            return bad, 1.0 if bad else 0.0
+        # A good key's slot can be taken over by another key: it comes back good, which it was
+        return self.table.update(key_id, transition, idle=lambda state: not state)
+
+
+def states():
+    """Shared states in multi-worker mode (unless FAILURE_BURSTS_SHARED=0), per-process otherwise."""
+    if store.APP_STATE_DB and FAILURE_BURSTS_SHARED:
+        return SharedStates(store.APP_STATE_DB + "-bursts")
+    return LocalStates()
@@ -0,0 +1,482 @@
+"""Chaos decision logic for config keys, shared by the gateway and the mitmproxy addon.
+
+Pure Python (no FastAPI/DB imports). Mirrors the Go proxy: latency in [min, max) ms, failure when
+random() < fail_rate / 100, error code picked from error_codes (500 when none are set), schedule
+phases compiled into a timeline looked up by binary search, response corruption and transport faults.
+Every decision takes an `rng` (the global `random` module by default); a CounterRng makes them
+reproducible.
+"""
+import itertools
+import math
+import random
+from bisect import bisect_right
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_ERROR_CODES = (500,)
+SEED_MODES = ("sequence", "request")
+# (key id, seed) request counters kept per process for seed_mode "sequence"
+MAX_SEQUENCES = 10000
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+# Response corruption modes (config_api_keys.corruption), applied by the data plane while relaying
+CORRUPTION_MODES = ("truncate", "flip", "drop", "malformed_json")
+# Connection-level faults (config_api_keys.transport_faults)
+TRANSPORT_FAULT_MODES = ("reset", "hang", "slow_first_byte", "slow_body")
+# Per-message faults on proxied WebSockets (config_api_keys.websocket_chaos)
+WEBSOCKET_MODES = ("drop", "duplicate", "reorder", "close")
+WEBSOCKET_DIRECTIONS = ("both", "client", "target")
+
+
+def mix64(z: int) -> int:
+    """SplitMix64 finalizer: a bijective scramble of a 64-bit integer."""
+    z = (z + _GOLDEN) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def fnv1a64(data: bytes) -> int:
+    h = 0xCBF29CE484222325
+    for b in data:
+        h = ((h ^ b) * 0x100000001B3) & _MASK64
+    return h
+
+
+class CounterRng:
+    """Counter-based RNG: draw i for request n is mix64 of (seed, n, i), a pure function with no shared
+    state, so concurrent requests need no lock. Same output as the Go proxy (internal/chaos/rng.go)."""
+
+    __slots__ = ("base", "i")
+
+    def __init__(self, seed: int, n: int):
+        self.base = mix64((seed & _MASK64) ^ mix64(n & _MASK64))
+        self.i = 0
+
+    def next64(self) -> int:
+        self.i += 1
+        return mix64((self.base + self.i * _GOLDEN) & _MASK64)
+
+    def random(self) -> float:
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def randrange(self, n: int) -> int:
+        return self.next64() % n
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+    def sample(self, population, k: int) -> list:
+        """k distinct items (partial Fisher-Yates over a range or sequence)."""
+        pool = list(population) if not isinstance(population, range) else population
+        n = len(pool)
+        picked: Dict[int, int] = {}
+        out = []
+        for j in range(k):
+            r = j + self.randrange(n - j)
+            out.append(pool[picked.get(r, r)])
+            picked[r] = picked.get(j, j)
+        return out
+
+
+@dataclass(frozen=True)
+class ChaosSettings:
+    fail_rate: int = 0  # percentage 0-100
+    min_latency: int = 0  # ms
+    max_latency: int = 0  # ms
+    error_codes: Tuple[int, ...] = DEFAULT_ERROR_CODES
+
+
+@dataclass(frozen=True)
+class Phase:
+    duration: float
+    overrides: Dict[str, Any] = field(default_factory=dict)
+
+    def apply(self, base: ChaosSettings) -> ChaosSettings:
+        return replace(base, **self.overrides) if self.overrides else base
+
+
+class Timeline:
+    """Compiled schedule: cumulative phase end offsets (seconds from start_at)."""
+
+    __slots__ = ("start", "ends", "phases", "repeat")
+
+    def __init__(self, start: float, phases: List[Phase], repeat: bool = False):
+        self.start = start
+        self.phases = phases
+        self.repeat = repeat
+        self.ends = []
+        total = 0.0
+        for p in phases:
+            total += p.duration
+            self.ends.append(total)
+
+    @classmethod
+    def compile(cls, schedule: Optional[Dict[str, Any]]) -> Optional["Timeline"]:
+        """Build from the JSON stored in config_api_keys.schedule; None when empty or unreadable."""
+        if not schedule or not schedule.get("phases"):
+            return None
+        try:
+            start_at = schedule.get("start_at")
+            start = _parse_utc(start_at) if start_at else 0.0
+            phases = []
+            for p in schedule["phases"]:
+                duration = float(p.get("duration") or 0)
+                if duration <= 0:
+                    continue
+                overrides = {k: p[k] for k in ("fail_rate", "min_latency", "max_latency") if p.get(k) is not None}
+                if p.get("error_codes"):
+                    overrides["error_codes"] = tuple(p["error_codes"])
+                phases.append(Phase(duration, overrides))
+        except (TypeError, ValueError, AttributeError):
+            return None
+        return cls(start, phases, bool(schedule.get("repeat"))) if phases else None
+
+    def at(self, now: float) -> Optional[Phase]:
+        """Phase active at `now` (epoch seconds), None outside the schedule."""
+        elapsed = now - self.start
+        if elapsed < 0:
+            return None
+        total = self.ends[-1]
+        if elapsed >= total:
+            if not self.repeat:
+                return None
+            elapsed %= total
+        return self.phases[bisect_right(self.ends, elapsed)]
+
+
+@dataclass(frozen=True)
+class Corruption:
+    """Damage to forwarded response bodies: `rate`% of responses get one of `modes`.
+
+    truncate: body cut at truncate_at % of its length (random offset when unset), response ends cleanly
+    flip: flip_bytes random bytes XOR-ed
+    drop: connection closed after the cut, before the body is complete
+    malformed_json: body cut and followed by a dangling '",}' so JSON parsers fail on syntax
+    """
+    rate: int = 0  # percentage 0-100
+    modes: Tuple[str, ...] = ("truncate",)
+    truncate_at: Optional[int] = None  # percentage of the body kept
+    flip_bytes: int = 8
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> Optional["Corruption"]:
+        """Build from the JSON stored in config_api_keys.corruption; None when disabled or unreadable."""
+        if not data:
+            return None
+        try:
+            rate = int(data.get("rate") or 0)
+            modes = tuple(m for m in (data.get("modes") or ("truncate",)) if m in CORRUPTION_MODES)
+            truncate_at = data.get("truncate_at")
+            corruption = cls(
+                rate=min(100, max(0, rate)),
+                modes=modes,
+                truncate_at=min(100, max(0, int(truncate_at))) if truncate_at is not None else None,
+                flip_bytes=max(1, int(data.get("flip_bytes") or 8)),
+            )
+        except (TypeError, ValueError, AttributeError):
+            return None
+        return corruption if corruption.rate > 0 and corruption.modes else None
+
+
+@dataclass(frozen=True)
+class TransportFaults:
+    """Faults below HTTP: `rate`% of requests get one of `modes`.
+
+    reset: connection reset (TCP RST) instead of a response, the target is not called
+    hang: connection accepted and left open without a response for hang_ms, then closed
+    slow_first_byte: the target's response is held for delay_ms before its headers are sent
+    slow_body: headers are sent at once, the body only after delay_ms
+    """
+    rate: int = 0  # percentage 0-100
+    modes: Tuple[str, ...] = ("reset",)
+    delay_ms: int = 5000
+    hang_ms: int = 60000
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> Optional["TransportFaults"]:
+        """Build from the JSON stored in config_api_keys.transport_faults; None when disabled or unreadable."""
+        if not data:
+            return None
+        try:
+            faults = cls(
+                rate=min(100, max(0, int(data.get("rate") or 0))),
+                modes=tuple(m for m in (data.get("modes") or ("reset",)) if m in TRANSPORT_FAULT_MODES),
+                delay_ms=max(0, int(data.get("delay_ms") if data.get("delay_ms") is not None else 5000)),
+                hang_ms=max(0, int(data.get("hang_ms") if data.get("hang_ms") is not None else 60000)),
+            )
+        except (TypeError, ValueError, AttributeError):
+            return None
+        return faults if faults.rate > 0 and faults.modes else None
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket: `burst` requests at once, refilled at `rate` per second (see ratelimit.py)."""
+    rate: float
+    burst: int
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> Optional["RateLimit"]:
+        """Build from the JSON stored in config_api_keys.rate_limit; None when off or unreadable."""
+        if not data:
+            return None
+        try:
+            rate = float(data.get("rate") or 0)
+            burst = data.get("burst")
+            burst = int(burst) if burst is not None else math.ceil(rate)
+        except (TypeError, ValueError, AttributeError):
+            return None
+        return cls(rate=rate, burst=max(1, burst)) if rate > 0 and math.isfinite(rate) else None
+
+
+@dataclass(frozen=True)
+class ConcurrencyLimit:
+    """Saturated target: at most `max_in_flight` requests forwarded at once (see concurrency.py). Up to
+    `queue` more wait for a slot, at most queue_timeout_ms; the others get a 503. A request that waited
+    in nth position gets n * latency_per_queued_ms of extra latency."""
+    max_in_flight: int
+    queue: int = 0
+    queue_timeout_ms: int = 1000
+    latency_per_queued_ms: int = 0
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> Optional["ConcurrencyLimit"]:
+        """Build from the JSON stored in config_api_keys.concurrency_limit; None when off or unreadable."""
+        if not data:
+            return None
+        try:
+            limit = cls(
+                max_in_flight=int(data.get("max_in_flight") or 0),
+                queue=max(0, int(data.get("queue") or 0)),
+                queue_timeout_ms=max(0, int(data.get("queue_timeout_ms") if data.get("queue_timeout_ms") is not None else 1000)),
+                latency_per_queued_ms=max(0, int(data.get("latency_per_queued_ms") or 0)),
+            )
+        except (TypeError, ValueError, AttributeError):
+            return None
+        return limit if limit.max_in_flight > 0 else None
+
+
+@dataclass(frozen=True)
+class FailureBursts:
+    """Correlated failures (Gilbert-Elliott): the key is in a good or a bad state (see bursts.py). Each
+    request first moves a good key to bad with probability p_enter, or a bad one back with p_exit, then
+    fails at the key's fail_rate when good and at bad_fail_rate when bad. Bursts last 1 / p_exit requests
+    on average, and the key spends p_enter / (p_enter + p_exit) of its requests in them."""
+    p_enter: float
+    p_exit: float
+    bad_fail_rate: int = 100  # percentage 0-100
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> Optional["FailureBursts"]:
+        """Build from the JSON stored in config_api_keys.failure_bursts; None when off or unreadable."""
+        if not data:
+            return None
+        try:
+            bursts = cls(
+                p_enter=min(1.0, float(data.get("p_enter") or 0)),
+                p_exit=min(1.0, max(0.0, float(data.get("p_exit") or 0))),
+                bad_fail_rate=min(100, max(0, int(data.get("bad_fail_rate") if data.get("bad_fail_rate") is not None else 100))),
+            )
+        except (TypeError, ValueError, AttributeError):
+            return None
+        return bursts if bursts.p_enter > 0 else None
+
+    def step(self, bad: bool, rng=random) -> bool:
+        """The state after one request's transition."""
+        return rng.random() >= self.p_exit if bad else rng.random() < self.p_enter
+
+    def apply(self, settings: ChaosSettings, bad: bool) -> ChaosSettings:
+        return replace(settings, fail_rate=self.bad_fail_rate) if bad else settings
+
+
+class LocalStates:
+    """Burst states of one process: the keys that are in a bad state (a good key is simply absent).
+    bursts.py adds the states shared between workers."""
+
+    def __init__(self):
+        self.bad = set()
+
+    def step(self, key_id: int, bursts: FailureBursts, rng) -> bool:
+        """Move the key's state one request forward; True when it is (now) in a burst."""
+        if bursts.step(key_id in self.bad, rng):
+            self.bad.add(key_id)
+            return True
+        self.bad.discard(key_id)
+        return False
+
+    def __len__(self) -> int:
+        return len(self.bad)
+
+
+@dataclass(frozen=True)
+class WebSocketChaos:
+    """Chaos on proxied WebSockets, per data message (see wsproxy.py). Each message is held for a delay
+    in [min_delay_ms, max_delay_ms), then `rate`% of them get one of `modes`:
+
+    drop: the message is not delivered
+    duplicate: the message is delivered twice
+    reorder: the message is held back and delivered after the next one in the same direction
+    close: both sides get a close frame with close_code and the connection ends
+
+    `direction` limits this to messages sent by the client or by the target.
+    """
+    rate: int = 0  # percentage 0-100
+    modes: Tuple[str, ...] = ("drop",)
+    min_delay_ms: int = 0
+    max_delay_ms: int = 0
+    close_code: int = 1011
+    direction: str = "both"
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> Optional["WebSocketChaos"]:
+        """Build from the JSON stored in config_api_keys.websocket_chaos; None when off or unreadable."""
+        if not data:
+            return None
+        try:
+            ws = cls(
+                rate=min(100, max(0, int(data.get("rate") or 0))),
+                modes=tuple(m for m in (data.get("modes") or ("drop",)) if m in WEBSOCKET_MODES),
+                min_delay_ms=max(0, int(data.get("min_delay_ms") or 0)),
+                max_delay_ms=max(0, int(data.get("max_delay_ms") or 0)),
+                close_code=int(data.get("close_code") or 1011),
+                direction=data.get("direction") if data.get("direction") in WEBSOCKET_DIRECTIONS else "both",
+            )
+        except (TypeError, ValueError, AttributeError):
+            return None
+        if not (ws.rate > 0 and ws.modes) and not ws.max_delay_ms and not ws.min_delay_ms:
+            return None
+        return ws
+
+    def applies_to(self, direction: str) -> bool:
+        """Whether messages sent by `direction` ("client" or "target") get chaos."""
+        return self.direction in ("both", direction)
+
+
+@dataclass(frozen=True)
+class KeyConfig:
+    """A resolved config key as used by the data plane."""
+    id: int
+    key: str
+    target_url: str
+    method: str
+    settings: ChaosSettings
+    timeline: Optional[Timeline] = None
+    corruption: Optional[Corruption] = None
+    transport_faults: Optional[TransportFaults] = None
+    seed: Optional[int] = None  # reproducible decisions when set (see CounterRng)
+    seed_mode: str = "sequence"
+    rate_limit: Optional[RateLimit] = None
+    concurrency_limit: Optional[ConcurrencyLimit] = None
+    failure_bursts: Optional[FailureBursts] = None
+    websocket_chaos: Optional[WebSocketChaos] = None
+
+    def chaos_at(self, now: float) -> ChaosSettings:
+        if self.timeline is None:
+            return self.settings
+        phase = self.timeline.at(now)
+        return phase.apply(self.settings) if phase else self.settings
+
+    @classmethod
+    def from_row(cls, row: Any) -> "KeyConfig":
+        """Build from a config_api_keys row (ORM object or dict-like with the same attributes)."""
+        get = row.get if isinstance(row, dict) else lambda name, default=None: getattr(row, name, default)
+        return cls(
+            id=get("id"),
+            key=get("key"),
+            target_url=(get("target_url") or "").strip(),
+            method=(get("method") or "ANY").upper(),
+            settings=ChaosSettings(
+                fail_rate=int(get("fail_rate") or 0),
+                min_latency=int(get("min_latency") or 0),
+                max_latency=int(get("max_latency") or 0),
+                error_codes=tuple(get("error_codes") or ()) or DEFAULT_ERROR_CODES,
+            ),
+            timeline=Timeline.compile(get("schedule")),
+            corruption=Corruption.from_json(get("corruption")),
+            transport_faults=TransportFaults.from_json(get("transport_faults")),
+            seed=int(get("seed")) if get("seed") is not None else None,
+            seed_mode=get("seed_mode") if get("seed_mode") in SEED_MODES else "sequence",
+            rate_limit=RateLimit.from_json(get("rate_limit")),
+            concurrency_limit=ConcurrencyLimit.from_json(get("concurrency_limit")),
+            failure_bursts=FailureBursts.from_json(get("failure_bursts")),
+            websocket_chaos=WebSocketChaos.from_json(get("websocket_chaos")),
+        )
+
+
+def sample_latency(settings: ChaosSettings, rng=random) -> int:
+    """Injected delay in ms (0 when no latency is configured)."""
+    if settings.max_latency > settings.min_latency:
+        return settings.min_latency + rng.randrange(settings.max_latency - settings.min_latency)
+    return settings.min_latency
+
+
+def pick_failure(settings: ChaosSettings, rng=random) -> Optional[int]:
+    """Status code to inject, or None to forward the request."""
+    if settings.fail_rate > 0 and rng.random() < settings.fail_rate / 100.0:
+        codes = settings.error_codes or DEFAULT_ERROR_CODES
+        # No draw for a single code, as in the Go proxy, so seeded streams stay aligned
+        return codes[0] if len(codes) == 1 else rng.choice(codes)
+    return None
+
+
+def pick_corruption(corruption: Optional[Corruption], rng=random) -> Optional[str]:
+    """Corruption mode for a forwarded response, or None to relay it intact."""
+    if corruption is not None and rng.random() < corruption.rate / 100.0:
+        return rng.choice(corruption.modes)
+    return None
+
+
+def pick_transport_fault(faults: Optional[TransportFaults], rng=random) -> Optional[str]:
+    """Transport fault for a request, or None for a normal exchange."""
+    if faults is not None and rng.random() < faults.rate / 100.0:
+        return rng.choice(faults.modes)
+    return None
+
+
+def sample_message_delay(ws: WebSocketChaos, rng=random) -> int:
+    """Delay in ms for one WebSocket message."""
+    if ws.max_delay_ms > ws.min_delay_ms:
+        return ws.min_delay_ms + rng.randrange(ws.max_delay_ms - ws.min_delay_ms)
+    return ws.min_delay_ms
+
+
+def pick_message_fault(ws: WebSocketChaos, rng=random) -> Optional[str]:
+    """Fault for one WebSocket message, or None to deliver it."""
+    if ws.rate > 0 and ws.modes and rng.random() < ws.rate / 100.0:
+        return rng.choice(ws.modes)
+    return None
+
+
+def seeded_rng(config: KeyConfig, seed: Optional[int], seq: Optional[int],
+               request_key: Callable[[], bytes], sequences: Dict[Tuple[int, int], Any]) -> Tuple[Any, Optional[int]]:
+    """RNG for one request's decisions: `random`, or a CounterRng when a seed is set (`seed`, from the
+    request, overrides the key's). Returns (rng, request number or None). The number is `seq` when
+    given, the hash of request_key() (b"METHOD /key/path?query\nX-Request-Id") in seed mode "request",
+    else the next value of the per-(key, seed) counter in `sequences`."""
+    if seed is None:
+        seed = config.seed
+    if seed is None:
+        return random, None
+    if seq is None and config.seed_mode == "request":
+        seq = fnv1a64(request_key())
+    elif seq is None:
+        counter = sequences.get((config.id, seed))
+        if counter is None:
+            if len(sequences) >= MAX_SEQUENCES:
+                del sequences[next(iter(sequences))]
+            counter = sequences[(config.id, seed)] = itertools.count()
+        seq = next(counter)
+    return CounterRng(seed, seq), seq
+
+
+def method_allowed(config: KeyConfig, method: str) -> bool:
+    return config.method == "ANY" or config.method == method.upper()
+
+
+def _parse_utc(value: str) -> float:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
@@ -0,0 +1,103 @@
+"""Concurrency limits for config keys (config_api_keys.concurrency_limit): a simulated saturated target.
+
+Each limited key has `max_in_flight` slots. A request takes one before its injected latency and holds
+it until the target's response has been relayed, so slow responses fill the slots like they would on a
+real overloaded server. When all are taken, up to `queue` requests wait in arrival order (at most
+queue_timeout_ms) and later ones are rejected at once; the gateway answers both with a 503.
+
+Slots and queues are per process, kept in plain dicts and futures (the event loop serializes every
+change, no locking). Behind several workers each one enforces the limit on its own share of traffic.
+"""
+import asyncio
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from .chaos import ConcurrencyLimit
+
+
+class _Key:
+    __slots__ = ("in_flight", "max", "waiters")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max = 0
+        self.waiters: deque = deque()
+
+
+class Slot:
+    """A taken slot; release() is idempotent, so every exit path of a request can call it."""
+
+    __slots__ = ("_bulkheads", "_key_id", "_held")
+
+    def __init__(self, bulkheads: "Bulkheads", key_id: int):
+        self._bulkheads = bulkheads
+        self._key_id = key_id
+        self._held = True
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            self._bulkheads._release(self._key_id)
+
+
+class Bulkheads:
+    def __init__(self):
+        self.keys: Dict[int, _Key] = {}
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self, key_id: int, limit: ConcurrencyLimit) -> Tuple[Optional[Slot], int]:
+        """(slot, or None when rejected or timed out; queue position at arrival, 0 when a slot was free)."""
+        k = self.keys.get(key_id)
+        if k is None:
+            k = self.keys[key_id] = _Key()
+        # Follows the key's current setting; slots above a lowered limit drain as they are released
+        k.max = limit.max_in_flight
+        if k.in_flight < k.max and not k.waiters:
+            k.in_flight += 1
+            return Slot(self, key_id), 0
+        position = len(k.waiters) + 1
+        if position > limit.queue:
+            self.rejected += 1
+            return None, position
+        waiter = asyncio.get_running_loop().create_future()
+        k.waiters.append(waiter)
+        try:
+            # Shielded: on timeout the waiter is still ours to inspect (a slot may have just been handed over)
+            await asyncio.wait_for(asyncio.shield(waiter), limit.queue_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return Slot(self, key_id), position
+            self._abandon(k, waiter)
+            self.timed_out += 1
+            return None, position
+        except asyncio.CancelledError:
+            # Client gone while waiting: pass a slot handed over in the meantime on
+            if waiter.done():
+                Slot(self, key_id).release()
+            else:
+                self._abandon(k, waiter)
+            raise
+        return Slot(self, key_id), position
+
+    def _abandon(self, k: _Key, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        k.waiters.remove(waiter)
+
+    def _release(self, key_id: int) -> None:
+        k = self.keys[key_id]
+        k.in_flight -= 1
+        # Hand the freed slot to the oldest waiter
+        while k.waiters and k.in_flight < k.max:
+            waiter = k.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                k.in_flight += 1
+        if not k.in_flight and not k.waiters:
+            del self.keys[key_id]
+
+    def in_flight(self) -> int:
+        return sum(k.in_flight for k in self.keys.values())
+
+    def queued(self) -> int:
+        return sum(len(k.waiters) for k in self.keys.values())
@@ -0,0 +1,81 @@
+"""Response body corruption applied while relaying (see chaos.Corruption for the modes).
+
+The upstream chunks are passed through as they arrive, as the same objects: only the chunk holding
+the cut point is sliced and only chunks with flipped bytes are copied. Nothing is re-buffered, so
+large bodies keep their throughput.
+"""
+import random
+from typing import AsyncIterator, Callable, List, Optional
+
+from .chaos import Corruption
+
+MALFORMED_JSON_TAIL = b'",}'
+
+
+class ConnectionDropped(Exception):
+    """Raised mid-body for mode "drop" when the client connection cannot be closed directly, so the
+    server aborts it."""
+
+
+def strips_content_length(mode: str) -> bool:
+    """Modes that end the body early and cleanly: the response must not announce the original length."""
+    return mode in ("truncate", "malformed_json")
+
+
+class _Plan:
+    __slots__ = ("cut", "flips")
+
+    def __init__(self, mode: str, corruption: Corruption, length: int, rng):
+        self.cut: Optional[int] = None
+        self.flips: List[int] = []
+        if mode == "flip":
+            self.flips = sorted(rng.sample(range(length), min(corruption.flip_bytes, length))) if length else []
+        elif corruption.truncate_at is not None:
+            self.cut = length * corruption.truncate_at // 100
+        else:
+            self.cut = rng.randrange(length) if length else 0
+
+
+async def corrupt_body(
+    chunks: AsyncIterator[bytes],
+    mode: str,
+    corruption: Corruption,
+    content_length: Optional[int] = None,
+    rng=random,
+    drop: Optional[Callable[[], None]] = None,
+) -> AsyncIterator[bytes]:
+    """Relay `chunks` with `mode` applied. Without a Content-Length, offsets are picked in the first chunk.
+    `chunks` is closed when the body is cut (the upstream connection is released, not read to the end).
+    In mode "drop", `drop()` closes the client connection once the bytes before the cut are sent and the
+    body ends there; without it ConnectionDropped is raised instead."""
+    plan = _Plan(mode, corruption, content_length, rng) if content_length is not None else None
+    offset = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if plan is None:
+                plan = _Plan(mode, corruption, len(chunk), rng)
+            end = offset + len(chunk)
+            if plan.cut is not None and end >= plan.cut:
+                if plan.cut > offset:
+                    yield chunk[:plan.cut - offset]
+                break
+            if plan.flips and plan.flips[0] < end:
+                data = bytearray(chunk)
+                while plan.flips and plan.flips[0] < end:
+                    data[plan.flips.pop(0) - offset] ^= 0xFF
+                chunk = bytes(data)
+            yield chunk
+            offset = end
+        else:
+            # Flip mode, or a body shorter than announced: nothing was cut
+            return
+    finally:
+        await chunks.aclose()
+    if mode == "malformed_json":
+        yield MALFORMED_JSON_TAIL
+    elif mode == "drop":
+        if drop is None:
+            raise ConnectionDropped(f"chaos: connection dropped after {plan.cut} bytes")
+        drop()
@@ -0,0 +1,83 @@
+"""Read access to the config keys shared with the API service (api/database.py owns the schema)."""
+from sqlalchemy import create_engine, text, Column, Integer, String, Boolean, JSON, DateTime, Text, SmallInteger, Index, BigInteger
+from sqlalchemy.orm import declarative_base, sessionmaker
+import os
+from typing import Set
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./latencypoison.db")
+
+_engine_kwargs = {"pool_pre_ping": True, "pool_recycle": 3600}
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    _engine_kwargs = {"connect_args": {"check_same_thread": False}}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base = declarative_base()
+
+
+class ConfigApiKey(Base):
+    """Mirror of api/database.py ConfigApiKey (columns read by the gateway)."""
+    __tablename__ = "config_api_keys"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255))
+    key = Column(String(255), unique=True, index=True)
+    is_active = Column(Boolean, default=True)
+    target_url = Column(Text)
+    fail_rate = Column(Integer, default=0)
+    min_latency = Column(Integer, default=0)
+    max_latency = Column(Integer, default=0)
+    method = Column(String(20), default="ANY")
+    error_codes = Column(JSON, default=list)
+    schedule = Column(JSON, nullable=True)
+    corruption = Column(JSON, nullable=True)
+    transport_faults = Column(JSON, nullable=True)
+    seed = Column(BigInteger, nullable=True)
+    seed_mode = Column(String(16), nullable=True)
+    rate_limit = Column(JSON, nullable=True)
+    concurrency_limit = Column(JSON, nullable=True)
+    failure_bursts = Column(JSON, nullable=True)
+    websocket_chaos = Column(JSON, nullable=True)
+    owner_id = Column(Integer)
+
+
+class UsageLog(Base):
+    __tablename__ = "usage_log"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    config_api_key_id = Column(Integer, index=True)
+    requested_at = Column(DateTime, nullable=False, index=True)
+    status_code = Column(SmallInteger, nullable=True)
+    latency_us = Column(Integer, nullable=True)
+    upstream_us = Column(Integer, nullable=True)
+
+
+class LatencyRollup(Base):
+    """Mirror of api/database.py LatencyRollup (one row per key, minute and process)."""
+    __tablename__ = "latency_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    config_api_key_id = Column(Integer, nullable=False)
+    minute = Column(DateTime, nullable=False)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    status_counts = Column(JSON)
+    latency_bins = Column(JSON)
+    upstream_bins = Column(JSON)
+
+    __table_args__ = (Index("ix_latency_rollups_key_minute", "config_api_key_id", "minute"),)
+
+
+def init_db():
+    """Create the tables when running standalone (e.g. SQLite in docker-compose.dev.yml)."""
+    Base.metadata.create_all(bind=engine)
+
+
+def owned_key_ids(email: str) -> Set[int]:
+    """Ids of the config keys whose owner (users table of the API) has this email. Blocking."""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT k.id FROM config_api_keys k JOIN users u ON u.id = k.owner_id WHERE u.email = :email"),
+            {"email": email},
+        )
+        return {row[0] for row in rows}
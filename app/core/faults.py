@@ -0,0 +1,99 @@
+"""Connection-level faults (see chaos.TransportFaults): resets and hung connections, and the close
+used by the "drop" corruption mode.
+
+They need the client connection itself, which ASGI does not expose: under uvicorn it is reached
+through the request/response cycle behind `request.receive`. Elsewhere resets and hangs are skipped
+and a dropped body aborts the connection by raising.
+
+A hung connection costs no task: its transport goes into ConnectionParker, an insertion-ordered dict
+of transport -> deadline scanned by one reaper task per worker. The parker is capped (oldest evicted
+first), so hang faults at high rates cannot exhaust memory or file descriptors.
+"""
+import asyncio
+import os
+import socket
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+TRANSPORT_MAX_PARKED = int(os.getenv("TRANSPORT_MAX_PARKED", "1000"))
+_REAP_INTERVAL = 1.0
+
+
+def client_connection(receive) -> Tuple[Any, Optional[asyncio.Transport]]:
+    """(uvicorn request cycle, transport) behind an ASGI receive callable; (None, None) elsewhere."""
+    cycle = getattr(receive, "__self__", None)
+    transport = getattr(cycle, "transport", None)
+    if transport is None or not hasattr(cycle, "disconnected"):
+        return None, None
+    return cycle, transport
+
+
+def detach(cycle) -> None:
+    """Make the server ignore whatever the app sends for this request (no response is written)."""
+    cycle.disconnected = True
+
+
+def close_connection(cycle, transport: asyncio.Transport) -> None:
+    """Close mid-response: what was already written is flushed, then a FIN. Nothing the app sends
+    afterwards is written (no chunked terminator), so the client sees an incomplete body."""
+    detach(cycle)
+    transport.close()
+
+
+def reset_connection(transport: asyncio.Transport) -> None:
+    """Close with a TCP RST (SO_LINGER 0) instead of a FIN."""
+    sock = transport.get_extra_info("socket")
+    if sock is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except OSError:
+            pass
+    transport.abort()
+
+
+class ConnectionParker:
+    def __init__(self, max_parked: int = TRANSPORT_MAX_PARKED):
+        self.max_parked = max_parked
+        self._parked: Dict[asyncio.Transport, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._parked)
+
+    def park(self, transport: asyncio.Transport, hold: float) -> None:
+        """Keep the connection open, without a response, for `hold` seconds."""
+        while len(self._parked) >= self.max_parked:
+            oldest = next(iter(self._parked))
+            del self._parked[oldest]
+            oldest.close()
+            self.evicted += 1
+        self._parked[transport] = time.monotonic() + hold
+
+    def reap(self) -> None:
+        """Close expired connections and forget the ones the client already closed."""
+        now = time.monotonic()
+        for transport, deadline in list(self._parked.items()):
+            if transport.is_closing():
+                del self._parked[transport]
+            elif deadline <= now:
+                del self._parked[transport]
+                transport.close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(_REAP_INTERVAL)
+            self.reap()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for transport in self._parked:
+            transport.close()
+        self._parked.clear()
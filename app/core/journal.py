@@ -0,0 +1,294 @@
+"""Append-only journal of per-request outcomes for config-key traffic, in a fixed-width binary format.
+
+One file per writer process (`journal-<pid>-<seq>.lpj` in JOURNAL_DIR), rotated at JOURNAL_MAX_BYTES;
+the oldest files beyond JOURNAL_MAX_FILES are deleted. A file is a 16-byte header followed by 32-byte
+little-endian records:
+
+    ts_us       int64   time the response started (unix microseconds); non-decreasing within a file
+    key_id      uint32  config_api_keys.id
+    status      uint16  status returned to the client (0: none, connection reset or hung)
+    flags       uint16  FLAG_* bits
+    delay_ms    uint32  injected latency
+    upstream_us uint32  time waiting for the upstream response headers (0 when not forwarded)
+    total_us    uint32  time from request start to response start
+    method      uint8   METHODS index (0 = other)
+    (3 bytes padding)
+
+The Go proxy writes the same format (proxy/internal/journal). Readers memory-map the files and
+binary-search on ts_us, so a time-window query only touches the records inside the window.
+"""
+import asyncio
+import bisect
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import AbstractSet, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .sketch import LatencySketch
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "")
+JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", str(64 * 1024 * 1024)))
+JOURNAL_MAX_FILES = int(os.getenv("JOURNAL_MAX_FILES", "32"))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL_MS", "200")) / 1000
+
+MAGIC = b"LPJ1"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")
+RECORD = struct.Struct("<qIHHIIIB3x")
+TS = struct.Struct("<q")
+assert HEADER.size == 16 and RECORD.size == 32
+
+FLAG_INJECTED = 1  # failure injected by chaos (status is the injected code)
+FLAG_UPSTREAM_ERROR = 2  # target unreachable / timed out (status 502)
+FLAG_CORRUPTED = 4  # response body corrupted by chaos (truncated, flipped, dropped, malformed)
+FLAG_TRANSPORT_FAULT = 8  # connection-level fault (reset/hang: status 0, no response was sent)
+FLAG_RATE_LIMITED = 16  # 429 from the key's rate limit (set with FLAG_INJECTED)
+FLAG_SATURATED = 32  # 503 from the key's concurrency limit (set with FLAG_INJECTED)
+
+METHODS = ("", "GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS")
+METHOD_CODES = {m: i for i, m in enumerate(METHODS) if m}
+
+# Flush when this much is buffered, without waiting for the interval
+_FLUSH_BYTES = 64 * 1024
+
+
+class JournalWriter:
+    """Buffers packed records in memory; a background task appends them to the current file."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = JOURNAL_MAX_BYTES,
+        max_files: int = JOURNAL_MAX_FILES,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+    ):
+        self.directory = directory
+        self.max_bytes = max(max_bytes, HEADER.size + RECORD.size)
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self._buffer = bytearray()
+        self._fd: Optional[int] = None
+        self._size = 0
+        self._seq = 0
+        self._last_us = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.written = 0
+
+    def record(
+        self,
+        key_id: int,
+        status: int,
+        flags: int = 0,
+        delay_ms: int = 0,
+        upstream_us: int = 0,
+        total_us: int = 0,
+        method: str = "",
+        ts: Optional[float] = None,
+    ) -> None:
+        # Timestamps must not go backwards within a file (clock steps): readers binary-search on them
+        ts_us = max(int((ts if ts is not None else time.time()) * 1_000_000), self._last_us)
+        self._last_us = ts_us
+        self._buffer += RECORD.pack(
+            ts_us,
+            key_id & 0xFFFFFFFF,
+            status & 0xFFFF,
+            flags,
+            min(delay_ms, 0xFFFFFFFF),
+            min(upstream_us, 0xFFFFFFFF),
+            min(total_us, 0xFFFFFFFF),
+            METHOD_CODES.get(method.upper(), 0),
+        )
+        if len(self._buffer) >= _FLUSH_BYTES and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _open_next(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        path = os.path.join(self.directory, f"journal-{os.getpid()}-{self._seq:06d}.lpj")
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        os.write(self._fd, HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self._size = HEADER.size
+        self._prune()
+
+    def _prune(self) -> None:
+        files = journal_files(self.directory)
+        for path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _write(self, data: bytes) -> None:
+        """Blocking append; rotation only happens on record boundaries."""
+        view = memoryview(data)
+        while view:
+            if self._fd is None or self._size + RECORD.size > self.max_bytes:
+                self._open_next()
+            room = (self.max_bytes - self._size) // RECORD.size * RECORD.size
+            chunk = view[:room]
+            os.write(self._fd, chunk)
+            self._size += len(chunk)
+            view = view[len(chunk):]
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        try:
+            await asyncio.to_thread(self._write, data)
+            self.written += len(data) // RECORD.size
+        except OSError as e:
+            logger.error(f"Journal write failed, dropped {len(data) // RECORD.size} records: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def journal_files(directory: str) -> List[str]:
+    """Journal files, oldest first (by modification time)."""
+    paths = glob.glob(os.path.join(directory, "journal-*.lpj"))
+    return sorted(paths, key=lambda p: (os.path.getmtime(p), p))
+
+
+class _Timestamps(Sequence):
+    """ts_us of each record of a mapped file, as a lazy sequence for bisect."""
+
+    def __init__(self, buf, count: int):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> int:
+        return TS.unpack_from(self.buf, HEADER.size + i * RECORD.size)[0]
+
+
+def read_window(directory: str, since_us: int, until_us: int) -> Iterator[Tuple]:
+    """Yield raw record tuples with since_us <= ts_us < until_us from every journal file."""
+    for path in journal_files(directory):
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < HEADER.size + RECORD.size:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    magic, version, record_size = HEADER.unpack_from(mm, 0)
+                    if magic != MAGIC or record_size != RECORD.size:
+                        continue
+                    # A writer may be mid-append: only whole records count
+                    count = (size - HEADER.size) // RECORD.size
+                    ts = _Timestamps(mm, count)
+                    if ts[count - 1] < since_us or ts[0] >= until_us:
+                        continue
+                    lo = bisect.bisect_left(ts, since_us)
+                    hi = bisect.bisect_left(ts, until_us, lo)
+                    view = memoryview(mm)[HEADER.size + lo * RECORD.size:HEADER.size + hi * RECORD.size]
+                    try:
+                        yield from RECORD.iter_unpack(view)
+                    finally:
+                        view.release()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping journal file {path}: {e}")
+
+
+def window_stats(
+    directory: str,
+    since: float,
+    until: float,
+    key_id: Optional[int] = None,
+    ps: Sequence[float] = (50, 90, 99),
+    key_ids: Optional[AbstractSet[int]] = None,
+) -> Dict:
+    """Counts, error breakdown and latency percentiles (ms) for records in [since, until), of one key
+    or of the keys in `key_ids` (None: every key). Records are folded into counters and latency
+    sketches as they are read, so memory does not grow with the window; percentiles have the
+    sketch's resolution (about 6%)."""
+    since_us, until_us = int(since * 1_000_000), int(until * 1_000_000)
+    total, upstream, delay = LatencySketch(), LatencySketch(), LatencySketch()
+    by_status: Dict[int, int] = {}
+    by_method: Dict[str, int] = {}
+    injected = upstream_errors = errors = corrupted = transport_faults = rate_limited = saturated = 0
+    for _, kid, status, flags, delay_ms, upstream_us, total_us, method in read_window(directory, since_us, until_us):
+        if key_id is not None and kid != key_id:
+            continue
+        if key_ids is not None and kid not in key_ids:
+            continue
+        total.add(total_us)
+        delay.add(delay_ms)
+        if upstream_us:
+            upstream.add(upstream_us)
+        by_status[status] = by_status.get(status, 0) + 1
+        name = METHODS[method] if method < len(METHODS) else ""
+        by_method[name or "OTHER"] = by_method.get(name or "OTHER", 0) + 1
+        if status >= 400 or status == 0:
+            errors += 1
+        if flags & FLAG_INJECTED:
+            injected += 1
+        if flags & FLAG_UPSTREAM_ERROR:
+            upstream_errors += 1
+        if flags & FLAG_CORRUPTED:
+            corrupted += 1
+        if flags & FLAG_TRANSPORT_FAULT:
+            transport_faults += 1
+        if flags & FLAG_RATE_LIMITED:
+            rate_limited += 1
+        if flags & FLAG_SATURATED:
+            saturated += 1
+
+    def ms(stats: Dict[str, float]) -> Dict[str, float]:
+        return {k: (round(v / 1000, 3) if v is not None else None) for k, v in stats.items()}
+
+    return {
+        "since": since,
+        "until": until,
+        "key_id": key_id,
+        "requests": total.count,
+        "errors": {
+            "total": errors,
+            "injected": injected,
+            "rate_limited": rate_limited,
+            "saturated": saturated,
+            "upstream_unreachable": upstream_errors,
+            "no_response": by_status.get(0, 0),
+            "from_target": errors - injected - upstream_errors - by_status.get(0, 0),
+            "by_status": {str(s): n for s, n in sorted(by_status.items()) if s >= 400 or s == 0},
+        },
+        "corrupted": corrupted,
+        "transport_faults": transport_faults,
+        "status": {str(s): n for s, n in sorted(by_status.items())},
+        "methods": by_method,
+        "latency_ms": {
+            "total": ms(total.quantiles(ps)),
+            "upstream": ms(upstream.quantiles(ps)),
+            "injected_delay": delay.quantiles(ps),
+        },
+    }
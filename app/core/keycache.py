@@ -0,0 +1,75 @@
+"""TTL cache of resolved config keys for the gateway.
+
+Lookups hit memory; a miss loads the row in a worker thread, and concurrent misses for the same key
+share one load. Unknown/inactive keys are cached as None so random keys cannot hammer the DB.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .chaos import KeyConfig
+from .database import SessionLocal, ConfigApiKey
+
+KEY_CACHE_TTL = float(os.getenv("KEY_CACHE_TTL_MS", "2000")) / 1000
+KEY_CACHE_MAX_ENTRIES = int(os.getenv("KEY_CACHE_MAX_ENTRIES", "10000"))
+
+
+def load_key(key: str) -> Optional[KeyConfig]:
+    """Blocking DB read of an active config key."""
+    db = SessionLocal()
+    try:
+        row = db.query(ConfigApiKey).filter(ConfigApiKey.key == key, ConfigApiKey.is_active.is_(True)).first()
+        return KeyConfig.from_row(row) if row is not None else None
+    finally:
+        db.close()
+
+
+class KeyCache:
+    def __init__(
+        self,
+        loader: Callable[[str], Optional[KeyConfig]] = load_key,
+        ttl: float = KEY_CACHE_TTL,
+        max_entries: int = KEY_CACHE_MAX_ENTRIES,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Optional[KeyConfig]]] = {}
+        self._pending: Dict[str, Awaitable[Optional[KeyConfig]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[KeyConfig]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(key))
+            self._pending[key] = pending
+        return await asyncio.shield(pending)
+
+    async def _load(self, key: str) -> Optional[KeyConfig]:
+        try:
+            config = await asyncio.to_thread(self.loader, key)
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = (time.monotonic() + self.ttl, config)
+            return config
+        finally:
+            self._pending.pop(key, None)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for k in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
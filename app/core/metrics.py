@@ -0,0 +1,79 @@
+"""Per-worker counters and gauges, aggregated across workers for GET /metrics.
+
+Each worker counts in memory (no locking or IO on the request path) and, in multi-worker mode,
+publishes a snapshot to the shared state file every METRICS_PUBLISH_INTERVAL_MS. /metrics served
+by any worker sums the latest snapshot of every live worker.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+
+from . import store
+
+logger = logging.getLogger(__name__)
+
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL_MS", "1000")) / 1000
+# A worker that has not published for this long is considered gone
+METRICS_STALE_AFTER = max(5.0, METRICS_PUBLISH_INTERVAL * 5)
+
+
+class WorkerMetrics:
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self.started_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    def inc(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Register a gauge read lazily at snapshot time (pool sizes, queue depth...)."""
+        self._gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Any]:
+        values: Dict[str, Any] = dict(self.counters)
+        for name, read in self._gauges.items():
+            try:
+                values[name] = read()
+            except Exception:
+                values[name] = 0
+        return {"pid": os.getpid(), "uptime_s": round(time.time() - self.started_at, 1), "metrics": values}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(store.publish_worker_metrics, self.snapshot())
+            except Exception as e:
+                logger.error(f"Publishing worker metrics failed: {e}")
+            await asyncio.sleep(METRICS_PUBLISH_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None and store.APP_STATE_DB:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def aggregate(local: Dict[str, Any], workers: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum the metrics of all workers; the calling worker's live snapshot replaces its published one."""
+    workers = dict(workers)
+    workers[local["pid"]] = local
+    totals: Dict[str, float] = defaultdict(int)
+    for snap in workers.values():
+        for name, value in snap["metrics"].items():
+            totals[name] += value
+    return {
+        "workers": len(workers),
+        "totals": dict(totals),
+        "per_worker": {str(pid): snap for pid, snap in sorted(workers.items())},
+    }
+
+
+metrics = WorkerMetrics()
@@ -0,0 +1,101 @@
+"""Token-bucket rate limits for config keys (config_api_keys.rate_limit), as GCRA.
+
+A bucket of `burst` tokens refilled at `rate` per second is kept as one number per key: the
+theoretical arrival time (TAT) of the next request on an empty-to-full schedule. A request is
+allowed when now >= TAT - burst * interval and moves TAT one interval forward; remaining tokens,
+Retry-After and the reset time all follow from TAT. Same algorithm as the Go proxy
+(internal/ratelimit), so both answer with the same headers.
+
+One worker keeps TATs in a dict (the event loop serializes updates, no locking). In multi-worker mode
+(APP_STATE_DB set) the buckets live in a shared memory-mapped file next to the state DB unless
+RATE_LIMIT_SHARED=0, so the limit holds for the sum of all workers (see slots.py).
+"""
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from . import store
+from .chaos import RateLimit
+from .slots import SlotTable
+
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "1").lower() not in ("0", "false", "no")
+# Shared slot table size (keys hashed into it, linear probing)
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # seconds until a token is available (0 when allowed)
+    reset: float  # seconds until the bucket is full again
+
+    def headers(self) -> Dict[str, str]:
+        """X-RateLimit-* (reset as epoch seconds), plus Retry-After when denied."""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(time.time() + self.reset)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def gcra(limit: RateLimit, tat: float, now: float):
+    """(decision, new TAT) for one request against a bucket with theoretical arrival time `tat`."""
+    interval = 1.0 / limit.rate
+    capacity = limit.burst * interval
+    tat = max(tat, now)
+    allow_at = tat + interval - capacity
+    if now < allow_at:
+        return Decision(False, limit.burst, 0, allow_at - now, tat - now), tat
+    tat += interval
+    remaining = int((now - (tat - capacity)) / interval + 1e-9)
+    return Decision(True, limit.burst, max(0, remaining), 0.0, tat - now), tat
+
+
+class LocalBuckets:
+    """TATs in this process, by key id."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.tats: Dict[int, float] = {}
+        self.max_keys = max_keys
+
+    def take(self, key_id: int, limit: RateLimit) -> Decision:
+        """Take a token from the key's bucket (when one is left)."""
+        now = time.monotonic()
+        tats = self.tats
+        if key_id not in tats and len(tats) >= self.max_keys:
+            # Buckets whose TAT is past are full anyway: forgetting them changes nothing
+            for k in [k for k, t in tats.items() if t <= now]:
+                del tats[k]
+        decision, tats[key_id] = gcra(limit, tats.get(key_id, 0.0), now)
+        return decision
+
+    def __len__(self) -> int:
+        return len(self.tats)
+
+
+class SharedBuckets:
+    """TATs in a memory-mapped file shared by the workers on this box (CLOCK_MONOTONIC is system-wide)."""
+
+    def __init__(self, path: str, slots: int = RATE_LIMIT_SLOTS):
+        self.table = SlotTable(path, slots)
+
+    def take(self, key_id: int, limit: RateLimit) -> Decision:
+        """Take a token from the key's bucket (when one is left)."""
+        now = time.monotonic()
+        # A bucket whose TAT is past is full: another key can take its slot over
+        return self.table.update(key_id, lambda tat: gcra(limit, tat or 0.0, time.monotonic()),
+                                 idle=lambda tat: tat <= now)
+
+
+def buckets():
+    """Shared buckets in multi-worker mode (unless RATE_LIMIT_SHARED=0), per-process otherwise."""
+    if store.APP_STATE_DB and RATE_LIMIT_SHARED:
+        return SharedBuckets(store.APP_STATE_DB + "-ratelimit")
+    return LocalBuckets()
@@ -0,0 +1,122 @@
+"""Per-minute latency rollups for config-key traffic.
+
+Each worker keeps, per config key, the current minute's request/error counts, counts per status and
+two latency sketches (end-to-end and upstream). Closed minutes are written to latency_rollups, one
+row per key and minute, by a background task; memory per key is fixed however much traffic it gets.
+Rows from other workers and from the Go proxy are merged at read time (/api/usage/summary).
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .database import engine, LatencyRollup
+from .sketch import LatencySketch
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL_MS", "5000")) / 1000
+# Closed minutes kept while the DB is unreachable, before the oldest are dropped
+ROLLUP_MAX_PENDING_MINUTES = int(os.getenv("ROLLUP_MAX_PENDING_MINUTES", "60"))
+
+
+class KeyWindow:
+    __slots__ = ("requests", "errors", "statuses", "latency", "upstream")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.latency = LatencySketch()
+        self.upstream = LatencySketch()
+
+
+class RollupRecorder:
+    def __init__(self, flush_interval: float = ROLLUP_FLUSH_INTERVAL, max_pending: int = ROLLUP_MAX_PENDING_MINUTES):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._minute = 0
+        self._windows: Dict[int, KeyWindow] = {}
+        # (minute start, windows) not yet written
+        self._closed: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+        self.minutes_dropped = 0
+
+    def _rotate(self, minute: int) -> None:
+        if self._windows:
+            self._closed.append((self._minute, self._windows))
+            if len(self._closed) > self.max_pending:
+                self._closed.pop(0)
+                self.minutes_dropped += 1
+        self._minute = minute
+        self._windows = {}
+
+    def record(self, config_key_id: int, status_code: int, latency_us: int, upstream_us: Optional[int] = None) -> None:
+        minute = int(time.time()) // 60 * 60
+        if minute != self._minute:
+            self._rotate(minute)
+        window = self._windows.get(config_key_id)
+        if window is None:
+            window = self._windows[config_key_id] = KeyWindow()
+        window.requests += 1
+        # 0: no response at all (transport fault)
+        if status_code >= 400 or status_code == 0:
+            window.errors += 1
+        window.statuses[status_code] = window.statuses.get(status_code, 0) + 1
+        window.latency.add(latency_us)
+        if upstream_us:
+            window.upstream.add(upstream_us)
+
+    def _write(self, closed: List[tuple]) -> int:
+        rows = [
+            {
+                "config_api_key_id": key_id,
+                "minute": datetime.utcfromtimestamp(minute),
+                "requests": w.requests,
+                "errors": w.errors,
+                "status_counts": {str(code): n for code, n in sorted(w.statuses.items())},
+                "latency_bins": w.latency.to_json(),
+                "upstream_bins": w.upstream.to_json(),
+            }
+            for minute, windows in closed
+            for key_id, w in windows.items()
+        ]
+        with engine.begin() as conn:
+            conn.execute(LatencyRollup.__table__.insert(), rows)
+        return len(rows)
+
+    async def flush(self, include_current: bool = False) -> None:
+        minute = int(time.time()) // 60 * 60
+        if include_current or minute != self._minute:
+            self._rotate(minute)
+        if not self._closed:
+            return
+        closed, self._closed = self._closed, []
+        try:
+            self.rows_written += await asyncio.to_thread(self._write, closed)
+        except Exception as e:
+            logger.error(f"Rollup flush failed, keeping {len(closed)} minutes for retry: {e}")
+            # Put them back in front of minutes closed meanwhile
+            self._closed = closed + self._closed
+            while len(self._closed) > self.max_pending:
+                self._closed.pop(0)
+                self.minutes_dropped += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # The partial minute is written too; readers merge it with the rows of other processes
+        await self.flush(include_current=True)
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
+import os
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
@@ -10,6 +11,8 @@ from ..schemas.user import TokenData
 SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Comma-separated emails allowed to read data of every user's config keys (e.g. journal stats)
+ADMIN_EMAILS = frozenset(e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip())
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -50,4 +53,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenData:
         )
     except jwt.PyJWTError:
         raise credentials_exception
-    return token_data 
\ No newline at end of file
+    return token_data 
+
+def is_admin(user: TokenData) -> bool:
+    return bool(user.email) and user.email.lower() in ADMIN_EMAILS
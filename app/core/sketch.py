@@ -0,0 +1,24 @@
+"""Mergeable latency histogram: api/sketch.py, loaded from there so the API and the gateway share one
+copy of the bins (the Go proxy has the same, internal/rollup).
+
+The file lives under api/ because the API image is built from that directory alone; the gateway images
+copy it next to app/ (see Dockerfile).
+"""
+import importlib.util
+import os
+import sys
+
+_NAME = "latencypoison_sketch"
+_module = sys.modules.get(_NAME)
+if _module is None:
+    _path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "api", "sketch.py")
+    _spec = importlib.util.spec_from_file_location(_NAME, os.path.normpath(_path))
+    _module = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(_module)
+    sys.modules[_NAME] = _module
+
+SUB_BITS = _module.SUB_BITS
+SUB_COUNT = _module.SUB_COUNT
+bin_index = _module.bin_index
+bin_bounds = _module.bin_bounds
+LatencySketch = _module.LatencySketch
@@ -0,0 +1,74 @@
+"""Fixed-size table of per-key values in a memory-mapped file, shared by the workers on this box.
+
+Each slot is 16 bytes: key id + 1 (0 = empty) and a float. Keys are hashed into the table with linear
+probing over a few slots; an update is one read and one write under a byte-range lock on the slot, no
+database round trip. Used for the rate limit buckets (ratelimit.py) and failure burst states (bursts.py).
+"""
+import fcntl
+import mmap
+import os
+import struct
+from typing import Callable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_PROBES = 8
+_SLOT = struct.Struct("<qd")  # key id + 1 (0 = empty), value
+
+
+class SlotTable:
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = slots
+        self._pid = None
+        self._fd = -1
+        self._map = None
+
+    def _open(self):
+        # Opened lazily, once per process: a descriptor inherited across fork would share lock ownership
+        if self._pid != os.getpid():
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = self.slots * _SLOT.size
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd, self._map, self._pid = fd, mmap.mmap(fd, size), os.getpid()
+        return self._fd, self._map
+
+    def update(self, key_id: int, fn: Callable[[Optional[float]], Tuple[T, float]],
+               idle: Callable[[float], bool]) -> T:
+        """Replace the key's value (None when it has none yet) with fn's second result, under the slot's
+        lock, and return its first one. `idle` tells the values another key may take over."""
+        fd, buf = self._open()
+        tag = key_id + 1
+        start = (key_id * 0x9E3779B1) % self.slots
+        offsets = [((start + probe) % self.slots) * _SLOT.size for probe in range(_PROBES)]
+        for attempt in range(_PROBES):
+            offset, seen = self._probe(buf, tag, offsets, idle)
+            fcntl.lockf(fd, fcntl.LOCK_EX, _SLOT.size, offset)
+            try:
+                owner, value = _SLOT.unpack_from(buf, offset)
+                # The probe ran unlocked: another worker may have claimed the slot since. Keep it only if
+                # it still holds what was seen (or this key); otherwise probe again, and take it anyway
+                # on the last attempt rather than spin
+                if owner == tag or owner == seen or attempt == _PROBES - 1:
+                    result, value = fn(value if owner == tag else None)
+                    _SLOT.pack_into(buf, offset, tag, value)
+                    return result
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, _SLOT.size, offset)
+
+    @staticmethod
+    def _probe(buf, tag: int, offsets, idle) -> Tuple[int, int]:
+        """(offset, owner seen there) of the slot to use."""
+        # Slots are never emptied, so a key's slot comes before the first empty one of its probe sequence.
+        # When neither is found, an idle slot of another key (nothing to lose) or the last slot is taken over.
+        reclaim, seen = offsets[-1], None
+        for offset in offsets:
+            owner, value = _SLOT.unpack_from(buf, offset)
+            if owner in (0, tag):
+                return offset, owner
+            if idle(value) and seen is None:
+                reclaim, seen = offset, owner
+        if seen is None:
+            seen = _SLOT.unpack_from(buf, reclaim)[0]
+        return reclaim, seen
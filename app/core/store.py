@@ -0,0 +1,127 @@
+"""Process-shared state for the app's registries (tunnels, collections, endpoints) and worker metrics.
+
+A single process keeps plain dicts. When APP_STATE_DB points to a file (app/serve.py sets it for the
+multi-worker mode), registries become SharedDicts: rows in one local SQLite file in WAL mode, so every
+worker on the box sees the same tunnels and chaos settings. Values are the pydantic models as JSON.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Optional, Type
+
+from pydantic import BaseModel
+
+APP_STATE_DB = os.getenv("APP_STATE_DB", "")
+
+_local = threading.local()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """One connection per process and thread (never reused across fork)."""
+    conns = getattr(_local, "conns", None)
+    if conns is None or getattr(_local, "pid", None) != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (ns TEXT NOT NULL, k TEXT NOT NULL, v TEXT NOT NULL, PRIMARY KEY (ns, k))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS worker_metrics (pid INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conns[path] = conn
+    return conn
+
+
+class SharedDict(MutableMapping):
+    """dict-like registry stored in the shared SQLite file, namespaced by `name`.
+
+    Like the in-memory dicts it replaces, reads return a copy: mutate the model, then assign it back.
+    """
+
+    def __init__(self, path: str, name: str, model: Type[BaseModel], initial: Optional[Dict[str, BaseModel]] = None):
+        self.path = path
+        self.name = name
+        self.model = model
+        if initial:
+            # Fixtures are inserted once; rows created or deleted by any worker win
+            self._conn().executemany(
+                "INSERT OR IGNORE INTO kv (ns, k, v) VALUES (?, ?, ?)",
+                [(name, k, v.model_dump_json()) for k, v in initial.items()],
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        return _connect(self.path)
+
+    def __getitem__(self, key: str) -> BaseModel:
+        row = self._conn().execute("SELECT v FROM kv WHERE ns = ? AND k = ?", (self.name, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self.model.model_validate_json(row[0])
+
+    def __setitem__(self, key: str, value: BaseModel) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (ns, k, v) VALUES (?, ?, ?)", (self.name, key, value.model_dump_json())
+        )
+
+    def __delitem__(self, key: str) -> None:
+        cur = self._conn().execute("DELETE FROM kv WHERE ns = ? AND k = ?", (self.name, key))
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter([k for (k,) in self._conn().execute("SELECT k FROM kv WHERE ns = ?", (self.name,))])
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM kv WHERE ns = ?", (self.name,)).fetchone()[0]
+
+    def __contains__(self, key: object) -> bool:
+        return self._conn().execute("SELECT 1 FROM kv WHERE ns = ? AND k = ?", (self.name, key)).fetchone() is not None
+
+    # One query instead of one per key
+    def values(self):
+        return [self.model.model_validate_json(v) for (v,) in self._conn().execute("SELECT v FROM kv WHERE ns = ?", (self.name,))]
+
+    def items(self):
+        return [
+            (k, self.model.model_validate_json(v))
+            for k, v in self._conn().execute("SELECT k, v FROM kv WHERE ns = ?", (self.name,))
+        ]
+
+
+def registry(name: str, model: Type[BaseModel], initial: Iterable[BaseModel] = ()) -> MutableMapping:
+    """Registry keyed by model id: a plain dict, or a SharedDict in multi-worker mode."""
+    seed = {item.id: item for item in initial}
+    if not APP_STATE_DB:
+        return seed
+    return SharedDict(APP_STATE_DB, name, model, seed)
+
+
+def publish_worker_metrics(snapshot: Dict[str, Any]) -> None:
+    if APP_STATE_DB:
+        _connect(APP_STATE_DB).execute(
+            "INSERT OR REPLACE INTO worker_metrics (pid, data, updated_at) VALUES (?, ?, ?)",
+            (os.getpid(), json.dumps(snapshot), time.time()),
+        )
+
+
+def read_worker_metrics(max_age: float) -> Dict[int, Dict[str, Any]]:
+    """Latest snapshot per live worker (rows older than max_age seconds belong to exited workers)."""
+    if not APP_STATE_DB:
+        return {}
+    rows = _connect(APP_STATE_DB).execute(
+        "SELECT pid, data FROM worker_metrics WHERE updated_at >= ?", (time.time() - max_age,)
+    )
+    return {pid: json.loads(data) for pid, data in rows}
+
+
+def reset_shared_state(path: str) -> None:
+    """Called once by the supervisor before workers start: drop metrics left by a previous run."""
+    _connect(path).execute("DELETE FROM worker_metrics")
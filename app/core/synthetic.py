@@ -0,0 +1,81 @@
+"""Synthetic response bodies for sandbox throughput tests.
+
+A body is a shape's head, filler and tail, sent in pieces of `chunk_size` bytes. Every shape has one
+filler template (built once, on first use), and the pieces a body is made of are cached slices of it:
+the first piece (head + filler) and the middle piece (filler only) are the same objects for every
+request with the same shape and chunk size. A 100 MB response therefore allocates only its last piece.
+"""
+import os
+import random
+from functools import lru_cache
+from typing import AsyncIterator, Optional, Tuple
+
+TEMPLATE_SIZE = 1 << 20  # largest chunk size
+SANDBOX_MAX_BODY_BYTES = int(os.getenv("SANDBOX_MAX_BODY_BYTES", str(100 << 20)))
+DEFAULT_CHUNK_SIZE = 64 << 10
+MIN_CHUNK_SIZE = 64
+
+# name -> (content type, head, tail)
+SHAPES = {
+    "json": ("application/json", b'{"data":"', b'"}'),
+    "text": ("text/plain; charset=utf-8", b"", b""),
+    "binary": ("application/octet-stream", b"", b""),
+}
+
+_UNITS = {"": 1, "b": 1, "kb": 1 << 10, "mb": 1 << 20, "gb": 1 << 30}
+
+
+def parse_size(value: str) -> int:
+    """'2048', '64KB' or '10MB' -> bytes. Raises ValueError."""
+    value = value.strip().lower()
+    digits = value.rstrip("kmgb")
+    unit = _UNITS.get(value[len(digits):])
+    if unit is None or not digits.isdigit():
+        raise ValueError(f"invalid size: {value!r}")
+    return int(digits) * unit
+
+
+@lru_cache(maxsize=None)
+def _filler(shape: str) -> bytes:
+    if shape == "binary":
+        return random.Random(0).randbytes(TEMPLATE_SIZE)
+    line = b"abcdefghijklmnopqrstuvwxyz0123456789" if shape == "json" else b"The quick brown fox jumps over the lazy dog.\n"
+    return (line * (TEMPLATE_SIZE // len(line) + 1))[:TEMPLATE_SIZE]
+
+
+@lru_cache(maxsize=64)
+def _pieces(shape: str, chunk_size: int) -> Tuple[bytes, bytes]:
+    """(first piece, middle piece) for a shape and chunk size."""
+    head = SHAPES[shape][1]
+    filler = _filler(shape)
+    return (head + filler)[:chunk_size], filler[:chunk_size]
+
+
+def check(shape: str, size: int, chunk_size: Optional[int]) -> Optional[str]:
+    """Error message for unusable parameters, None when they are fine."""
+    if shape not in SHAPES:
+        return f"shape must be one of: {', '.join(SHAPES)}"
+    if not 0 <= size <= SANDBOX_MAX_BODY_BYTES:
+        return f"size must be between 0 and {SANDBOX_MAX_BODY_BYTES} bytes"
+    _, head, tail = SHAPES[shape]
+    if size < len(head) + len(tail):
+        return f"size must be at least {len(head) + len(tail)} bytes for shape {shape}"
+    if chunk_size is not None and not MIN_CHUNK_SIZE <= chunk_size <= TEMPLATE_SIZE:
+        return f"chunk_size must be between {MIN_CHUNK_SIZE} and {TEMPLATE_SIZE}"
+    return None
+
+
+async def body(shape: str, size: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Pieces of a `size`-byte body (parameters validated with check()). Async, so Starlette streams it
+    without a thread pool round trip per piece."""
+    first, middle = _pieces(shape, chunk_size)
+    tail = SHAPES[shape][2]
+    end = size - len(tail)
+    piece, sent = first, 0
+    while sent + chunk_size <= end:
+        yield piece
+        sent += chunk_size
+        piece = middle
+    last = piece[:end - sent] + tail
+    if last:
+        yield last
@@ -0,0 +1,96 @@
+"""Non-blocking usage recording for the gateway.
+
+`record()` only appends to an in-memory buffer; a background task flushes the buffer to usage_log
+with one multi-row INSERT per batch, in a worker thread. If the DB falls behind, the oldest
+pending rows are dropped (and counted) instead of growing memory without bound.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+
+from .database import engine, UsageLog
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL_MS", "500")) / 1000
+USAGE_BATCH_SIZE = int(os.getenv("USAGE_BATCH_SIZE", "1000"))
+USAGE_MAX_PENDING = int(os.getenv("USAGE_MAX_PENDING", "100000"))
+
+# (config_api_key_id, status_code, requested_at, latency_us, upstream_us)
+UsageRow = Tuple[int, int, datetime, Optional[int], Optional[int]]
+
+
+class UsageRecorder:
+    def __init__(
+        self,
+        flush_interval: float = USAGE_FLUSH_INTERVAL,
+        batch_size: int = USAGE_BATCH_SIZE,
+        max_pending: int = USAGE_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Deque[UsageRow] = deque(maxlen=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(
+        self,
+        config_key_id: int,
+        status_code: int,
+        requested_at: Optional[datetime] = None,
+        latency_us: Optional[int] = None,
+        upstream_us: Optional[int] = None,
+    ) -> None:
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append((config_key_id, status_code, requested_at or datetime.utcnow(), latency_us, upstream_us))
+
+    def _take_batch(self) -> List[UsageRow]:
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popleft())
+        return batch
+
+    def _write(self, batch: List[UsageRow]) -> None:
+        with engine.begin() as conn:
+            conn.execute(
+                UsageLog.__table__.insert(),
+                [
+                    {"config_api_key_id": kid, "status_code": code, "requested_at": ts, "latency_us": latency, "upstream_us": upstream}
+                    for kid, code, ts, latency, upstream in batch
+                ],
+            )
+
+    async def flush(self) -> None:
+        while self._pending:
+            batch = self._take_batch()
+            try:
+                await asyncio.to_thread(self._write, batch)
+                self.recorded += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.error(f"Usage flush failed, dropped {len(batch)} rows: {e}")
+                return
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
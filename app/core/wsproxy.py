@@ -0,0 +1,379 @@
+"""WebSocket pass-through for config keys, with per-message chaos (see chaos.WebSocketChaos).
+
+The gateway forwards the client's upgrade request to the target over a new connection and, once the
+target has answered 101, takes the client connection over from uvicorn (as for transport faults, see
+faults.py). From then on bytes are relayed between the two sockets by asyncio protocols: no task per
+connection, and nothing is held for an idle one beyond its two transports.
+
+A direction without chaos is relayed as raw bytes, unparsed. A direction with chaos is split into frames
+by their headers only (payloads are neither unmasked nor re-encoded): control frames go through at once,
+data messages are collected up to their FIN frame and then delayed, dropped, duplicated, reordered or
+turned into a close, the original frames being written out as they came. Messages larger than
+WEBSOCKET_MAX_MESSAGE pass through as they arrive, without chaos.
+
+Sec-WebSocket-Extensions is not forwarded: with permessage-deflate, a dropped or reordered message
+would break the compression context shared by both ends.
+"""
+import asyncio
+import os
+import ssl
+import struct
+from collections import deque
+from typing import List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from .chaos import WebSocketChaos, pick_message_fault, sample_message_delay
+from .metrics import metrics
+
+WEBSOCKET_MAX_MESSAGE = int(os.getenv("WEBSOCKET_MAX_MESSAGE", str(1 << 20)))
+# A reordered message is held until the next one in its direction, at most this long
+REORDER_HOLD = 1.0
+MAX_HANDSHAKE_RESPONSE = 65536
+GOING_AWAY = 1001
+
+# Open relays of this worker
+relays: Set["Relay"] = set()
+
+
+class HandshakeError(Exception):
+    pass
+
+
+def is_upgrade(headers) -> bool:
+    """Whether a request's headers (Starlette Headers) ask for a WebSocket upgrade."""
+    connection = {token.strip().lower() for token in headers.get("connection", "").split(",")}
+    return headers.get("upgrade", "").lower() == "websocket" and "upgrade" in connection
+
+
+def _frame_size(buf: bytearray, pos: int) -> Optional[int]:
+    """Size (header included) of the frame starting at buf[pos], None until its header is complete."""
+    avail = len(buf) - pos
+    if avail < 2:
+        return None
+    second = buf[pos + 1]
+    n = second & 0x7F
+    header = 2
+    if n == 126:
+        if avail < 4:
+            return None
+        n = int.from_bytes(buf[pos + 2:pos + 4], "big")
+        header = 4
+    elif n == 127:
+        if avail < 10:
+            return None
+        n = int.from_bytes(buf[pos + 2:pos + 10], "big")
+        header = 10
+    if second & 0x80:
+        header += 4  # masking key
+    return header + n
+
+
+def close_frame(code: int, masked: bool) -> bytes:
+    """A close frame with a status code; frames sent to a server must be masked."""
+    payload = struct.pack("!H", code)
+    if not masked:
+        return b"\x88\x02" + payload
+    key = os.urandom(4)
+    return b"\x88\x82" + key + bytes(b ^ key[i] for i, b in enumerate(payload))
+
+
+class _Side(asyncio.Protocol):
+    """The client or the target socket of a relay. Until the relay starts, the target side collects the
+    handshake response."""
+
+    __slots__ = ("transport", "relay", "pipe", "peer", "connections", "head", "head_end", "status", "status_line",
+                 "handshake", "lost")
+
+    def __init__(self):
+        self.transport: Optional[asyncio.Transport] = None
+        self.relay: Optional["Relay"] = None
+        self.pipe: Optional["_Pipe"] = None  # where received bytes go
+        self.peer: Optional["_Side"] = None
+        self.connections = None  # uvicorn's set of open connections (client side)
+        self.head = bytearray()
+        self.head_end = 0
+        self.status = 0
+        self.status_line = ""
+        self.handshake: Optional[asyncio.Future] = None
+        self.lost = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.handshake = asyncio.get_running_loop().create_future()
+
+    def data_received(self, data):
+        if self.pipe is not None:
+            self.pipe.feed(data)
+            return
+        self.head += data
+        if self.handshake.done():
+            return
+        end = self.head.find(b"\r\n\r\n")
+        if end < 0:
+            if len(self.head) > MAX_HANDSHAKE_RESPONSE:
+                self.handshake.set_exception(HandshakeError("handshake response too large"))
+            return
+        self.head_end = end + 4
+        self.status_line = bytes(self.head[:self.head.find(b"\r\n")]).decode("latin-1")
+        parts = self.status_line.split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+            self.handshake.set_exception(HandshakeError(f"invalid handshake response: {self.status_line[:100]!r}"))
+            return
+        self.status = int(parts[1])
+        self.handshake.set_result(None)
+
+    def eof_received(self):
+        return False  # close: the relay closes the other side
+
+    def pause_writing(self):
+        # Backpressure: stop reading from the other side until this one drains
+        if self.peer is not None and not self.peer.transport.is_closing():
+            self.peer.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.peer is not None and not self.peer.transport.is_closing():
+            self.peer.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        self.lost = True
+        if self.handshake is not None and not self.handshake.done():
+            self.handshake.set_exception(HandshakeError("connection closed during the handshake"))
+        if self.relay is not None:
+            self.relay.lost(self)
+
+    def shutdown(self):
+        """Called by uvicorn on server shutdown (the client side stands in for its HTTP protocol)."""
+        if self.relay is not None:
+            self.relay.close(GOING_AWAY)
+
+    def close(self):
+        self.transport.close()
+
+
+class _Pipe:
+    """One direction of a relay: bytes received from one side, written to `dst`."""
+
+    __slots__ = ("relay", "dst", "chaos", "buf", "message", "size", "passing", "skip",
+                 "queue", "timer", "last_due", "held", "held_timer")
+
+    def __init__(self, relay: "Relay", dst: asyncio.Transport, chaos: Optional[WebSocketChaos]):
+        self.relay = relay
+        self.dst = dst
+        self.chaos = chaos
+        self.buf = bytearray()
+        self.message: List[bytes] = []  # frames of the data message being collected
+        self.size = 0
+        self.passing = False  # rest of an oversized message, relayed without chaos
+        self.skip = 0  # bytes of an oversized frame still to relay as they come
+        self.queue: deque = deque()  # (due, bytes) in write order
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.last_due = 0.0
+        self.held: Optional[Tuple[bytes, float]] = None  # reordered message and its delay
+        self.held_timer: Optional[asyncio.TimerHandle] = None
+
+    def feed(self, data: bytes) -> None:
+        if self.chaos is None:
+            self.write(data)
+            return
+        if self.skip:
+            chunk = data[:self.skip]
+            self.skip -= len(chunk)
+            self.send(chunk)
+            data = data[len(chunk):]
+        buf = self.buf
+        buf += data
+        pos, end = 0, len(buf)
+        while True:
+            size = _frame_size(buf, pos)
+            if size is None:
+                break
+            first = buf[pos]
+            if not first & 0x08 and (self.passing or self.size + size > WEBSOCKET_MAX_MESSAGE):
+                # Too large to hold: the message goes on as it arrives
+                if self.message:
+                    self.send(b"".join(self.message))
+                    self.message, self.size = [], 0
+                self.passing = not first & 0x80
+                chunk = bytes(buf[pos:pos + size])
+                self.send(chunk)
+                pos += len(chunk)
+                self.skip = size - len(chunk)
+                if self.skip:
+                    break
+                continue
+            if pos + size > end:
+                break
+            frame = bytes(buf[pos:pos + size])
+            pos += size
+            if first & 0x08:
+                # Control frames (close, ping, pong) keep their place among the messages already sent
+                self.send(frame)
+            else:
+                self.message.append(frame)
+                self.size += size
+                if first & 0x80:
+                    message = b"".join(self.message)
+                    self.message, self.size = [], 0
+                    self.on_message(message)
+        if pos:
+            del buf[:pos]
+
+    def on_message(self, message: bytes) -> None:
+        chaos, rng = self.chaos, self.relay.rng
+        delay = sample_message_delay(chaos, rng) / 1000
+        fault = pick_message_fault(chaos, rng)
+        if fault is not None:
+            metrics.inc(f"websocket_messages_{fault}")
+        if fault == "drop":
+            return
+        if fault == "close":
+            self.relay.close(chaos.close_code)
+            return
+        if fault == "reorder" and self.held is None:
+            self.held = (message, delay)
+            self.held_timer = self.relay.loop.call_later(REORDER_HOLD, self.release_held)
+            return
+        self.send(message, delay)
+        if fault == "duplicate":
+            self.send(message, delay)
+        self.release_held()
+
+    def release_held(self) -> None:
+        if self.held is not None:
+            self.held_timer.cancel()
+            message, delay = self.held
+            self.held = self.held_timer = None
+            self.send(message, delay)
+
+    def send(self, data: bytes, delay: float = 0) -> None:
+        """Write after `delay` seconds; nothing overtakes what was sent before it."""
+        now = self.relay.loop.time()
+        due = max(now + delay, self.last_due)
+        self.last_due = due
+        if due <= now and not self.queue:
+            self.write(data)
+            return
+        self.queue.append((due, data))
+        if self.timer is None:
+            self.timer = self.relay.loop.call_at(self.queue[0][0], self._flush)
+
+    def _flush(self) -> None:
+        self.timer = None
+        now = self.relay.loop.time()
+        while self.queue and self.queue[0][0] <= now:
+            self.write(self.queue.popleft()[1])
+        if self.queue:
+            self.timer = self.relay.loop.call_at(self.queue[0][0], self._flush)
+
+    def write(self, data: bytes) -> None:
+        if not self.dst.is_closing():
+            self.dst.write(data)
+
+    def cancel(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.held_timer is not None:
+            self.held_timer.cancel()
+        self.queue.clear()
+        self.held = self.timer = self.held_timer = None
+
+
+class Relay:
+    __slots__ = ("loop", "client", "target", "rng", "to_target", "to_client", "closed")
+
+    def __init__(self, client: _Side, target: _Side, chaos: Optional[WebSocketChaos], rng):
+        self.loop = asyncio.get_running_loop()
+        self.client = client
+        self.target = target
+        self.rng = rng
+        self.to_target = _Pipe(self, target.transport, chaos if chaos and chaos.applies_to("client") else None)
+        self.to_client = _Pipe(self, client.transport, chaos if chaos and chaos.applies_to("target") else None)
+        client.relay, client.pipe, client.peer = self, self.to_target, target
+        target.relay, target.pipe, target.peer = self, self.to_client, client
+        self.closed = False
+
+    def close(self, code: int) -> None:
+        """End the connection on both sides with a close frame."""
+        if self.closed:
+            return
+        self.to_target.cancel()
+        self.to_client.cancel()
+        self.to_client.write(close_frame(code, masked=False))
+        self.to_target.write(close_frame(code, masked=True))
+        self.client.close()
+        self.target.close()
+        self._done()
+
+    def lost(self, side: _Side) -> None:
+        """One socket closed: close the other once what was already written to it is flushed."""
+        if side is self.client and side.connections is not None:
+            side.connections.discard(side)
+        if not self.closed:
+            self.to_target.cancel()
+            self.to_client.cancel()
+            side.peer.close()
+            self._done()
+
+    def _done(self) -> None:
+        self.closed = True
+        relays.discard(self)
+
+
+async def connect(url: str, headers: List[Tuple[bytes, bytes]], timeout: float) -> _Side:
+    """Open a connection to the target and send it the upgrade request; returns once the response head
+    is in (status / status_line). The caller relays it with relay() when it is a 101, or closes it."""
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    host = parts.hostname or ""
+    loop = asyncio.get_running_loop()
+    try:
+        transport, side = await asyncio.wait_for(
+            loop.create_connection(_Side, host, parts.port or (443 if https else 80),
+                                   ssl=ssl.create_default_context() if https else None,
+                                   server_hostname=host if https else None),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        raise HandshakeError(f"timed out connecting to {parts.netloc}")
+    path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+    lines = [f"GET {path} HTTP/1.1".encode("latin-1"), b"Host: " + parts.netloc.encode("idna"),
+             b"Connection: Upgrade", b"Upgrade: websocket"]
+    lines.extend(k + b": " + v for k, v in headers)
+    transport.write(b"\r\n".join(lines) + b"\r\n\r\n")
+    try:
+        await asyncio.wait_for(side.handshake, timeout)
+    except asyncio.TimeoutError:
+        transport.close()
+        raise HandshakeError("timed out waiting for the handshake response")
+    except HandshakeError:
+        transport.close()
+        raise
+    return side
+
+
+def relay(transport: asyncio.Transport, target: _Side, chaos: Optional[WebSocketChaos], rng, headers: dict) -> Relay:
+    """Take the client connection over (from uvicorn's HTTP protocol), send it the target's handshake
+    response with `headers` added, and relay both ways from then on."""
+    client = _Side()
+    client.transport = transport
+    http = transport.get_protocol()
+    # Stand in for the HTTP protocol in uvicorn's connection set, so shutdown closes the relay
+    client.connections = getattr(http, "connections", None)
+    if client.connections is not None:
+        client.connections.discard(http)
+        client.connections.add(client)
+    transport.set_protocol(client)
+    transport.resume_reading()  # uvicorn pauses reading after an upgrade request
+
+    head = bytes(target.head[:target.head_end - 2])
+    extra = b"".join(f"{k}: {v}\r\n".encode("latin-1") for k, v in headers.items())
+    transport.write(head + extra + b"\r\n")
+    r = Relay(client, target, chaos, rng)
+    relays.add(r)
+    rest = bytes(target.head[target.head_end:])
+    target.head = bytearray()
+    if rest:
+        r.to_client.feed(rest)
+    if target.lost:
+        r.lost(target)
+    return r
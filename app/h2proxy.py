@@ -0,0 +1,486 @@
+"""HTTP/2 pass-through for config keys, for gRPC and other h2 services.
+
+    python -m app.h2proxy --port 50051 [--key lp_xxx] [--certfile cert.pem --keyfile key.pem]
+
+Clients speak HTTP/2: h2c with prior knowledge (what plaintext gRPC channels use), or h2 over TLS with
+--certfile/--keyfile. Each call names its config key in the x-latency-poison-key header (gRPC metadata),
+or gets --key. It is forwarded as is (method, path, headers) to the key's target_url over HTTP/2: h2c for
+http://, h2 negotiated with ALPN for https://. One upstream connection per target carries all
+concurrent calls as separate streams, up to the target's SETTINGS_MAX_CONCURRENT_STREAMS. Request and
+response DATA frames are relayed as they arrive, under the flow control of both sides, and trailers
+(grpc-status) are passed through. A reset on either side resets the other.
+
+Chaos applies per call, with the gateway's decisions in the gateway's order: seeded RNG, method check,
+latency, failure bursts, failure. An injected failure is the picked HTTP status, or for gRPC calls
+(content-type application/grpc*) a trailers-only response whose grpc-status is mapped from it
+(503 -> UNAVAILABLE, 500 -> INTERNAL, ...). Rate and concurrency limits, transport faults, corruption
+and usage recording stay with the gateway. Requires the h2 package.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import ssl
+import time
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+import h2.config
+import h2.connection
+import h2.errors
+import h2.events
+import h2.exceptions
+import h2.settings
+
+from .core.bursts import states
+from .core.chaos import KeyConfig, method_allowed, pick_failure, sample_latency, seeded_rng
+from .core.keycache import KeyCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("app.h2proxy")
+
+KEY_HEADER = b"x-latency-poison-key"
+SEED_HEADER = b"x-latency-poison-seed"
+SEQ_HEADER = b"x-latency-poison-seq"
+# Connection-specific headers are not allowed in HTTP/2 (RFC 9113 section 8.2.2); Host is :authority
+DROP_HEADERS = frozenset({
+    b"connection", b"keep-alive", b"proxy-connection", b"transfer-encoding", b"upgrade", b"host", KEY_HEADER,
+})
+# grpc-status of an injected HTTP failure (grpc-gateway's gRPC to HTTP mapping, reversed)
+GRPC_STATUS = {400: 3, 401: 16, 403: 7, 404: 5, 408: 4, 409: 10, 412: 9, 429: 8, 499: 1, 500: 13, 501: 12, 503: 14, 504: 4}
+GRPC_UNKNOWN = 2
+GRPC_MESSAGE_SAFE = "".join(chr(c) for c in range(0x20, 0x7F) if c != 0x25)  # percent-encoded otherwise
+
+READ_SIZE = 65536
+# Receive window per stream and per connection: data is acknowledged once relayed, so a slow reader on
+# one side holds the other back instead of being buffered here
+H2_WINDOW = int(os.getenv("H2_WINDOW", str(1 << 20)))
+
+
+class Endpoint:
+    """One HTTP/2 connection, either side. A reader task feeds the h2 state machine and queues each
+    stream's events, as (kind, value) with kind headers, data, trailers, end or reset; senders wait for
+    flow-control window and stream slots."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, client_side: bool, on_request=None):
+        self.reader = reader
+        self.writer = writer
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=client_side, header_encoding=None))
+        self.streams: Dict[int, asyncio.Queue] = {}
+        self.on_request = on_request  # server side: called with (stream id, headers, event queue)
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.goaway = False  # no new streams; the open ones finish
+        # Replaced on every window update, settings change or closed stream, after waking its waiters
+        self._changed = asyncio.Event()
+
+    async def start(self) -> None:
+        self.conn.initiate_connection()
+        self.conn.update_settings({h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: H2_WINDOW})
+        self.conn.increment_flow_control_window(H2_WINDOW - self.conn.inbound_flow_control_window)
+        await self.flush()
+
+    async def flush(self) -> None:
+        data = self.conn.data_to_send()
+        if data:
+            self.writer.write(data)
+            await self.writer.drain()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                data = await self.reader.read(READ_SIZE)
+                if not data:
+                    break
+                try:
+                    events = self.conn.receive_data(data)
+                except h2.exceptions.ProtocolError as e:
+                    logger.info(f"HTTP/2 protocol error: {e}")
+                    await self.flush()
+                    break
+                for event in events:
+                    self._dispatch(event)
+                await self.flush()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.closed = True
+            for events in self.streams.values():
+                events.put_nowait(("reset", h2.errors.ErrorCodes.CANCEL))
+            self._wake()
+            self.writer.close()
+
+    def _dispatch(self, event) -> None:
+        if isinstance(event, h2.events.RequestReceived):
+            self.streams[event.stream_id] = events = asyncio.Queue()
+            self.on_request(event.stream_id, event.headers, events)
+        elif isinstance(event, h2.events.ResponseReceived):
+            # Ended at once: a trailers-only response (how gRPC servers answer with an error)
+            self._put(event.stream_id, "headers", (event.headers, event.stream_ended is not None))
+        elif isinstance(event, h2.events.TrailersReceived):
+            self._put(event.stream_id, "trailers", event.headers)
+        elif isinstance(event, h2.events.DataReceived):
+            if event.stream_id in self.streams:
+                self._put(event.stream_id, "data", (event.data, event.flow_controlled_length))
+            else:
+                # Nobody relays it any more: give the window back at once
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded):
+            self._put(event.stream_id, "end", None)
+            self._wake()
+        elif isinstance(event, h2.events.StreamReset):
+            self._put(event.stream_id, "reset", event.error_code)
+            self._wake()
+        elif isinstance(event, h2.events.ConnectionTerminated):
+            self.goaway = True
+            self._wake()
+        elif isinstance(event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)):
+            self._wake()
+
+    def _put(self, stream_id: int, kind: str, value) -> None:
+        events = self.streams.get(stream_id)
+        if events is not None:
+            events.put_nowait((kind, value))
+
+    async def request(self, headers: list) -> Tuple[int, asyncio.Queue]:
+        """Open a stream (client side), waiting while the peer's concurrent stream limit is reached."""
+        while True:
+            changed = self._changed
+            if self.closed or self.goaway:
+                raise ConnectionError("upstream connection closed")
+            if self.conn.open_outbound_streams < self.conn.remote_settings.max_concurrent_streams:
+                break
+            await changed.wait()
+        stream_id = self.conn.get_next_available_stream_id()
+        self.streams[stream_id] = events = asyncio.Queue()
+        self.conn.send_headers(stream_id, headers)
+        await self.flush()
+        return stream_id, events
+
+    async def send_headers(self, stream_id: int, headers: list, end_stream: bool = False) -> None:
+        self.conn.send_headers(stream_id, headers, end_stream=end_stream)
+        await self.flush()
+
+    async def send_data(self, stream_id: int, data: bytes, end_stream: bool = False) -> None:
+        """Send data in frames as the stream's and the connection's windows allow."""
+        view = memoryview(data)
+        while True:
+            changed = self._changed
+            if self.closed:
+                raise ConnectionError("connection closed")
+            window = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+            if view and window <= 0:
+                await changed.wait()
+                continue
+            chunk, view = view[:window], view[window:]
+            self.conn.send_data(stream_id, bytes(chunk), end_stream=end_stream and not view)
+            await self.flush()
+            if not view:
+                return
+
+    async def ack(self, stream_id: int, size: int) -> None:
+        """Give back the window of relayed data."""
+        if size and not self.closed:
+            self.conn.acknowledge_received_data(size, stream_id)
+            await self.flush()
+
+    async def reset(self, stream_id: int, code=h2.errors.ErrorCodes.CANCEL) -> None:
+        """Reset the stream; its event queue gets a reset too, to stop whoever reads it."""
+        self._put(stream_id, "reset", code)
+        if self.closed:
+            return
+        try:
+            self.conn.reset_stream(stream_id, code)
+        except h2.exceptions.StreamClosedError:
+            return
+        await self.flush()
+
+    def close_stream(self, stream_id: int, code=h2.errors.ErrorCodes.NO_ERROR) -> None:
+        """Forget the stream: data still queued gets its window back, and a stream the peer has not ended
+        is reset with `code` (NO_ERROR once the response is complete: the peer can stop sending)."""
+        events = self.streams.pop(stream_id, None)
+        if self.closed:
+            return
+        while events is not None and not events.empty():
+            kind, value = events.get_nowait()
+            if kind == "data":
+                self.conn.acknowledge_received_data(value[1], stream_id)
+        stream = self.conn.streams.get(stream_id)
+        if stream is not None and not stream.closed:
+            self.conn.reset_stream(stream_id, code)
+        # Written without waiting for drain: the peer may be blocked on this window update
+        self.writer.write(self.conn.data_to_send())
+        self._wake()
+
+
+class Upstreams:
+    """One HTTP/2 connection per target (scheme, host, port), opened on first use and replaced once closed.
+    Concurrent calls to a target with no connection yet share one connection attempt."""
+
+    def __init__(self):
+        self.conns: Dict[tuple, Endpoint] = {}
+        self._connecting: Dict[tuple, asyncio.Future] = {}
+
+    async def get(self, scheme: str, host: str, port: int) -> Endpoint:
+        target = (scheme, host, port)
+        endpoint = self.conns.get(target)
+        if endpoint is not None and not endpoint.closed and not endpoint.goaway:
+            return endpoint
+        pending = self._connecting.get(target)
+        if pending is None:
+            pending = self._connecting[target] = asyncio.ensure_future(self._connect(*target))
+            pending.add_done_callback(lambda _: self._connecting.pop(target, None))
+        return await asyncio.shield(pending)
+
+    async def _connect(self, scheme: str, host: str, port: int) -> Endpoint:
+        context = None
+        if scheme == "https":
+            context = ssl.create_default_context()
+            context.set_alpn_protocols(["h2"])
+        reader, writer = await asyncio.open_connection(host, port, ssl=context)
+        if context is not None and writer.get_extra_info("ssl_object").selected_alpn_protocol() != "h2":
+            writer.close()
+            raise ConnectionError(f"{host}:{port} does not speak HTTP/2")
+        endpoint = Endpoint(reader, writer, client_side=True)
+        await endpoint.start()
+        endpoint.task = asyncio.create_task(endpoint.run())
+        self.conns[(scheme, host, port)] = endpoint
+        return endpoint
+
+    async def close(self) -> None:
+        for endpoint in self.conns.values():
+            endpoint.writer.close()
+            endpoint.task.cancel()
+
+
+def _header_int(value: Optional[bytes]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class H2Proxy:
+    def __init__(self, default_key: Optional[str] = None):
+        self.default_key = default_key
+        self.keys = KeyCache()
+        self.upstreams = Upstreams()
+        # (key id, seed) -> request counter, for seed_mode "sequence"
+        self.sequences: dict = {}
+        self.burst_states = states()
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        calls = set()
+
+        def on_request(stream_id: int, headers: list, events: asyncio.Queue) -> None:
+            task = asyncio.create_task(self.call(client, stream_id, headers, events))
+            calls.add(task)
+            task.add_done_callback(calls.discard)
+
+        client = Endpoint(reader, writer, client_side=False, on_request=on_request)
+        try:
+            await client.start()
+            await client.run()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            for task in calls:
+                task.cancel()
+
+    async def call(self, client: Endpoint, stream_id: int, headers: list, events: asyncio.Queue) -> None:
+        request = dict(headers)
+        grpc = request.get(b"content-type", b"").startswith(b"application/grpc")
+        code = h2.errors.ErrorCodes.CANCEL
+        try:
+            await self._call(client, stream_id, headers, request, events, grpc)
+            code = h2.errors.ErrorCodes.NO_ERROR
+        except (h2.exceptions.ProtocolError, ConnectionError, OSError) as e:
+            logger.info(f"HTTP/2 call failed: {e}")
+            code = h2.errors.ErrorCodes.INTERNAL_ERROR
+        except Exception as e:
+            # Key store unavailable (or a bug): answer 503 (UNAVAILABLE for gRPC), unless the response started
+            logger.exception(f"HTTP/2 call failed: {e}")
+            code = h2.errors.ErrorCodes.INTERNAL_ERROR
+            try:
+                await self.fail(client, stream_id, 503, "Service unavailable", grpc, [], json_error=True)
+                code = h2.errors.ErrorCodes.NO_ERROR
+            except (h2.exceptions.ProtocolError, ConnectionError, OSError):
+                pass
+        finally:
+            client.close_stream(stream_id, code)
+
+    async def _call(self, client: Endpoint, stream_id: int, headers: list, request: dict, events: asyncio.Queue,
+                    grpc: bool) -> None:
+        method = request.get(b":method", b"GET").decode("latin-1")
+        path = request.get(b":path", b"/")
+        key = request.get(KEY_HEADER, b"").decode("latin-1") or self.default_key
+        config: Optional[KeyConfig] = await self.keys.get(key) if key else None
+        if config is None:
+            return await self.fail(client, stream_id, 401, "Invalid or inactive API key", grpc, [], json_error=True)
+
+        settings = config.chaos_at(time.time())
+        rng, seq = seeded_rng(
+            config, _header_int(request.get(SEED_HEADER)), _header_int(request.get(SEQ_HEADER)),
+            lambda: b"%s %s\n%s" % (method.encode(), path, request.get(b"x-request-id", b"")),
+            self.sequences,
+        )
+        extra = [(b"x-latency-poison-fail-rate", str(settings.fail_rate).encode())]
+        if seq is not None:
+            extra.append((b"x-latency-poison-seq", str(seq).encode()))
+
+        target = urlsplit(config.target_url)
+        if target.scheme not in ("http", "https") or not target.hostname:
+            return await self.fail(client, stream_id, 400, "target_url must use http or https scheme", grpc, extra, json_error=True)
+        if not method_allowed(config, method):
+            return await self.fail(client, stream_id, 405, f"Method {method} not allowed (config method: {config.method})",
+                                   grpc, extra, json_error=True)
+
+        latency = sample_latency(settings, rng)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+        if config.failure_bursts is not None:
+            bad = self.burst_states.step(config.id, config.failure_bursts, rng)
+            extra.append((b"x-latency-poison-failure-state", b"bad" if bad else b"good"))
+            settings = config.failure_bursts.apply(settings, bad)
+        code = pick_failure(settings, rng)
+        if code is not None:
+            try:
+                reason = HTTPStatus(code).phrase
+            except ValueError:
+                reason = ""
+            return await self.fail(client, stream_id, code, reason, grpc, extra)
+
+        forwarded = [
+            (b":method", method.encode()),
+            (b":scheme", target.scheme.encode()),
+            (b":authority", target.netloc.encode()),
+            (b":path", target.path.rstrip("/").encode() + path),
+        ] + [(k, v) for k, v in headers if not k.startswith(b":") and k not in DROP_HEADERS]
+        try:
+            upstream = await self.upstreams.get(target.scheme, target.hostname, target.port or (443 if target.scheme == "https" else 80))
+            upstream_id, upstream_events = await upstream.request(forwarded)
+        except (ConnectionError, OSError, h2.exceptions.ProtocolError) as e:
+            return await self.fail(client, stream_id, 502, f"failed to proxy request: {e}", grpc, extra, json_error=True)
+
+        sending = asyncio.create_task(self._relay_request(client, stream_id, events, upstream, upstream_id))
+        code = h2.errors.ErrorCodes.CANCEL
+        try:
+            await self._relay_response(upstream, upstream_id, upstream_events, client, stream_id, extra)
+            code = h2.errors.ErrorCodes.NO_ERROR
+        finally:
+            sending.cancel()
+            upstream.close_stream(upstream_id, code)
+
+    @staticmethod
+    async def _relay_request(client: Endpoint, stream_id: int, events: asyncio.Queue, upstream: Endpoint,
+                             upstream_id: int) -> None:
+        """Client stream -> upstream stream, then wait for a reset of the client stream to pass on."""
+        ended = False
+        try:
+            while True:
+                kind, value = await events.get()
+                if kind == "reset":
+                    await upstream.reset(upstream_id, value)
+                    return
+                if ended:
+                    continue
+                if kind == "data":
+                    data, size = value
+                    await upstream.send_data(upstream_id, data)
+                    await client.ack(stream_id, size)
+                elif kind == "trailers":
+                    await upstream.send_headers(upstream_id, value, end_stream=True)
+                    ended = True
+                elif kind == "end":
+                    await upstream.send_data(upstream_id, b"", end_stream=True)
+                    ended = True
+        except (h2.exceptions.ProtocolError, ConnectionError, OSError):
+            # Upstream stream gone: its own events end the response
+            await upstream.reset(upstream_id)
+
+    @staticmethod
+    async def _relay_response(upstream: Endpoint, upstream_id: int, events: asyncio.Queue, client: Endpoint,
+                              stream_id: int, extra: list) -> None:
+        """Upstream stream -> client stream: headers (with ours), data, trailers or reset."""
+        ended = False
+        while not ended:
+            kind, value = await events.get()
+            if kind == "headers":
+                headers, ended = value
+                await client.send_headers(stream_id, [(k, v) for k, v in headers if k not in DROP_HEADERS] + extra, ended)
+            elif kind == "data":
+                data, size = value
+                await client.send_data(stream_id, data)
+                await upstream.ack(upstream_id, size)
+            elif kind == "trailers":
+                await client.send_headers(stream_id, value, end_stream=True)
+                ended = True
+            elif kind == "end":
+                await client.send_data(stream_id, b"", end_stream=True)
+                ended = True
+            elif kind == "reset":
+                await client.reset(stream_id, value)
+                ended = True
+
+    @staticmethod
+    async def fail(client: Endpoint, stream_id: int, status: int, message: str, grpc: bool, extra: list,
+                   json_error: bool = False) -> None:
+        """Answer the call here: the status (a JSON error or the reason phrase), or for gRPC a trailers-only
+        response with the mapped grpc-status."""
+        if grpc:
+            headers = [
+                (b":status", b"200"),
+                (b"content-type", b"application/grpc"),
+                (b"grpc-status", str(GRPC_STATUS.get(status, GRPC_UNKNOWN)).encode()),
+                (b"grpc-message", quote(message, safe=GRPC_MESSAGE_SAFE).encode()),
+            ]
+            await client.send_headers(stream_id, headers + extra, end_stream=True)
+        else:
+            body = (json.dumps({"error": message}) if json_error else message).encode()
+            headers = [
+                (b":status", str(status).encode()),
+                (b"content-type", b"application/json" if json_error else b"text/plain"),
+                (b"content-length", str(len(body)).encode()),
+            ]
+            await client.send_headers(stream_id, headers + extra)
+            await client.send_data(stream_id, body, end_stream=True)
+
+
+async def serve(host: str, port: int, default_key: Optional[str], certfile: Optional[str], keyfile: Optional[str]) -> None:
+    context = None
+    if certfile:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        context.set_alpn_protocols(["h2"])
+    proxy = H2Proxy(default_key)
+    server = await asyncio.start_server(proxy.serve_connection, host, port, ssl=context)
+    logger.info(f"HTTP/2 proxy listening on {host}:{port} ({'h2' if context else 'h2c'})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await proxy.upstreams.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/2 and gRPC pass-through for config keys")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("H2_PORT", "50051")))
+    parser.add_argument("--key", default=os.getenv("H2_DEFAULT_KEY"), help="Config key of calls without x-latency-poison-key")
+    parser.add_argument("--certfile", help="Serve h2 over TLS with this certificate (h2c otherwise)")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.key, args.certfile, args.keyfile))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, proxy, collections, endpoints, tunnels
+from .core.database import init_db
+from .core.metrics import metrics as worker_metrics
+from .routers import auth, proxy, collections, endpoints, tunnels, metrics, journal, gateway
 
 app = FastAPI(title="LatencyPoison", description="Network Chaos Proxy")
 
@@ -19,6 +21,21 @@ app.include_router(proxy.router)
 app.include_router(collections.router)
 app.include_router(endpoints.router)
 app.include_router(tunnels.router)
+app.include_router(metrics.router)
+app.include_router(journal.router)
+# /lp_<key>/... routes: keep last so they never shadow the routes above
+app.include_router(gateway.router)
+
+@app.on_event("startup")
+async def startup():
+    init_db()
+    await gateway.startup()
+    worker_metrics.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    worker_metrics.stop()
+    await gateway.shutdown()
 
 @app.get("/")
 async def root():
@@ -31,6 +48,9 @@ async def root():
             "/api/collections": "Collections endpoints",
             "/api/endpoints": "Endpoints endpoints",
             "/api/tunnels": "Proxy tunnels endpoints",
+            "/metrics": "Request and pool metrics, aggregated across workers",
+            "/api/journal/stats": "Latency percentiles and error breakdown from the request journal",
+            "/{api_key}/{path}": "Config key proxy: forwards to the key's target URL with its chaos settings",
             "/docs": "API documentation"
         }
     } 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from ..core.security import get_current_user
+from ..core.store import registry
 from ..schemas.collection import Collection, CollectionCreate, CollectionUpdate
 from ..schemas.endpoint import Endpoint
 from ..schemas.user import TokenData
@@ -57,8 +58,8 @@ DEFAULT_COLLECTIONS = [
     ),
 ]
 
-# In-memory storage for collections (replace with database in production)
-collections = {c.id: c for c in DEFAULT_COLLECTIONS}
+# Storage for collections (in-memory, shared across workers in multi-worker mode; replace with database in production)
+collections = registry("collections", Collection, DEFAULT_COLLECTIONS)
 
 @router.post("/", response_model=Collection)
 async def create_collection(
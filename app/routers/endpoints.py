@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from ..core.security import get_current_user
+from ..core.store import registry
 from ..schemas.endpoint import Endpoint, EndpointCreate, EndpointUpdate
 from ..schemas.user import TokenData
 import uuid
@@ -81,8 +82,8 @@ DEFAULT_ENDPOINTS = [
     ),
 ]
 
-# In-memory storage for endpoints (replace with database in production)
-endpoints = {e.id: e for e in DEFAULT_ENDPOINTS}
+# Storage for endpoints (in-memory, shared across workers in multi-worker mode; replace with database in production)
+endpoints = registry("endpoints", Endpoint, DEFAULT_ENDPOINTS)
 
 @router.post("/", response_model=Endpoint)
 async def create_endpoint(
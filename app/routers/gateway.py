@@ -0,0 +1,391 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.convertors import StringConvertor, register_url_convertor
+from http import HTTPStatus
+from datetime import datetime
+from typing import Optional
+import asyncio
+import httpx
+import logging
+import os
+import time
+
+from ..core.bursts import states
+from ..core.chaos import (
+    method_allowed, pick_corruption, pick_failure, pick_transport_fault, sample_latency, seeded_rng,
+)
+from ..core.corruption import corrupt_body, strips_content_length
+from ..core.faults import ConnectionParker, client_connection, close_connection, detach, reset_connection
+from ..core.journal import (
+    JOURNAL_DIR, FLAG_CORRUPTED, FLAG_INJECTED, FLAG_RATE_LIMITED, FLAG_SATURATED, FLAG_TRANSPORT_FAULT, FLAG_UPSTREAM_ERROR,
+    JournalWriter,
+)
+from ..core.concurrency import Bulkheads, Slot
+from ..core.keycache import KeyCache
+from ..core.metrics import metrics
+from ..core.ratelimit import buckets
+from ..core.rollup import RollupRecorder
+from ..core.usage import UsageRecorder
+from ..core import wsproxy
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Config-key data plane, same contract as the Go proxy: /{apiKey} or /{apiKey}/* -> target_url + path, with chaos.
+router = APIRouter(tags=["gateway"])
+
+
+class ConfigKeyConvertor(StringConvertor):
+    """Matches a config key path segment (keys are issued as lp_<token>). Other first segments fall
+    through to the app's own 404/405 and trailing-slash redirects instead of a key lookup."""
+    regex = "lp_[^/]+"
+
+
+register_url_convertor("config_key", ConfigKeyConvertor())
+
+GATEWAY_MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", "512"))
+GATEWAY_MAX_KEEPALIVE = int(os.getenv("GATEWAY_MAX_KEEPALIVE", "128"))
+GATEWAY_TIMEOUT = float(os.getenv("GATEWAY_TIMEOUT", "30"))
+
+ALL_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"]
+
+# Not forwarded in either direction (RFC 7230 section 6.1), plus Host which httpx sets from the target URL
+HOP_BY_HOP_HEADERS = frozenset({
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization", b"proxy-connection",
+    b"te", b"trailer", b"transfer-encoding", b"upgrade", b"host",
+})
+# Set by uvicorn on every response; forwarding the upstream ones would duplicate them
+SERVER_SET_HEADERS = frozenset({b"date", b"server"})
+# The target's own rate limit headers, replaced by the simulated ones on keys with a rate_limit
+RATE_LIMIT_HEADERS = frozenset({b"x-ratelimit-limit", b"x-ratelimit-remaining", b"x-ratelimit-reset", b"retry-after"})
+# Not forwarded with a WebSocket handshake (Connection and Upgrade are set by wsproxy.connect, see it about extensions)
+WEBSOCKET_HANDSHAKE_HEADERS = HOP_BY_HOP_HEADERS | {b"sec-websocket-extensions"}
+
+# Per-run seed (overrides the key's seed) and explicit request number for seeded chaos
+SEED_HEADER = "x-latency-poison-seed"
+SEQ_HEADER = "x-latency-poison-seq"
+
+key_cache = KeyCache()
+# (key id, seed) -> request counter of this worker, for seed_mode "sequence"
+sequences: dict = {}
+# Token buckets of keys with a rate_limit (shared by all workers in multi-worker mode)
+rate_buckets = buckets()
+# In-flight slots and wait queues of keys with a concurrency_limit (per worker)
+bulkheads = Bulkheads()
+# Good/bad states of keys with failure_bursts (shared by all workers in multi-worker mode)
+burst_states = states()
+usage_recorder = UsageRecorder()
+# Per-minute latency sketches and status counts per key, flushed to latency_rollups
+rollups = RollupRecorder()
+# Connections held open by "hang" transport faults (capped, closed by one reaper task)
+parked = ConnectionParker()
+# Per-request outcome journal, only when JOURNAL_DIR is set
+journal = JournalWriter(JOURNAL_DIR) if JOURNAL_DIR else None
+# Shared pooled client, created on startup (keep-alive connections are reused across requests)
+upstream: httpx.AsyncClient = None
+
+
+async def startup():
+    global upstream
+    upstream = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=GATEWAY_MAX_CONNECTIONS, max_keepalive_connections=GATEWAY_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(GATEWAY_TIMEOUT),
+        follow_redirects=False,
+    )
+    usage_recorder.start()
+    rollups.start()
+    parked.start()
+    if journal is not None:
+        journal.start()
+        metrics.gauge("journal_records", lambda: journal.written)
+    metrics.gauge("gateway_pool_connections", pool_connections)
+    metrics.gauge("gateway_key_cache_entries", lambda: len(key_cache))
+    metrics.gauge("usage_pending", lambda: usage_recorder.pending)
+    metrics.gauge("usage_recorded", lambda: usage_recorder.recorded)
+    metrics.gauge("usage_dropped", lambda: usage_recorder.dropped)
+    metrics.gauge("rollup_rows_written", lambda: rollups.rows_written)
+    metrics.gauge("rollup_minutes_dropped", lambda: rollups.minutes_dropped)
+    metrics.gauge("parked_connections", lambda: len(parked))
+    metrics.gauge("parked_connections_evicted", lambda: parked.evicted)
+    metrics.gauge("concurrency_in_flight", bulkheads.in_flight)
+    metrics.gauge("concurrency_queued", bulkheads.queued)
+    metrics.gauge("concurrency_timed_out", lambda: bulkheads.timed_out)
+    metrics.gauge("websocket_connections", lambda: len(wsproxy.relays))
+
+
+async def shutdown():
+    await usage_recorder.stop()
+    await rollups.stop()
+    parked.stop()
+    if journal is not None:
+        await journal.stop()
+    if upstream is not None:
+        await upstream.aclose()
+
+
+def pool_connections() -> int:
+    """Open upstream connections in this worker's pool (httpcore internals, 0 if unavailable)."""
+    pool = getattr(getattr(upstream, "_transport", None), "_pool", None)
+    return len(getattr(pool, "connections", ()))
+
+
+def build_target_url(target_url: str, path: str, query: str) -> str:
+    url = target_url.rstrip("/")
+    if path:
+        url = url + "/" + path.lstrip("/")
+    if query:
+        url = url + "?" + query
+    return url
+
+
+def path_after_key(request: Request, api_key: str) -> str:
+    """Rest of the path after /{api_key}, still percent-encoded as the client sent it."""
+    raw_path = request.scope.get("raw_path") or request.url.path.encode()
+    return raw_path.decode("latin-1")[len(api_key) + 1:]
+
+
+def forward_headers(raw_headers, drop=HOP_BY_HOP_HEADERS) -> list:
+    """Filter raw (bytes) header pairs; repeated headers such as Set-Cookie are kept as-is."""
+    return [(k, v) for k, v in raw_headers if k.lower() not in drop]
+
+
+async def relay_body(upstream_response: httpx.Response, delay: float = 0, slot: Optional[Slot] = None):
+    """Stream the upstream body without decoding; the connection goes back to the pool when done.
+    With a delay, the body starts that many seconds after the headers were sent. A concurrency slot
+    is released with the connection (and by finish_relay, if the body never starts)."""
+    try:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async for chunk in upstream_response.aiter_raw():
+            yield chunk
+    finally:
+        if slot is not None:
+            slot.release()
+        await upstream_response.aclose()
+
+
+async def finish_relay(upstream_response: httpx.Response, slot: Optional[Slot]) -> None:
+    """Background task of a relayed response. A client gone before the first chunk cancels the body
+    unstarted, so its own cleanup never runs: the slot and the upstream connection are freed here too."""
+    if slot is not None:
+        slot.release()
+    await upstream_response.aclose()
+
+
+def _header_int(request: Request, name: str):
+    try:
+        return int(request.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def chaos_rng(config, request: Request):
+    """RNG for this request's chaos decisions (see chaos.seeded_rng). Returns (rng, request number or None)."""
+    def request_key() -> bytes:
+        raw_path = request.scope.get("raw_path") or request.url.path.encode()
+        query = request.scope.get("query_string") or b""
+        return b"%s %s%s\n%s" % (
+            request.method.encode(), raw_path, b"?" + query if query else b"",
+            request.headers.get("x-request-id", "").encode("latin-1"),
+        )
+    return seeded_rng(config, _header_int(request, SEED_HEADER), _header_int(request, SEQ_HEADER), request_key, sequences)
+
+
+def record_outcome(config, request: Request, status: int, requested_at: datetime, started: float,
+                   delay_ms: int, flags: int = 0, upstream_us: int = 0) -> None:
+    total_us = int((time.perf_counter() - started) * 1_000_000)
+    usage_recorder.record(config.id, status, requested_at, total_us, upstream_us or None)
+    rollups.record(config.id, status, total_us, upstream_us)
+    if journal is not None:
+        journal.record(config.id, status, flags, delay_ms, upstream_us, total_us, request.method)
+
+
+def error_response(status_code: int, message: str, headers: dict = None) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"error": message}, headers=headers)
+
+
+async def proxy_websocket(config, request: Request, api_key: str, headers: dict, rng,
+                          requested_at: datetime, started: float, latency: int) -> Response:
+    """Forward a WebSocket handshake; on a 101 the client connection is handed to wsproxy, which relays
+    the messages with the key's websocket_chaos. The handshake itself counts as one request."""
+    cycle, transport = client_connection(request.receive)
+    if transport is None:
+        return error_response(501, "WebSocket proxying needs the uvicorn server (with --ws none)", headers)
+    url = build_target_url(config.target_url, path_after_key(request, api_key), request.url.query)
+    sent = time.perf_counter()
+    try:
+        target = await wsproxy.connect(url, forward_headers(request.headers.raw, WEBSOCKET_HANDSHAKE_HEADERS), GATEWAY_TIMEOUT)
+    except (OSError, wsproxy.HandshakeError) as e:
+        metrics.inc("gateway_upstream_errors")
+        record_outcome(config, request, 502, requested_at, started, latency, FLAG_UPSTREAM_ERROR,
+                       int((time.perf_counter() - sent) * 1_000_000))
+        return error_response(502, f"failed to proxy WebSocket: {str(e)}", headers)
+    record_outcome(config, request, target.status, requested_at, started, latency, 0,
+                   int((time.perf_counter() - sent) * 1_000_000))
+    if target.status != 101:
+        target.close()
+        return error_response(target.status, f"Target did not accept the WebSocket upgrade: {target.status_line}", headers)
+    metrics.inc("gateway_websockets")
+    # Nothing the handler returns is written: the target's 101 goes out with the relay
+    detach(cycle)
+    wsproxy.relay(transport, target, config.websocket_chaos, rng, headers)
+    return Response(status_code=204)
+
+
+@router.api_route("/{api_key:config_key}", methods=ALL_METHODS, include_in_schema=False)
+@router.api_route("/{api_key:config_key}/{path:path}", methods=ALL_METHODS, include_in_schema=False)
+async def config_key_proxy(api_key: str, request: Request):
+    started = time.perf_counter()
+    metrics.inc("gateway_requests")
+    try:
+        config = await key_cache.get(api_key)
+    except Exception as e:
+        logger.error(f"Config key lookup failed: {str(e)}")
+        return error_response(500, "Internal server error")
+    if config is None:
+        return error_response(401, "Invalid or inactive API key")
+
+    settings = config.chaos_at(time.time())
+    headers = {"X-Latency-Poison-Fail-Rate": str(settings.fail_rate)}
+    rng, seq = chaos_rng(config, request)
+    if seq is not None:
+        # Send it back as X-Latency-Poison-Seq (with the same seed) to replay this request's decisions
+        headers["X-Latency-Poison-Seq"] = str(seq)
+
+    if not config.target_url:
+        return error_response(400, "Config key has no target URL. Set target_url in Configs.", headers)
+    if not config.target_url.lower().startswith(("http://", "https://")):
+        return error_response(400, "target_url must use http or https scheme", headers)
+    if not method_allowed(config, request.method):
+        return error_response(405, f"Method {request.method} not allowed (config method: {config.method})", headers)
+
+    # Usage is recorded for every request from here on (including simulated failures), with the final status;
+    # rows are buffered and flushed in the background
+    requested_at = datetime.utcnow()
+    headers["X-Latency-Poison-Usage-Recorded"] = "1"
+
+    if config.rate_limit is not None:
+        decision = rate_buckets.take(config.id, config.rate_limit)
+        headers.update(decision.headers())
+        if not decision.allowed:
+            metrics.inc("gateway_rate_limited")
+            record_outcome(config, request, 429, requested_at, started, 0, FLAG_INJECTED | FLAG_RATE_LIMITED)
+            return error_response(429, "Rate limit exceeded", headers)
+
+    slot = None
+    extra_latency = 0
+    if config.concurrency_limit is not None:
+        limit = config.concurrency_limit
+        waited = time.perf_counter()
+        slot, position = await bulkheads.acquire(config.id, limit)
+        if slot is None:
+            metrics.inc("gateway_concurrency_rejected")
+            record_outcome(config, request, 503, requested_at, started, 0, FLAG_INJECTED | FLAG_SATURATED)
+            return error_response(503, f"Target saturated: {limit.max_in_flight} requests in flight", headers)
+        if position:
+            headers["X-Latency-Poison-Queue-Wait-Ms"] = str(int((time.perf_counter() - waited) * 1000))
+            extra_latency = position * limit.latency_per_queued_ms
+
+    # The slot and the upstream response are held until the response is relayed: released here on every other exit
+    relayed = False
+    upstream_response = None
+    try:
+        latency = sample_latency(settings, rng) + extra_latency
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+        if config.failure_bursts is not None:
+            bad = burst_states.step(config.id, config.failure_bursts, rng)
+            headers["X-Latency-Poison-Failure-State"] = "bad" if bad else "good"
+            settings = config.failure_bursts.apply(settings, bad)
+        code = pick_failure(settings, rng)
+        if code is not None:
+            metrics.inc("gateway_failures_injected")
+            try:
+                reason = HTTPStatus(code).phrase
+            except ValueError:
+                reason = ""
+            record_outcome(config, request, code, requested_at, started, latency, FLAG_INJECTED)
+            return Response(content=reason, status_code=code, headers=headers, media_type="text/plain")
+
+        fault = pick_transport_fault(config.transport_faults, rng)
+        if fault in ("reset", "hang"):
+            cycle, transport = client_connection(request.receive)
+            if transport is not None:
+                metrics.inc("gateway_transport_faults")
+                # Nothing the handler returns is written: the client gets a reset or no response at all
+                detach(cycle)
+                if fault == "reset":
+                    reset_connection(transport)
+                else:
+                    parked.park(transport, config.transport_faults.hang_ms / 1000)
+                record_outcome(config, request, 0, requested_at, started, latency, FLAG_TRANSPORT_FAULT)
+                return Response(status_code=204)
+            # Client connection not reachable under this server: relay normally
+            fault = None
+
+        if wsproxy.is_upgrade(request.headers):
+            return await proxy_websocket(config, request, api_key, headers, rng, requested_at, started, latency)
+
+        url = build_target_url(config.target_url, path_after_key(request, api_key), request.url.query)
+        # Stream the request body only when there is one, so bodiless requests are not sent chunked
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+        upstream_request = upstream.build_request(
+            request.method,
+            url,
+            headers=forward_headers(request.headers.raw),
+            content=request.stream() if has_body else None,
+        )
+        sent = time.perf_counter()
+        try:
+            upstream_response = await upstream.send(upstream_request, stream=True)
+        except httpx.RequestError as e:
+            metrics.inc("gateway_upstream_errors")
+            record_outcome(config, request, 502, requested_at, started, latency, FLAG_UPSTREAM_ERROR,
+                           int((time.perf_counter() - sent) * 1_000_000))
+            return error_response(502, f"failed to proxy request: {str(e)}", headers)
+
+        upstream_us = int((time.perf_counter() - sent) * 1_000_000)
+        flags = 0
+        if fault is not None:
+            metrics.inc("gateway_transport_faults")
+            flags |= FLAG_TRANSPORT_FAULT
+            headers["X-Latency-Poison-Transport-Fault"] = fault
+            if fault == "slow_first_byte":
+                await asyncio.sleep(config.transport_faults.delay_ms / 1000)
+        body = relay_body(upstream_response, config.transport_faults.delay_ms / 1000 if fault == "slow_body" else 0, slot)
+        drop = HOP_BY_HOP_HEADERS | SERVER_SET_HEADERS
+        if config.rate_limit is not None:
+            drop = drop | RATE_LIMIT_HEADERS
+        mode = pick_corruption(config.corruption, rng) if request.method != "HEAD" else None
+        if mode is not None:
+            metrics.inc("gateway_responses_corrupted")
+            headers["X-Latency-Poison-Corruption"] = mode
+            content_length = upstream_response.headers.get("content-length")
+            drop_connection = None
+            if mode == "drop":
+                cycle, transport = client_connection(request.receive)
+                if transport is not None:
+                    drop_connection = lambda: close_connection(cycle, transport)
+            body = corrupt_body(body, mode, config.corruption,
+                                int(content_length) if content_length and content_length.isdigit() else None, rng,
+                                drop_connection)
+            if strips_content_length(mode):
+                drop = drop | {b"content-length"}
+            flags |= FLAG_CORRUPTED
+        record_outcome(config, request, upstream_response.status_code, requested_at, started, latency, flags, upstream_us)
+        response = StreamingResponse(body, status_code=upstream_response.status_code,
+                                     background=BackgroundTask(finish_relay, upstream_response, slot))
+        response.raw_headers = forward_headers(upstream_response.headers.raw, drop) + [
+            (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()
+        ]
+        relayed = True
+        return response
+    finally:
+        if not relayed:
+            if slot is not None:
+                slot.release()
+            if upstream_response is not None:
+                await upstream_response.aclose()
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from ..core.database import owned_key_ids
+from ..core.journal import JOURNAL_DIR, window_stats
+from ..core.security import get_current_user, is_admin
+from ..schemas.user import TokenData
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/journal", tags=["journal"])
+
+MAX_WINDOW_SECONDS = 7 * 24 * 3600
+
+
+def parse_percentiles(value: str) -> tuple:
+    try:
+        ps = tuple(float(p) for p in value.split(",") if p.strip())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers")
+    if not ps or any(p <= 0 or p > 100 for p in ps):
+        raise HTTPException(status_code=400, detail="percentiles must be in (0, 100]")
+    return ps
+
+
+@router.get("/stats")
+async def journal_stats(
+    since: Optional[float] = Query(None, description="Window start (unix seconds), default: 15 minutes ago"),
+    until: Optional[float] = Query(None, description="Window end (unix seconds, exclusive), default: now"),
+    key_id: Optional[int] = Query(None, description="Only this config key (default: all keys of the caller)"),
+    percentiles: str = Query("50,90,99", description="Comma-separated percentiles"),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """Latency percentiles and error breakdown from the request journal, for the caller's config keys
+    (every key for ADMIN_EMAILS). The database is only read for the list of the caller's keys."""
+    if not JOURNAL_DIR:
+        raise HTTPException(status_code=404, detail="Request journal is disabled (set JOURNAL_DIR)")
+    until = until if until is not None else time.time()
+    since = since if since is not None else until - 900
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if until - since > MAX_WINDOW_SECONDS:
+        raise HTTPException(status_code=400, detail="Window is limited to 7 days")
+    ps = parse_percentiles(percentiles)
+    key_ids = None
+    if not is_admin(current_user):
+        try:
+            key_ids = await asyncio.to_thread(owned_key_ids, current_user.email)
+        except Exception as e:
+            logger.error(f"Error loading config keys of {current_user.email}: {str(e)}")
+            raise HTTPException(status_code=503, detail="Database unavailable")
+        if key_id is not None and key_id not in key_ids:
+            raise HTTPException(status_code=404, detail="Config key not found")
+    try:
+        return await asyncio.to_thread(window_stats, JOURNAL_DIR, since, until, key_id, ps, key_ids)
+    except Exception as e:
+        logger.error(f"Error reading journal: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
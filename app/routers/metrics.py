@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+import asyncio
+
+from ..core import store
+from ..core.metrics import metrics, aggregate, METRICS_STALE_AFTER
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counters and gauges summed over all workers (just this process when running single-worker)."""
+    workers = await asyncio.to_thread(store.read_worker_metrics, METRICS_STALE_AFTER)
+    return aggregate(metrics.snapshot(), workers)
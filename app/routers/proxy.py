@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
 import httpx
 import random
@@ -6,6 +7,9 @@ import asyncio
 from urllib.parse import urlparse
 from datetime import datetime
 
+from ..core import synthetic
+from ..core.chaos import CounterRng, fnv1a64
+
 router = APIRouter(tags=["proxy"])
 
 def validate_url(url: str) -> bool:
@@ -22,7 +26,13 @@ async def proxy(
     min_latency: Optional[int] = Query(0, description="Minimum latency in milliseconds"),
     max_latency: Optional[int] = Query(0, description="Maximum latency in milliseconds"),
     fail_rate: Optional[float] = Query(0.0, description="Probability of returning a 500 error (0.0 to 1.0)"),
-    sandbox: Optional[bool] = Query(False, description="Enable sandbox mode to return mock data")
+    sandbox: Optional[bool] = Query(False, description="Enable sandbox mode to return mock data"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible latency/failure decisions"),
+    seq: Optional[int] = Query(None, description="Request number for the seed (default: hash of the URL)"),
+    size: Optional[str] = Query(None, description="Sandbox: synthetic body of this size instead of mock data (bytes, or e.g. 64KB, 10MB)"),
+    shape: str = Query("json", description="Sandbox body shape: json, text or binary"),
+    content_type: Optional[str] = Query(None, description="Sandbox body Content-Type (default: the shape's)"),
+    chunk_size: Optional[int] = Query(None, description="Sandbox body sent with chunked encoding, in chunks of this size")
 ):
     # Validate URL
     if not validate_url(url):
@@ -37,17 +47,42 @@ async def proxy(
         raise HTTPException(status_code=400, detail="Latency values must be positive")
     if min_latency > max_latency:
         raise HTTPException(status_code=400, detail="min_latency must be less than or equal to max_latency")
+
+    # Validate the synthetic body
+    body_size = None
+    if sandbox and size is not None:
+        try:
+            body_size = synthetic.parse_size(size)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        error = synthetic.check(shape, body_size, chunk_size)
+        if error:
+            raise HTTPException(status_code=400, detail=error)
     
+    # Seeded runs draw from a counter-based RNG: same seed and seq, same decisions
+    rng = random
+    if seed is not None:
+        rng = CounterRng(seed, seq if seq is not None else fnv1a64(url.encode()))
+
     # Apply random latency within range
     latency = 0
     if max_latency > 0:
-        latency = random.randint(min_latency, max_latency)
+        latency = min_latency + rng.randrange(max_latency - min_latency + 1)
         await asyncio.sleep(latency / 1000)
     
     # Check if we should fail
-    if random.random() < fail_rate:
+    if rng.random() < fail_rate:
         raise HTTPException(status_code=500, detail="Random failure injected")
     
+    # Synthetic body: cached template pieces, with a Content-Length unless chunking was asked for
+    if body_size is not None:
+        headers = {"Content-Type": content_type or synthetic.SHAPES[shape][0]}
+        if not chunk_size:
+            headers["Content-Length"] = str(body_size)
+        return StreamingResponse(
+            synthetic.body(shape, body_size, chunk_size or synthetic.DEFAULT_CHUNK_SIZE), headers=headers,
+        )
+
     # In sandbox mode, return mock data
     if sandbox:
         return {
@@ -6,6 +6,7 @@ import logging
 from datetime import datetime
 
 from ..core.security import get_current_user
+from ..core.store import registry
 from ..schemas.tunnel import ProxyTunnel, ProxyTunnelCreate, ProxyTunnelUpdate, TunnelTarget
 from ..schemas.user import TokenData
 
@@ -15,8 +16,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/tunnels", tags=["tunnels"])
 
-# In-memory storage for tunnels
-tunnels = {}
+# Tunnel storage (in-memory, shared across workers in multi-worker mode)
+tunnels = registry("tunnels", ProxyTunnel)
 
 def generate_tunnel_key():
     """Generate a unique tunnel key"""
@@ -85,6 +86,10 @@ async def create_tunnel(
                 min_latency=t.min_latency,
                 max_latency=t.max_latency,
                 fail_rate=t.fail_rate,
+                rate_limit=t.rate_limit,
+                concurrency_limit=t.concurrency_limit,
+                failure_bursts=t.failure_bursts,
+                websocket_chaos=t.websocket_chaos,
                 is_active=t.is_active
             )
             processed_targets.append(target)
@@ -144,6 +149,10 @@ async def update_tunnel(
                         min_latency=t.get('min_latency', 0),
                         max_latency=t.get('max_latency', 0),
                         fail_rate=t.get('fail_rate', 0),
+                        rate_limit=t.get('rate_limit'),
+                        concurrency_limit=t.get('concurrency_limit'),
+                        failure_bursts=t.get('failure_bursts'),
+                        websocket_chaos=t.get('websocket_chaos'),
                         is_active=t.get('is_active', True)
                     )
                 else:
@@ -157,6 +166,10 @@ async def update_tunnel(
                         min_latency=t.min_latency,
                         max_latency=t.max_latency,
                         fail_rate=t.fail_rate,
+                        rate_limit=t.rate_limit,
+                        concurrency_limit=t.concurrency_limit,
+                        failure_bursts=t.failure_bursts,
+                        websocket_chaos=t.websocket_chaos,
                         is_active=t.is_active
                     )
                 new_targets.append(target)
@@ -1,7 +1,34 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
+class RateLimit(BaseModel):
+    """Token bucket: `burst` requests at once, refilled at `rate` per second; over it, 429"""
+    rate: float = Field(0, ge=0, le=1000000)
+    burst: Optional[int] = Field(None, ge=1, le=1000000)
+
+class ConcurrencyLimit(BaseModel):
+    """At most max_in_flight requests at once; `queue` more wait up to queue_timeout_ms, others get 503"""
+    max_in_flight: int = Field(0, ge=0, le=100000)
+    queue: int = Field(0, ge=0, le=100000)
+    queue_timeout_ms: int = Field(1000, ge=0, le=600000)
+    latency_per_queued_ms: int = Field(0, ge=0, le=60000)
+
+class FailureBursts(BaseModel):
+    """Good/bad state moved per request (p_enter, p_exit); while bad, requests fail at bad_fail_rate"""
+    p_enter: float = Field(0, ge=0, le=1)
+    p_exit: float = Field(0.1, ge=0, le=1)
+    bad_fail_rate: int = Field(100, ge=0, le=100)
+
+class WebSocketChaos(BaseModel):
+    """Per WebSocket message: a delay in [min_delay_ms, max_delay_ms), then rate% dropped, duplicated, reordered or closed"""
+    rate: int = Field(0, ge=0, le=100)
+    modes: List[str] = Field(default_factory=lambda: ["drop"], min_length=1)
+    min_delay_ms: int = Field(0, ge=0, le=60000)
+    max_delay_ms: int = Field(0, ge=0, le=60000)
+    close_code: int = Field(1011, ge=1000, le=4999)
+    direction: str = "both"
+
 class TunnelTarget(BaseModel):
     """A target configuration for a tunnel"""
     id: Optional[str] = None
@@ -13,6 +40,10 @@ class TunnelTarget(BaseModel):
     min_latency: int = 0
     max_latency: int = 0
     fail_rate: int = 0  # Percentage 0-100
+    rate_limit: Optional[RateLimit] = None
+    concurrency_limit: Optional[ConcurrencyLimit] = None
+    failure_bursts: Optional[FailureBursts] = None
+    websocket_chaos: Optional[WebSocketChaos] = None
     is_active: bool = True
 
 class TunnelTargetCreate(BaseModel):
@@ -24,6 +55,10 @@ class TunnelTargetCreate(BaseModel):
     min_latency: int = 0
     max_latency: int = 0
     fail_rate: int = 0
+    rate_limit: Optional[RateLimit] = None
+    concurrency_limit: Optional[ConcurrencyLimit] = None
+    failure_bursts: Optional[FailureBursts] = None
+    websocket_chaos: Optional[WebSocketChaos] = None
     is_active: bool = True
 
 class ProxyTunnelBase(BaseModel):
@@ -0,0 +1,112 @@
+"""Multi-worker serving mode for the app: N uvicorn workers (default: one per core) on one port.
+
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 80
+
+Each worker binds its own listening socket with SO_REUSEPORT, so the kernel spreads incoming
+connections across workers without a shared accept queue. Tunnels, collections and endpoints live in a
+shared state file (APP_STATE_DB, a temporary file unless set) instead of per-process dicts, and each
+worker publishes its metrics there for GET /metrics. Dead workers are restarted.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("app.serve")
+
+HAS_REUSEPORT = hasattr(socket, "SO_REUSEPORT")
+
+
+def bind_socket(host: str, port: int, backlog: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(host: str, port: int, backlog: int, log_level: str, shared_sock: socket.socket = None) -> None:
+    import uvicorn
+
+    sock = shared_sock or bind_socket(host, port, backlog, reuse_port=True)
+    # ws="none": WebSocket upgrades reach the gateway as HTTP requests (see core/wsproxy.py)
+    config = uvicorn.Config("app.main:app", log_level=log_level, backlog=backlog, proxy_headers=True, ws="none")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app with several worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "80")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Shared state must be configured before any app module is imported (here or in the workers)
+    state_dir = None
+    if not os.getenv("APP_STATE_DB"):
+        state_dir = tempfile.mkdtemp(prefix="latencypoison-")
+        os.environ["APP_STATE_DB"] = os.path.join(state_dir, "state.db")
+    from .core import store
+    from .core.database import init_db
+
+    store.reset_shared_state(os.environ["APP_STATE_DB"])
+    init_db()  # once here, so workers do not race on CREATE TABLE
+
+    # Without SO_REUSEPORT all workers accept on one socket bound here
+    shared_sock = None if HAS_REUSEPORT else bind_socket(args.host, args.port, args.backlog, reuse_port=False)
+    if HAS_REUSEPORT:
+        # Fail fast on a busy port instead of in every worker
+        bind_socket(args.host, args.port, args.backlog, reuse_port=True).close()
+
+    ctx = multiprocessing.get_context("spawn")
+    worker_args = (args.host, args.port, args.backlog, args.log_level, shared_sock)
+    workers = []
+    stopping = False
+
+    def spawn():
+        p = ctx.Process(target=run_worker, args=worker_args, daemon=False)
+        p.start()
+        return p
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    logger.info(f"Starting {args.workers} workers on {args.host}:{args.port} (SO_REUSEPORT: {HAS_REUSEPORT})")
+    workers = [spawn() for _ in range(args.workers)]
+    try:
+        while not stopping:
+            time.sleep(0.5)
+            for i, p in enumerate(workers):
+                if not p.is_alive() and not stopping:
+                    logger.warning(f"Worker {p.pid} exited with code {p.exitcode}, restarting")
+                    workers[i] = spawn()
+    finally:
+        for p in workers:
+            if p.is_alive():
+                p.terminate()
+        for p in workers:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.kill()
+        if state_dir:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark the config-key data plane: Python gateway (app/) vs Go proxy, same key, same concurrency.
+
+Usage:
+    python bench_gateway.py --key lp_xxx --path /get \
+        --target python=http://localhost:80 --target go=http://localhost:8080 \
+        --concurrency 64 --requests 5000
+
+Use a key with fail_rate 0 and no latency to measure proxy overhead only. Each target gets a warmup
+pass (keys cached, pools filled), then the measured pass. Reports rps, p50/p90/p99 latency and errors.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(client, url, total, concurrency):
+    latencies = []
+    errors = {}
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                await response.aread()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": total / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--key", required=True, help="Config API key (lp_...)")
+    parser.add_argument("--path", default="/", help="Path appended after /{key}")
+    parser.add_argument("--target", action="append", required=True, help="name=base_url, repeatable")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    print(f"{'target':<10} {'rps':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}  errors")
+    for spec in args.target:
+        name, _, base = spec.partition("=")
+        url = base.rstrip("/") + "/" + args.key + args.path
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            await run(client, url, args.warmup, args.concurrency)
+            r = await run(client, url, args.requests, args.concurrency)
+        print(f"{name:<10} {r['rps']:>10.1f} {r['p50']:>9.2f} {r['p90']:>9.2f} {r['p99']:>9.2f}  {r['errors'] or '-'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
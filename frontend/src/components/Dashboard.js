@@ -28,6 +28,7 @@ import KeyIcon from '@mui/icons-material/Key';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import SettingsIcon from '@mui/icons-material/Settings';
 import TimelineIcon from '@mui/icons-material/Timeline';
+import ErrorOutlineIcon from '@mui/icons-material/ErrorOutline';
 import {
   BarChart,
   Bar,
@@ -40,7 +41,7 @@ import {
   ResponsiveContainer,
   Legend,
 } from 'recharts';
-import { fetchConfigKeys, fetchUsageTimeline, fetchUsageSummary } from '../services/api';
+import { fetchConfigKeys, fetchUsageTimeline, fetchUsageSummary, openUsageStream } from '../services/api';
 
 const COLORS = ['#90caf9', '#f48fb1', '#ce93d8', '#81c784', '#ffb74d'];
 
@@ -53,6 +54,9 @@ function Dashboard() {
   const [usageTimeline, setUsageTimeline] = useState(null);
   const [usageLoading, setUsageLoading] = useState(false);
   const [usageSummary, setUsageSummary] = useState(null);
+  const [liveErrors, setLiveErrors] = useState(null);
+  // Bumped when the live stream asks for a resync (this tab missed deltas): reloads summary and timeline
+  const [resyncCount, setResyncCount] = useState(0);
 
   useEffect(() => {
     let cancelled = false;
@@ -81,6 +85,42 @@ function Dashboard() {
       }
     })();
     return () => { cancelled = true; };
+  }, [configKeys.length, resyncCount]);
+
+  // Totals are loaded once; live deltas from the usage stream are added on top (no polling)
+  useEffect(() => {
+    if (!configKeys.length) return undefined;
+    const source = openUsageStream();
+    if (!source) return undefined;
+    source.addEventListener('hello', () => setLiveErrors((n) => n ?? 0));
+    source.addEventListener('resync', () => setResyncCount((n) => n + 1));
+    source.addEventListener('usage', (e) => {
+      const { keys } = JSON.parse(e.data);
+      let requests = 0;
+      let errors = 0;
+      Object.values(keys).forEach((d) => {
+        requests += d.requests;
+        errors += d.errors;
+      });
+      setLiveErrors((n) => (n ?? 0) + errors);
+      setUsageSummary((prev) => (prev && !prev.error ? {
+        ...prev,
+        total_requests: prev.total_requests + requests,
+        by_key: (prev.by_key || []).map((k) => (keys[k.key_id] ? { ...k, count: k.count + keys[k.key_id].requests } : k)),
+      } : prev));
+      // New requests belong to the current (last) bucket of the timeline
+      setUsageTimeline((prev) => (prev ? {
+        ...prev,
+        series: (prev.series || []).map((s) => {
+          const d = keys[s.key_id];
+          if (!d || !s.counts?.length) return s;
+          const counts = s.counts.slice();
+          counts[counts.length - 1] += d.requests;
+          return { ...s, counts };
+        }),
+      } : prev));
+    });
+    return () => source.close();
   }, [configKeys.length]);
 
   useEffect(() => {
@@ -100,7 +140,7 @@ function Dashboard() {
       }
     })();
     return () => { cancelled = true; };
-  }, [configKeys.length, groupBy, period]);
+  }, [configKeys.length, groupBy, period, resyncCount]);
 
   const activeCount = configKeys.filter((k) => k.is_active).length;
   const chartData = configKeys.map((k) => ({
@@ -175,6 +215,17 @@ function Dashboard() {
               </CardContent>
             </Card>
           </Grid>
+          <Grid item xs={12} sm={6} md={3}>
+            <Card>
+              <CardContent>
+                <Box sx={{ display: 'flex', alignItems: 'center', gap: 1, mb: 1 }}>
+                  <ErrorOutlineIcon color="error" />
+                  <Typography color="text.secondary" variant="body2">Errors (live, since page load)</Typography>
+                </Box>
+                <Typography variant="h4">{liveErrors ?? '—'}</Typography>
+              </CardContent>
+            </Card>
+          </Grid>
         </Grid>
 
         {usageSummary?.error && (
@@ -18,6 +18,7 @@ export const API_ENDPOINTS = {
   },
   USAGE_TIMELINE: `${API_BASE_URL}/api/usage/timeline`,
   USAGE_SUMMARY: `${API_BASE_URL}/api/usage/summary`,
+  USAGE_STREAM: `${API_BASE_URL}/api/usage/stream`,
   BILLING: {
     PLANS: `${API_BASE_URL}/api/billing/plans`,
     USAGE: `${API_BASE_URL}/api/billing/usage`,
@@ -107,6 +107,13 @@ export const fetchUsageSummary = async () => {
   return handleResponse(response);
 };
 
+// Live usage deltas (server-sent events). EventSource cannot send headers, so the token goes in the query.
+export const openUsageStream = () => {
+  const token = localStorage.getItem('token');
+  if (!token || typeof EventSource === 'undefined') return null;
+  return new EventSource(`${API_ENDPOINTS.USAGE_STREAM}?${new URLSearchParams({ token })}`);
+};
+
 // Billing
 export const fetchBillingPlans = async () => {
   const response = await fetch(API_ENDPOINTS.BILLING.PLANS);
@@ -7,6 +7,30 @@ Usage:
 Or with mitmdump (headless):
     mitmdump -p 9090 -s mitmproxy_addon.py --set apikey=YOUR_API_KEY --set proxy_host=localhost:8080
 
+Route hosts to their config keys (the /{apiKey}/path route: the key's target_url must be the host's origin):
+    mitmdump -p 9090 -s mitmproxy_addon.py --set host_keys=api.github.com=lp_xxx,localhost:3000=lp_yyy
+    mitmdump -p 9090 -s mitmproxy_addon.py --set api_url=http://localhost:8000 --set api_token=JWT
+
+With api_url/api_token, the mapping is built once from your active config keys (their target_url
+hosts). allow_hosts limits interception to a comma-separated list of hosts; other traffic passes
+through untouched. Hosts without a config key go to /proxy/?url=... with apikey, when it is set.
+
+Local chaos (no second hop): the keys' chaos settings are applied in the addon and requests go
+straight to their host. Keys are re-read every refresh_interval seconds:
+    mitmdump -p 9090 -s mitmproxy_addon.py --set api_url=http://localhost:8000 --set api_token=JWT \
+        --set local_chaos=true --set refresh_interval=30
+
+Latency, injected failures, schedules, method checks and seeds behave as on the proxy (same decision
+code, app/core/chaos.py). Response corruption, transport faults and usage recording need the proxy
+route; hosts mapped with host_keys only (no settings) are still routed to the proxy.
+
+The addon imports app.core.chaos (standard library only: no FastAPI, pydantic or database), so run
+mitmproxy from the repository root or put the root on PYTHONPATH:
+    PYTHONPATH=/path/to/simple-python-poison-latency mitmdump -p 9090 -s mitmproxy_addon.py ...
+
+Record traffic for replay_capture.py (one JSON line per request, original URLs and timings):
+    mitmdump -p 9090 -s mitmproxy_addon.py --set capture=capture.ndjson
+
 Then configure your browser to use localhost:9090 as HTTP/HTTPS proxy.
 
 First time setup - install mitmproxy CA certificate:
@@ -15,12 +39,90 @@ First time setup - install mitmproxy CA certificate:
     3. Import into browser (Firefox: Settings → Privacy → Certificates → Import)
 """
 
+import asyncio
+import base64
+import json
+import time
+from http import HTTPStatus
+
 import mitmproxy.http
 from mitmproxy import ctx
 import urllib.parse
+import urllib.request
+
+from app.core.chaos import KeyConfig, LocalStates, method_allowed, pick_failure, sample_latency, seeded_rng
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+OPTIONS = ("apikey", "proxy_host", "host_keys", "allow_hosts", "api_url", "api_token", "local_chaos", "refresh_interval", "capture")
+# Config key fields needed to decide chaos locally
+KEY_FIELDS = "key,target_url,method,fail_rate,min_latency,max_latency,error_codes,schedule,seed,seed_mode,failure_bursts"
+SEED_HEADER = "X-Latency-Poison-Seed"
+SEQ_HEADER = "X-Latency-Poison-Seq"
+
+
+def host_id(host: str, port: int, scheme: str) -> str:
+    """'host' on the scheme's default port, 'host:port' otherwise (the form used in host_keys)."""
+    host = host.lower()
+    return host if DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+
+
+def split_list(value: str):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def header_int(headers, name: str):
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def fetch_host_keys(api_url: str, token: str) -> dict:
+    """host -> [(base path, key, KeyConfig)] for the active config keys of the token's user, longest base
+    path first (first key per host and base path wins)."""
+    routes = {}
+    after = None
+    while True:
+        query = {"is_active": "true", "fields": KEY_FIELDS, "limit": "100"}
+        if after is not None:
+            query["after"] = after
+        request = urllib.request.Request(
+            f"{api_url.rstrip('/')}/api/config-keys/?{urllib.parse.urlencode(query)}",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            keys = json.load(response)
+            after = response.headers.get("X-Next-Cursor")
+        for k in keys:
+            target = urllib.parse.urlsplit(k.get("target_url") or "")
+            if target.scheme in DEFAULT_PORTS and target.hostname:
+                host = host_id(target.hostname, target.port or DEFAULT_PORTS[target.scheme], target.scheme)
+                routes.setdefault(host, {}).setdefault(target.path.rstrip("/"), k)
+        if not after:
+            return {
+                host: [(base, k["key"], KeyConfig.from_row(k)) for base, k in sorted(bases.items(), key=lambda b: -len(b[0]))]
+                for host, bases in routes.items()
+            }
 
 
 class LatencyPoisonAddon:
+    def __init__(self):
+        # Filled by configure() from the options, so request() does lookups only
+        self.routes = {}
+        self.allowed = frozenset()
+        self.skip = frozenset()
+        self.apikey = ""
+        self.proxy_host = ""
+        self.proxy_hostname = ""
+        self.proxy_port = 8080
+        self.local_chaos = False
+        self.host_keys = {}
+        # (key id, seed) request counters for seeded keys (see chaos.seeded_rng)
+        self.sequences = {}
+        self.burst_states = LocalStates()
+        self._refresh_task = None
+        self.capture_file = None
+
     def load(self, loader):
         loader.add_option(
             name="apikey",
@@ -34,44 +136,202 @@ class LatencyPoisonAddon:
             default="localhost:8080",
             help="Latency Poison proxy host:port"
         )
+        loader.add_option(
+            name="host_keys",
+            typespec=str,
+            default="",
+            help="Config key per host: host=key,host:port=key (routed to /{key}/path)"
+        )
+        loader.add_option(
+            name="allow_hosts",
+            typespec=str,
+            default="",
+            help="Only intercept these hosts (comma-separated; empty = all)"
+        )
+        loader.add_option(
+            name="api_url",
+            typespec=str,
+            default="",
+            help="Latency Poison API URL: map hosts to your config keys by their target_url"
+        )
+        loader.add_option(
+            name="api_token",
+            typespec=str,
+            default="",
+            help="Access token for api_url"
+        )
+        loader.add_option(
+            name="local_chaos",
+            typespec=bool,
+            default=False,
+            help="Apply the config keys' chaos in the addon instead of routing through the proxy"
+        )
+        loader.add_option(
+            name="refresh_interval",
+            typespec=int,
+            default=30,
+            help="Seconds between reloads of the config keys from api_url (local_chaos)"
+        )
+        loader.add_option(
+            name="capture",
+            typespec=str,
+            default="",
+            help="Append every request and its timing to this NDJSON file (for replay_capture.py)"
+        )
+
+    def configure(self, updated):
+        if not updated & set(OPTIONS):
+            return
+        opts = ctx.options
+        self.apikey = opts.apikey
+        self.proxy_host = opts.proxy_host
+        hostname, _, port = opts.proxy_host.partition(":")
+        self.proxy_hostname = hostname
+        self.proxy_port = int(port) if port else 8080
+        # Requests to the proxy itself are never rewritten (loops)
+        self.skip = frozenset({host_id(hostname, self.proxy_port, "http")})
+        self.allowed = frozenset(h.lower() for h in split_list(opts.allow_hosts))
+        self.local_chaos = opts.local_chaos
+        self.host_keys = {}
+        for entry in split_list(opts.host_keys):
+            host, _, key = entry.partition("=")
+            if key:
+                self.host_keys[host.strip().lower()] = [("", key.strip(), None)]
+
+        routes = {}
+        if opts.api_url and opts.api_token:
+            try:
+                routes = fetch_host_keys(opts.api_url, opts.api_token)
+                ctx.log.info(f"Loaded {len(routes)} host mappings from {opts.api_url}")
+            except Exception as e:
+                ctx.log.error(f"Could not load config keys from {opts.api_url}: {e}")
+        self.routes = {**routes, **self.host_keys}
+        if not self.routes and not self.apikey and not opts.capture:
+            ctx.log.warn("No API key configured! Use --set apikey=YOUR_KEY or --set host_keys=host=KEY")
+        if "capture" in updated:
+            if self.capture_file is not None:
+                self.capture_file.close()
+            self.capture_file = open(opts.capture, "a", encoding="utf-8", buffering=1) if opts.capture else None
+
+    async def _refresh(self):
+        """Reload the config keys every refresh_interval seconds (local chaos); keep the last ones on errors."""
+        while True:
+            await asyncio.sleep(max(1, ctx.options.refresh_interval))
+            opts = ctx.options
+            if not (self.local_chaos and opts.api_url and opts.api_token):
+                continue
+            try:
+                routes = await asyncio.to_thread(fetch_host_keys, opts.api_url, opts.api_token)
+            except Exception as e:
+                ctx.log.error(f"Could not refresh config keys from {opts.api_url}: {e}")
+                continue
+            self.routes = {**routes, **self.host_keys}
+
+    def running(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    def done(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self.capture_file is not None:
+            self.capture_file.close()
+            self.capture_file = None
 
-    def request(self, flow: mitmproxy.http.HTTPFlow) -> None:
-        apikey = ctx.options.apikey
-        proxy_host = ctx.options.proxy_host
-        
-        if not apikey:
-            ctx.log.warn("No API key configured! Use --set apikey=YOUR_KEY")
+    async def apply_chaos(self, flow: mitmproxy.http.HTTPFlow, key: str, config: KeyConfig, rest: str) -> None:
+        """Decide and apply the key's chaos here; the request then goes straight to its host (or gets its
+        response from the addon). Same decisions, in the same order, as the proxy's /{key}/path route."""
+        req = flow.request
+        settings = config.chaos_at(time.time())
+        rng, seq = seeded_rng(
+            config, header_int(req.headers, SEED_HEADER), header_int(req.headers, SEQ_HEADER),
+            lambda: f"{req.method} /{key}{rest}\n{req.headers.get('X-Request-Id', '')}".encode("latin-1", "replace"),
+            self.sequences,
+        )
+        headers = {"X-Latency-Poison-Fail-Rate": str(settings.fail_rate)}
+        if seq is not None:
+            headers[SEQ_HEADER] = str(seq)
+        if not method_allowed(config, req.method):
+            flow.response = mitmproxy.http.Response.make(
+                405, json.dumps({"error": f"Method {req.method} not allowed (config method: {config.method})"}),
+                {**headers, "Content-Type": "application/json"},
+            )
             return
-        
-        # Build the original URL
-        original_url = flow.request.pretty_url
-        
-        # Skip requests to the proxy itself to avoid loops
-        if proxy_host in original_url or "latencypoison" in original_url.lower():
+        latency = sample_latency(settings, rng)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+        if config.failure_bursts is not None:
+            bad = self.burst_states.step(config.id, config.failure_bursts, rng)
+            headers["X-Latency-Poison-Failure-State"] = "bad" if bad else "good"
+            settings = config.failure_bursts.apply(settings, bad)
+        code = pick_failure(settings, rng)
+        if code is not None:
+            try:
+                reason = HTTPStatus(code).phrase
+            except ValueError:
+                reason = ""
+            flow.response = mitmproxy.http.Response.make(code, reason, {**headers, "Content-Type": "text/plain"})
             return
-        
-        # URL encode the target
-        encoded_url = urllib.parse.quote(original_url, safe='')
-        
-        # Rewrite to go through Latency Poison proxy
-        proxy_url = f"http://{proxy_host}/proxy/?url={encoded_url}"
-        
-        ctx.log.info(f"Redirecting: {original_url} -> Latency Poison proxy")
-        
-        # Modify the request
-        flow.request.host = proxy_host.split(':')[0]
-        flow.request.port = int(proxy_host.split(':')[1]) if ':' in proxy_host else 8080
-        flow.request.scheme = "http"
-        flow.request.path = f"/proxy/?url={encoded_url}"
-        
-        # Add API key header
-        flow.request.headers["X-API-Key"] = apikey
-        
-        # Keep original headers that might be needed
-        if "Host" in flow.request.headers:
-            flow.request.headers["X-Original-Host"] = flow.request.headers["Host"]
-        
-        flow.request.headers["Host"] = proxy_host
+        flow.metadata["latency_poison_headers"] = headers
+
+    def record(self, flow: mitmproxy.http.HTTPFlow) -> None:
+        """One capture line: the request as the client sent it, its status and total time."""
+        method, url, headers, body = flow.metadata["latency_poison_capture"]
+        line = {
+            "started": flow.request.timestamp_start,
+            "method": method,
+            "url": url,
+            "headers": headers,
+            "status": flow.response.status_code,
+            "duration_ms": round(((flow.response.timestamp_end or time.time()) - flow.request.timestamp_start) * 1000, 3),
+        }
+        try:
+            line["body"] = body.decode()
+        except UnicodeDecodeError:
+            line["body_base64"] = base64.b64encode(body).decode()
+        self.capture_file.write(json.dumps(line) + "\n")
+
+    def response(self, flow: mitmproxy.http.HTTPFlow) -> None:
+        headers = flow.metadata.get("latency_poison_headers")
+        if headers:
+            flow.response.headers.update(headers)
+        if self.capture_file is not None and "latency_poison_capture" in flow.metadata:
+            self.record(flow)
+
+    async def request(self, flow: mitmproxy.http.HTTPFlow) -> None:
+        req = flow.request
+        if self.capture_file is not None:
+            # Before any rewrite to the proxy
+            flow.metadata["latency_poison_capture"] = (
+                req.method, req.pretty_url, list(req.headers.items(multi=True)), req.raw_content or b"",
+            )
+        host = host_id(req.host, req.port, req.scheme)
+        if host in self.skip or (self.allowed and host not in self.allowed) or "latencypoison" in host:
+            return
+
+        path = req.path
+        for base, key, config in self.routes.get(host, ()):
+            if path.startswith(base) and path[len(base):len(base) + 1] in ("", "/", "?"):
+                if self.local_chaos and config is not None:
+                    await self.apply_chaos(flow, key, config, path[len(base):])
+                    return
+                # Config key route: /{key} + path below the key's target_url
+                req.path = f"/{key}{path[len(base):]}"
+                break
+        else:
+            if not self.apikey:
+                return
+            # No key for this host: the generic route with the full URL
+            req.path = f"/proxy/?url={urllib.parse.quote(req.pretty_url, safe='')}"
+            req.headers["X-API-Key"] = self.apikey
+
+        if "Host" in req.headers:
+            req.headers["X-Original-Host"] = req.headers["Host"]
+        req.host = self.proxy_hostname
+        req.port = self.proxy_port
+        req.scheme = "http"
+        req.headers["Host"] = self.proxy_host
 
 
 addons = [LatencyPoisonAddon()]
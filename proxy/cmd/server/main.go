@@ -40,6 +40,9 @@ func main() {
 	app := fiber.New(fiber.Config{
 		AppName: "Latency Simulation Proxy",
 	})
+	// Hijacked connections (transport faults, dropped bodies) are closed by their handlers, so hung
+	// ones can be parked without a goroutine each
+	app.Server().KeepHijackedConns = true
 
 	// Add CORS middleware
 	app.Use(cors.New(cors.Config{
@@ -50,11 +53,13 @@ func main() {
 
 	// Initialize handlers with MySQL database
 	handler := handlers.NewHandler(logger, mysqlClient.GetDB())
+	defer handler.Close()
 
 	app.Get("/sandbox", handler.SandboxHandler)
 	app.Get("/health", func(c *fiber.Ctx) error {
 		return c.JSON(fiber.Map{"status": "ok"})
 	})
+	app.Get("/metrics", handler.MetricsHandler)
 	// Config proxy: /{apiKey} or /{apiKey}/* -> one key -> one target URL + chaos
 	app.All("/:apiKey", handler.ConfigKeyProxyHandler)
 	app.All("/:apiKey/*", handler.ConfigKeyProxyHandler)
@@ -0,0 +1,29 @@
+// Package bursts holds the good/bad state of keys with failure bursts (see chaos.FailureBursts): one
+// atomic bool per key, moved by one transition per request. Same model as the Python gateway
+// (app/core/bursts.py).
+package bursts
+
+import (
+	"sync"
+	"sync/atomic"
+
+	"github.com/grrr/latency-sim-proxy/internal/chaos"
+)
+
+// States maps key ids to their state.
+type States struct {
+	keys sync.Map // key id -> *atomic.Bool (true: in a burst)
+}
+
+// Step moves the key's state one request forward and reports whether it is (now) in a burst.
+func (s *States) Step(id int, b *chaos.FailureBursts, rng chaos.RNG) bool {
+	v, ok := s.keys.Load(id)
+	if !ok {
+		v, _ = s.keys.LoadOrStore(id, new(atomic.Bool))
+	}
+	state := v.(*atomic.Bool)
+	bad := b.Step(state.Load(), rng)
+	// Concurrent requests of the key each make their transition; the last one written wins
+	state.Store(bad)
+	return bad
+}
@@ -0,0 +1,50 @@
+package chaos
+
+import "encoding/json"
+
+// FailureBursts is the JSON stored in config_api_keys.failure_bursts: correlated failures (Gilbert-Elliott).
+// Each request first moves a key in the good state to bad with probability PEnter, or a bad one back with
+// PExit (see internal/bursts), then fails at the key's fail_rate when good and BadFailRate when bad.
+type FailureBursts struct {
+	PEnter      float64 `json:"p_enter"`
+	PExit       float64 `json:"p_exit"`
+	BadFailRate *int    `json:"bad_fail_rate"`
+}
+
+// ParseFailureBursts reads stored failure bursts. Returns nil when off. BadFailRate defaults to 100.
+func ParseFailureBursts(raw []byte) (*FailureBursts, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var b FailureBursts
+	if err := json.Unmarshal(raw, &b); err != nil {
+		return nil, err
+	}
+	if !(b.PEnter > 0) {
+		return nil, nil
+	}
+	b.PEnter = min(b.PEnter, 1)
+	b.PExit = max(0, min(b.PExit, 1))
+	rate := 100
+	if b.BadFailRate != nil {
+		rate = max(0, min(*b.BadFailRate, 100))
+	}
+	b.BadFailRate = &rate
+	return &b, nil
+}
+
+// Step is the state after one request's transition (true: bad).
+func (b *FailureBursts) Step(bad bool, rng RNG) bool {
+	if bad {
+		return rng.Float64() >= b.PExit
+	}
+	return rng.Float64() < b.PEnter
+}
+
+// Apply returns the settings in effect in the given state.
+func (b *FailureBursts) Apply(s Settings, bad bool) Settings {
+	if bad {
+		s.FailRate = *b.BadFailRate
+	}
+	return s
+}
@@ -0,0 +1,45 @@
+package chaos
+
+import (
+	"encoding/json"
+	"time"
+)
+
+// ConcurrencyLimit is the JSON stored in config_api_keys.concurrency_limit: a saturated target with
+// MaxInFlight slots (see internal/concurrency). Up to Queue more requests wait QueueTimeoutMs at most,
+// the others get a 503; a request queued in nth position gets n * LatencyPerQueuedMs of extra latency.
+type ConcurrencyLimit struct {
+	MaxInFlight        int  `json:"max_in_flight"`
+	Queue              int  `json:"queue"`
+	QueueTimeoutMs     *int `json:"queue_timeout_ms"`
+	LatencyPerQueuedMs int  `json:"latency_per_queued_ms"`
+}
+
+// ParseConcurrencyLimit reads a stored concurrency limit. Returns nil when off.
+func ParseConcurrencyLimit(raw []byte) (*ConcurrencyLimit, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var l ConcurrencyLimit
+	if err := json.Unmarshal(raw, &l); err != nil {
+		return nil, err
+	}
+	if l.MaxInFlight <= 0 {
+		return nil, nil
+	}
+	if l.Queue < 0 {
+		l.Queue = 0
+	}
+	if l.LatencyPerQueuedMs < 0 {
+		l.LatencyPerQueuedMs = 0
+	}
+	return &l, nil
+}
+
+// QueueTimeout is the longest wait for a slot (default 1s).
+func (l *ConcurrencyLimit) QueueTimeout() time.Duration {
+	if l.QueueTimeoutMs == nil || *l.QueueTimeoutMs < 0 {
+		return time.Second
+	}
+	return time.Duration(*l.QueueTimeoutMs) * time.Millisecond
+}
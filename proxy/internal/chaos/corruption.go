@@ -0,0 +1,90 @@
+package chaos
+
+import (
+	"encoding/json"
+)
+
+// Corruption modes for forwarded response bodies (config_api_keys.corruption)
+const (
+	CorruptTruncate      = "truncate"       // body cut, response ends cleanly (no Content-Length)
+	CorruptFlip          = "flip"           // FlipBytes random bytes XOR-ed, length unchanged
+	CorruptDrop          = "drop"           // connection closed after the cut, Content-Length still announced
+	CorruptMalformedJSON = "malformed_json" // body cut and followed by MalformedJSONTail
+)
+
+// MalformedJSONTail is appended after the cut so JSON parsers fail on syntax, not on end of input.
+var MalformedJSONTail = []byte(`",}`)
+
+// Corruption is the JSON stored in config_api_keys.corruption: Rate% of forwarded responses get one of Modes.
+type Corruption struct {
+	Rate       int      `json:"rate"`
+	Modes      []string `json:"modes"`
+	TruncateAt *int     `json:"truncate_at"` // percentage of the body kept; nil = random offset
+	FlipBytes  int      `json:"flip_bytes"`
+}
+
+// ParseCorruption reads a stored corruption config. Returns nil when disabled.
+func ParseCorruption(raw []byte) (*Corruption, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var c Corruption
+	if err := json.Unmarshal(raw, &c); err != nil {
+		return nil, err
+	}
+	modes := c.Modes[:0]
+	for _, m := range c.Modes {
+		switch m {
+		case CorruptTruncate, CorruptFlip, CorruptDrop, CorruptMalformedJSON:
+			modes = append(modes, m)
+		}
+	}
+	if len(c.Modes) == 0 {
+		modes = []string{CorruptTruncate}
+	}
+	c.Modes = modes
+	if c.FlipBytes <= 0 {
+		c.FlipBytes = 8
+	}
+	if c.Rate <= 0 || len(c.Modes) == 0 {
+		return nil, nil
+	}
+	return &c, nil
+}
+
+// Pick returns the mode for one forwarded response, or "" to relay it intact. Safe on a nil receiver.
+func (c *Corruption) Pick(rng RNG) string {
+	if c == nil || rng.Float64() >= float64(c.Rate)/100.0 {
+		return ""
+	}
+	return c.Modes[rng.Intn(len(c.Modes))]
+}
+
+// Cut returns the offset where a body of length n is cut (truncate, drop and malformed_json).
+func (c *Corruption) Cut(rng RNG, n int) int {
+	if c.TruncateAt != nil {
+		pct := *c.TruncateAt
+		if pct < 0 {
+			pct = 0
+		}
+		if pct > 100 {
+			pct = 100
+		}
+		return n * pct / 100
+	}
+	if n == 0 {
+		return 0
+	}
+	return rng.Intn(n)
+}
+
+// Flip XORs FlipBytes distinct random bytes of body (all of them if shorter) in place.
+func (c *Corruption) Flip(rng RNG, body []byte) {
+	k := c.FlipBytes
+	if k > len(body) {
+		k = len(body)
+	}
+	for _, i := range sample(rng, len(body), k) {
+		body[i] ^= 0xFF
+	}
+}
@@ -0,0 +1,71 @@
+package chaos
+
+import (
+	"encoding/json"
+)
+
+// Transport fault modes (config_api_keys.transport_faults)
+const (
+	FaultReset         = "reset"           // TCP RST instead of a response, the target is not called
+	FaultHang          = "hang"            // connection left open without a response for HangMs
+	FaultSlowFirstByte = "slow_first_byte" // target response held DelayMs before its headers are sent
+	FaultSlowBody      = "slow_body"       // headers sent at once, body DelayMs later
+)
+
+// TransportFaults is the JSON stored in config_api_keys.transport_faults: Rate% of requests get one of Modes.
+type TransportFaults struct {
+	Rate    int      `json:"rate"`
+	Modes   []string `json:"modes"`
+	DelayMs *int     `json:"delay_ms"`
+	HangMs  *int     `json:"hang_ms"`
+}
+
+// ParseTransportFaults reads a stored transport fault config. Returns nil when disabled.
+func ParseTransportFaults(raw []byte) (*TransportFaults, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var f TransportFaults
+	if err := json.Unmarshal(raw, &f); err != nil {
+		return nil, err
+	}
+	if len(f.Modes) == 0 {
+		f.Modes = []string{FaultReset}
+	}
+	modes := f.Modes[:0]
+	for _, m := range f.Modes {
+		switch m {
+		case FaultReset, FaultHang, FaultSlowFirstByte, FaultSlowBody:
+			modes = append(modes, m)
+		}
+	}
+	f.Modes = modes
+	if f.Rate <= 0 || len(f.Modes) == 0 {
+		return nil, nil
+	}
+	return &f, nil
+}
+
+// Pick returns the fault for one request, or "" for a normal exchange. Safe on a nil receiver.
+func (f *TransportFaults) Pick(rng RNG) string {
+	if f == nil || rng.Float64() >= float64(f.Rate)/100.0 {
+		return ""
+	}
+	return f.Modes[rng.Intn(len(f.Modes))]
+}
+
+// Delay is the slow_first_byte / slow_body delay in ms (default 5000).
+func (f *TransportFaults) Delay() int {
+	if f.DelayMs == nil || *f.DelayMs < 0 {
+		return 5000
+	}
+	return *f.DelayMs
+}
+
+// Hang is how long a hung connection is held open, in ms (default 60000).
+func (f *TransportFaults) Hang() int {
+	if f.HangMs == nil || *f.HangMs < 0 {
+		return 60000
+	}
+	return *f.HangMs
+}
@@ -0,0 +1,40 @@
+package chaos
+
+import (
+	"encoding/json"
+	"math"
+)
+
+// RateLimit is the JSON stored in config_api_keys.rate_limit: a token bucket of Burst requests refilled
+// at Rate per second (see internal/ratelimit).
+type RateLimit struct {
+	Rate  float64 `json:"rate"`
+	Burst *int    `json:"burst"`
+}
+
+// ParseRateLimit reads a stored rate limit. Returns nil when off. Burst defaults to Rate rounded up.
+func ParseRateLimit(raw []byte) (*RateLimit, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var l RateLimit
+	if err := json.Unmarshal(raw, &l); err != nil {
+		return nil, err
+	}
+	if !(l.Rate > 0) || math.IsInf(l.Rate, 0) {
+		return nil, nil
+	}
+	return &l, nil
+}
+
+// Size is the bucket size (at least 1).
+func (l *RateLimit) Size() int {
+	burst := int(math.Ceil(l.Rate))
+	if l.Burst != nil {
+		burst = *l.Burst
+	}
+	if burst < 1 {
+		return 1
+	}
+	return burst
+}
@@ -0,0 +1,86 @@
+package chaos
+
+import (
+	"hash/fnv"
+	"math/rand"
+)
+
+// RNG is the source of every chaos decision. *rand.Rand, Global and *CounterRNG implement it.
+type RNG interface {
+	Float64() float64
+	Intn(n int) int
+}
+
+type globalRNG struct{}
+
+func (globalRNG) Float64() float64 { return rand.Float64() }
+func (globalRNG) Intn(n int) int   { return rand.Intn(n) }
+
+// Global draws from the math/rand global source (unseeded chaos).
+var Global RNG = globalRNG{}
+
+const golden = 0x9E3779B97F4A7C15
+
+// Mix64 is the SplitMix64 finalizer: a bijective scramble of a 64-bit integer.
+func Mix64(z uint64) uint64 {
+	z += golden
+	z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9
+	z = (z ^ (z >> 27)) * 0x94D049BB133111EB
+	return z ^ (z >> 31)
+}
+
+// Hash64 is FNV-1a over data (request hashes for seed mode "request").
+func Hash64(data []byte) uint64 {
+	h := fnv.New64a()
+	h.Write(data)
+	return h.Sum64()
+}
+
+// CounterRNG is a counter-based generator: draw i for request n is Mix64 of (seed, n, i), a pure
+// function with no shared state, so concurrent requests need no lock. Same output as the Python
+// gateway (app/core/chaos.py CounterRng).
+type CounterRNG struct {
+	base uint64
+	i    uint64
+}
+
+// NewCounterRNG returns the generator for request n of a seeded run.
+func NewCounterRNG(seed, n uint64) *CounterRNG {
+	return &CounterRNG{base: Mix64(seed ^ Mix64(n))}
+}
+
+// Next64 returns the next 64 random bits.
+func (r *CounterRNG) Next64() uint64 {
+	r.i++
+	return Mix64(r.base + r.i*golden)
+}
+
+// Float64 returns a number in [0, 1).
+func (r *CounterRNG) Float64() float64 {
+	return float64(r.Next64()>>11) / (1 << 53)
+}
+
+// Intn returns a number in [0, n).
+func (r *CounterRNG) Intn(n int) int {
+	return int(r.Next64() % uint64(n))
+}
+
+// sample returns k distinct numbers of [0, n) (partial Fisher-Yates, as the Python side).
+func sample(rng RNG, n, k int) []int {
+	picked := make(map[int]int, k)
+	out := make([]int, 0, k)
+	for j := 0; j < k; j++ {
+		r := j + rng.Intn(n-j)
+		v, ok := picked[r]
+		if !ok {
+			v = r
+		}
+		out = append(out, v)
+		w, ok := picked[j]
+		if !ok {
+			w = j
+		}
+		picked[r] = w
+	}
+	return out
+}
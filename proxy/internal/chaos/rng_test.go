@@ -0,0 +1,45 @@
+package chaos
+
+import "testing"
+
+// The same values are checked on the Python side (tests/test_chaos_parity.py): a seeded run must make
+// the same decisions in both proxies.
+
+func TestCounterRNGStream(t *testing.T) {
+	cases := []struct {
+		seed, n uint64
+		want    [3]uint64
+	}{
+		{0, 0, [3]uint64{17913671590881668180, 5125111896206277188, 16650050240625395466}},
+		{42, 0, [3]uint64{9768087101940977081, 16198280482362107779, 5575036784327092912}},
+		{42, 1, [3]uint64{10484939787884347202, 209618559335851655, 1465413541280160453}},
+		{1<<64 - 1, 12345, [3]uint64{15781758747013243463, 11432469452498933060, 16155869564082819130}},
+	}
+	for _, c := range cases {
+		r := NewCounterRNG(c.seed, c.n)
+		for i, want := range c.want {
+			if got := r.Next64(); got != want {
+				t.Errorf("seed %d n %d draw %d: got %d, want %d", c.seed, c.n, i, got, want)
+			}
+		}
+	}
+}
+
+func TestCounterRNGFloatAndIntn(t *testing.T) {
+	r := NewCounterRNG(42, 0)
+	if got := r.Float64(); got != 0.52952906284760204 {
+		t.Errorf("Float64: got %.17g", got)
+	}
+	if got := r.Intn(1000); got != 779 {
+		t.Errorf("Intn: got %d", got)
+	}
+}
+
+func TestMix64AndHash64(t *testing.T) {
+	if got := Mix64(123456789); got != 2466975172287755897 {
+		t.Errorf("Mix64: got %d", got)
+	}
+	if got := Hash64([]byte("GET /lp_test/a?x=1\nreq-1")); got != 336266627662317258 {
+		t.Errorf("Hash64: got %d", got)
+	}
+}
@@ -0,0 +1,111 @@
+package chaos
+
+import (
+	"encoding/json"
+	"sort"
+	"time"
+)
+
+// Settings are the chaos parameters applied to one request
+type Settings struct {
+	FailRate   int // percentage 0-100
+	MinLatency int // ms
+	MaxLatency int // ms
+	ErrorCodes []int
+}
+
+// Phase overrides the static settings for a time window. Nil fields keep the static value.
+type Phase struct {
+	Duration   float64 `json:"duration"` // seconds
+	FailRate   *int    `json:"fail_rate"`
+	MinLatency *int    `json:"min_latency"`
+	MaxLatency *int    `json:"max_latency"`
+	ErrorCodes []int   `json:"error_codes"`
+}
+
+// Schedule is the JSON stored in config_api_keys.schedule
+type Schedule struct {
+	StartAt time.Time `json:"start_at"`
+	Repeat  bool      `json:"repeat"`
+	Phases  []Phase   `json:"phases"`
+}
+
+// Timeline is a compiled schedule: cumulative phase end offsets, so finding the
+// active phase is a binary search over the phases.
+type Timeline struct {
+	start  time.Time
+	ends   []time.Duration
+	phases []Phase
+	repeat bool
+}
+
+// ParseTimeline compiles a stored schedule. Returns nil for an empty schedule.
+func ParseTimeline(raw []byte) (*Timeline, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var s Schedule
+	if err := json.Unmarshal(raw, &s); err != nil {
+		return nil, err
+	}
+	return Compile(s), nil
+}
+
+// Compile builds a Timeline. Phases with a non-positive duration are skipped.
+func Compile(s Schedule) *Timeline {
+	t := &Timeline{start: s.StartAt, repeat: s.Repeat}
+	var total time.Duration
+	for _, p := range s.Phases {
+		if p.Duration <= 0 {
+			continue
+		}
+		total += time.Duration(p.Duration * float64(time.Second))
+		t.ends = append(t.ends, total)
+		t.phases = append(t.phases, p)
+	}
+	if len(t.phases) == 0 {
+		return nil
+	}
+	return t
+}
+
+// At returns the phase active at now, or nil before the start and after the last phase
+// (unless the schedule repeats).
+func (t *Timeline) At(now time.Time) *Phase {
+	if t == nil {
+		return nil
+	}
+	elapsed := now.Sub(t.start)
+	if elapsed < 0 {
+		return nil
+	}
+	total := t.ends[len(t.ends)-1]
+	if elapsed >= total {
+		if !t.repeat {
+			return nil
+		}
+		elapsed %= total
+	}
+	i := sort.Search(len(t.ends), func(i int) bool { return t.ends[i] > elapsed })
+	return &t.phases[i]
+}
+
+// Apply returns base with the phase overrides applied.
+func (p *Phase) Apply(base Settings) Settings {
+	if p == nil {
+		return base
+	}
+	if p.FailRate != nil {
+		base.FailRate = *p.FailRate
+	}
+	if p.MinLatency != nil {
+		base.MinLatency = *p.MinLatency
+	}
+	if p.MaxLatency != nil {
+		base.MaxLatency = *p.MaxLatency
+	}
+	if len(p.ErrorCodes) > 0 {
+		base.ErrorCodes = p.ErrorCodes
+	}
+	return base
+}
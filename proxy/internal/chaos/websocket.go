@@ -0,0 +1,79 @@
+package chaos
+
+import "encoding/json"
+
+// WebSocket message fault modes (config_api_keys.websocket_chaos)
+const (
+	WSDrop      = "drop"      // the message is not delivered
+	WSDuplicate = "duplicate" // the message is delivered twice
+	WSReorder   = "reorder"   // the message is held back and delivered after the next one in its direction
+	WSClose     = "close"     // both sides get a close frame with CloseCode and the connection ends
+)
+
+// WebSocketChaos is the JSON stored in config_api_keys.websocket_chaos: each data message relayed on a
+// proxied WebSocket is held for a delay in [MinDelayMs, MaxDelayMs), then Rate% of them get one of Modes.
+// Direction limits this to messages sent by the "client" or by the "target" (default "both").
+type WebSocketChaos struct {
+	Rate       int      `json:"rate"`
+	Modes      []string `json:"modes"`
+	MinDelayMs int      `json:"min_delay_ms"`
+	MaxDelayMs int      `json:"max_delay_ms"`
+	CloseCode  int      `json:"close_code"`
+	Direction  string   `json:"direction"`
+}
+
+// ParseWebSocketChaos reads stored WebSocket chaos. Returns nil when off (no fault rate and no delay).
+func ParseWebSocketChaos(raw []byte) (*WebSocketChaos, error) {
+	if len(raw) == 0 || string(raw) == "null" {
+		return nil, nil
+	}
+	var w WebSocketChaos
+	if err := json.Unmarshal(raw, &w); err != nil {
+		return nil, err
+	}
+	if len(w.Modes) == 0 {
+		w.Modes = []string{WSDrop}
+	}
+	modes := w.Modes[:0]
+	for _, m := range w.Modes {
+		switch m {
+		case WSDrop, WSDuplicate, WSReorder, WSClose:
+			modes = append(modes, m)
+		}
+	}
+	w.Modes = modes
+	w.Rate = max(0, min(w.Rate, 100))
+	w.MinDelayMs = max(0, w.MinDelayMs)
+	w.MaxDelayMs = max(0, w.MaxDelayMs)
+	if w.CloseCode == 0 {
+		w.CloseCode = 1011
+	}
+	if w.Direction != "client" && w.Direction != "target" {
+		w.Direction = "both"
+	}
+	if !(w.Rate > 0 && len(w.Modes) > 0) && w.MinDelayMs == 0 && w.MaxDelayMs == 0 {
+		return nil, nil
+	}
+	return &w, nil
+}
+
+// AppliesTo reports whether messages sent by direction ("client" or "target") get chaos. Safe on a nil receiver.
+func (w *WebSocketChaos) AppliesTo(direction string) bool {
+	return w != nil && (w.Direction == "both" || w.Direction == direction)
+}
+
+// Delay is the delay in ms for one message.
+func (w *WebSocketChaos) Delay(rng RNG) int {
+	if w.MaxDelayMs > w.MinDelayMs {
+		return w.MinDelayMs + rng.Intn(w.MaxDelayMs-w.MinDelayMs)
+	}
+	return w.MinDelayMs
+}
+
+// Pick returns the fault for one message, or "" to deliver it.
+func (w *WebSocketChaos) Pick(rng RNG) string {
+	if w.Rate <= 0 || len(w.Modes) == 0 || rng.Float64() >= float64(w.Rate)/100.0 {
+		return ""
+	}
+	return w.Modes[rng.Intn(len(w.Modes))]
+}
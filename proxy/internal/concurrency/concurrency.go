@@ -0,0 +1,90 @@
+// Package concurrency simulates saturated targets: each config key with a concurrency limit has a fixed
+// number of in-flight slots (a buffered channel), and requests that find them taken wait in a bounded
+// queue (blocked channel senders are served in arrival order) or are rejected. Same behaviour as the
+// Python gateway (app/core/concurrency.py).
+package concurrency
+
+import (
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+type bulkhead struct {
+	slots  chan struct{}
+	queued atomic.Int64
+}
+
+func (k *bulkhead) release() {
+	<-k.slots
+}
+
+// Bulkheads holds the slots of every limited key.
+type Bulkheads struct {
+	keys     sync.Map // key id -> *bulkhead
+	rejected atomic.Int64
+	timedOut atomic.Int64
+}
+
+func (b *Bulkheads) bulkhead(id, maxInFlight int) *bulkhead {
+	if v, ok := b.keys.Load(id); ok {
+		if k := v.(*bulkhead); cap(k.slots) == maxInFlight {
+			return k
+		}
+	}
+	// New key, or a changed limit: requests holding slots of the old one release them there
+	k := &bulkhead{slots: make(chan struct{}, maxInFlight)}
+	b.keys.Store(id, k)
+	return k
+}
+
+// Acquire takes a slot of the key, waiting up to timeout when queue allows it. Returns the function that
+// gives the slot back (nil when rejected or timed out) and the queue position at arrival (0 when a slot was free).
+func (b *Bulkheads) Acquire(id, maxInFlight, queue int, timeout time.Duration) (release func(), position int) {
+	k := b.bulkhead(id, maxInFlight)
+	select {
+	case k.slots <- struct{}{}:
+		return k.release, 0
+	default:
+	}
+	position = int(k.queued.Add(1))
+	defer k.queued.Add(-1)
+	if position > queue {
+		b.rejected.Add(1)
+		return nil, position
+	}
+	timer := time.NewTimer(timeout)
+	defer timer.Stop()
+	select {
+	case k.slots <- struct{}{}:
+		return k.release, position
+	case <-timer.C:
+		b.rejected.Add(1)
+		b.timedOut.Add(1)
+		return nil, position
+	}
+}
+
+// InFlight is the number of slots taken, over all keys.
+func (b *Bulkheads) InFlight() int {
+	n := 0
+	b.keys.Range(func(_, v any) bool {
+		n += len(v.(*bulkhead).slots)
+		return true
+	})
+	return n
+}
+
+// Queued is the number of requests waiting for a slot, over all keys.
+func (b *Bulkheads) Queued() int {
+	n := 0
+	b.keys.Range(func(_, v any) bool {
+		n += int(v.(*bulkhead).queued.Load())
+		return true
+	})
+	return n
+}
+
+// Rejected counts requests turned away (queue full or timed out); TimedOut the ones that waited in vain.
+func (b *Bulkheads) Rejected() int64 { return b.rejected.Load() }
+func (b *Bulkheads) TimedOut() int64 { return b.timedOut.Load() }
@@ -0,0 +1,93 @@
+// Package connfault holds client connections for transport faults: resets, and hung connections parked
+// without a goroutine each. The parker is capped (oldest evicted first) and one goroutine closes expired
+// connections, so hang faults at high rates cannot exhaust memory or file descriptors.
+package connfault
+
+import (
+	"net"
+	"sync"
+	"time"
+)
+
+// Reset closes conn with a TCP RST instead of a FIN (raw is the accepted connection, used for SO_LINGER).
+func Reset(raw, conn net.Conn) {
+	if tcp, ok := raw.(*net.TCPConn); ok {
+		tcp.SetLinger(0)
+	}
+	conn.Close()
+}
+
+type parked struct {
+	conn     net.Conn
+	deadline time.Time
+}
+
+// Parker keeps hung connections open until their deadline.
+type Parker struct {
+	max int
+
+	mu    sync.Mutex
+	conns []parked // in parking order
+
+	done chan struct{}
+}
+
+// NewParker starts the reaper. At most max connections are held.
+func NewParker(max int) *Parker {
+	p := &Parker{max: max, done: make(chan struct{})}
+	go p.run(time.Second)
+	return p
+}
+
+// Park holds conn open for hold, then closes it.
+func (p *Parker) Park(conn net.Conn, hold time.Duration) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	for len(p.conns) >= p.max && len(p.conns) > 0 {
+		p.conns[0].conn.Close()
+		p.conns[0] = parked{}
+		p.conns = p.conns[1:]
+	}
+	p.conns = append(p.conns, parked{conn: conn, deadline: time.Now().Add(hold)})
+}
+
+func (p *Parker) reap(now time.Time) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	kept := p.conns[:0]
+	for _, c := range p.conns {
+		if now.Before(c.deadline) {
+			kept = append(kept, c)
+		} else {
+			c.conn.Close()
+		}
+	}
+	for i := len(kept); i < len(p.conns); i++ {
+		p.conns[i] = parked{}
+	}
+	p.conns = kept
+}
+
+func (p *Parker) run(interval time.Duration) {
+	ticker := time.NewTicker(interval)
+	defer ticker.Stop()
+	for {
+		select {
+		case now := <-ticker.C:
+			p.reap(now)
+		case <-p.done:
+			return
+		}
+	}
+}
+
+// Close stops the reaper and closes every parked connection.
+func (p *Parker) Close() {
+	close(p.done)
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	for _, c := range p.conns {
+		c.conn.Close()
+	}
+	p.conns = nil
+}
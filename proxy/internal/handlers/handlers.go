@@ -1,33 +1,160 @@
 package handlers
 
 import (
+	"bufio"
 	"database/sql"
 	"fmt"
-	"math/rand"
+	"net"
 	"net/http"
+	"os"
 	"strconv"
 	"strings"
+	"sync"
+	"sync/atomic"
 	"time"
 
 	"github.com/gofiber/fiber/v2"
 	"go.uber.org/zap"
 
+	"github.com/grrr/latency-sim-proxy/internal/bursts"
+	"github.com/grrr/latency-sim-proxy/internal/chaos"
+	"github.com/grrr/latency-sim-proxy/internal/concurrency"
+	"github.com/grrr/latency-sim-proxy/internal/connfault"
+	"github.com/grrr/latency-sim-proxy/internal/journal"
 	"github.com/grrr/latency-sim-proxy/internal/models"
 	"github.com/grrr/latency-sim-proxy/internal/proxy"
+	"github.com/grrr/latency-sim-proxy/internal/ratelimit"
+	"github.com/grrr/latency-sim-proxy/internal/rollup"
+	"github.com/grrr/latency-sim-proxy/internal/synthetic"
+	"github.com/grrr/latency-sim-proxy/internal/wsproxy"
 )
 
 // Handler holds the application handlers and dependencies
 type Handler struct {
-	logger *zap.Logger
-	repo   *models.Repository
+	logger  *zap.Logger
+	repo    *models.Repository
+	keys    *models.KeyCache
+	journal *journal.Writer // nil unless JOURNAL_DIR is set
+	rollups *rollup.Recorder
+	parked  *connfault.Parker  // connections held by "hang" transport faults
+	buckets *ratelimit.Buckets // token buckets of keys with a rate limit
+	// in-flight slots and wait queues of keys with a concurrency limit
+	bulkheads concurrency.Bulkheads
+	// good/bad states of keys with failure bursts
+	bursts bursts.States
+	// open WebSocket relays
+	websockets wsproxy.Relays
+
+	// (key id, seed) -> *atomic.Uint64 request counter, for seed_mode "sequence"
+	sequences    sync.Map
+	sequenceKeys atomic.Int64
+}
+
+// Per-run seed (overrides the key's seed) and explicit request number for seeded chaos
+const (
+	seedHeader   = "X-Latency-Poison-Seed"
+	seqHeader    = "X-Latency-Poison-Seq"
+	maxSequences = 10000
+)
+
+type sequenceKey struct {
+	keyID int
+	seed  uint64
+}
+
+func parseUint64(s string) (uint64, bool) {
+	if v, err := strconv.ParseInt(s, 10, 64); err == nil {
+		return uint64(v), true
+	}
+	v, err := strconv.ParseUint(s, 10, 64)
+	return v, err == nil
+}
+
+// chaosRNG returns the RNG for this request's chaos decisions: chaos.Global, or a CounterRNG when a seed
+// is set (header or key). ok reports whether seq is meaningful.
+func (h *Handler) chaosRNG(c *fiber.Ctx, configKey *models.ConfigApiKey) (rng chaos.RNG, seq uint64, ok bool) {
+	seed, ok := parseUint64(c.Get(seedHeader))
+	if !ok {
+		if !configKey.Seed.Valid {
+			return chaos.Global, 0, false
+		}
+		seed = uint64(configKey.Seed.Int64)
+	}
+	if n, given := parseUint64(c.Get(seqHeader)); given {
+		seq = n
+	} else if configKey.SeedMode == "request" {
+		seq = chaos.Hash64([]byte(c.Method() + " " + string(c.Request().RequestURI()) + "\n" + c.Get("X-Request-Id")))
+	} else {
+		k := sequenceKey{configKey.ID, seed}
+		counter, found := h.sequences.Load(k)
+		if !found {
+			if h.sequenceKeys.Load() >= maxSequences {
+				// Runs that never come back would grow the map forever: start over
+				h.sequences.Range(func(key, _ any) bool {
+					h.sequences.Delete(key)
+					return true
+				})
+				h.sequenceKeys.Store(0)
+			}
+			counter, found = h.sequences.LoadOrStore(k, new(atomic.Uint64))
+			if !found {
+				h.sequenceKeys.Add(1)
+			}
+		}
+		seq = counter.(*atomic.Uint64).Add(1) - 1
+	}
+	return chaos.NewCounterRNG(seed, seq), seq, true
 }
 
 // NewHandler creates a new Handler instance
 func NewHandler(logger *zap.Logger, db *sql.DB) *Handler {
-	return &Handler{
-		logger: logger,
-		repo:   models.NewRepository(db),
+	repo := models.NewRepository(db)
+	h := &Handler{
+		logger:  logger,
+		repo:    repo,
+		keys:    models.NewKeyCache(repo, keyCacheTTL()),
+		parked:  connfault.NewParker(int(envInt64("TRANSPORT_MAX_PARKED", 1000))),
+		buckets: ratelimit.New(),
+	}
+	h.rollups = rollup.NewRecorder(repo.InsertRollups, time.Duration(envInt64("ROLLUP_FLUSH_INTERVAL_MS", 5000))*time.Millisecond, 100000, func(err error) {
+		logger.Error("Latency rollup write failed (kept for retry)", zap.Error(err))
+	})
+	if dir := os.Getenv("JOURNAL_DIR"); dir != "" {
+		w, err := journal.NewWriter(dir, envInt64("JOURNAL_MAX_BYTES", 64<<20), int(envInt64("JOURNAL_MAX_FILES", 32)), 200*time.Millisecond)
+		if err != nil {
+			logger.Error("Request journal disabled", zap.Error(err))
+		} else {
+			h.journal = w
+		}
+	}
+	return h
+}
+
+// Close flushes the latency rollups and the request journal and closes parked connections and WebSockets.
+func (h *Handler) Close() {
+	h.parked.Close()
+	h.websockets.CloseAll()
+	h.rollups.Close()
+	if h.journal != nil {
+		h.journal.Close()
+	}
+}
+
+func envInt64(name string, def int64) int64 {
+	v, err := strconv.ParseInt(os.Getenv(name), 10, 64)
+	if err != nil || v <= 0 {
+		return def
 	}
+	return v
+}
+
+// keyCacheTTL: how long a resolved config key is reused before re-reading MySQL (KEY_CACHE_TTL_MS, default 2000)
+func keyCacheTTL() time.Duration {
+	ms, err := strconv.Atoi(os.Getenv("KEY_CACHE_TTL_MS"))
+	if err != nil || ms < 0 {
+		ms = 2000
+	}
+	return time.Duration(ms) * time.Millisecond
 }
 
 // SandboxHandler handles the sandbox endpoint (no auth required)
@@ -60,6 +187,37 @@ func (h *Handler) SandboxHandler(c *fiber.Ctx) error {
 		MinLatency: minLatency,
 		MaxLatency: maxLatency,
 	}
+	// Seeded runs draw from a counter-based RNG: same seed and seq, same decisions
+	if seed, ok := parseUint64(c.Query("seed")); ok {
+		seq, ok := parseUint64(c.Query("seq"))
+		if !ok {
+			seq = chaos.Hash64([]byte(targetURL))
+		}
+		config.RNG = chaos.NewCounterRNG(seed, seq)
+	}
+	// Synthetic body (throughput tests): served from shared templates instead of forwarding
+	if sizeStr := c.Query("size"); sizeStr != "" {
+		size, err := synthetic.ParseSize(sizeStr)
+		chunkSize := c.QueryInt("chunkSize", 0)
+		var body *synthetic.Body
+		var shape *synthetic.Shape
+		if err == nil {
+			chunk := chunkSize
+			if chunk == 0 {
+				chunk = synthetic.DefaultChunkSize
+			}
+			body, shape, err = synthetic.NewBody(c.Query("shape", "json"), size, chunk, int(envInt64("SANDBOX_MAX_BODY_BYTES", 100<<20)))
+		}
+		if err != nil {
+			return c.Status(fiber.StatusBadRequest).JSON(fiber.Map{"error": err.Error()})
+		}
+		config.Synthetic = body
+		config.SyntheticType = c.Query("contentType", shape.ContentType)
+		config.SyntheticSize = size
+		if chunkSize != 0 {
+			config.SyntheticSize = -1
+		}
+	}
 
 	// Create proxy handler
 	proxyHandler := proxy.NewProxyHandler(h.logger, config)
@@ -82,7 +240,7 @@ func (h *Handler) ConfigKeyProxyHandler(c *fiber.Ctx) error {
 		return c.Status(fiber.StatusBadRequest).JSON(fiber.Map{"error": "API key path segment is required"})
 	}
 
-	configKey, err := h.repo.GetConfigApiKeyByKey(apiKeyStr)
+	configKey, err := h.keys.Get(apiKeyStr)
 	if err != nil {
 		if err == sql.ErrNoRows {
 			return c.Status(fiber.StatusUnauthorized).JSON(fiber.Map{
@@ -93,8 +251,16 @@ func (h *Handler) ConfigKeyProxyHandler(c *fiber.Ctx) error {
 		return c.Status(fiber.StatusInternalServerError).JSON(fiber.Map{"error": "Internal server error"})
 	}
 
+	// Static settings, or the active schedule phase (compiled once per cache fill, binary search per request)
+	settings := configKey.Chaos(time.Now())
+
 	// Debug: expose fail_rate so clients can verify (remove in production if desired)
-	c.Set("X-Latency-Poison-Fail-Rate", strconv.Itoa(configKey.FailRate))
+	c.Set("X-Latency-Poison-Fail-Rate", strconv.Itoa(settings.FailRate))
+	rng, seq, seeded := h.chaosRNG(c, configKey)
+	if seeded {
+		// Send it back as X-Latency-Poison-Seq (with the same seed) to replay this request's decisions
+		c.Set(seqHeader, strconv.FormatUint(seq, 10))
+	}
 
 	if configKey.TargetURL == "" {
 		return c.Status(fiber.StatusBadRequest).JSON(fiber.Map{
@@ -127,43 +293,258 @@ func (h *Handler) ConfigKeyProxyHandler(c *fiber.Ctx) error {
 		})
 	}
 
-	// Record usage for every request (including when we later simulate failure)
-	if err := h.repo.InsertUsage(configKey.ID, time.Now()); err != nil {
-		h.logger.Error("Usage log insert failed (dashboard usage will be empty)", zap.Error(err))
-		c.Set("X-Latency-Poison-Usage-Recorded", "0")
-	} else {
-		c.Set("X-Latency-Poison-Usage-Recorded", "1")
+	// Usage is recorded for every request from here on (including simulated failures), with the final status
+	requestedAt := time.Now()
+
+	var rate *ratelimit.Decision
+	if limit := configKey.RateLimit; limit != nil {
+		d := h.buckets.Take(configKey.ID, limit.Rate, limit.Size())
+		rate = &d
+		setRateLimitHeaders(c, d)
+		if !d.Allowed {
+			h.recordUsage(c, configKey.ID, fiber.StatusTooManyRequests, requestedAt, 0)
+			h.journalOutcome(configKey.ID, fiber.StatusTooManyRequests, journal.FlagInjected|journal.FlagRateLimited, 0, 0, requestedAt, method)
+			return c.Status(fiber.StatusTooManyRequests).JSON(fiber.Map{"error": "Rate limit exceeded"})
+		}
+	}
+
+	// The slot is held until the handler returns, i.e. until the target's response has been read
+	queueWait, extraLatency := "", 0
+	if limit := configKey.ConcurrencyLimit; limit != nil {
+		waited := time.Now()
+		release, position := h.bulkheads.Acquire(configKey.ID, limit.MaxInFlight, limit.Queue, limit.QueueTimeout())
+		if release == nil {
+			h.recordUsage(c, configKey.ID, fiber.StatusServiceUnavailable, requestedAt, 0)
+			h.journalOutcome(configKey.ID, fiber.StatusServiceUnavailable, journal.FlagInjected|journal.FlagSaturated, 0, 0, requestedAt, method)
+			return c.Status(fiber.StatusServiceUnavailable).JSON(fiber.Map{"error": fmt.Sprintf("Target saturated: %d requests in flight", limit.MaxInFlight)})
+		}
+		defer release()
+		if position > 0 {
+			queueWait = strconv.FormatInt(time.Since(waited).Milliseconds(), 10)
+			c.Set("X-Latency-Poison-Queue-Wait-Ms", queueWait)
+			extraLatency = position * limit.LatencyPerQueuedMs
+		}
 	}
 
 	// Apply latency
-	if configKey.MinLatency > 0 || configKey.MaxLatency > 0 {
-		latency := configKey.MinLatency
-		if configKey.MaxLatency > configKey.MinLatency {
-			latency = configKey.MinLatency + rand.Intn(configKey.MaxLatency-configKey.MinLatency)
+	latency := 0
+	if settings.MinLatency > 0 || settings.MaxLatency > 0 {
+		latency = settings.MinLatency
+		if settings.MaxLatency > settings.MinLatency {
+			latency = settings.MinLatency + rng.Intn(settings.MaxLatency-settings.MinLatency)
 		}
+	}
+	latency += extraLatency
+	if latency > 0 {
 		time.Sleep(time.Duration(latency) * time.Millisecond)
 	}
 
+	failureState := ""
+	if b := configKey.FailureBursts; b != nil {
+		bad := h.bursts.Step(configKey.ID, b, rng)
+		failureState = "good"
+		if bad {
+			failureState = "bad"
+		}
+		c.Set("X-Latency-Poison-Failure-State", failureState)
+		settings = b.Apply(settings, bad)
+	}
+
 	// Simulate failure: FailRate is 0–100 from DB, compare as 0–1 like sandbox
-	if configKey.FailRate > 0 && rand.Float64() < (float64(configKey.FailRate)/100.0) {
+	if settings.FailRate > 0 && rng.Float64() < (float64(settings.FailRate)/100.0) {
+		// 500 when the key has no error codes; no draw for a single code (same as the Python gateway)
 		code := 500
-		if len(configKey.ErrorCodes) > 0 {
-			code = configKey.ErrorCodes[rand.Intn(len(configKey.ErrorCodes))]
+		switch n := len(settings.ErrorCodes); {
+		case n == 1:
+			code = settings.ErrorCodes[0]
+		case n > 1:
+			code = settings.ErrorCodes[rng.Intn(n)]
 		}
+		h.recordUsage(c, configKey.ID, code, requestedAt, 0)
+		h.journalOutcome(configKey.ID, code, journal.FlagInjected, latency, 0, requestedAt, method)
 		return c.Status(code).SendString(http.StatusText(code))
 	}
 
+	faults := configKey.TransportFaults
+	fault := faults.Pick(rng)
+	if fault == chaos.FaultReset || fault == chaos.FaultHang {
+		// No response is written: the client gets a reset, or an open connection until it gives up
+		h.recordUsage(c, configKey.ID, 0, requestedAt, 0)
+		h.journalOutcome(configKey.ID, 0, journal.FlagTransportFault, latency, 0, requestedAt, method)
+		raw := c.Context().Conn()
+		hold := time.Duration(faults.Hang()) * time.Millisecond
+		c.Context().HijackSetNoResponse(true)
+		c.Context().Hijack(func(conn net.Conn) {
+			if fault == chaos.FaultReset {
+				connfault.Reset(raw, conn)
+			} else {
+				h.parked.Park(conn, hold)
+			}
+		})
+		return nil
+	}
+
+	if wsproxy.IsUpgrade(c.Get(fiber.HeaderConnection), c.Get(fiber.HeaderUpgrade)) {
+		return h.proxyWebSocket(c, configKey, targetURL, rng, latency, requestedAt, method)
+	}
+
 	// Forward to target
 	proxyConfig := &proxy.ProxyConfig{
 		TargetURL:  targetURL,
 		FailRate:   0,
-		FailCodes:  configKey.ErrorCodes,
+		FailCodes:  settings.ErrorCodes,
 		MinLatency: 0,
 		MaxLatency: 0,
+		RNG:        rng,
+	}
+	if method != fiber.MethodHead {
+		proxyConfig.Corruption = configKey.Corruption
+		proxyConfig.CorruptionMode = configKey.Corruption.Pick(rng)
 	}
 	proxyHandler := proxy.NewProxyHandler(h.logger, proxyConfig)
-	if err := proxyHandler.HandleFiberRequest(c); err != nil {
+	sent := time.Now()
+	err := proxyHandler.HandleFiberRequest(c)
+	upstream := time.Since(sent)
+	if err != nil {
+		h.recordUsage(c, configKey.ID, fiber.StatusBadGateway, requestedAt, upstream)
+		h.journalOutcome(configKey.ID, fiber.StatusBadGateway, journal.FlagUpstreamError, latency, upstream, requestedAt, method)
 		return c.Status(fiber.StatusBadGateway).JSON(fiber.Map{"error": err.Error()})
 	}
+	if rate != nil {
+		// The target's headers were copied over ours: the simulated limit replaces its own
+		setRateLimitHeaders(c, *rate)
+	}
+	if queueWait != "" {
+		c.Set("X-Latency-Poison-Queue-Wait-Ms", queueWait)
+	}
+	if failureState != "" {
+		c.Set("X-Latency-Poison-Failure-State", failureState)
+	}
+	var flags uint16
+	if proxyConfig.CorruptionMode != "" {
+		flags = journal.FlagCorrupted
+	}
+	if fault != "" {
+		flags |= journal.FlagTransportFault
+		c.Set("X-Latency-Poison-Transport-Fault", fault)
+		delay := time.Duration(faults.Delay()) * time.Millisecond
+		if fault == chaos.FaultSlowFirstByte {
+			time.Sleep(delay)
+		} else if !c.Context().Hijacked() {
+			// slow_body: headers are flushed at once, the body follows after the delay
+			body := append([]byte(nil), c.Response().Body()...)
+			c.Response().ImmediateHeaderFlush = true
+			c.Context().SetBodyStreamWriter(func(w *bufio.Writer) {
+				time.Sleep(delay)
+				w.Write(body)
+				w.Flush()
+			})
+		}
+	}
+	// The response is buffered until the handler returns, so the header can still be set here
+	h.recordUsage(c, configKey.ID, c.Response().StatusCode(), requestedAt, upstream)
+	h.journalOutcome(configKey.ID, c.Response().StatusCode(), flags, latency, upstream, requestedAt, method)
+	return nil
+}
+
+// proxyWebSocket forwards a WebSocket handshake; on a 101 the client connection is hijacked and relayed
+// with the key's websocket_chaos (see internal/wsproxy). The handshake itself counts as one request.
+func (h *Handler) proxyWebSocket(c *fiber.Ctx, configKey *models.ConfigApiKey, targetURL string, rng chaos.RNG, latency int, requestedAt time.Time, method string) error {
+	var headers [][2]string
+	c.Request().Header.VisitAll(func(k, v []byte) {
+		if wsproxy.Forwarded(string(k)) {
+			headers = append(headers, [2]string{string(k), string(v)})
+		}
+	})
+	sent := time.Now()
+	target, err := wsproxy.Dial(targetURL, headers, 30*time.Second)
+	upstream := time.Since(sent)
+	if err != nil {
+		h.recordUsage(c, configKey.ID, fiber.StatusBadGateway, requestedAt, upstream)
+		h.journalOutcome(configKey.ID, fiber.StatusBadGateway, journal.FlagUpstreamError, latency, upstream, requestedAt, method)
+		return c.Status(fiber.StatusBadGateway).JSON(fiber.Map{"error": "failed to proxy WebSocket: " + err.Error()})
+	}
+	status := target.Response.StatusCode
+	h.recordUsage(c, configKey.ID, status, requestedAt, upstream)
+	h.journalOutcome(configKey.ID, status, 0, latency, upstream, requestedAt, method)
+	if status != fiber.StatusSwitchingProtocols {
+		target.Conn.Close()
+		return c.Status(status).JSON(fiber.Map{"error": "Target did not accept the WebSocket upgrade: " + target.Response.Status})
+	}
+	// The chaos headers set so far go out with the target's 101
+	extra := http.Header{}
+	c.Response().Header.VisitAll(func(k, v []byte) {
+		if strings.HasPrefix(string(k), "X-") {
+			extra.Add(string(k), string(v))
+		}
+	})
+	head := target.Head(extra)
+	ws := configKey.WebSocketChaos
+	c.Context().HijackSetNoResponse(true)
+	c.Context().Hijack(func(conn net.Conn) {
+		h.websockets.Relay(conn, target, head, ws, rng)
+	})
 	return nil
 }
+
+// MetricsHandler reports the concurrency-limit gauges, the number of rate-limit buckets and of open
+// WebSockets (GET /metrics), under the names the Python gateway uses.
+func (h *Handler) MetricsHandler(c *fiber.Ctx) error {
+	return c.JSON(fiber.Map{"workers": 1, "totals": fiber.Map{
+		"concurrency_in_flight":        h.bulkheads.InFlight(),
+		"concurrency_queued":           h.bulkheads.Queued(),
+		"concurrency_timed_out":        h.bulkheads.TimedOut(),
+		"gateway_concurrency_rejected": h.bulkheads.Rejected(),
+		"rate_limit_buckets":           h.buckets.Len(),
+		"websocket_connections":        h.websockets.Open(),
+	}})
+}
+
+// setRateLimitHeaders sets X-RateLimit-Limit/Remaining/Reset (reset as epoch seconds), and Retry-After
+// (whole seconds, at least 1) on a denied request.
+func setRateLimitHeaders(c *fiber.Ctx, d ratelimit.Decision) {
+	c.Set("X-RateLimit-Limit", strconv.Itoa(d.Limit))
+	c.Set("X-RateLimit-Remaining", strconv.Itoa(d.Remaining))
+	c.Set("X-RateLimit-Reset", strconv.FormatInt(ceilSeconds(time.Duration(time.Now().UnixNano())+d.Reset), 10))
+	if !d.Allowed {
+		retry := ceilSeconds(d.RetryAfter)
+		if retry < 1 {
+			retry = 1
+		}
+		c.Set(fiber.HeaderRetryAfter, strconv.FormatInt(retry, 10))
+	}
+}
+
+func ceilSeconds(d time.Duration) int64 {
+	return int64((d + time.Second - 1) / time.Second)
+}
+
+// journalOutcome appends the request outcome to the request journal (see internal/journal), if enabled.
+func (h *Handler) journalOutcome(configKeyID, statusCode int, flags uint16, delayMs int, upstream time.Duration, requestedAt time.Time, method string) {
+	if h.journal == nil {
+		return
+	}
+	h.journal.Add(journal.Record{
+		KeyID:      configKeyID,
+		Status:     statusCode,
+		Flags:      flags,
+		DelayMs:    delayMs,
+		UpstreamUs: upstream.Microseconds(),
+		TotalUs:    time.Since(requestedAt).Microseconds(),
+		Method:     method,
+	})
+}
+
+// recordUsage inserts the usage row and reports the outcome in X-Latency-Poison-Usage-Recorded.
+// upstream is the time spent waiting for the target (0 when the request was not forwarded).
+// The outcome also goes to the in-memory per-minute rollups.
+func (h *Handler) recordUsage(c *fiber.Ctx, configKeyID int, statusCode int, requestedAt time.Time, upstream time.Duration) {
+	latency := time.Since(requestedAt)
+	h.rollups.Add(configKeyID, statusCode, latency, upstream)
+	if err := h.repo.InsertUsage(configKeyID, statusCode, requestedAt, latency, upstream); err != nil {
+		h.logger.Error("Usage log insert failed (dashboard usage will be empty)", zap.Error(err))
+		c.Set("X-Latency-Poison-Usage-Recorded", "0")
+	} else {
+		c.Set("X-Latency-Poison-Usage-Recorded", "1")
+	}
+}
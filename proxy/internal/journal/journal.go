@@ -0,0 +1,232 @@
+// Package journal appends per-request outcomes to fixed-width binary files, in the format read by
+// the Python app (app/core/journal.py): a 16-byte header ("LPJ1", version, record size) followed by
+// 32-byte little-endian records. One file per process, rotated by size; oldest files are pruned.
+package journal
+
+import (
+	"encoding/binary"
+	"fmt"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+	"time"
+)
+
+const (
+	headerSize = 16
+	RecordSize = 32
+	version    = 1
+
+	// FlagInjected marks a failure injected by chaos; FlagUpstreamError a target that could not be reached;
+	// FlagCorrupted a response body damaged by chaos; FlagTransportFault a connection-level fault
+	// (status 0 when the connection was reset or hung); FlagRateLimited a 429 from the key's rate limit and
+	// FlagSaturated a 503 from its concurrency limit (both set with FlagInjected).
+	FlagInjected       = 1
+	FlagUpstreamError  = 2
+	FlagCorrupted      = 4
+	FlagTransportFault = 8
+	FlagRateLimited    = 16
+	FlagSaturated      = 32
+
+	flushBytes = 64 * 1024
+)
+
+var methodCodes = map[string]uint8{
+	"GET": 1, "POST": 2, "PUT": 3, "DELETE": 4, "PATCH": 5, "HEAD": 6, "OPTIONS": 7,
+}
+
+// Record is one request outcome.
+type Record struct {
+	Time       time.Time // when the response started (zero: now)
+	KeyID      int
+	Status     int
+	Flags      uint16
+	DelayMs    int
+	UpstreamUs int64
+	TotalUs    int64
+	Method     string
+}
+
+// Writer buffers records in memory and appends them to the current file from a background goroutine.
+type Writer struct {
+	dir      string
+	maxBytes int64
+	maxFiles int
+
+	mu     sync.Mutex
+	buf    []byte
+	lastUs int64
+	file   *os.File
+	size   int64
+	seq    int
+
+	wake chan struct{}
+	done chan struct{}
+	wg   sync.WaitGroup
+}
+
+// NewWriter starts a writer flushing every interval. maxBytes is rounded down to whole records.
+func NewWriter(dir string, maxBytes int64, maxFiles int, interval time.Duration) (*Writer, error) {
+	if err := os.MkdirAll(dir, 0o755); err != nil {
+		return nil, err
+	}
+	if maxBytes < headerSize+RecordSize {
+		maxBytes = headerSize + RecordSize
+	}
+	w := &Writer{
+		dir:      dir,
+		maxBytes: maxBytes,
+		maxFiles: maxFiles,
+		wake:     make(chan struct{}, 1),
+		done:     make(chan struct{}),
+	}
+	w.wg.Add(1)
+	go w.run(interval)
+	return w, nil
+}
+
+func clampU32(v int64) uint32 {
+	if v < 0 {
+		return 0
+	}
+	if v > 0xFFFFFFFF {
+		return 0xFFFFFFFF
+	}
+	return uint32(v)
+}
+
+// Add appends one record to the in-memory buffer (never blocks on IO).
+func (w *Writer) Add(r Record) {
+	var rec [RecordSize]byte
+	binary.LittleEndian.PutUint32(rec[8:], uint32(r.KeyID))
+	binary.LittleEndian.PutUint16(rec[12:], uint16(r.Status))
+	binary.LittleEndian.PutUint16(rec[14:], r.Flags)
+	binary.LittleEndian.PutUint32(rec[16:], clampU32(int64(r.DelayMs)))
+	binary.LittleEndian.PutUint32(rec[20:], clampU32(r.UpstreamUs))
+	binary.LittleEndian.PutUint32(rec[24:], clampU32(r.TotalUs))
+	rec[28] = methodCodes[strings.ToUpper(r.Method)]
+
+	ts := r.Time
+	if ts.IsZero() {
+		ts = time.Now()
+	}
+	w.mu.Lock()
+	// Timestamps must not go backwards within a file: readers binary-search on them
+	us := ts.UnixMicro()
+	if us < w.lastUs {
+		us = w.lastUs
+	}
+	w.lastUs = us
+	binary.LittleEndian.PutUint64(rec[0:], uint64(us))
+	w.buf = append(w.buf, rec[:]...)
+	full := len(w.buf) >= flushBytes
+	w.mu.Unlock()
+	if full {
+		select {
+		case w.wake <- struct{}{}:
+		default:
+		}
+	}
+}
+
+func (w *Writer) run(interval time.Duration) {
+	defer w.wg.Done()
+	ticker := time.NewTicker(interval)
+	defer ticker.Stop()
+	for {
+		select {
+		case <-ticker.C:
+		case <-w.wake:
+		case <-w.done:
+			w.flush()
+			return
+		}
+		w.flush()
+	}
+}
+
+func (w *Writer) flush() {
+	w.mu.Lock()
+	data := w.buf
+	w.buf = nil
+	w.mu.Unlock()
+	for len(data) > 0 {
+		if w.file == nil || w.size+RecordSize > w.maxBytes {
+			if err := w.openNext(); err != nil {
+				return
+			}
+		}
+		room := (w.maxBytes - w.size) / RecordSize * RecordSize
+		chunk := data
+		if int64(len(chunk)) > room {
+			chunk = chunk[:room]
+		}
+		n, err := w.file.Write(chunk)
+		w.size += int64(n)
+		if err != nil {
+			return
+		}
+		data = data[n:]
+	}
+}
+
+func (w *Writer) openNext() error {
+	if w.file != nil {
+		w.file.Close()
+	}
+	w.seq++
+	path := filepath.Join(w.dir, fmt.Sprintf("journal-%d-%06d.lpj", os.Getpid(), w.seq))
+	f, err := os.OpenFile(path, os.O_WRONLY|os.O_CREATE|os.O_TRUNC|os.O_APPEND, 0o644)
+	if err != nil {
+		w.file = nil
+		return err
+	}
+	var header [headerSize]byte
+	copy(header[0:4], "LPJ1")
+	binary.LittleEndian.PutUint16(header[4:], version)
+	binary.LittleEndian.PutUint16(header[6:], RecordSize)
+	if _, err := f.Write(header[:]); err != nil {
+		f.Close()
+		w.file = nil
+		return err
+	}
+	w.file = f
+	w.size = headerSize
+	w.prune()
+	return nil
+}
+
+// prune deletes the oldest journal files beyond maxFiles (all writers share the directory).
+func (w *Writer) prune() {
+	paths, _ := filepath.Glob(filepath.Join(w.dir, "journal-*.lpj"))
+	if len(paths) <= w.maxFiles {
+		return
+	}
+	mtimes := make(map[string]time.Time, len(paths))
+	for _, p := range paths {
+		if st, err := os.Stat(p); err == nil {
+			mtimes[p] = st.ModTime()
+		}
+	}
+	sort.Slice(paths, func(i, j int) bool {
+		if !mtimes[paths[i]].Equal(mtimes[paths[j]]) {
+			return mtimes[paths[i]].Before(mtimes[paths[j]])
+		}
+		return paths[i] < paths[j]
+	})
+	for _, p := range paths[:len(paths)-w.maxFiles] {
+		os.Remove(p)
+	}
+}
+
+// Close flushes pending records and closes the current file.
+func (w *Writer) Close() error {
+	close(w.done)
+	w.wg.Wait()
+	if w.file != nil {
+		return w.file.Close()
+	}
+	return nil
+}
@@ -0,0 +1,58 @@
+package models
+
+import (
+	"database/sql"
+	"sync"
+	"time"
+)
+
+// KeyCache keeps resolved config keys (with their compiled schedule) in memory for a short TTL,
+// so the proxy does not query MySQL on every request. Unknown keys are cached too.
+type KeyCache struct {
+	repo    *Repository
+	ttl     time.Duration
+	mu      sync.RWMutex
+	entries map[string]keyCacheEntry
+}
+
+type keyCacheEntry struct {
+	key     *ConfigApiKey
+	err     error
+	expires time.Time
+}
+
+// keyCacheMaxEntries bounds memory when clients send many random keys
+const keyCacheMaxEntries = 10000
+
+func NewKeyCache(repo *Repository, ttl time.Duration) *KeyCache {
+	return &KeyCache{repo: repo, ttl: ttl, entries: make(map[string]keyCacheEntry)}
+}
+
+// Get returns the key from cache or loads it. Only sql.ErrNoRows is cached as an error.
+func (c *KeyCache) Get(key string) (*ConfigApiKey, error) {
+	now := time.Now()
+	c.mu.RLock()
+	e, ok := c.entries[key]
+	c.mu.RUnlock()
+	if ok && now.Before(e.expires) {
+		return e.key, e.err
+	}
+	k, err := c.repo.GetConfigApiKeyByKey(key)
+	if err != nil && err != sql.ErrNoRows {
+		return nil, err
+	}
+	c.mu.Lock()
+	if len(c.entries) >= keyCacheMaxEntries {
+		for kk, ee := range c.entries {
+			if now.After(ee.expires) {
+				delete(c.entries, kk)
+			}
+		}
+		if len(c.entries) >= keyCacheMaxEntries {
+			c.entries = make(map[string]keyCacheEntry)
+		}
+	}
+	c.entries[key] = keyCacheEntry{key: k, err: err, expires: now.Add(c.ttl)}
+	c.mu.Unlock()
+	return k, err
+}
@@ -3,7 +3,12 @@ package models
 import (
 	"database/sql"
 	"encoding/json"
+	"strconv"
+	"strings"
 	"time"
+
+	"github.com/grrr/latency-sim-proxy/internal/chaos"
+	"github.com/grrr/latency-sim-proxy/internal/rollup"
 )
 
 // ConfigApiKey: one key -> one target URL + chaos settings
@@ -20,6 +25,34 @@ type ConfigApiKey struct {
 	ErrorCodes []int
 	CreatedAt  time.Time
 	OwnerID    int
+	// Timeline is the compiled schedule (nil when the key has no schedule)
+	Timeline *chaos.Timeline
+	// Corruption of forwarded response bodies (nil when off)
+	Corruption *chaos.Corruption
+	// TransportFaults: resets, hangs and slow responses (nil when off)
+	TransportFaults *chaos.TransportFaults
+	// Seed makes chaos decisions reproducible (see chaos.CounterRNG); SeedMode is "sequence" or "request"
+	Seed     sql.NullInt64
+	SeedMode string
+	// RateLimit: token bucket, 429 when empty (nil when off)
+	RateLimit *chaos.RateLimit
+	// ConcurrencyLimit: in-flight slots and wait queue, 503 when saturated (nil when off)
+	ConcurrencyLimit *chaos.ConcurrencyLimit
+	// FailureBursts: good/bad state per key, failures clustered in bursts (nil when off)
+	FailureBursts *chaos.FailureBursts
+	// WebSocketChaos: per-message delays and faults on proxied WebSockets (nil when off)
+	WebSocketChaos *chaos.WebSocketChaos
+}
+
+// Chaos returns the settings in effect at now: the static ones, overridden by the active schedule phase.
+func (c *ConfigApiKey) Chaos(now time.Time) chaos.Settings {
+	base := chaos.Settings{
+		FailRate:   c.FailRate,
+		MinLatency: c.MinLatency,
+		MaxLatency: c.MaxLatency,
+		ErrorCodes: c.ErrorCodes,
+	}
+	return c.Timeline.At(now).Apply(base)
 }
 
 type Repository struct {
@@ -32,33 +65,74 @@ func NewRepository(db *sql.DB) *Repository {
 
 func (r *Repository) GetConfigApiKeyByKey(key string) (*ConfigApiKey, error) {
 	c := &ConfigApiKey{}
-	var errorCodesJSON string
+	var errorCodesJSON, scheduleJSON, corruptionJSON, faultsJSON, rateLimitJSON, concurrencyJSON, burstsJSON, websocketJSON string
 	var failRate int64
 	err := r.db.QueryRow(`
-		SELECT id, name, `+"`key`"+`, is_active, COALESCE(target_url, ''), COALESCE(fail_rate, 0), COALESCE(min_latency, 0), COALESCE(max_latency, 0), COALESCE(method, 'ANY'), COALESCE(error_codes, '[]'), created_at, owner_id
+		SELECT id, name, `+"`key`"+`, is_active, COALESCE(target_url, ''), COALESCE(fail_rate, 0), COALESCE(min_latency, 0), COALESCE(max_latency, 0), COALESCE(method, 'ANY'), COALESCE(error_codes, '[]'), COALESCE(schedule, 'null'), COALESCE(corruption, 'null'), COALESCE(transport_faults, 'null'), seed, COALESCE(seed_mode, 'sequence'), COALESCE(rate_limit, 'null'), COALESCE(concurrency_limit, 'null'), COALESCE(failure_bursts, 'null'), COALESCE(websocket_chaos, 'null'), created_at, owner_id
 		FROM config_api_keys
 		WHERE `+"`key`"+` = ? AND is_active = 1
-	`, key).Scan(&c.ID, &c.Name, &c.Key, &c.IsActive, &c.TargetURL, &failRate, &c.MinLatency, &c.MaxLatency, &c.Method, &errorCodesJSON, &c.CreatedAt, &c.OwnerID)
+	`, key).Scan(&c.ID, &c.Name, &c.Key, &c.IsActive, &c.TargetURL, &failRate, &c.MinLatency, &c.MaxLatency, &c.Method, &errorCodesJSON, &scheduleJSON, &corruptionJSON, &faultsJSON, &c.Seed, &c.SeedMode, &rateLimitJSON, &concurrencyJSON, &burstsJSON, &websocketJSON, &c.CreatedAt, &c.OwnerID)
 	if err != nil {
 		return nil, err
 	}
+	// An unreadable schedule is ignored: the key keeps its static chaos settings
+	c.Timeline, _ = chaos.ParseTimeline([]byte(scheduleJSON))
+	c.Corruption, _ = chaos.ParseCorruption([]byte(corruptionJSON))
+	c.TransportFaults, _ = chaos.ParseTransportFaults([]byte(faultsJSON))
+	c.RateLimit, _ = chaos.ParseRateLimit([]byte(rateLimitJSON))
+	c.ConcurrencyLimit, _ = chaos.ParseConcurrencyLimit([]byte(concurrencyJSON))
+	c.FailureBursts, _ = chaos.ParseFailureBursts([]byte(burstsJSON))
+	c.WebSocketChaos, _ = chaos.ParseWebSocketChaos([]byte(websocketJSON))
 	c.FailRate = int(failRate)
 	if errorCodesJSON != "" && errorCodesJSON != "[]" {
 		_ = json.Unmarshal([]byte(errorCodesJSON), &c.ErrorCodes)
 	}
-	if len(c.ErrorCodes) == 0 {
-		c.ErrorCodes = []int{500, 503}
-	}
 	return c, nil
 }
 
-// InsertUsage records one request for a config key (for usage timeline).
-// Returns error so callers can log (e.g. if usage_log table is missing).
-func (r *Repository) InsertUsage(configKeyID int, requestedAt time.Time) error {
+// InsertUsage records one request for a config key, the status code returned to the client and its
+// timings (for the usage timeline, live error counts and latency percentiles). upstream is 0 when the
+// request was not forwarded (stored as NULL). Returns error so callers can log (e.g. if usage_log
+// table is missing).
+func (r *Repository) InsertUsage(configKeyID int, statusCode int, requestedAt time.Time, latency, upstream time.Duration) error {
+	upstreamUs := sql.NullInt64{Int64: upstream.Microseconds(), Valid: upstream > 0}
 	_, err := r.db.Exec(
-		`INSERT INTO usage_log (config_api_key_id, requested_at) VALUES (?, ?)`,
+		`INSERT INTO usage_log (config_api_key_id, requested_at, status_code, latency_us, upstream_us) VALUES (?, ?, ?, ?, ?)`,
 		configKeyID,
 		requestedAt.UTC(),
+		statusCode,
+		latency.Microseconds(),
+		upstreamUs,
+	)
+	return err
+}
+
+// countsJSON encodes counts as a JSON object with string keys ({"200": 12}), as stored in latency_rollups.
+func countsJSON(counts map[int]int) string {
+	m := make(map[string]int, len(counts))
+	for k, n := range counts {
+		m[strconv.Itoa(k)] = n
+	}
+	b, _ := json.Marshal(m)
+	return string(b)
+}
+
+// InsertRollups writes closed per-minute rollups (one multi-row INSERT).
+func (r *Repository) InsertRollups(rows []rollup.Row) error {
+	if len(rows) == 0 {
+		return nil
+	}
+	placeholders := make([]string, len(rows))
+	args := make([]interface{}, 0, len(rows)*7)
+	for i, row := range rows {
+		placeholders[i] = "(?, ?, ?, ?, ?, ?, ?)"
+		args = append(args, row.KeyID, row.Minute, row.Requests, row.Errors,
+			countsJSON(row.Statuses), countsJSON(row.Latency), countsJSON(row.Upstream))
+	}
+	_, err := r.db.Exec(
+		`INSERT INTO latency_rollups (config_api_key_id, minute, requests, errors, status_counts, latency_bins, upstream_bins) VALUES `+
+			strings.Join(placeholders, ", "),
+		args...,
 	)
 	return err
 }
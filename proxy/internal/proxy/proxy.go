@@ -2,7 +2,8 @@ package proxy
 
 import (
 	"fmt"
-	"math/rand"
+	"io"
+	"net"
 	"net/http"
 	"net/url"
 	"strconv"
@@ -12,6 +13,8 @@ import (
 	"github.com/gofiber/fiber/v2"
 	"github.com/valyala/fasthttp"
 	"go.uber.org/zap"
+
+	"github.com/grrr/latency-sim-proxy/internal/chaos"
 )
 
 // ProxyConfig holds the configuration for proxy behavior
@@ -21,6 +24,15 @@ type ProxyConfig struct {
 	FailCodes  []int
 	MinLatency int
 	MaxLatency int
+	// Corruption applied to the upstream body when CorruptionMode is set (see chaos.Corruption)
+	Corruption     *chaos.Corruption
+	CorruptionMode string
+	// RNG for latency, failure and corruption draws (nil: math/rand)
+	RNG chaos.RNG
+	// Synthetic body sent instead of forwarding (see internal/synthetic); SyntheticSize -1 = chunked
+	Synthetic     io.Reader
+	SyntheticType string
+	SyntheticSize int
 }
 
 // ProxyHandler handles the proxying of requests with latency and error injection
@@ -32,6 +44,9 @@ type ProxyHandler struct {
 
 // NewProxyHandler creates a new ProxyHandler
 func NewProxyHandler(logger *zap.Logger, config *ProxyConfig) *ProxyHandler {
+	if config.RNG == nil {
+		config.RNG = chaos.Global
+	}
 	return &ProxyHandler{
 		logger: logger,
 		config: config,
@@ -52,6 +67,12 @@ func (p *ProxyHandler) HandleFiberRequest(c *fiber.Ctx) error {
 		return p.injectError(c)
 	}
 
+	if p.config.Synthetic != nil {
+		c.Set(fiber.HeaderContentType, p.config.SyntheticType)
+		c.Response().SetBodyStream(p.config.Synthetic, p.config.SyntheticSize)
+		return nil
+	}
+
 	// Parse target URL
 	target, err := url.Parse(p.config.TargetURL)
 	if err != nil {
@@ -81,15 +102,46 @@ func (p *ProxyHandler) HandleFiberRequest(c *fiber.Ctx) error {
 	// Copy response headers and body
 	resp.Header.CopyTo(&c.Response().Header)
 	c.Status(resp.StatusCode())
+	if p.config.CorruptionMode != "" {
+		return p.sendCorrupted(c, resp)
+	}
 	return c.Send(resp.Body())
 }
 
+// sendCorrupted relays the buffered upstream body damaged per CorruptionMode: truncation slices it and
+// flips modify it in place, so no copy is made (except for drop, whose bytes must outlive resp).
+func (p *ProxyHandler) sendCorrupted(c *fiber.Ctx, resp *fasthttp.Response) error {
+	body := resp.Body()
+	corruption := p.config.Corruption
+	c.Set("X-Latency-Poison-Corruption", p.config.CorruptionMode)
+	switch p.config.CorruptionMode {
+	case chaos.CorruptFlip:
+		corruption.Flip(p.config.RNG, body)
+		return c.Send(body)
+	case chaos.CorruptTruncate:
+		return c.Send(body[:corruption.Cut(p.config.RNG, len(body))])
+	case chaos.CorruptMalformedJSON:
+		cut := corruption.Cut(p.config.RNG, len(body))
+		return c.Send(append(body[:cut:cut], chaos.MalformedJSONTail...))
+	}
+	// drop: status line, headers announcing the full length and part of the body, then the connection is closed
+	cut := corruption.Cut(p.config.RNG, len(body))
+	c.Response().Header.SetContentLength(len(body))
+	raw := append(append([]byte(nil), c.Response().Header.Header()...), body[:cut]...)
+	c.Context().HijackSetNoResponse(true)
+	c.Context().Hijack(func(conn net.Conn) {
+		conn.Write(raw)
+		conn.Close()
+	})
+	return nil
+}
+
 // shouldInjectError determines if an error should be injected based on fail rate
 func (p *ProxyHandler) shouldInjectError() bool {
 	if p.config.FailRate <= 0 {
 		return false
 	}
-	return rand.Float64() < p.config.FailRate
+	return p.config.RNG.Float64() < p.config.FailRate
 }
 
 // injectError sends an error response
@@ -100,7 +152,7 @@ func (p *ProxyHandler) injectError(c *fiber.Ctx) error {
 	}
 
 	// Select a random error code
-	errorCode := p.config.FailCodes[rand.Intn(len(p.config.FailCodes))]
+	errorCode := p.config.FailCodes[p.config.RNG.Intn(len(p.config.FailCodes))]
 	return c.Status(errorCode).SendString(http.StatusText(errorCode))
 }
 
@@ -113,7 +165,7 @@ func (p *ProxyHandler) getRandomLatency() int {
 	if diff <= 0 {
 		return p.config.MinLatency
 	}
-	return p.config.MinLatency + rand.Intn(diff)
+	return p.config.MinLatency + p.config.RNG.Intn(diff)
 }
 
 // ParseFailCodes converts a comma-separated string of error codes to integers
@@ -0,0 +1,83 @@
+// Package ratelimit keeps the token buckets of config keys with a rate limit, as GCRA: a bucket of burst
+// tokens refilled at rate per second is one integer per key, the theoretical arrival time (TAT) of the
+// next request. A request is allowed when now >= TAT - burst*interval and moves TAT one interval
+// forward. Updates are a compare-and-swap on that integer, so concurrent requests never take a lock.
+// Same algorithm and headers as the Python gateway (app/core/ratelimit.py).
+package ratelimit
+
+import (
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// maxBuckets bounds the map; past it, buckets are dropped and start full again
+const maxBuckets = 100000
+
+// Decision is the outcome of one request against a bucket.
+type Decision struct {
+	Allowed    bool
+	Limit      int           // bucket size
+	Remaining  int           // tokens left after this request
+	RetryAfter time.Duration // until a token is available (0 when allowed)
+	Reset      time.Duration // until the bucket is full again
+}
+
+// Buckets holds one bucket per config key id. The zero value is not usable: see New.
+type Buckets struct {
+	epoch time.Time // TATs are monotonic nanoseconds since epoch
+	tats  sync.Map  // key id -> *atomic.Int64
+	size  atomic.Int64
+}
+
+func New() *Buckets {
+	return &Buckets{epoch: time.Now()}
+}
+
+func (b *Buckets) bucket(id int) *atomic.Int64 {
+	if v, ok := b.tats.Load(id); ok {
+		return v.(*atomic.Int64)
+	}
+	if b.size.Load() >= maxBuckets {
+		b.tats.Range(func(k, _ any) bool {
+			b.tats.Delete(k)
+			return true
+		})
+		b.size.Store(0)
+	}
+	v, loaded := b.tats.LoadOrStore(id, new(atomic.Int64))
+	if !loaded {
+		b.size.Add(1)
+	}
+	return v.(*atomic.Int64)
+}
+
+// Take takes a token from the key's bucket, when one is left.
+func (b *Buckets) Take(id int, rate float64, burst int) Decision {
+	interval := int64(float64(time.Second) / rate)
+	if interval < 1 {
+		interval = 1
+	}
+	capacity := int64(burst) * interval
+	tat := b.bucket(id)
+	for {
+		now := int64(time.Since(b.epoch))
+		old := tat.Load()
+		t := old
+		if t < now {
+			t = now
+		}
+		if allowAt := t + interval - capacity; now < allowAt {
+			return Decision{Limit: burst, RetryAfter: time.Duration(allowAt - now), Reset: time.Duration(t - now)}
+		}
+		t += interval
+		if tat.CompareAndSwap(old, t) {
+			return Decision{Allowed: true, Limit: burst, Remaining: int((now - (t - capacity)) / interval), Reset: time.Duration(t - now)}
+		}
+	}
+}
+
+// Len is the number of buckets kept.
+func (b *Buckets) Len() int {
+	return int(b.size.Load())
+}
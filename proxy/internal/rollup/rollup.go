@@ -0,0 +1,165 @@
+// Package rollup keeps per-minute latency sketches and status counts per config key in memory and
+// hands closed minutes to a writer (models.Repository.InsertRollups -> latency_rollups). Bins are the
+// same as the Python side (api/sketch.py, app/core/sketch.py), so rows from every proxy process merge.
+package rollup
+
+import (
+	"sync"
+	"time"
+)
+
+const (
+	subBits  = 4
+	subCount = 1 << subBits
+)
+
+// BinIndex maps a value (microseconds) to its log-linear bin: exact below 16, then 16 bins per power of two.
+func BinIndex(v int64) int {
+	if v < subCount {
+		if v < 0 {
+			return 0
+		}
+		return int(v)
+	}
+	shift := 0
+	for x := v; x >= 2*subCount; x >>= 1 {
+		shift++
+	}
+	return shift*subCount + int(v>>shift)
+}
+
+// Row is one closed minute of one key.
+type Row struct {
+	KeyID    int
+	Minute   time.Time
+	Requests int
+	Errors   int
+	Statuses map[int]int
+	Latency  map[int]int // bin -> count, end-to-end
+	Upstream map[int]int // bin -> count, forwarded requests only
+}
+
+// Recorder aggregates outcomes for the current minute; Add never blocks on IO.
+type Recorder struct {
+	write      func([]Row) error
+	maxPending int
+
+	mu      sync.Mutex
+	minute  int64
+	current map[int]*Row
+	closed  []*Row
+
+	done chan struct{}
+	wg   sync.WaitGroup
+	// onError is called with write errors (closed minutes are kept for the next attempt)
+	onError func(error)
+}
+
+// NewRecorder starts a recorder writing closed minutes every interval. While writes fail, at most
+// maxPending rows are kept (oldest dropped first).
+func NewRecorder(write func([]Row) error, interval time.Duration, maxPending int, onError func(error)) *Recorder {
+	r := &Recorder{
+		write:      write,
+		maxPending: maxPending,
+		current:    make(map[int]*Row),
+		done:       make(chan struct{}),
+		onError:    onError,
+	}
+	r.wg.Add(1)
+	go r.run(interval)
+	return r
+}
+
+// rotate must be called with mu held.
+func (r *Recorder) rotate(minute int64) {
+	for _, row := range r.current {
+		r.closed = append(r.closed, row)
+	}
+	if over := len(r.closed) - r.maxPending; over > 0 {
+		r.closed = r.closed[over:]
+	}
+	r.minute = minute
+	r.current = make(map[int]*Row)
+}
+
+// Add records one request outcome. upstream is 0 when the request was not forwarded.
+func (r *Recorder) Add(keyID, status int, latency, upstream time.Duration) {
+	minute := time.Now().Unix() / 60 * 60
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	if minute != r.minute {
+		r.rotate(minute)
+	}
+	row := r.current[keyID]
+	if row == nil {
+		row = &Row{
+			KeyID:    keyID,
+			Minute:   time.Unix(minute, 0).UTC(),
+			Statuses: make(map[int]int),
+			Latency:  make(map[int]int),
+			Upstream: make(map[int]int),
+		}
+		r.current[keyID] = row
+	}
+	row.Requests++
+	// 0: no response at all (transport fault)
+	if status >= 400 || status == 0 {
+		row.Errors++
+	}
+	row.Statuses[status]++
+	row.Latency[BinIndex(latency.Microseconds())]++
+	if upstream > 0 {
+		row.Upstream[BinIndex(upstream.Microseconds())]++
+	}
+}
+
+func (r *Recorder) flush(includeCurrent bool) {
+	minute := time.Now().Unix() / 60 * 60
+	r.mu.Lock()
+	if includeCurrent || minute != r.minute {
+		r.rotate(minute)
+	}
+	closed := r.closed
+	r.closed = nil
+	r.mu.Unlock()
+	if len(closed) == 0 {
+		return
+	}
+	rows := make([]Row, len(closed))
+	for i, row := range closed {
+		rows[i] = *row
+	}
+	if err := r.write(rows); err != nil {
+		if r.onError != nil {
+			r.onError(err)
+		}
+		r.mu.Lock()
+		r.closed = append(closed, r.closed...)
+		if over := len(r.closed) - r.maxPending; over > 0 {
+			r.closed = r.closed[over:]
+		}
+		r.mu.Unlock()
+	}
+}
+
+func (r *Recorder) run(interval time.Duration) {
+	defer r.wg.Done()
+	ticker := time.NewTicker(interval)
+	defer ticker.Stop()
+	for {
+		select {
+		case <-ticker.C:
+			r.flush(false)
+		case <-r.done:
+			// The partial minute is written too; readers merge it with the rows of other processes
+			r.flush(true)
+			return
+		}
+	}
+}
+
+// Close writes the pending minutes, including the current one.
+func (r *Recorder) Close() {
+	close(r.done)
+	r.wg.Wait()
+}
@@ -0,0 +1,144 @@
+// Package synthetic generates sandbox response bodies for throughput tests (same shapes as the Python
+// gateway, app/core/synthetic.py). A body is a shape's head, filler and tail sent in pieces of the chunk
+// size; every piece is a slice of one template built at startup, so bodies of any size allocate nothing.
+package synthetic
+
+import (
+	"bytes"
+	"fmt"
+	"io"
+	"math/rand"
+	"strconv"
+	"strings"
+)
+
+const (
+	TemplateSize     = 1 << 20 // largest chunk size
+	DefaultChunkSize = 64 << 10
+	MinChunkSize     = 64
+)
+
+// Shape is a kind of body: head + filler + tail, e.g. one JSON string field.
+type Shape struct {
+	ContentType string
+	head, tail  []byte
+	full        []byte // head + filler
+}
+
+func newShape(contentType, head, tail string, filler []byte) *Shape {
+	return &Shape{
+		ContentType: contentType,
+		head:        []byte(head),
+		tail:        []byte(tail),
+		full:        append([]byte(head), filler...),
+	}
+}
+
+func repeated(line string) []byte {
+	return bytes.Repeat([]byte(line), TemplateSize/len(line)+1)[:TemplateSize]
+}
+
+func random() []byte {
+	b := make([]byte, TemplateSize)
+	rand.New(rand.NewSource(0)).Read(b)
+	return b
+}
+
+// Shapes by name
+var Shapes = map[string]*Shape{
+	"json":   newShape("application/json", `{"data":"`, `"}`, repeated("abcdefghijklmnopqrstuvwxyz0123456789")),
+	"text":   newShape("text/plain; charset=utf-8", "", "", repeated("The quick brown fox jumps over the lazy dog.\n")),
+	"binary": newShape("application/octet-stream", "", "", random()),
+}
+
+var units = map[string]int{"": 1, "b": 1, "kb": 1 << 10, "mb": 1 << 20, "gb": 1 << 30}
+
+// ParseSize reads "2048", "64KB" or "10MB" as bytes.
+func ParseSize(s string) (int, error) {
+	s = strings.ToLower(strings.TrimSpace(s))
+	digits := strings.TrimRight(s, "kmgb")
+	unit, ok := units[s[len(digits):]]
+	n, err := strconv.Atoi(digits)
+	if !ok || err != nil || n < 0 {
+		return 0, fmt.Errorf("invalid size: %q", s)
+	}
+	return n * unit, nil
+}
+
+// Body is one response body; it is read once (use as the response body stream).
+type Body struct {
+	first, middle, last, tail []byte
+	middles                   int
+	cur                       []byte
+}
+
+// NewBody checks the parameters and returns a body of size bytes.
+func NewBody(shape string, size, chunkSize, maxSize int) (*Body, *Shape, error) {
+	s, ok := Shapes[shape]
+	if !ok {
+		return nil, nil, fmt.Errorf("shape must be one of: json, text, binary")
+	}
+	if size < 0 || size > maxSize {
+		return nil, nil, fmt.Errorf("size must be between 0 and %d bytes", maxSize)
+	}
+	if size < len(s.head)+len(s.tail) {
+		return nil, nil, fmt.Errorf("size must be at least %d bytes for shape %s", len(s.head)+len(s.tail), shape)
+	}
+	if chunkSize < MinChunkSize || chunkSize > TemplateSize {
+		return nil, nil, fmt.Errorf("chunkSize must be between %d and %d", MinChunkSize, TemplateSize)
+	}
+	end := size - len(s.tail)
+	b := &Body{middle: s.full[len(s.head) : len(s.head)+chunkSize], tail: s.tail}
+	if n := end / chunkSize; n > 0 {
+		b.first = s.full[:chunkSize]
+		b.middles = n - 1
+		b.last = b.middle[:end%chunkSize]
+	} else {
+		b.last = s.full[:end]
+	}
+	return b, s, nil
+}
+
+// next moves to the next non-empty piece; false at the end of the body.
+func (b *Body) next() bool {
+	for len(b.cur) == 0 {
+		switch {
+		case b.first != nil:
+			b.cur, b.first = b.first, nil
+		case b.middles > 0:
+			b.cur = b.middle
+			b.middles--
+		case b.last != nil:
+			b.cur, b.last = b.last, nil
+		case b.tail != nil:
+			b.cur, b.tail = b.tail, nil
+		default:
+			return false
+		}
+	}
+	return true
+}
+
+// Read copies at most one piece (chunked responses get one chunk per piece, up to the server's buffer size).
+func (b *Body) Read(p []byte) (int, error) {
+	if !b.next() {
+		return 0, io.EOF
+	}
+	n := copy(p, b.cur)
+	b.cur = b.cur[n:]
+	return n, nil
+}
+
+// WriteTo writes the template slices themselves, without copying (fixed-size responses).
+func (b *Body) WriteTo(w io.Writer) (int64, error) {
+	var total int64
+	for b.next() {
+		n, err := w.Write(b.cur)
+		total += int64(n)
+		if err != nil {
+			return total, err
+		}
+		b.cur = nil
+	}
+	return total, nil
+}
@@ -0,0 +1,457 @@
+// Package wsproxy relays proxied WebSocket connections for config keys, with per-message chaos (see
+// chaos.WebSocketChaos). Same behaviour as the Python gateway (app/core/wsproxy.py).
+//
+// A direction without chaos is copied as raw bytes through a small buffer, so an idle connection costs
+// two goroutines and two 4 KiB buffers. A direction with chaos is split into frames by their headers only
+// (payloads are neither unmasked nor re-encoded): control frames go through at once, data messages are
+// collected up to their FIN frame, then delayed, dropped, duplicated, reordered or turned into a close,
+// and a writer goroutine sends the original frames when they are due. Messages larger than MaxMessage
+// pass through as they arrive, without chaos.
+package wsproxy
+
+import (
+	"bufio"
+	"crypto/rand"
+	"crypto/tls"
+	"encoding/binary"
+	"fmt"
+	"io"
+	"net"
+	"net/http"
+	"net/url"
+	"os"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	"github.com/grrr/latency-sim-proxy/internal/chaos"
+)
+
+const (
+	bufferSize = 4096
+	// a reordered message is held until the next one in its direction, at most this long
+	reorderHold = time.Second
+	// messages waiting for their delay, per direction; a full queue stops reading from the sender
+	queueSize = 64
+	// close code sent to both sides when the proxy shuts down
+	goingAway = 1001
+)
+
+// MaxMessage is the largest message held for chaos (WEBSOCKET_MAX_MESSAGE, default 1 MiB).
+var MaxMessage = maxMessage()
+
+func maxMessage() int {
+	n, err := strconv.Atoi(os.Getenv("WEBSOCKET_MAX_MESSAGE"))
+	if err != nil || n <= 0 {
+		return 1 << 20
+	}
+	return n
+}
+
+// IsUpgrade reports whether a request's Connection and Upgrade headers ask for a WebSocket upgrade.
+func IsUpgrade(connection, upgrade string) bool {
+	if !strings.EqualFold(strings.TrimSpace(upgrade), "websocket") {
+		return false
+	}
+	for _, token := range strings.Split(connection, ",") {
+		if strings.EqualFold(strings.TrimSpace(token), "upgrade") {
+			return true
+		}
+	}
+	return false
+}
+
+// Forwarded reports whether a client header is sent on with the handshake: not hop-by-hop (Connection
+// and Upgrade are set by Dial), and not Sec-WebSocket-Extensions, since with permessage-deflate a dropped
+// or reordered message would break the compression context shared by both ends.
+func Forwarded(name string) bool {
+	switch strings.ToLower(name) {
+	case "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+		"te", "trailer", "transfer-encoding", "upgrade", "host", "sec-websocket-extensions":
+		return false
+	}
+	return true
+}
+
+// Target is an upstream connection whose handshake response has been read.
+type Target struct {
+	Conn     net.Conn
+	Reader   *bufio.Reader // frames sent right after the response may already be buffered here
+	Response *http.Response
+}
+
+// Dial connects to the target and sends it the upgrade request for targetURL's path and query, with
+// headers (name, value pairs) added.
+func Dial(targetURL string, headers [][2]string, timeout time.Duration) (*Target, error) {
+	u, err := url.Parse(targetURL)
+	if err != nil {
+		return nil, err
+	}
+	addr := u.Host
+	if u.Port() == "" {
+		if u.Scheme == "https" {
+			addr = net.JoinHostPort(u.Hostname(), "443")
+		} else {
+			addr = net.JoinHostPort(u.Hostname(), "80")
+		}
+	}
+	dialer := &net.Dialer{Timeout: timeout}
+	var conn net.Conn
+	if u.Scheme == "https" {
+		conn, err = tls.DialWithDialer(dialer, "tcp", addr, &tls.Config{ServerName: u.Hostname()})
+	} else {
+		conn, err = dialer.Dial("tcp", addr)
+	}
+	if err != nil {
+		return nil, err
+	}
+	var b strings.Builder
+	fmt.Fprintf(&b, "GET %s HTTP/1.1\r\nHost: %s\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n", u.RequestURI(), u.Host)
+	for _, h := range headers {
+		b.WriteString(h[0] + ": " + h[1] + "\r\n")
+	}
+	b.WriteString("\r\n")
+	conn.SetDeadline(time.Now().Add(timeout))
+	if _, err := io.WriteString(conn, b.String()); err != nil {
+		conn.Close()
+		return nil, err
+	}
+	r := bufio.NewReaderSize(conn, bufferSize)
+	resp, err := http.ReadResponse(r, nil)
+	if err != nil {
+		conn.Close()
+		return nil, err
+	}
+	conn.SetDeadline(time.Time{})
+	return &Target{Conn: conn, Reader: r, Response: resp}, nil
+}
+
+// Head is the handshake response to send the client: the target's, with extra headers added.
+func (t *Target) Head(extra http.Header) []byte {
+	var b strings.Builder
+	fmt.Fprintf(&b, "HTTP/1.1 %s\r\n", t.Response.Status)
+	t.Response.Header.Write(&b)
+	extra.Write(&b)
+	b.WriteString("\r\n")
+	return []byte(b.String())
+}
+
+// Relays runs relays and keeps track of the open ones.
+type Relays struct {
+	relays sync.Map // *relay -> struct{}
+	open   atomic.Int64
+}
+
+// Open is the number of open relays.
+func (rs *Relays) Open() int64 {
+	return rs.open.Load()
+}
+
+// Relay sends head to the client, then relays both ways until either side closes. It blocks: call it from
+// the client connection's own goroutine (fasthttp's hijack handler).
+func (rs *Relays) Relay(client net.Conn, t *Target, head []byte, ws *chaos.WebSocketChaos, rng chaos.RNG) {
+	r := &relay{client: client, target: t.Conn}
+	rs.relays.Store(r, struct{}{})
+	rs.open.Add(1)
+	defer func() {
+		r.shut()
+		rs.relays.Delete(r)
+		rs.open.Add(-1)
+	}()
+	// No deadline left over from the server's timeouts: relays stay open as long as both sides want
+	client.SetDeadline(time.Time{})
+	if _, err := client.Write(head); err != nil {
+		return
+	}
+	rng = &lockedRNG{rng: rng}
+	toClient := &pipe{relay: r, dst: client}
+	toTarget := &pipe{relay: r, dst: t.Conn}
+	if ws.AppliesTo("target") {
+		toClient.ws, toClient.rng = ws, rng
+	}
+	if ws.AppliesTo("client") {
+		toTarget.ws, toTarget.rng = ws, rng
+	}
+	done := make(chan struct{})
+	go func() {
+		toClient.run(t.Reader)
+		r.shut()
+		close(done)
+	}()
+	toTarget.run(client)
+	r.shut()
+	<-done
+}
+
+// CloseAll ends every open relay with a "going away" close frame (server shutdown).
+func (rs *Relays) CloseAll() {
+	rs.relays.Range(func(r, _ any) bool {
+		r.(*relay).closeWith(goingAway)
+		return true
+	})
+}
+
+// lockedRNG serializes the draws of both directions on the handshake's RNG.
+type lockedRNG struct {
+	mu  sync.Mutex
+	rng chaos.RNG
+}
+
+func (l *lockedRNG) Float64() float64 {
+	l.mu.Lock()
+	defer l.mu.Unlock()
+	return l.rng.Float64()
+}
+
+func (l *lockedRNG) Intn(n int) int {
+	l.mu.Lock()
+	defer l.mu.Unlock()
+	return l.rng.Intn(n)
+}
+
+type relay struct {
+	client, target net.Conn
+	once           sync.Once
+}
+
+// shut closes both sides (once).
+func (r *relay) shut() {
+	r.once.Do(func() {
+		r.client.Close()
+		r.target.Close()
+	})
+}
+
+// closeWith ends the connection on both sides with a close frame.
+func (r *relay) closeWith(code int) {
+	r.once.Do(func() {
+		r.client.Write(closeFrame(code, false))
+		r.target.Write(closeFrame(code, true))
+		r.client.Close()
+		r.target.Close()
+	})
+}
+
+// closeFrame is a close frame with a status code; frames sent to a server must be masked.
+func closeFrame(code int, masked bool) []byte {
+	payload := binary.BigEndian.AppendUint16(nil, uint16(code))
+	if !masked {
+		return append([]byte{0x88, 0x02}, payload...)
+	}
+	key := make([]byte, 4)
+	rand.Read(key)
+	frame := append([]byte{0x88, 0x82}, key...)
+	for i, b := range payload {
+		frame = append(frame, b^key[i])
+	}
+	return frame
+}
+
+type queued struct {
+	due  time.Time
+	data []byte
+}
+
+// pipe is one direction of a relay.
+type pipe struct {
+	relay *relay
+	dst   net.Conn
+	ws    *chaos.WebSocketChaos
+	rng   chaos.RNG
+
+	queue chan queued
+	stop  chan struct{}
+
+	mu        sync.Mutex // send order, and the held message shared with its release timer
+	lastDue   time.Time
+	stopped   bool
+	held      []byte // reordered message
+	heldDelay time.Duration
+	heldTimer *time.Timer
+}
+
+func (p *pipe) run(src io.Reader) {
+	if p.ws == nil {
+		// Wrapped so the copy goes through the small buffer (no ReaderFrom/WriterTo fallbacks with their own)
+		io.CopyBuffer(struct{ io.Writer }{p.dst}, struct{ io.Reader }{src}, make([]byte, bufferSize))
+		return
+	}
+	r, ok := src.(*bufio.Reader)
+	if !ok {
+		r = bufio.NewReaderSize(src, bufferSize)
+	}
+	p.queue = make(chan queued, queueSize)
+	p.stop = make(chan struct{})
+	written := make(chan struct{})
+	go p.write(written)
+	p.frames(r)
+	// The sender is gone: what is still waiting for its delay is dropped, and the other side closed (which
+	// also unblocks a write to a peer that stopped reading)
+	close(p.stop)
+	p.relay.shut()
+	p.mu.Lock()
+	p.stopped = true
+	if p.heldTimer != nil {
+		p.heldTimer.Stop()
+	}
+	close(p.queue)
+	p.mu.Unlock()
+	<-written
+}
+
+// frames reads frames until the sender closes or an error.
+func (p *pipe) frames(r *bufio.Reader) {
+	var message []byte
+	passing := false // rest of an oversized message, relayed without chaos
+	for {
+		first, size, err := frameHeader(r)
+		if err != nil {
+			return
+		}
+		if first&0x08 == 0 && (passing || len(message)+size > MaxMessage) {
+			// Too large to hold: the message goes on as it arrives
+			if len(message) > 0 {
+				p.send(message, 0)
+				message = nil
+			}
+			passing = first&0x80 == 0
+			for size > 0 {
+				chunk := make([]byte, min(size, bufferSize))
+				if _, err := io.ReadFull(r, chunk); err != nil {
+					return
+				}
+				p.send(chunk, 0)
+				size -= len(chunk)
+			}
+			continue
+		}
+		frame := make([]byte, size)
+		if _, err := io.ReadFull(r, frame); err != nil {
+			return
+		}
+		if first&0x08 != 0 {
+			// Control frames (close, ping, pong) keep their place among the messages already sent
+			p.send(frame, 0)
+			continue
+		}
+		message = append(message, frame...)
+		if first&0x80 != 0 {
+			p.message(message)
+			message = nil
+		}
+	}
+}
+
+// frameHeader peeks at the next frame: its first byte (FIN and opcode) and its size, header included.
+func frameHeader(r *bufio.Reader) (byte, int, error) {
+	h, err := r.Peek(2)
+	if err != nil {
+		return 0, 0, err
+	}
+	first, second := h[0], h[1]
+	n, header := uint64(second&0x7F), 2
+	switch n {
+	case 126:
+		if h, err = r.Peek(4); err != nil {
+			return 0, 0, err
+		}
+		n, header = uint64(binary.BigEndian.Uint16(h[2:])), 4
+	case 127:
+		if h, err = r.Peek(10); err != nil {
+			return 0, 0, err
+		}
+		n, header = binary.BigEndian.Uint64(h[2:]), 10
+	}
+	if second&0x80 != 0 {
+		header += 4 // masking key
+	}
+	if n > 1<<62 {
+		return 0, 0, fmt.Errorf("frame too large")
+	}
+	return first, header + int(n), nil
+}
+
+func (p *pipe) message(message []byte) {
+	delay := time.Duration(p.ws.Delay(p.rng)) * time.Millisecond
+	fault := p.ws.Pick(p.rng)
+	switch fault {
+	case chaos.WSDrop:
+		return
+	case chaos.WSClose:
+		p.relay.closeWith(p.ws.CloseCode)
+		return
+	}
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	if fault == chaos.WSReorder && p.held == nil {
+		p.held, p.heldDelay = message, delay
+		p.heldTimer = time.AfterFunc(reorderHold, func() {
+			p.mu.Lock()
+			defer p.mu.Unlock()
+			p.releaseHeld()
+		})
+		return
+	}
+	p.enqueue(message, delay)
+	if fault == chaos.WSDuplicate {
+		p.enqueue(message, delay)
+	}
+	p.releaseHeld()
+}
+
+// releaseHeld sends the reordered message, if any (p.mu held).
+func (p *pipe) releaseHeld() {
+	if p.held == nil || p.stopped {
+		return
+	}
+	p.heldTimer.Stop()
+	held := p.held
+	p.held = nil
+	p.enqueue(held, p.heldDelay)
+}
+
+func (p *pipe) send(data []byte, delay time.Duration) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	p.enqueue(data, delay)
+}
+
+// enqueue schedules data after delay; nothing overtakes what was sent before it (p.mu held).
+func (p *pipe) enqueue(data []byte, delay time.Duration) {
+	if p.stopped {
+		return
+	}
+	due := time.Now().Add(delay)
+	if due.Before(p.lastDue) {
+		due = p.lastDue
+	}
+	p.lastDue = due
+	p.queue <- queued{due: due, data: data}
+}
+
+// write sends queued data when due, until the queue is closed.
+func (p *pipe) write(done chan struct{}) {
+	defer close(done)
+	failed := false
+	for q := range p.queue {
+		if failed {
+			continue
+		}
+		if wait := time.Until(q.due); wait > 0 {
+			t := time.NewTimer(wait)
+			select {
+			case <-t.C:
+			case <-p.stop:
+				t.Stop()
+				failed = true
+				continue
+			}
+		}
+		if _, err := p.dst.Write(q.data); err != nil {
+			failed = true
+			p.relay.shut()
+		}
+	}
+}
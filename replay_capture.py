@@ -0,0 +1,210 @@
+"""Replay captured traffic (HAR or NDJSON) through the proxy, keeping its timing, and compare latencies.
+
+Usage:
+    python replay_capture.py capture.har --base http://localhost:8080 --key https://api.github.com=lp_xxx
+    python replay_capture.py capture.ndjson --base http://localhost:80 --via-proxy "fail_rate=0.1&max_latency=200" \
+        --speed 10
+
+Captures are HAR files (browser dev tools, mitmproxy) or NDJSON, one request per line as written by the
+mitmproxy addon's `capture` option: {"started", "method", "url", "headers", "body" or "body_base64",
+"status", "duration_ms"}.
+
+Requests go to the config-key route (`--key target_url=KEY`, repeatable: URLs under target_url are sent
+to /{KEY}/path) or, with --via-proxy, to /proxy?url=... with those chaos parameters (GET requests only;
+the Python gateway serves /proxy, the Go proxy does not). Other requests are skipped. Each request is
+sent at its original offset from the first one, divided by --speed (2 = twice as fast; 0 = back to
+back). Reports, per endpoint (method and path, with id-like segments folded into {id}), the captured
+and replayed p50/p95 latency, their difference and the requests whose status differed from the capture.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import re
+import time
+import urllib.parse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench_gateway import percentile
+
+# Not forwarded: hop-by-hop, and set by the client for the new connection
+SKIP_HEADERS = {"host", "connection", "keep-alive", "proxy-connection", "transfer-encoding", "te", "trailer",
+                "upgrade", "content-length", "accept-encoding"}
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$")
+
+
+@dataclass
+class Entry:
+    started: float  # epoch seconds
+    method: str
+    url: str
+    headers: List[tuple]
+    body: bytes
+    status: int
+    duration_ms: float
+
+
+def _body(data: dict) -> bytes:
+    if data.get("body_base64"):
+        return base64.b64decode(data["body_base64"])
+    return (data.get("body") or "").encode()
+
+
+def load_har(data: dict) -> List[Entry]:
+    entries = []
+    for e in data["log"]["entries"]:
+        req = e["request"]
+        post = req.get("postData") or {}
+        body = post.get("text") or ""
+        entries.append(Entry(
+            started=datetime.fromisoformat(e["startedDateTime"].replace("Z", "+00:00")).timestamp(),
+            method=req["method"],
+            url=req["url"],
+            headers=[(h["name"], h["value"]) for h in req.get("headers", [])],
+            body=base64.b64decode(body) if post.get("encoding") == "base64" else body.encode(),
+            status=e["response"]["status"],
+            duration_ms=float(e.get("time") or 0),
+        ))
+    return entries
+
+
+def load_ndjson(lines) -> List[Entry]:
+    entries = []
+    for line in lines:
+        if not line.strip():
+            continue
+        d = json.loads(line)
+        entries.append(Entry(
+            started=float(d["started"]),
+            method=d["method"],
+            url=d["url"],
+            headers=[tuple(h) for h in d.get("headers", [])],
+            body=_body(d),
+            status=int(d.get("status") or 0),
+            duration_ms=float(d.get("duration_ms") or 0),
+        ))
+    return entries
+
+
+def load(path: str) -> List[Entry]:
+    """Entries of a HAR or NDJSON capture, in start order."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None  # several JSON documents: NDJSON
+    entries = load_har(data) if isinstance(data, dict) and "log" in data else load_ndjson(text.splitlines())
+    entries.sort(key=lambda e: e.started)
+    return entries
+
+
+def endpoint(method: str, url: str) -> str:
+    path = urllib.parse.urlsplit(url).path or "/"
+    return f"{method} " + "/".join("{id}" if ID_SEGMENT.match(s) else s for s in path.split("/"))
+
+
+class Router:
+    """Where a captured URL is sent: /{key}/path for a configured target_url, /proxy?url= with --via-proxy."""
+
+    def __init__(self, base: str, keys: Dict[str, str], proxy_params: Optional[str]):
+        self.base = base.rstrip("/")
+        # Longest target_url first, so nested targets win over their parent
+        self.keys = sorted(((t.rstrip("/"), k) for t, k in keys.items()), key=lambda tk: -len(tk[0]))
+        self.proxy_params = proxy_params
+
+    def url(self, entry: Entry) -> Optional[str]:
+        for target, key in self.keys:
+            if entry.url.startswith(target) and entry.url[len(target):len(target) + 1] in ("", "/", "?"):
+                return f"{self.base}/{key}{entry.url[len(target):]}"
+        if self.proxy_params is not None and entry.method == "GET":
+            params = f"&{self.proxy_params}" if self.proxy_params else ""
+            return f"{self.base}/proxy?url={urllib.parse.quote(entry.url, safe='')}{params}"
+        return None
+
+
+async def replay(client: httpx.AsyncClient, entries: List[Entry], router: Router, speed: float):
+    """[(entry, replayed ms or None, status or error name, send lag ms)] for the routed entries."""
+    results = []
+    first = entries[0].started if entries else 0.0
+    start = time.perf_counter()
+
+    async def send(entry: Entry, url: str):
+        if speed > 0:
+            due = start + (entry.started - first) / speed
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            lag = max(0.0, time.perf_counter() - due) * 1000
+        else:
+            lag = 0.0
+        headers = [(k, v) for k, v in entry.headers if k.lower() not in SKIP_HEADERS and not k.startswith(":")]
+        sent = time.perf_counter()
+        try:
+            response = await client.request(entry.method, url, headers=headers, content=entry.body or None)
+            await response.aread()
+            results.append((entry, (time.perf_counter() - sent) * 1000, response.status_code, lag))
+        except httpx.HTTPError as e:
+            results.append((entry, None, type(e).__name__, lag))
+
+    await asyncio.gather(*(send(e, url) for e in entries if (url := router.url(e)) is not None))
+    return results
+
+
+def report(results, skipped: int, elapsed: float) -> None:
+    groups: Dict[str, list] = {}
+    for r in results:
+        groups.setdefault(endpoint(r[0].method, r[0].url), []).append(r)
+    print(f"{'endpoint':<40} {'n':>6} {'cap p50':>9} {'cap p95':>9} {'rep p50':>9} {'rep p95':>9} {'Δp50':>8} {'Δp95':>8}  status diffs")
+    for name, rows in sorted(groups.items(), key=lambda g: -len(g[1])):
+        captured = sorted(r[0].duration_ms for r in rows)
+        replayed = sorted(r[1] for r in rows if r[1] is not None)
+        diffs = {}
+        for entry, _, status, _ in rows:
+            if status != entry.status:
+                diffs[f"{entry.status}->{status}"] = diffs.get(f"{entry.status}->{status}", 0) + 1
+        c50, c95 = percentile(captured, 50), percentile(captured, 95)
+        r50, r95 = percentile(replayed, 50), percentile(replayed, 95)
+        print(f"{name[:40]:<40} {len(rows):>6} {c50:>9.1f} {c95:>9.1f} {r50:>9.1f} {r95:>9.1f} "
+              f"{r50 - c50:>+8.1f} {r95 - c95:>+8.1f}  {diffs or '-'}")
+    lags = sorted(r[3] for r in results)
+    print(f"\n{len(results)} requests replayed in {elapsed:.1f} s, {skipped} skipped (no route); "
+          f"send lag p99 {percentile(lags, 99):.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="HAR or NDJSON capture file")
+    parser.add_argument("--base", required=True, help="Proxy base URL (Go proxy or Python gateway)")
+    parser.add_argument("--key", action="append", default=[], help="target_url=KEY, repeatable")
+    parser.add_argument("--via-proxy", metavar="PARAMS", default=None,
+                        help="Send other GET requests to /proxy?url=... with these query parameters")
+    parser.add_argument("--speed", type=float, default=1.0, help="Timing scale: 2 = twice as fast, 0 = no waits")
+    parser.add_argument("--connections", type=int, default=100, help="Connection pool size")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N requests")
+    args = parser.parse_args()
+
+    keys = {}
+    for spec in args.key:
+        target, _, key = spec.rpartition("=")
+        if not target or not key:
+            parser.error(f"--key must be target_url=KEY: {spec!r}")
+        keys[target] = key
+    entries = load(args.capture)
+    if args.limit:
+        entries = entries[:args.limit]
+    router = Router(args.base, keys, args.via_proxy)
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    # Pool waits count as replayed latency: size the pool for the capture's concurrency
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        results = await replay(client, entries, router, args.speed)
+        elapsed = time.perf_counter() - start
+    report(results, len(entries) - len(results), elapsed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the gateway package as `app` (run from the repository root or with it on sys.path).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
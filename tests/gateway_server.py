@@ -0,0 +1,106 @@
+"""In-process gateway under uvicorn (h11), in front of a raw HTTP/1.1 target, for tests that need the real
+client connection (transport faults, aborted clients). Used as:
+
+    async with GatewayServer(lambda upstream_url: KeyConfig(...), respond) as server:
+        reader, writer = await server.open()
+"""
+import asyncio
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from app.routers import gateway
+
+
+class Upstream:
+    """Target answering each request head with `respond(reader, writer)`; `closed` is set once the
+    gateway closed its connection (or the target stopped answering it)."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.closed = asyncio.Event()
+        self.server = None
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                self.requests.append(await reader.readuntil(b"\r\n\r\n"))
+                if not await self.respond(reader, writer):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self.closed.set()
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:%d" % self.server.sockets[0].getsockname()[1]
+
+
+def response(body: bytes, content_length: int = None) -> bytes:
+    return b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n%s" % (
+        len(body) if content_length is None else content_length, body)
+
+
+async def answer(reader, writer, body=b"hello"):
+    """A complete response; the connection stays open for the next request."""
+    writer.write(response(body))
+    await writer.drain()
+    return True
+
+
+async def stall(reader, writer):
+    """Headers and part of the body, then nothing until the gateway closes the connection."""
+    writer.write(response(b"partial", content_length=1000))
+    await writer.drain()
+    await reader.read()
+    return False
+
+
+class GatewayServer:
+    def __init__(self, config_factory, respond=answer):
+        self.config_factory = config_factory  # upstream URL -> KeyConfig
+        self.upstream = Upstream(respond)
+        self.app = FastAPI()
+        self.app.include_router(gateway.router)
+
+    async def __aenter__(self):
+        self.upstream.server = await asyncio.start_server(self.upstream.handle, "127.0.0.1", 0)
+        self.config = self.config_factory(self.upstream.url)
+
+        async def get(api_key):
+            return self.config if api_key == self.config.key else None
+
+        self._saved = gateway.upstream, gateway.record_outcome
+        self.outcomes = []
+        gateway.key_cache.get = get
+        gateway.record_outcome = lambda config, request, status, *args, **kwargs: self.outcomes.append(status)
+        gateway.upstream = httpx.AsyncClient(timeout=httpx.Timeout(5))
+        gateway.parked.start()
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=0, http="h11", ws="none",
+                                                    lifespan="off", log_level="warning"))
+        self.server.install_signal_handlers = lambda: None
+        self._task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.should_exit = self.server.force_exit = True
+        await self._task
+        gateway.parked.stop()
+        await gateway.upstream.aclose()
+        self.upstream.server.close()
+        gateway.upstream, gateway.record_outcome = self._saved
+        del gateway.key_cache.get  # back to KeyCache.get
+
+    async def open(self, path: str = ""):
+        """Connect and send GET /{key}{path}; returns the client's (reader, writer)."""
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"GET /%s%s HTTP/1.1\r\nHost: gateway\r\n\r\n" % (self.config.key.encode(), path.encode()))
+        await writer.drain()
+        return reader, writer
@@ -0,0 +1,67 @@
+import random
+
+from app.core.bursts import SharedStates
+from app.core.chaos import ChaosSettings, FailureBursts, LocalStates
+
+
+class Draws:
+    """random() returns the given values in turn."""
+
+    def __init__(self, *values):
+        self.values = list(values)
+
+    def random(self):
+        return self.values.pop(0)
+
+
+def test_from_json():
+    assert FailureBursts.from_json(None) is None
+    assert FailureBursts.from_json({"p_enter": 0, "p_exit": 0.5}) is None
+    assert FailureBursts.from_json({"p_enter": "x"}) is None
+    assert FailureBursts.from_json({"p_enter": 2, "p_exit": -1, "bad_fail_rate": 150}) == FailureBursts(1.0, 0.0, 100)
+    assert FailureBursts.from_json({"p_enter": 0.1, "p_exit": 0.2, "bad_fail_rate": 0}).bad_fail_rate == 0
+
+
+def test_step_transitions():
+    bursts = FailureBursts(p_enter=0.1, p_exit=0.25)
+    # Good -> bad when the draw is under p_enter
+    assert bursts.step(False, Draws(0.05)) is True
+    assert bursts.step(False, Draws(0.1)) is False
+    # Bad -> good when the draw is under p_exit
+    assert bursts.step(True, Draws(0.2)) is False
+    assert bursts.step(True, Draws(0.25)) is True
+
+
+def test_apply_only_in_bad_state():
+    bursts = FailureBursts(p_enter=0.5, p_exit=0.5, bad_fail_rate=80)
+    settings = ChaosSettings(fail_rate=5, min_latency=10, max_latency=20)
+    assert bursts.apply(settings, False) is settings
+    assert bursts.apply(settings, True) == ChaosSettings(fail_rate=80, min_latency=10, max_latency=20)
+
+
+def test_stationary_share_of_bad_requests():
+    bursts = FailureBursts(p_enter=0.05, p_exit=0.2)
+    states, rng = LocalStates(), random.Random(1)
+    bad = sum(states.step(1, bursts, rng) for _ in range(50000))
+    assert abs(bad / 50000 - 0.05 / 0.25) < 0.02
+
+
+def test_local_states_are_per_key():
+    bursts = FailureBursts(p_enter=0.5, p_exit=0.5)
+    states = LocalStates()
+    assert states.step(1, bursts, Draws(0.1)) is True
+    assert states.step(2, bursts, Draws(0.9)) is False
+    assert len(states) == 1
+    assert states.step(1, bursts, Draws(0.1)) is False
+    assert len(states) == 0
+
+
+def test_shared_states_are_seen_by_every_worker(tmp_path):
+    bursts = FailureBursts(p_enter=0.5, p_exit=0.5)
+    path = str(tmp_path / "bursts")
+    a, b = SharedStates(path, slots=64), SharedStates(path, slots=64)
+    assert a.step(1, bursts, Draws(0.1)) is True
+    # The other worker moves the same key from bad: a draw of 0.9 keeps it there
+    assert b.step(1, bursts, Draws(0.9)) is True
+    assert a.step(1, bursts, Draws(0.1)) is False
+    assert b.step(2, bursts, Draws(0.9)) is False
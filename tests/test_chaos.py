@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+
+from app.core.chaos import (
+    DEFAULT_ERROR_CODES, ChaosSettings, CounterRng, KeyConfig, Timeline, method_allowed, pick_failure,
+    sample_latency, seeded_rng,
+)
+
+
+class CountingRng:
+    """Fixed draws, counting how many were taken."""
+
+    def __init__(self, value=0.0, index=0):
+        self.value = value
+        self.index = index
+        self.draws = 0
+
+    def random(self):
+        self.draws += 1
+        return self.value
+
+    def randrange(self, n):
+        self.draws += 1
+        return self.index % n
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+
+def key_config(**row):
+    row.setdefault("id", 1)
+    row.setdefault("key", "lp_test")
+    return KeyConfig.from_row(row)
+
+
+def test_from_row_defaults():
+    config = key_config(target_url=" https://example.com ", fail_rate="25", error_codes=[])
+    assert config.target_url == "https://example.com"
+    assert config.method == "ANY"
+    assert config.settings == ChaosSettings(fail_rate=25, error_codes=DEFAULT_ERROR_CODES)
+    assert config.seed_mode == "sequence"
+    assert config.rate_limit is None and config.failure_bursts is None
+
+
+def test_failure_without_error_codes_is_500_without_a_draw():
+    rng = CountingRng(value=0.0)
+    assert pick_failure(ChaosSettings(fail_rate=50, error_codes=()), rng) == 500
+    assert rng.draws == 1
+
+
+def test_single_error_code_takes_no_draw():
+    rng = CountingRng(value=0.0)
+    assert pick_failure(ChaosSettings(fail_rate=50, error_codes=(429,)), rng) == 429
+    assert rng.draws == 1
+
+
+def test_error_code_is_drawn_among_several():
+    rng = CountingRng(value=0.0, index=1)
+    assert pick_failure(ChaosSettings(fail_rate=50, error_codes=(500, 502, 503)), rng) == 502
+    assert rng.draws == 2
+
+
+def test_no_failure_above_fail_rate():
+    assert pick_failure(ChaosSettings(fail_rate=50), CountingRng(value=0.5)) is None
+    rng = CountingRng(value=0.0)
+    assert pick_failure(ChaosSettings(fail_rate=0), rng) is None
+    assert rng.draws == 0
+
+
+def test_sample_latency_range():
+    assert sample_latency(ChaosSettings(min_latency=100, max_latency=100)) == 100
+    assert sample_latency(ChaosSettings(min_latency=100, max_latency=200), CountingRng(index=42)) == 142
+    assert all(100 <= sample_latency(ChaosSettings(min_latency=100, max_latency=200), CounterRng(7, n)) < 200
+               for n in range(1000))
+
+
+def test_counter_rng_is_pure_and_uniform():
+    assert [CounterRng(42, 3).next64() for _ in range(2)] == [CounterRng(42, 3).next64()] * 2
+    assert CounterRng(42, 3).next64() != CounterRng(42, 4).next64()
+    values = [CounterRng(1, n).random() for n in range(10000)]
+    assert all(0.0 <= v < 1.0 for v in values)
+    assert abs(sum(values) / len(values) - 0.5) < 0.02
+
+
+def test_counter_rng_sample_is_distinct():
+    rng = CounterRng(9, 1)
+    picked = rng.sample(range(100), 20)
+    assert len(set(picked)) == 20 and all(0 <= p < 100 for p in picked)
+    assert sorted(CounterRng(9, 2).sample("abcde", 5)) == list("abcde")
+
+
+def test_timeline_phases_and_repeat():
+    schedule = {
+        "start_at": "2026-01-01T00:00:00",
+        "repeat": True,
+        "phases": [
+            {"duration": 60, "fail_rate": 0},
+            {"duration": 0, "fail_rate": 99},
+            {"duration": 30, "fail_rate": 80, "error_codes": [503]},
+        ],
+    }
+    config = key_config(fail_rate=10, schedule=schedule)
+    start = config.timeline.start
+    assert config.chaos_at(start - 1).fail_rate == 10
+    assert config.chaos_at(start + 59).fail_rate == 0
+    assert config.chaos_at(start + 60) == ChaosSettings(fail_rate=80, error_codes=(503,))
+    assert config.chaos_at(start + 90 + 75).fail_rate == 80
+    assert Timeline.compile({"phases": [{"duration": "x"}]}) is None
+
+
+def test_seeded_rng_sequence_and_request_modes():
+    sequences = {}
+    config = key_config(seed=42)
+    numbers = [seeded_rng(config, None, None, lambda: b"", sequences)[1] for _ in range(3)]
+    assert numbers == [0, 1, 2]
+    rng, seq = seeded_rng(config, None, 7, lambda: b"", sequences)
+    assert seq == 7 and rng.next64() == CounterRng(42, 7).next64()
+
+    by_request = key_config(seed=42, seed_mode="request")
+    first = seeded_rng(by_request, None, None, lambda: b"GET /lp_test/a", sequences)[1]
+    assert first == seeded_rng(by_request, None, None, lambda: b"GET /lp_test/a", sequences)[1]
+    assert first != seeded_rng(by_request, None, None, lambda: b"GET /lp_test/b", sequences)[1]
+
+    assert seeded_rng(key_config(), None, None, lambda: b"", sequences)[1] is None
+
+
+def test_method_allowed():
+    assert method_allowed(key_config(), "delete")
+    assert method_allowed(key_config(method="post"), "POST")
+    assert not method_allowed(key_config(method="POST"), "GET")
+
+
+def test_chaos_imports_stay_light():
+    # mitmproxy_addon.py imports app.core.chaos inside mitmproxy: no pydantic, store or shared slots
+    code = "import sys, app.core.chaos; print(sorted(m for m in sys.modules if m.startswith(('app', 'pydantic'))))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "['app', 'app.core', 'app.core.chaos']"
@@ -0,0 +1,53 @@
+"""Seeded chaos must make the same decisions in the Python gateway and the Go proxy. The expected
+values below were produced by proxy/internal/chaos (CounterRNG, Hash64) and the Go handler's decision
+order; proxy/internal/chaos/rng_test.go checks the same numbers on the Go side."""
+import pytest
+
+from app.core.chaos import ChaosSettings, CounterRng, fnv1a64, mix64, pick_failure, sample_latency
+
+MASK64 = (1 << 64) - 1
+
+
+@pytest.mark.parametrize("seed, n, expected", [
+    (0, 0, [17913671590881668180, 5125111896206277188, 16650050240625395466]),
+    (42, 0, [9768087101940977081, 16198280482362107779, 5575036784327092912]),
+    (42, 1, [10484939787884347202, 209618559335851655, 1465413541280160453]),
+    (MASK64, 12345, [15781758747013243463, 11432469452498933060, 16155869564082819130]),
+])
+def test_counter_rng_stream(seed, n, expected):
+    rng = CounterRng(seed, n)
+    assert [rng.next64() for _ in range(3)] == expected
+
+
+@pytest.mark.parametrize("seed, n, value, intn", [
+    (0, 0, 0.97110208280128829, 188),
+    (42, 0, 0.52952906284760204, 779),
+    (42, 1, 0.56838972482019556, 655),
+    (MASK64, 12345, 0.85553085595769351, 60),
+])
+def test_float_and_intn(seed, n, value, intn):
+    rng = CounterRng(seed, n)
+    assert rng.random() == value
+    assert rng.randrange(1000) == intn
+
+
+def test_mix64_and_request_hash():
+    assert mix64(123456789) == 2466975172287755897
+    assert fnv1a64(b"GET /lp_test/a?x=1\nreq-1") == 336266627662317258
+
+
+def decide(n, settings):
+    rng = CounterRng(7, n)
+    latency = sample_latency(settings, rng)
+    return latency, pick_failure(settings, rng) or 0
+
+
+@pytest.mark.parametrize("error_codes, codes", [
+    ((), [0, 0, 0, 500, 0, 500, 500, 0, 500, 500, 0, 0]),
+    ((429,), [0, 0, 0, 429, 0, 429, 429, 0, 429, 429, 0, 0]),
+    ((500, 502, 503), [0, 0, 0, 503, 0, 503, 503, 0, 500, 502, 0, 0]),
+])
+def test_decisions_match_the_go_proxy(error_codes, codes):
+    settings = ChaosSettings(fail_rate=50, min_latency=100, max_latency=300, error_codes=error_codes)
+    latencies = [231, 250, 106, 251, 294, 211, 258, 113, 131, 228, 188, 291]
+    assert [decide(n, settings) for n in range(12)] == list(zip(latencies, codes))
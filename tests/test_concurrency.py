@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.core.chaos import ConcurrencyLimit
+from app.core.concurrency import Bulkheads
+
+
+def test_from_json():
+    assert ConcurrencyLimit.from_json(None) is None
+    assert ConcurrencyLimit.from_json({"max_in_flight": 0, "queue": 5}) is None
+    assert ConcurrencyLimit.from_json({"max_in_flight": "x"}) is None
+    assert ConcurrencyLimit.from_json({"max_in_flight": 2, "queue": -1}) == ConcurrencyLimit(2, 0, 1000, 0)
+
+
+def test_saturated_without_queue_rejects():
+    async def main():
+        bulkheads = Bulkheads()
+        limit = ConcurrencyLimit(max_in_flight=1)
+        slot, position = await bulkheads.acquire(1, limit)
+        assert slot is not None and position == 0
+        assert await bulkheads.acquire(1, limit) == (None, 1)
+        # Other keys have slots of their own
+        other, _ = await bulkheads.acquire(2, limit)
+        assert other is not None
+        assert bulkheads.rejected == 1 and bulkheads.in_flight() == 2
+        slot.release()
+        slot.release()  # idempotent
+        other.release()
+        assert bulkheads.keys == {}
+
+    asyncio.run(main())
+
+
+def test_queue_is_served_in_arrival_order():
+    async def main():
+        bulkheads = Bulkheads()
+        limit = ConcurrencyLimit(max_in_flight=1, queue=2, queue_timeout_ms=1000)
+        first, _ = await bulkheads.acquire(1, limit)
+        second = asyncio.create_task(bulkheads.acquire(1, limit))
+        third = asyncio.create_task(bulkheads.acquire(1, limit))
+        await asyncio.sleep(0)
+        assert bulkheads.queued() == 2
+        # Queue full: the fourth is rejected at once with its would-be position
+        assert await bulkheads.acquire(1, limit) == (None, 3)
+        first.release()
+        slot, position = await second
+        assert position == 1 and not third.done()
+        assert bulkheads.in_flight() == 1 and bulkheads.queued() == 1
+        slot.release()
+        slot, position = await third
+        assert position == 2
+        slot.release()
+        assert bulkheads.keys == {}
+
+    asyncio.run(main())
+
+
+def test_queue_timeout():
+    async def main():
+        bulkheads = Bulkheads()
+        limit = ConcurrencyLimit(max_in_flight=1, queue=1, queue_timeout_ms=10)
+        slot, _ = await bulkheads.acquire(1, limit)
+        assert await bulkheads.acquire(1, limit) == (None, 1)
+        assert bulkheads.timed_out == 1 and bulkheads.queued() == 0
+        slot.release()
+        assert bulkheads.keys == {}
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        bulkheads = Bulkheads()
+        limit = ConcurrencyLimit(max_in_flight=1, queue=2, queue_timeout_ms=1000)
+        slot, _ = await bulkheads.acquire(1, limit)
+        gone = asyncio.create_task(bulkheads.acquire(1, limit))
+        waiting = asyncio.create_task(bulkheads.acquire(1, limit))
+        await asyncio.sleep(0)
+        # Client gone while queued: its place is given up, the next waiter gets the slot
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        assert bulkheads.queued() == 1
+        slot.release()
+        slot, position = await waiting
+        assert position == 2 and bulkheads.in_flight() == 1
+        slot.release()
+        assert bulkheads.keys == {}
+
+    asyncio.run(main())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_not_lost():
+    async def main():
+        bulkheads = Bulkheads()
+        limit = ConcurrencyLimit(max_in_flight=1, queue=2, queue_timeout_ms=1000)
+        slot, _ = await bulkheads.acquire(1, limit)
+        gone = asyncio.create_task(bulkheads.acquire(1, limit))
+        waiting = asyncio.create_task(bulkheads.acquire(1, limit))
+        await asyncio.sleep(0)
+        # The slot is handed over, then the waiter is cancelled before it resumes: either it returns the
+        # slot anyway (wait_for may keep a finished result) or it passes the slot on
+        slot.release()
+        gone.cancel()
+        try:
+            slot, _ = await gone
+            slot.release()
+        except asyncio.CancelledError:
+            pass
+        slot, position = await waiting
+        assert position == 2 and bulkheads.in_flight() == 1
+        slot.release()
+        assert bulkheads.keys == {}
+
+    asyncio.run(main())
+
+
+def test_lowered_limit_drains_as_slots_are_released():
+    async def main():
+        bulkheads = Bulkheads()
+        slots = [(await bulkheads.acquire(1, ConcurrencyLimit(max_in_flight=2)))[0] for _ in range(2)]
+        lowered = ConcurrencyLimit(max_in_flight=1, queue=1, queue_timeout_ms=1000)
+        waiter = asyncio.create_task(bulkheads.acquire(1, lowered))
+        await asyncio.sleep(0)
+        slots[0].release()
+        await asyncio.sleep(0)
+        # Still one in flight, at the new limit: the waiter keeps waiting
+        assert not waiter.done()
+        slots[1].release()
+        slot, position = await waiter
+        assert slot is not None and position == 1
+        slot.release()
+
+    asyncio.run(main())
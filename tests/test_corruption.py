@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.core.chaos import Corruption, CounterRng, pick_corruption
+from app.core.corruption import MALFORMED_JSON_TAIL, ConnectionDropped, corrupt_body, strips_content_length
+
+BODY = bytes(range(256)) * 40  # 10240 bytes
+
+
+class Source:
+    """Upstream body in fixed-size chunks, remembering whether it was closed early."""
+
+    def __init__(self, data, size=1000):
+        self.chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        self.read = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read == len(self.chunks):
+            raise StopAsyncIteration
+        self.read += 1
+        return self.chunks[self.read - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+def relay(mode, corruption, content_length=len(BODY), rng=None, drop=None, source=None):
+    source = source or Source(BODY)
+
+    async def run():
+        return [chunk async for chunk in corrupt_body(source, mode, corruption, content_length,
+                                                      rng or CounterRng(1, 1), drop)]
+
+    return b"".join(asyncio.run(run())), source
+
+
+def test_truncate_at_percentage_stops_reading_upstream():
+    body, source = relay("truncate", Corruption(rate=100, truncate_at=25))
+    assert body == BODY[:2560]
+    assert source.read == 3 and source.closed
+
+
+def test_random_cut_without_content_length_is_in_the_first_chunk():
+    body, _ = relay("truncate", Corruption(rate=100), content_length=None)
+    assert len(body) < 1000 and BODY.startswith(body)
+
+
+def test_flip_changes_exactly_flip_bytes_bytes():
+    body, source = relay("flip", Corruption(rate=100, modes=("flip",), flip_bytes=12))
+    assert len(body) == len(BODY) and source.read == len(source.chunks)
+    assert sum(a != b for a, b in zip(body, BODY)) == 12
+
+
+def test_flip_is_reproducible_with_a_seed():
+    corruption = Corruption(rate=100, modes=("flip",), flip_bytes=5)
+    assert relay("flip", corruption, rng=CounterRng(7, 3))[0] == relay("flip", corruption, rng=CounterRng(7, 3))[0]
+    assert relay("flip", corruption, rng=CounterRng(7, 3))[0] != relay("flip", corruption, rng=CounterRng(7, 4))[0]
+
+
+def test_flip_short_body():
+    body, _ = relay("flip", Corruption(rate=100, modes=("flip",), flip_bytes=50), source=Source(b"abc"), content_length=3)
+    assert body == bytes(b ^ 0xFF for b in b"abc")
+
+
+def test_malformed_json_appends_the_tail():
+    body, _ = relay("malformed_json", Corruption(rate=100, truncate_at=50))
+    assert body == BODY[:5120] + MALFORMED_JSON_TAIL
+
+
+def test_drop_closes_the_connection_after_the_cut():
+    dropped = []
+    body, source = relay("drop", Corruption(rate=100, truncate_at=10), drop=lambda: dropped.append(True))
+    assert body == BODY[:1024] and dropped == [True] and source.closed
+
+
+def test_drop_without_a_connection_raises():
+    with pytest.raises(ConnectionDropped):
+        relay("drop", Corruption(rate=100, truncate_at=10))
+
+
+def test_content_length_handling():
+    assert strips_content_length("truncate") and strips_content_length("malformed_json")
+    assert not strips_content_length("drop") and not strips_content_length("flip")
+
+
+def test_corruption_config():
+    assert Corruption.from_json({"rate": 0}) is None
+    assert Corruption.from_json({"rate": 150, "modes": ["bogus"]}) is None
+    c = Corruption.from_json({"rate": 150, "modes": ["drop", "bogus"], "truncate_at": -5})
+    assert c == Corruption(rate=100, modes=("drop",), truncate_at=0)
+    assert pick_corruption(c, CounterRng(1, 1)) == "drop"
+    assert pick_corruption(None) is None
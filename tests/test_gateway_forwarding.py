@@ -0,0 +1,85 @@
+import asyncio
+
+from app.core.chaos import ChaosSettings, ConcurrencyLimit, KeyConfig, TransportFaults
+from app.routers import gateway
+from gateway_server import GatewayServer, stall
+
+
+def key(**fields):
+    return lambda upstream_url: KeyConfig(id=1, key="lp_test", target_url=upstream_url, method="ANY",
+                                          settings=ChaosSettings(), **fields)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(next(line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")))
+    return head, await reader.readexactly(length)
+
+
+def test_request_is_forwarded_and_the_connection_reused():
+    async def main():
+        async with GatewayServer(key()) as server:
+            reader, writer = await server.open("/items?x=1")
+            head, body = await read_response(reader)
+            assert head.startswith(b"HTTP/1.1 200") and body == b"hello"
+            assert b"x-latency-poison-fail-rate: 0" in head.lower()
+            assert server.upstream.requests[0].startswith(b"GET /items?x=1 HTTP/1.1")
+            writer.close()
+            reader, writer = await server.open()
+            await read_response(reader)
+            writer.close()
+            # Both requests went over one pooled connection, idle again
+            assert len(server.upstream.requests) == 2 and gateway.pool_connections() == 1
+            assert server.outcomes == [200, 200]
+
+    asyncio.run(main())
+
+
+def test_client_abort_mid_body_closes_the_upstream_response():
+    async def main():
+        async with GatewayServer(key(concurrency_limit=ConcurrencyLimit(max_in_flight=1)), stall) as server:
+            reader, writer = await server.open()
+            await reader.readuntil(b"partial")
+            writer.close()
+            await asyncio.wait_for(server.upstream.closed.wait(), 2)
+            assert gateway.pool_connections() == 0
+            assert gateway.bulkheads.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_handler_cancelled_before_the_body_starts_closes_the_upstream_response():
+    # slow_first_byte holds the target's response in the handler; a cancelled handler (e.g. server shutdown)
+    # never builds the response whose body would have closed it
+    faults = TransportFaults(rate=100, modes=("slow_first_byte",), delay_ms=5000)
+
+    async def main():
+        async with GatewayServer(key(transport_faults=faults, concurrency_limit=ConcurrencyLimit(max_in_flight=1)),
+                                 stall) as server:
+            await server.open()
+            while not server.upstream.requests:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            for task in server.server.server_state.tasks:
+                task.cancel()
+            await asyncio.wait_for(server.upstream.closed.wait(), 2)
+            assert gateway.bulkheads.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_error_after_the_upstream_answered_closes_its_response(monkeypatch):
+    def pick_corruption(corruption, rng):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(gateway, "pick_corruption", pick_corruption)
+
+    async def main():
+        async with GatewayServer(key(), stall) as server:
+            reader, writer = await server.open()
+            head = await reader.readuntil(b"\r\n\r\n")
+            assert head.startswith(b"HTTP/1.1 500")
+            await asyncio.wait_for(server.upstream.closed.wait(), 2)
+            assert gateway.pool_connections() == 0
+
+    asyncio.run(main())
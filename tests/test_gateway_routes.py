@@ -0,0 +1,36 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import gateway
+
+
+@pytest.fixture
+def client(monkeypatch):
+    lookups = []
+
+    async def get(api_key):
+        lookups.append(api_key)
+        return None
+
+    monkeypatch.setattr(gateway.key_cache, "get", get)
+    # No context manager: startup (database, upstream pool) is not needed for routing
+    client = TestClient(app)
+    client.lookups = lookups
+    return client
+
+
+def test_config_key_paths_reach_the_gateway(client):
+    assert client.get("/lp_unknown").status_code == 401
+    response = client.post("/lp_unknown/v1/items?x=1")
+    assert response.status_code == 401
+    assert response.json() == {"error": "Invalid or inactive API key"}
+    assert client.lookups == ["lp_unknown", "lp_unknown"]
+
+
+def test_other_paths_keep_the_app_routing(client):
+    assert client.get("/api/tunnels", follow_redirects=False).status_code == 307
+    assert client.post("/proxy").status_code == 405
+    assert client.delete("/api/auth/login").status_code == 405
+    assert client.get("/favicon.ico").status_code == 404
+    assert client.lookups == []
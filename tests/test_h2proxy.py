@@ -0,0 +1,217 @@
+import asyncio
+
+import h2.config
+import h2.connection
+import h2.errors
+import h2.events
+
+from app.core.chaos import ChaosSettings, KeyConfig
+from app.h2proxy import H2Proxy
+
+
+class Target:
+    """In-process h2c server: /echo answers with the request body, /grpc-error with a gRPC error in trailers,
+    /reset resets the stream after its headers; /wait answers nothing. Keeps what it received."""
+
+    def __init__(self):
+        self.requests = {}
+        self.resets = []
+        self.server = None
+        self.done = asyncio.Event()
+
+    async def handle(self, reader, writer):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding=None))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        bodies = {}
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    self.requests[event.stream_id] = dict(event.headers)
+                    bodies[event.stream_id] = b""
+                elif isinstance(event, h2.events.DataReceived):
+                    bodies[event.stream_id] += event.data
+                    conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    self.respond(conn, event.stream_id, bodies[event.stream_id])
+                elif isinstance(event, h2.events.StreamReset):
+                    self.resets.append(event.error_code)
+            writer.write(conn.data_to_send())
+        writer.close()
+        self.done.set()
+
+    def respond(self, conn, stream_id, body):
+        path = self.requests[stream_id][b":path"].split(b"?")[0]
+        if path.endswith(b"/echo"):
+            conn.send_headers(stream_id, [(b":status", b"200"), (b"x-target", b"1")])
+            conn.send_data(stream_id, b"echo:" + body, end_stream=True)
+        elif path.endswith(b"/grpc-error"):
+            conn.send_headers(stream_id, [(b":status", b"200"), (b"content-type", b"application/grpc")])
+            conn.send_data(stream_id, b"\x00\x00\x00\x00\x00")
+            conn.send_headers(stream_id, [(b"grpc-status", b"5"), (b"grpc-message", b"not found")], end_stream=True)
+        elif path.endswith(b"/reset"):
+            conn.send_headers(stream_id, [(b":status", b"200")])
+            conn.reset_stream(stream_id, h2.errors.ErrorCodes.REFUSED_STREAM)
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=True, header_encoding=None))
+        self.conn.initiate_connection()
+        self.writer.write(self.conn.data_to_send())
+
+    def request(self, path: bytes, headers=(), body=b"", end=True) -> int:
+        stream_id = self.conn.get_next_available_stream_id()
+        self.conn.send_headers(stream_id, [(b":method", b"POST"), (b":scheme", b"http"), (b":authority", b"proxy"),
+                                           (b":path", path)] + list(headers), end_stream=end and not body)
+        if body:
+            self.conn.send_data(stream_id, body, end_stream=end)
+        self.writer.write(self.conn.data_to_send())
+        return stream_id
+
+    async def response(self, stream_id: int) -> dict:
+        """headers, data, trailers and reset (error code) of the stream, once it ended."""
+        result = {"headers": {}, "data": b"", "trailers": {}, "reset": None}
+        while True:
+            data = await asyncio.wait_for(self.reader.read(65536), 5)
+            assert data, "connection closed"
+            for event in self.conn.receive_data(data):
+                if getattr(event, "stream_id", None) != stream_id:
+                    continue
+                if isinstance(event, h2.events.ResponseReceived):
+                    result["headers"] = dict(event.headers)
+                elif isinstance(event, h2.events.DataReceived):
+                    result["data"] += event.data
+                    self.conn.acknowledge_received_data(event.flow_controlled_length, stream_id)
+                elif isinstance(event, h2.events.TrailersReceived):
+                    result["trailers"] = dict(event.headers)
+                elif isinstance(event, h2.events.StreamReset):
+                    result["reset"] = event.error_code
+                    return result
+                elif isinstance(event, h2.events.StreamEnded):
+                    return result
+            self.writer.write(self.conn.data_to_send())
+
+
+def run(test, get_key=None):
+    """Run `test(client, target)` against an H2Proxy whose only key, lp_test, targets the Target."""
+    async def main():
+        target = Target()
+        target.server = await asyncio.start_server(target.handle, "127.0.0.1", 0)
+        port = target.server.sockets[0].getsockname()[1]
+        config = KeyConfig(id=1, key="lp_test", target_url=f"http://127.0.0.1:{port}/base", method="ANY",
+                           settings=ChaosSettings())
+        proxy = H2Proxy()
+
+        async def get(api_key):
+            return config if api_key == "lp_test" else None
+
+        proxy.keys.get = get_key or get
+        served = asyncio.Event()
+
+        async def serve_connection(reader, writer):
+            await proxy.serve_connection(reader, writer)
+            served.set()
+
+        server = await asyncio.start_server(serve_connection, "127.0.0.1", 0)
+        client = Client(*await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1]))
+        try:
+            await test(client, target)
+        finally:
+            client.writer.close()
+            await proxy.upstreams.close()
+            # Both connections end on EOF
+            await asyncio.wait_for(served.wait(), 2)
+            if target.requests:
+                await asyncio.wait_for(target.done.wait(), 2)
+            server.close()
+            target.server.close()
+
+    asyncio.run(main())
+
+
+KEY = [(b"x-latency-poison-key", b"lp_test")]
+
+
+def test_call_is_forwarded():
+    async def test(client, target):
+        stream_id = client.request(b"/echo?x=1", KEY + [(b"x-custom", b"a")], body=b"ping")
+        response = await client.response(stream_id)
+        assert response["headers"][b":status"] == b"200"
+        assert response["headers"][b"x-target"] == b"1"
+        assert response["headers"][b"x-latency-poison-fail-rate"] == b"0"
+        assert response["data"] == b"echo:ping"
+        forwarded = next(iter(target.requests.values()))
+        assert forwarded[b":path"] == b"/base/echo?x=1"
+        assert forwarded[b"x-custom"] == b"a" and b"x-latency-poison-key" not in forwarded
+
+    run(test)
+
+
+def test_grpc_error_trailers_are_passed_through():
+    async def test(client, target):
+        stream_id = client.request(b"/pkg.Svc/grpc-error", KEY + [(b"content-type", b"application/grpc")],
+                                   body=b"\x00\x00\x00\x00\x00")
+        response = await client.response(stream_id)
+        assert response["headers"][b"content-type"] == b"application/grpc"
+        assert response["trailers"] == {b"grpc-status": b"5", b"grpc-message": b"not found"}
+
+    run(test)
+
+
+def test_unknown_key_is_401():
+    async def test(client, target):
+        response = await client.response(client.request(b"/echo", [(b"x-latency-poison-key", b"lp_nope")]))
+        assert response["headers"][b":status"] == b"401"
+        assert response["data"] == b'{"error": "Invalid or inactive API key"}'
+        # gRPC calls get a trailers-only UNAUTHENTICATED
+        response = await client.response(client.request(b"/echo", [(b"content-type", b"application/grpc")]))
+        assert response["headers"][b"grpc-status"] == b"16"
+        assert target.requests == {}
+
+    run(test)
+
+
+def test_upstream_reset_is_passed_to_the_client():
+    async def test(client, target):
+        response = await client.response(client.request(b"/reset", KEY))
+        assert response["headers"][b":status"] == b"200"
+        assert response["reset"] == h2.errors.ErrorCodes.REFUSED_STREAM
+        # The connection is still usable
+        response = await client.response(client.request(b"/echo", KEY))
+        assert response["data"] == b"echo:"
+
+    run(test)
+
+
+def test_client_reset_is_passed_upstream():
+    async def test(client, target):
+        stream_id = client.request(b"/wait", KEY, body=b"partial", end=False)
+        while not target.requests:
+            await asyncio.sleep(0.01)
+        client.conn.reset_stream(stream_id, h2.errors.ErrorCodes.CANCEL)
+        client.writer.write(client.conn.data_to_send())
+        for _ in range(100):
+            if target.resets:
+                break
+            await asyncio.sleep(0.01)
+        assert target.resets == [h2.errors.ErrorCodes.CANCEL]
+
+    run(test)
+
+
+def test_key_store_failure_is_503():
+    async def get(api_key):
+        raise RuntimeError("database unavailable")
+
+    async def test(client, target):
+        response = await client.response(client.request(b"/echo", KEY))
+        assert response["headers"][b":status"] == b"503"
+        response = await client.response(client.request(b"/echo", KEY + [(b"content-type", b"application/grpc")]))
+        assert response["headers"][b"grpc-status"] == b"14"
+
+    run(test, get)
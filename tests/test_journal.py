@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.journal import (
+    FLAG_INJECTED, FLAG_RATE_LIMITED, FLAG_UPSTREAM_ERROR, JournalWriter, read_window, window_stats,
+)
+from app.core.security import create_access_token
+from app.main import app
+from app.routers import journal as journal_router
+
+T0 = 1_800_000_000.0
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    writer = JournalWriter(str(tmp_path), max_bytes=16 + 32 * 50)
+    for i in range(100):
+        writer.record(1, 200, delay_ms=10, upstream_us=1000 + i, total_us=12_000 + i * 10, method="GET", ts=T0 + i)
+    writer.record(1, 503, FLAG_INJECTED, delay_ms=10, total_us=10_500, method="POST", ts=T0 + 100)
+    writer.record(2, 429, FLAG_INJECTED | FLAG_RATE_LIMITED, method="GET", ts=T0 + 101)
+    writer.record(2, 502, FLAG_UPSTREAM_ERROR, total_us=30_000, method="PURGE", ts=T0 + 102)
+    asyncio.run(writer.stop())
+    return str(tmp_path)
+
+
+def test_read_window_spans_rotated_files(journal_dir):
+    records = list(read_window(journal_dir, int((T0 + 40) * 1e6), int((T0 + 60) * 1e6)))
+    assert [r[0] for r in records] == [int((T0 + i) * 1e6) for i in range(40, 60)]
+
+
+def test_window_stats(journal_dir):
+    stats = window_stats(journal_dir, T0, T0 + 200)
+    assert stats["requests"] == 103
+    assert stats["status"] == {"200": 100, "429": 1, "502": 1, "503": 1}
+    assert stats["errors"]["total"] == 3
+    assert stats["errors"]["injected"] == 2
+    assert stats["errors"]["rate_limited"] == 1
+    assert stats["errors"]["upstream_unreachable"] == 1
+    assert stats["errors"]["from_target"] == 0
+    assert stats["methods"] == {"GET": 101, "POST": 1, "OTHER": 1}
+    p50 = stats["latency_ms"]["total"]["p50"]
+    assert abs(p50 - 12.5) <= 12.5 / 16
+    assert stats["latency_ms"]["injected_delay"]["p50"] == 10
+
+
+def test_window_stats_key_filters(journal_dir):
+    assert window_stats(journal_dir, T0, T0 + 200, key_id=2)["requests"] == 2
+    assert window_stats(journal_dir, T0, T0 + 200, key_ids={2, 3})["requests"] == 2
+    assert window_stats(journal_dir, T0, T0 + 200, key_ids=set())["requests"] == 0
+    empty = window_stats(journal_dir, T0 + 500, T0 + 600)
+    assert empty["requests"] == 0 and empty["latency_ms"]["total"]["p50"] is None
+
+
+@pytest.fixture
+def client(journal_dir, monkeypatch):
+    monkeypatch.setattr(journal_router, "JOURNAL_DIR", journal_dir)
+    monkeypatch.setattr(journal_router, "owned_key_ids", lambda email: {2} if email == "bob@example.com" else set())
+    monkeypatch.setattr("app.core.security.ADMIN_EMAILS", frozenset({"admin@example.com"}))
+    return TestClient(app)
+
+
+def stats(client, email, **params):
+    token = create_access_token({"sub": email})
+    params.update(since=T0, until=T0 + 200)
+    return client.get("/api/journal/stats", params=params, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_stats_are_limited_to_the_callers_keys(client):
+    assert stats(client, "bob@example.com").json()["requests"] == 2
+    assert stats(client, "bob@example.com", key_id=2).json()["requests"] == 2
+    assert stats(client, "bob@example.com", key_id=1).status_code == 404
+    assert stats(client, "eve@example.com").json()["requests"] == 0
+
+
+def test_admins_see_every_key(client):
+    assert stats(client, "admin@example.com").json()["requests"] == 103
+    assert stats(client, "admin@example.com", key_id=1).json()["requests"] == 101
+
+
+def test_stats_require_a_token(client):
+    assert client.get("/api/journal/stats").status_code == 401
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mitmproxy")  # not a dependency of the gateway: the addon runs inside mitmproxy
+
+from mitmproxy import http
+from mitmproxy.test import tflow
+
+from mitmproxy_addon import LatencyPoisonAddon
+from replay_capture import endpoint, load, load_ndjson
+
+
+def flow(method, url, content, headers, status, started, ended):
+    request = http.Request.make(method, url, content, headers)
+    request.timestamp_start = started
+    response = http.Response.make(status, b"ok")
+    response.timestamp_end = ended
+    return tflow.tflow(req=request, resp=response)
+
+
+def test_capture_lines_load_for_replay(tmp_path):
+    path = tmp_path / "capture.ndjson"
+    addon = LatencyPoisonAddon()
+    # Unmapped hosts go to the generic route: the capture must keep the URL from before the rewrite
+    addon.apikey = "lp_generic"
+    addon.proxy_host, addon.proxy_hostname, addon.proxy_port = "localhost:8080", "localhost", 8080
+    addon.capture_file = open(path, "a", encoding="utf-8", buffering=1)
+    flows = [
+        flow("POST", "https://api.example.com/users/42?full=1", "héllo".encode(),
+             ((b"Accept", b"*/*"), (b"X-Tag", b"a"), (b"X-Tag", b"b")), 201, 1700000001.0, 1700000001.0425),
+        flow("PUT", "https://api.example.com/avatar", b"\x89PNG\xff\x00", (), 204, 1700000000.5, 1700000000.51),
+        flow("GET", "http://localhost:3000/", b"", (), 503, 1700000002.0, 1700000003.0),
+    ]
+    for f in flows:
+        asyncio.run(addon.request(f))
+        addon.response(f)
+    addon.done()
+
+    assert flows[0].request.path.startswith("/proxy/?url=https%3A%2F%2Fapi.example.com")
+    with open(path, encoding="utf-8") as lines:
+        entries = load_ndjson(lines)
+    assert [(e.method, e.url, e.status) for e in entries] == [
+        ("POST", "https://api.example.com/users/42?full=1", 201),
+        ("PUT", "https://api.example.com/avatar", 204),
+        ("GET", "http://localhost:3000/", 503),
+    ]
+    first = entries[0]
+    assert first.started == 1700000001.0
+    assert first.duration_ms == pytest.approx(42.5, abs=0.01)
+    assert [h for h in first.headers if h[0].lower() != "content-length"] == [("Accept", "*/*"), ("X-Tag", "a"), ("X-Tag", "b")]
+    assert [e.body for e in entries] == ["héllo".encode(), b"\x89PNG\xff\x00", b""]
+    assert endpoint(first.method, first.url) == "POST /users/{id}"
+
+    # load() sorts by start time, as the replay sends them
+    assert [e.method for e in load(str(path))] == ["PUT", "POST", "GET"]
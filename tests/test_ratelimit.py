@@ -0,0 +1,72 @@
+import pytest
+
+from app.core.chaos import RateLimit
+from app.core.ratelimit import LocalBuckets, SharedBuckets, gcra
+
+
+def run(limit, times, tat=0.0):
+    decisions = []
+    for now in times:
+        decision, tat = gcra(limit, tat, now)
+        decisions.append(decision)
+    return decisions, tat
+
+
+def test_burst_then_denied():
+    decisions, tat = run(RateLimit(rate=2, burst=3), [10.0] * 4)
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions] == [2, 1, 0, 0]
+    assert tat == pytest.approx(11.5)
+    denied = decisions[-1]
+    assert denied.retry_after == pytest.approx(0.5)
+    assert denied.reset == pytest.approx(1.5)
+    assert denied.headers()["Retry-After"] == "1"
+
+
+def test_refill_at_rate():
+    limit = RateLimit(rate=2, burst=3)
+    _, tat = run(limit, [10.0] * 3)
+    # One token back every 0.5 s
+    decision, tat = gcra(limit, tat, 10.49)
+    assert not decision.allowed
+    decision, tat = gcra(limit, tat, 10.5)
+    assert decision.allowed and decision.remaining == 0
+    # Idle long enough: full bucket again, TAT in the past is clamped to now
+    decision, _ = gcra(limit, tat, 100.0)
+    assert decision.allowed and decision.remaining == 2
+    assert decision.reset == pytest.approx(0.5)
+
+
+def test_denied_request_does_not_move_tat():
+    limit = RateLimit(rate=1, burst=1)
+    decision, tat = gcra(limit, 0.0, 5.0)
+    assert decision.allowed and tat == pytest.approx(6.0)
+    decision, after = gcra(limit, tat, 5.2)
+    assert not decision.allowed and after == tat
+    assert decision.retry_after == pytest.approx(0.8)
+
+
+def test_allowed_headers_have_no_retry_after():
+    decision, _ = gcra(RateLimit(rate=5, burst=5), 0.0, 1.0)
+    headers = decision.headers()
+    assert headers["X-RateLimit-Limit"] == "5"
+    assert headers["X-RateLimit-Remaining"] == "4"
+    assert "Retry-After" not in headers
+
+
+def test_local_buckets_forget_full_buckets_when_full():
+    buckets = LocalBuckets(max_keys=2)
+    limit = RateLimit(rate=1000, burst=1)
+    buckets.take(1, limit)
+    buckets.take(2, limit)
+    buckets.tats[1] = 0.0  # long past: a full bucket
+    buckets.take(3, limit)
+    assert set(buckets.tats) == {2, 3}
+
+
+def test_shared_buckets_are_per_key(tmp_path):
+    path = str(tmp_path / "ratelimit")
+    limit = RateLimit(rate=0.001, burst=2)
+    a, b = SharedBuckets(path, slots=64), SharedBuckets(path, slots=64)
+    assert [a.take(1, limit).allowed, b.take(1, limit).allowed, a.take(1, limit).allowed] == [True, True, False]
+    assert b.take(2, limit).allowed
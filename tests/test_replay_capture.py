@@ -0,0 +1,114 @@
+import base64
+import json
+
+from replay_capture import Entry, Router, endpoint, load, load_har, load_ndjson
+
+
+def entry(url, method="GET"):
+    return Entry(started=0.0, method=method, url=url, headers=[], body=b"", status=200, duration_ms=0.0)
+
+
+def har_entry(started, method, url, status, time_ms, post=None):
+    request = {"method": method, "url": url, "headers": [{"name": "Accept", "value": "*/*"}]}
+    if post is not None:
+        request["postData"] = post
+    return {"startedDateTime": started, "request": request, "response": {"status": status}, "time": time_ms}
+
+
+def test_load_har():
+    entries = load_har({"log": {"entries": [
+        har_entry("2024-05-01T10:00:00.000Z", "GET", "https://api.example.com/users/42", 200, 12.5),
+        har_entry("2024-05-01T10:00:01.250+00:00", "POST", "https://api.example.com/users", 201, 30,
+                  post={"mimeType": "application/json", "text": '{"name":"ada"}'}),
+        har_entry("2024-05-01T10:00:02Z", "PUT", "https://api.example.com/avatar", 204, None,
+                  post={"text": base64.b64encode(b"\x89PNG\x00").decode(), "encoding": "base64"}),
+    ]}})
+    assert [(e.method, e.url, e.status) for e in entries] == [
+        ("GET", "https://api.example.com/users/42", 200),
+        ("POST", "https://api.example.com/users", 201),
+        ("PUT", "https://api.example.com/avatar", 204),
+    ]
+    assert entries[1].started - entries[0].started == 1.25
+    assert entries[0].started == 1714557600.0
+    assert entries[0].headers == [("Accept", "*/*")]
+    assert [e.body for e in entries] == [b"", b'{"name":"ada"}', b"\x89PNG\x00"]
+    assert [e.duration_ms for e in entries] == [12.5, 30.0, 0.0]
+
+
+def test_load_ndjson():
+    lines = [
+        json.dumps({"started": 100.5, "method": "POST", "url": "http://svc/items", "headers": [["X-A", "1"]],
+                    "body": "héllo", "status": 201, "duration_ms": 4.2}),
+        "",
+        json.dumps({"started": "101", "method": "PUT", "url": "http://svc/blob",
+                    "body_base64": base64.b64encode(b"\xff\x00").decode(), "status": 200, "duration_ms": 1}),
+        "   ",
+        json.dumps({"started": 102, "method": "GET", "url": "http://svc/"}),
+    ]
+    entries = load_ndjson(lines)
+    assert len(entries) == 3
+    assert entries[0] == Entry(100.5, "POST", "http://svc/items", [("X-A", "1")], "héllo".encode(), 201, 4.2)
+    assert (entries[1].started, entries[1].body, entries[1].headers) == (101.0, b"\xff\x00", [])
+    # Missing status and duration (a request that never got an answer)
+    assert (entries[2].body, entries[2].status, entries[2].duration_ms) == (b"", 0, 0.0)
+
+
+def test_load_detects_the_format_and_sorts(tmp_path):
+    har = tmp_path / "capture.har"
+    har.write_text(json.dumps({"log": {"entries": [
+        har_entry("2024-05-01T10:00:05Z", "GET", "http://svc/b", 200, 1),
+        har_entry("2024-05-01T10:00:00Z", "GET", "http://svc/a", 200, 1),
+    ]}}), encoding="utf-8")
+    assert [e.url for e in load(str(har))] == ["http://svc/a", "http://svc/b"]
+
+    ndjson = tmp_path / "capture.ndjson"
+    ndjson.write_text("\n".join(json.dumps({"started": s, "method": "GET", "url": u})
+                                for s, u in ((3, "http://svc/c"), (1, "http://svc/a"), (2, "http://svc/b"))) + "\n",
+                      encoding="utf-8")
+    assert [e.url for e in load(str(ndjson))] == ["http://svc/a", "http://svc/b", "http://svc/c"]
+
+    # A single NDJSON line is one JSON document, but not a HAR
+    single = tmp_path / "single.ndjson"
+    single.write_text(json.dumps({"started": 1, "method": "GET", "url": "http://svc/a"}), encoding="utf-8")
+    assert [e.url for e in load(str(single))] == ["http://svc/a"]
+
+
+def test_endpoint_folds_id_segments():
+    assert endpoint("GET", "https://svc/users/42/orders") == "GET /users/{id}/orders"
+    assert endpoint("GET", "https://svc/items/0123456789abcdef0123") == "GET /items/{id}"
+    assert endpoint("DELETE", "https://svc/s/123e4567-e89b-12d3-a456-426614174000?x=1") == "DELETE /s/{id}"
+    # Not id-like: words, short hex, versions, mixed
+    assert endpoint("GET", "https://svc/v2/users/abc/cafe/42a") == "GET /v2/users/abc/cafe/42a"
+    assert endpoint("GET", "https://svc") == "GET /"
+    assert endpoint("GET", "https://svc/?q=1") == "GET /"
+    assert endpoint("POST", "https://svc/a/7/") == "POST /a/{id}/"
+
+
+def test_router_key_prefix_matches_at_a_boundary():
+    router = Router("http://gw:8080/", {"https://api.example.com/v1/": "lp_v1"}, None)
+    assert router.url(entry("https://api.example.com/v1")) == "http://gw:8080/lp_v1"
+    assert router.url(entry("https://api.example.com/v1/users?x=1")) == "http://gw:8080/lp_v1/users?x=1"
+    assert router.url(entry("https://api.example.com/v1?x=1")) == "http://gw:8080/lp_v1?x=1"
+    # Same prefix, but not at a / or ? boundary
+    assert router.url(entry("https://api.example.com/v10/users")) is None
+    assert router.url(entry("https://api.example.com/v1.5")) is None
+    assert router.url(entry("https://api.example.com.evil.test/v1")) is None
+    assert router.url(entry("https://api.example.com/")) is None
+
+
+def test_router_prefers_the_longest_target():
+    router = Router("http://gw", {"https://svc": "lp_root", "https://svc/admin": "lp_admin"}, None)
+    assert router.url(entry("https://svc/admin/users")) == "http://gw/lp_admin/users"
+    assert router.url(entry("https://svc/administrators")) == "http://gw/lp_root/administrators"
+    assert router.url(entry("https://svc/users", method="POST")) == "http://gw/lp_root/users"
+
+
+def test_router_via_proxy_for_unmapped_gets():
+    router = Router("http://gw", {"https://svc": "lp_root"}, "fail_rate=0.1&max_latency=200")
+    assert router.url(entry("https://svc/a")) == "http://gw/lp_root/a"
+    assert router.url(entry("https://other/a?b=1")) == (
+        "http://gw/proxy?url=https%3A%2F%2Fother%2Fa%3Fb%3D1&fail_rate=0.1&max_latency=200")
+    # Only GETs go through /proxy
+    assert router.url(entry("https://other/a", method="POST")) is None
+    assert Router("http://gw", {}, "").url(entry("https://other/")) == "http://gw/proxy?url=https%3A%2F%2Fother%2F"
+    assert Router("http://gw", {}, None).url(entry("https://other/")) is None
@@ -0,0 +1,27 @@
+import os
+
+from app.core import sketch
+from app.core.rollup import RollupRecorder
+
+
+def test_sketch_is_the_api_module():
+    assert os.path.samefile(sketch._module.__file__, os.path.join(os.path.dirname(__file__), "..", "api", "sketch.py"))
+    assert sketch.LatencySketch().to_json() == {}
+
+
+def test_minutes_accumulate_per_key(monkeypatch):
+    now = [600.0]
+    monkeypatch.setattr("app.core.rollup.time.time", lambda: now[0])
+    recorder = RollupRecorder()
+    recorder.record(1, 200, 1500, 1000)
+    recorder.record(1, 503, 20, None)
+    recorder.record(2, 0, 30_000_000)
+    window = recorder._windows[1]
+    assert (window.requests, window.errors, window.statuses) == (2, 1, {200: 1, 503: 1})
+    assert window.latency.count == 2 and window.upstream.count == 1
+    assert recorder._windows[2].errors == 1
+
+    now[0] = 660.0
+    recorder.record(1, 200, 10)
+    assert [(minute, sorted(windows)) for minute, windows in recorder._closed] == [(600, [1, 2])]
+    assert recorder._windows[1].requests == 1
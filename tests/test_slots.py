@@ -0,0 +1,57 @@
+from app.core import slots
+from app.core.slots import SlotTable
+
+
+def bump(value):
+    value = (value or 0.0) + 1
+    return value, value
+
+
+def busy(value):
+    return False
+
+
+def test_values_are_kept_per_key(tmp_path):
+    table = SlotTable(str(tmp_path / "slots"), 16)
+    assert [table.update(1, bump, busy) for _ in range(3)] == [1.0, 2.0, 3.0]
+    assert table.update(2, bump, busy) == 1.0
+    # Another table on the same file (another worker) sees the same values
+    assert SlotTable(str(tmp_path / "slots"), 16).update(1, bump, busy) == 4.0
+
+
+def test_colliding_keys_probe_to_the_next_slot(tmp_path):
+    table = SlotTable(str(tmp_path / "slots"), 4)
+    keys = [0, 4, 8]  # same start slot
+    for key in keys:
+        table.update(key, bump, busy)
+    assert [table.update(key, bump, busy) for key in keys] == [2.0, 2.0, 2.0]
+
+
+def test_idle_slot_of_another_key_is_taken_over(tmp_path):
+    table = SlotTable(str(tmp_path / "slots"), 1)
+    table.update(0, bump, busy)
+    # The only slot holds key 0; key 1 may take it once its value is idle and starts from None
+    assert table.update(1, bump, idle=lambda value: True) == 1.0
+    assert table.update(0, bump, busy) == 1.0
+
+
+def test_slot_claimed_between_probe_and_lock_is_probed_again(tmp_path, monkeypatch):
+    table = SlotTable(str(tmp_path / "slots"), 16)
+    probe = SlotTable._probe
+    calls = []
+
+    def racing_probe(buf, tag, offsets, idle):
+        offset, seen = probe(buf, tag, offsets, idle)
+        if not calls:
+            # Another worker takes the empty slot for key 99 before this one locks it
+            slots._SLOT.pack_into(buf, offset, 100, 7.0)
+        calls.append(offset)
+        return offset, seen
+
+    monkeypatch.setattr(SlotTable, "_probe", staticmethod(racing_probe))
+    assert table.update(5, bump, busy) == 1.0
+    assert len(calls) == 2 and calls[1] != calls[0]
+    monkeypatch.setattr(SlotTable, "_probe", staticmethod(probe))
+    # Key 99's value survived, and key 5 finds its own slot
+    assert slots._SLOT.unpack_from(table._map, calls[0]) == (100, 7.0)
+    assert table.update(5, bump, busy) == 2.0
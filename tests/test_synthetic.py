@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import synthetic
+from app.main import app
+
+SANDBOX = "/proxy?url=http://example.com&sandbox=true"
+
+
+def collect(shape, size, chunk_size=synthetic.DEFAULT_CHUNK_SIZE):
+    async def main():
+        return [piece async for piece in synthetic.body(shape, size, chunk_size)]
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def client():
+    # No context manager: the sandbox answers without the database or the upstream pool
+    return TestClient(app)
+
+
+def test_parse_size():
+    assert synthetic.parse_size("2048") == 2048
+    assert synthetic.parse_size("64KB") == 64 << 10
+    assert synthetic.parse_size(" 10mb ") == 10 << 20
+    assert synthetic.parse_size("1GB") == 1 << 30
+    assert synthetic.parse_size("12b") == 12
+    for value in ("", "KB", "1.5MB", "10TB", "-1", "ten"):
+        with pytest.raises(ValueError):
+            synthetic.parse_size(value)
+
+
+def test_check():
+    assert synthetic.check("json", 100, None) is None
+    assert synthetic.check("text", 0, None) is None
+    assert synthetic.check("binary", synthetic.SANDBOX_MAX_BODY_BYTES, synthetic.TEMPLATE_SIZE) is None
+    assert "shape must be one of" in synthetic.check("xml", 100, None)
+    assert "size must be between" in synthetic.check("text", synthetic.SANDBOX_MAX_BODY_BYTES + 1, None)
+    assert "at least 11 bytes" in synthetic.check("json", 10, None)
+    assert "chunk_size" in synthetic.check("text", 100, synthetic.MIN_CHUNK_SIZE - 1)
+    assert "chunk_size" in synthetic.check("text", 100, synthetic.TEMPLATE_SIZE + 1)
+
+
+@pytest.mark.parametrize("size", [11, 64, 100, 128, 1000, 3 * 64 + 1])
+def test_json_bodies_are_valid_and_exact(size):
+    data = b"".join(collect("json", size, 64))
+    assert len(data) == size
+    assert set(json.loads(data)) == {"data"}
+
+
+@pytest.mark.parametrize("shape", ["text", "binary"])
+def test_bodies_are_the_template_prefix(shape):
+    for size in (0, 1, 64, 1000, synthetic.TEMPLATE_SIZE + 5):
+        pieces = collect(shape, size, 256)
+        data = b"".join(pieces)
+        assert len(data) == size
+        # Past the template the filler starts over, piece by piece
+        expected = b"".join(synthetic._filler(shape)[:len(piece)] for piece in pieces)
+        assert data == expected
+        assert all(len(piece) == 256 for piece in pieces[:-1])
+        assert not pieces or 0 < len(pieces[-1]) <= 256
+
+
+def test_pieces_are_shared_between_requests():
+    first = collect("text", 10 * 128, 128)
+    second = collect("text", 5 * 128 + 7, 128)
+    assert first[0] is second[0]
+    assert all(piece is first[1] for piece in first[1:] + second[1:-1])
+    assert len(second[-1]) == 7
+
+
+def test_sandbox_body_with_content_length(client):
+    response = client.get(SANDBOX + "&size=2KB&shape=json")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["content-length"] == "2048"
+    assert "transfer-encoding" not in response.headers
+    assert len(response.content) == 2048
+    assert json.loads(response.content)["data"].startswith("abcdefghij")
+
+
+def test_sandbox_body_chunked_with_content_type(client):
+    with client.stream("GET", SANDBOX + "&size=1000&shape=binary&chunk_size=256&content_type=image/png") as response:
+        pieces = list(response.iter_raw())
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert "content-length" not in response.headers
+    assert b"".join(pieces) == synthetic._filler("binary")[:256] * 3 + synthetic._filler("binary")[:232]
+
+
+def test_sandbox_text_shape(client):
+    response = client.get(SANDBOX + "&size=50&shape=text")
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+    assert response.text == "The quick brown fox jumps over the lazy dog.\nThe q"
+
+
+def test_sandbox_without_size_keeps_the_mock_data(client):
+    response = client.get(SANDBOX + "&shape=binary")
+    assert response.status_code == 200
+    assert response.json()["content"]["message"] == "Sandbox mode enabled"
+
+
+@pytest.mark.parametrize("query, detail", [
+    ("&size=lots", "invalid size: 'lots'"),
+    ("&size=10&shape=xml", "shape must be one of: json, text, binary"),
+    ("&size=5&shape=json", "size must be at least 11 bytes for shape json"),
+    ("&size=100&chunk_size=8", "chunk_size must be between 64 and 1048576"),
+])
+def test_sandbox_rejects_bad_parameters(client, query, detail):
+    response = client.get(SANDBOX + query)
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
+
+
+def test_sandbox_size_cap(client, monkeypatch):
+    monkeypatch.setattr(synthetic, "SANDBOX_MAX_BODY_BYTES", 4096)
+    assert client.get(SANDBOX + "&size=4KB").status_code == 200
+    response = client.get(SANDBOX + "&size=4097")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "size must be between 0 and 4096 bytes"}
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.chaos import ChaosSettings, KeyConfig, TransportFaults
+from app.routers import gateway
+from gateway_server import GatewayServer, stall
+
+
+def key(mode, **fields):
+    faults = TransportFaults(rate=100, modes=(mode,), **fields)
+    return lambda upstream_url: KeyConfig(id=1, key="lp_test", target_url=upstream_url, method="ANY",
+                                          settings=ChaosSettings(), transport_faults=faults)
+
+
+def test_from_json():
+    assert TransportFaults.from_json({"rate": 0}) is None
+    assert TransportFaults.from_json({"rate": 10, "modes": ["bogus"]}) is None
+    assert TransportFaults.from_json({"rate": 150, "modes": ["hang", "bogus"], "delay_ms": -1}) == \
+        TransportFaults(rate=100, modes=("hang",), delay_ms=0)
+
+
+def test_reset():
+    async def main():
+        async with GatewayServer(key("reset")) as server:
+            reader, writer = await server.open()
+            with pytest.raises(ConnectionResetError):
+                await asyncio.wait_for(reader.read(), 2)
+            assert server.upstream.requests == []
+            assert server.outcomes == [0]
+
+    asyncio.run(main())
+
+
+def test_hang_then_close():
+    async def main():
+        async with GatewayServer(key("hang", hang_ms=200)) as server:
+            reader, writer = await server.open()
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(reader.read(1), 0.15)
+            # Closed by the parker's reaper once hang_ms is over, still without a response
+            assert await asyncio.wait_for(reader.read(), 3) == b""
+            assert server.upstream.requests == []
+            assert server.outcomes == [0]
+
+    asyncio.run(main())
+
+
+def test_slow_first_byte_holds_the_headers():
+    async def main():
+        async with GatewayServer(key("slow_first_byte", delay_ms=300)) as server:
+            started = time.monotonic()
+            reader, writer = await server.open()
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 3)
+            assert time.monotonic() - started >= 0.3
+            assert b"x-latency-poison-transport-fault: slow_first_byte" in head.lower()
+            assert await reader.readexactly(5) == b"hello"
+            writer.close()
+
+    asyncio.run(main())
+
+
+def test_slow_body_sends_the_headers_at_once():
+    async def main():
+        async with GatewayServer(key("slow_body", delay_ms=300)) as server:
+            started = time.monotonic()
+            reader, writer = await server.open()
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 3)
+            assert time.monotonic() - started < 0.25
+            assert b"x-latency-poison-transport-fault: slow_body" in head.lower()
+            assert await asyncio.wait_for(reader.readexactly(5), 3) == b"hello"
+            assert time.monotonic() - started >= 0.3
+            writer.close()
+
+    asyncio.run(main())
+
+
+def test_client_gone_during_slow_first_byte_frees_the_upstream_connection():
+    async def main():
+        async with GatewayServer(key("slow_first_byte", delay_ms=300), stall) as server:
+            reader, writer = await server.open()
+            await asyncio.sleep(0.1)
+            writer.close()
+            await asyncio.wait_for(server.upstream.closed.wait(), 2)
+            assert gateway.pool_connections() == 0
+
+    asyncio.run(main())
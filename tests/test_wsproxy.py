@@ -0,0 +1,205 @@
+import struct
+
+from starlette.datastructures import Headers
+
+from app.core import wsproxy
+from app.core.chaos import WebSocketChaos
+from app.core.wsproxy import _frame_size, _Pipe, close_frame, is_upgrade
+
+
+def frame(payload: bytes, opcode: int = 1, fin: bool = True, masked: bool = False) -> bytes:
+    first = (0x80 if fin else 0) | opcode
+    mask = 0x80 if masked else 0
+    n = len(payload)
+    if n < 126:
+        head = bytes([first, mask | n])
+    elif n < 65536:
+        head = bytes([first, mask | 126]) + struct.pack("!H", n)
+    else:
+        head = bytes([first, mask | 127]) + struct.pack("!Q", n)
+    return head + (b"\x00" * 4 if masked else b"") + payload
+
+
+class Timer:
+    def __init__(self, loop, when, fn):
+        self.loop, self.when, self.fn = loop, when, fn
+
+    def cancel(self):
+        if self in self.loop.timers:
+            self.loop.timers.remove(self)
+
+
+class Loop:
+    """Clock moved by hand; run() fires the timers that are due."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.timers = []
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, fn):
+        timer = Timer(self, when, fn)
+        self.timers.append(timer)
+        return timer
+
+    def call_later(self, delay, fn):
+        return self.call_at(self.now + delay, fn)
+
+    def run(self, until):
+        self.now = until
+        for timer in sorted(self.timers, key=lambda t: t.when):
+            if timer.when <= until and timer in self.timers:
+                self.timers.remove(timer)
+                timer.fn()
+
+
+class Rng:
+    """random() and choice() answer from fixed lists, randrange() is 0."""
+
+    def __init__(self, randoms=(), choices=()):
+        self.randoms, self.choices = list(randoms), list(choices)
+
+    def random(self):
+        return self.randoms.pop(0) if self.randoms else 1.0
+
+    def choice(self, options):
+        return self.choices.pop(0)
+
+    def randrange(self, n):
+        return 0
+
+
+class Relay:
+    def __init__(self, rng=None):
+        self.loop = Loop()
+        self.rng = rng or Rng()
+        self.closed_with = None
+
+    def close(self, code):
+        self.closed_with = code
+
+
+class Transport:
+    def __init__(self):
+        self.written = []
+        self.closing = False
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def is_closing(self):
+        return self.closing
+
+
+def pipe(chaos=None, rng=None):
+    dst = Transport()
+    return _Pipe(Relay(rng), dst, chaos), dst
+
+
+def test_is_upgrade():
+    assert is_upgrade(Headers({"connection": "keep-alive, Upgrade", "upgrade": "WebSocket"}))
+    assert not is_upgrade(Headers({"connection": "keep-alive", "upgrade": "websocket"}))
+    assert not is_upgrade(Headers({"connection": "upgrade", "upgrade": "h2c"}))
+
+
+def test_frame_size():
+    assert _frame_size(bytearray(b"\x81"), 0) is None
+    assert _frame_size(bytearray(frame(b"hello")), 0) == 7
+    assert _frame_size(bytearray(frame(b"hello", masked=True)), 0) == 11
+    big = frame(b"x" * 300)
+    assert _frame_size(bytearray(big[:3]), 0) is None
+    assert _frame_size(bytearray(big[:4]), 0) == 304
+    huge = frame(b"x" * 70000, masked=True)
+    assert _frame_size(bytearray(huge[:9]), 0) is None
+    assert _frame_size(bytearray(huge[:10]), 0) == 70014
+    # From an offset inside the buffer
+    assert _frame_size(bytearray(b"zz" + frame(b"ab")), 2) == 4
+
+
+def test_close_frame():
+    assert close_frame(1011, masked=False) == b"\x88\x02\x03\xf3"
+    masked = close_frame(1001, masked=True)
+    assert masked[:2] == b"\x88\x82" and len(masked) == 8
+    key = masked[2:6]
+    assert bytes(b ^ key[i] for i, b in enumerate(masked[6:])) == struct.pack("!H", 1001)
+
+
+def test_without_chaos_bytes_pass_unparsed():
+    p, dst = pipe()
+    p.feed(b"\x81")
+    p.feed(b"\x05hel")
+    assert dst.written == [b"\x81", b"\x05hel"]
+
+
+def test_messages_are_split_across_reads():
+    p, dst = pipe(WebSocketChaos(min_delay_ms=0, max_delay_ms=0, rate=0))
+    data = frame(b"one") + frame(b"two", masked=True)
+    for i in range(len(data)):
+        p.feed(data[i:i + 1])
+    assert dst.written == [frame(b"one"), frame(b"two", masked=True)]
+    assert not p.buf
+
+
+def test_fragmented_message_is_held_until_fin_and_control_frames_go_first():
+    p, dst = pipe(WebSocketChaos(rate=0))
+    first, ping, last = frame(b"he", fin=False), frame(b"", opcode=9), frame(b"llo", opcode=0)
+    p.feed(first + ping)
+    assert dst.written == [ping]
+    p.feed(last)
+    assert dst.written == [ping, first + last]
+
+
+def test_delay_keeps_order():
+    p, dst = pipe(WebSocketChaos(min_delay_ms=50))
+    loop = p.relay.loop
+    p.feed(frame(b"a"))
+    p.feed(frame(b"", opcode=9))
+    assert dst.written == []
+    loop.run(100.049)
+    assert dst.written == []
+    loop.run(100.05)
+    # The ping was queued behind the delayed message
+    assert dst.written == [frame(b"a"), frame(b"", opcode=9)]
+
+
+def test_drop_duplicate_and_close():
+    chaos = WebSocketChaos(rate=100, modes=("drop", "duplicate", "close"), close_code=4000)
+    p, dst = pipe(chaos, Rng(randoms=[0.0] * 3, choices=["drop", "duplicate", "close"]))
+    p.feed(frame(b"a") + frame(b"b") + frame(b"c"))
+    assert dst.written == [frame(b"b"), frame(b"b")]
+    assert p.relay.closed_with == 4000
+
+
+def test_reorder_holds_until_next_message_or_timeout():
+    chaos = WebSocketChaos(rate=50, modes=("reorder",))
+    p, dst = pipe(chaos, Rng(randoms=[0.0, 0.9, 0.0], choices=["reorder", "reorder"]))
+    p.feed(frame(b"a"))
+    assert dst.written == []
+    p.feed(frame(b"b"))
+    assert dst.written == [frame(b"b"), frame(b"a")]
+    p.feed(frame(b"c"))
+    assert dst.written == [frame(b"b"), frame(b"a")]
+    p.relay.loop.run(100 + wsproxy.REORDER_HOLD)
+    assert dst.written[-1] == frame(b"c")
+
+
+def test_oversized_message_passes_through(monkeypatch):
+    monkeypatch.setattr(wsproxy, "WEBSOCKET_MAX_MESSAGE", 10)
+    chaos = WebSocketChaos(rate=100, modes=("drop",))
+    p, dst = pipe(chaos, Rng(randoms=[0.0], choices=["drop"]))
+    big = frame(b"x" * 20)
+    # Relayed as it arrives, including the rest of a frame split across reads
+    p.feed(big[:8])
+    p.feed(big[8:])
+    assert b"".join(dst.written) == big
+    p.feed(frame(b"y"))
+    assert b"".join(dst.written) == big  # back to chaos: dropped
+
+
+def test_nothing_written_to_a_closing_transport():
+    p, dst = pipe()
+    dst.closing = True
+    p.feed(frame(b"a"))
+    assert dst.written == []